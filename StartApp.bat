@@ -71,6 +71,15 @@ if not exist "migrations\versions\" (
   mkdir "migrations\versions"
 )
 
+REM ===== Bring an existing database up to the shipped revisions =====
+echo Applying shipped migrations...
+flask db upgrade
+if errorlevel 1 (
+  echo ERROR: flask db upgrade failed
+  pause
+  exit /b 1
+)
+
 REM ===== Create migration (safe to run) =====
 echo Generating migration...
 flask db migrate -m "auto migration"
@@ -126,7 +135,7 @@ echo [3/4] All dependencies installed. Automatically starting servers...
 
 REM Backend window - Start in new CMD window
 echo Starting BACKEND server...
-start "BACKEND Server" cmd /k "cd /d "%~dp0backend" && call venv\Scripts\activate.bat && python app.py"
+start "BACKEND Server" cmd /k "cd /d "%~dp0backend" && call venv\Scripts\activate.bat && python run.py"
 
 REM Wait a bit for backend to start
 timeout /t 3 /nobreak >nul
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, url_for, current_app
+from flask import Flask, Response, request, jsonify, stream_with_context, url_for, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import (
     JWTManager, create_access_token, create_refresh_token,
@@ -14,11 +14,12 @@ import random
 import json
 import string
 import math
+import time
 import smtplib
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from models import db, User, Destination, SavedDestination, Review, Itinerary, Region, Province, DestinationImage
+from models import db, User, Destination, SavedDestination, Review, Itinerary, Region, Province, DestinationImage, Tag, destination_tags, AiJob, CatalogMeta
 from routes.chat import chat_bp
 from routes.search import search_bp
 from routes.auth import auth_bp
@@ -27,6 +28,36 @@ from routes.profile import profile_bp
 from routes.saved import saved_bp
 from utils.env_loader import load_backend_env
 from utils.openai_client import OpenAIChatClient
+from utils.catalog_cache import (
+    destination_card_cache, get_catalog_version, install_catalog_listeners, sync_catalog_version
+)
+from utils.search_index import (
+    install_search_index_listeners, ranked_match_subquery, rebuild_search_index, search_index_available
+)
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE, InvalidPageParams, fetch_keyset_page, fetch_ranked_page, parse_page_args
+)
+from utils.tag_index import install_tag_listeners, rebuild_destination_tags, tag_index
+from utils.http_cache import catalog_conditional
+from utils.geo_index import (
+    candidate_subquery, geo_index_available, install_geo_index_listeners, radius_bbox, rebuild_geo_index
+)
+from utils.travel_matrix import DEFAULT_SPEED_KMH, TRAVEL_SPEEDS_KMH, haversine_distance, haversine_km
+from utils.card_images import install_card_image_listeners, public_image_url, rebuild_card_images
+from utils.itinerary_planner import (
+    DAY_END_MIN, DAY_START_MIN, Stop, can_visit, choose_base, day_centroids, format_time_slot, insert_stop,
+    parse_time_slot, schedule_stops
+)
+from utils.itinerary_variants import OBJECTIVES, VariantPlace, VariantProblem, solve_variant, solve_variants
+from utils.place_selection import TRAVEL_ALLOWANCE_MIN
+from utils.place_types import install_accommodation_listeners, rebuild_accommodation_flags
+from utils.opening_hours import install_opening_hours_listeners, rebuild_opening_windows
+from utils.candidate_pool import candidate_pool
+from utils.draft_cache import catalog_token, draft_key, draft_seed, itinerary_draft_cache
+from utils.job_queue import ai_job_queue
+from utils.fieldsets import (
+    DESTINATION_FIELDS, Field, InvalidFieldset, parse_fieldset, project_destinations
+)
 from sqlalchemy.orm import joinedload
 from flask_migrate import Migrate
 import flask_migrate
@@ -50,7 +81,8 @@ REGION_CONFIG = {
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
+# DATABASE_URL: dùng CSDL khác (vd. benchmarks.itinerary_generation chạy trên file SQLite tạm)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'your_super_secret_key'
 app.config['JSON_AS_ASCII'] = False
@@ -66,6 +98,33 @@ db.init_app(app)
 jwt = JWTManager(app)
 migrate = Migrate(app, db)
 
+# Mọi thay đổi catalog (API, seed.py) đều làm mất hiệu lực cache card địa điểm
+install_catalog_listeners(db.metadata, {
+    Destination: lambda dest: [dest.id],
+    DestinationImage: lambda img: [img.destination_id],
+    Province: lambda province: None,
+    Region: lambda region: None,
+}, meta_table=CatalogMeta.__table__)
+
+
+@app.before_request
+def _sync_catalog_version():
+    # seed.py, lệnh CLI hay worker khác ghi catalog: nhận ra qua catalog_meta và bỏ cache trong process.
+    # Tối đa một lần đọc mỗi CATALOG_SYNC_INTERVAL giây, không phải mỗi request (kể cả 304)
+    sync_catalog_version(db.engine, throttle=True)
+
+# Đồng bộ bảng FTS5 destinations_fts khi ghi Destination/Province
+install_search_index_listeners(db.metadata, Destination, Province)
+install_tag_listeners(Destination, Tag, destination_tags)
+# Chỉ mục không gian R*Tree cho /api/destinations/nearby và /bbox
+install_geo_index_listeners(db.metadata, Destination)
+# Ảnh card + thumbnail resolve sẵn khi ghi Destination/DestinationImage
+install_card_image_listeners(Destination, DestinationImage)
+# Cờ is_accommodation tính từ place_type khi ghi (dùng khi chọn địa điểm cho lịch trình)
+install_accommodation_listeners(Destination)
+# Parse opening_hours thành khung giờ (phút trong ngày) ngay khi ghi, không parse lúc request
+install_opening_hours_listeners(Destination)
+
 
 @app.cli.command("db-migrate")
 @click.option("-m", "--message", default="Auto migration", help="Migration message")
@@ -94,6 +153,54 @@ def db_upgrade_safe():
         click.echo(f"Error running upgrade: {e}")
         raise
 
+@app.cli.command("search-reindex")
+@with_appcontext
+def search_reindex():
+    """Rebuild the destinations_fts full-text index from the destinations table."""
+    count = rebuild_search_index(db.session, Destination, Province)
+    db.session.commit()
+    click.echo(f"Done: indexed {count} destinations.")
+
+@app.cli.command("tags-reindex")
+@with_appcontext
+def tags_reindex():
+    """Rebuild the tags / destination_tags tables from Destination.tags."""
+    count = rebuild_destination_tags(db.session, Destination, Tag, destination_tags)
+    db.session.commit()
+    click.echo(f"Done: linked {count} destination tags.")
+
+@app.cli.command("geo-reindex")
+@with_appcontext
+def geo_reindex():
+    """Rebuild the destinations_rtree spatial index from destination coordinates."""
+    count = rebuild_geo_index(db.session, Destination)
+    db.session.commit()
+    click.echo(f"Done: indexed {count} destination coordinates.")
+
+@app.cli.command("card-images-rebuild")
+@with_appcontext
+def card_images_rebuild():
+    """Recompute Destination.card_image_url / card_thumbnail_url and write local thumbnails."""
+    count = rebuild_card_images(db.session, Destination, DestinationImage, app.static_folder)
+    db.session.commit()
+    click.echo(f"Done: resolved {count} card images.")
+
+@app.cli.command("accommodation-reindex")
+@with_appcontext
+def accommodation_reindex():
+    """Recompute Destination.is_accommodation from place_type."""
+    count = rebuild_accommodation_flags(db.session, Destination)
+    db.session.commit()
+    click.echo(f"Done: flagged {count} accommodations.")
+
+@app.cli.command("opening-hours-reindex")
+@with_appcontext
+def opening_hours_reindex():
+    """Re-parse Destination.opening_hours into opening_windows."""
+    count = rebuild_opening_windows(db.session, Destination)
+    db.session.commit()
+    click.echo(f"Done: parsed opening hours for {count} destinations.")
+
 # Register blueprints
 app.register_blueprint(chat_bp, url_prefix="/api/chat")
 app.register_blueprint(search_bp, url_prefix="/api/search")
@@ -137,34 +244,6 @@ def get_province_name_by_id(province_id):
     province = db.session.get(Province, province_id)
     return province.name if province else "Can't find..."
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Tính khoảng cách thực tế (km) giữa hai điểm GPS sử dụng Haversine formula.
-    Chính xác hơn simple_distance cho tính toán địa lý thực tế.
-    """
-    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
-        return None
-    
-    # Bán kính Trái Đất (km)
-    R = 6371.0
-    
-    # Chuyển đổi độ sang radian
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Chênh lệch
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Haversine formula
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return round(distance, 2)
-
 def estimate_travel_time_km(distance_km, transport_mode="car"):
     """
     Ước tính thời gian di chuyển (phút) dựa trên khoảng cách và phương tiện.
@@ -173,12 +252,8 @@ def estimate_travel_time_km(distance_km, transport_mode="car"):
     if distance_km is None or distance_km <= 0:
         return 0
     
-    speeds = {
-        "car": 50,  # km/h
-        "walk": 5,  # km/h
-        "bike": 15  # km/h
-    }
-    speed = speeds.get(transport_mode, 50)
+    # Bảng tốc độ dùng chung với utils/travel_matrix (ma trận thời gian di chuyển)
+    speed = TRAVEL_SPEEDS_KMH.get(transport_mode, DEFAULT_SPEED_KMH)
     time_hours = distance_km / speed
     return int(time_hours * 60)  # trả về phút
 
@@ -224,33 +299,102 @@ def generate_otp(length=6):
     """Tạo mã OTP ngẫu nhiên gồm 6 chữ số"""
     return ''.join(random.choices(string.digits, k=length))
 
-# HÀM MỚI: Xử lý ưu tiên URL ảnh cho RecommendCard
-def get_card_image_url(destination):
+# -------- CACHE CARD ĐỊA ĐIỂM --------
+def build_destination_card(dest):
     """
-    Ưu tiên lấy URL ảnh: 
-    1. image_url chính (cột đơn). 
-    2. DUYỆT qua danh sách DestinationImage cho đến khi tìm thấy URL hợp lệ.
+    Phần tĩnh của card địa điểm (được cache theo id).
+    Không gồm 'weather' (random mỗi request) và 'image_url' (phụ thuộc host của request).
     """
-    # 1. Kiểm tra cột image_url chính
-    if destination.image_url:
-        source_url = destination.image_url
-        if source_url and (source_url.startswith('http://') or source_url.startswith('https://')):
-            return source_url # URL mạng
-        else:
-            # Đường dẫn cục bộ (ví dụ: halong.png)
-            image_filename = source_url.split("/")[-1]
-            return request.host_url.rstrip('/') + url_for('static', filename=f'images/{image_filename}')
-
-    # 2. Duyệt qua danh sách DestinationImage (ảnh mạng)
-    # Nếu ảnh chính NULL, ta duyệt qua các ảnh chi tiết
-    elif destination.images: 
-        for image_obj in destination.images:
-            url = image_obj.image_url
-            if url and (url.startswith('http://') or url.startswith('https://')):
-                # Trả về URL mạng đầu tiên hợp lệ tìm thấy
-                return url
+    province = dest.province
+    region = province.region if province else None
+    region_name = region.name if region else "Miền Nam" 
+
+    return {
+        "id": dest.id,
+        "name": dest.name,
+        "province_name": province.name if province else None,
+        "region_name": region_name, 
+        "description": decode_db_json_string(dest.description),
+        "image_source": dest.card_image_url, 
+        "thumbnail_source": dest.card_thumbnail_url,
+        "latitude": dest.latitude,
+        "longitude": dest.longitude,
+        "rating": dest.rating or 0,
+        "category": dest.category,
+        "tags": decode_db_json_string(dest.tags, default_type='text'),
         
-    return None # Trả về None nếu không có ảnh nào hợp lệ tìm thấy
+        #TAO CẤM THẰNG NÀO XOÁ CỦA TAOOOOOO!!!!!!!!
+        "gps": {
+            "lat": dest.latitude,
+            "lng": dest.longitude
+        } if dest.latitude and dest.longitude else None,    
+        "images": [img.image_url for img in dest.images],
+        "type": dest.place_type,
+        "place_type": dest.place_type,
+        "opening_hours": dest.opening_hours,
+        "entry_fee": dest.entry_fee,
+        "source": dest.source
+    }
+
+def render_destination_card(card):
+    """Ghép phần phụ thuộc request (image_url, weather) vào card đã cache."""
+    result = {}
+    for key, value in card.items():
+        if key == "image_source":
+            result["image_url"] = public_image_url(value)
+        elif key == "thumbnail_source":
+            result["thumbnail_url"] = public_image_url(value)
+        elif key == "tags":
+            result[key] = value
+            result["weather"] = generate_random_weather(card["region_name"])
+        else:
+            result[key] = value
+    return result
+
+CARD_LOAD_CHUNK_SIZE = 500  # Giới hạn số tham số trong mệnh đề IN của SQLite
+
+def get_destination_cards(destination_ids):
+    """Lấy card theo thứ tự destination_ids: đọc từ cache, chỉ query DB cho id còn thiếu."""
+    cards, missing = destination_card_cache.get_many(destination_ids)
+    if missing:
+        version = get_catalog_version()
+        for start in range(0, len(missing), CARD_LOAD_CHUNK_SIZE):
+            chunk = missing[start:start + CARD_LOAD_CHUNK_SIZE]
+            rows = Destination.query.options(
+                db.joinedload(Destination.images),
+                db.joinedload(Destination.province).joinedload(Province.region)
+            ).filter(Destination.id.in_(chunk)).all()
+            for dest in rows:
+                cards[dest.id] = destination_card_cache.put(dest.id, build_destination_card(dest), version)
+    return [render_destination_card(cards[dest_id]) for dest_id in destination_ids if dest_id in cards]
+
+# -------- SPARSE FIELDSETS (fields= / view=summary|full) --------
+DESTINATION_CARD_FIELDS = (
+    "id", "name", "province_name", "region_name", "description", "image_url", "thumbnail_url",
+    "latitude", "longitude", "rating", "category", "tags", "weather", "gps", "images", "type",
+    "place_type", "opening_hours", "entry_fee", "source",
+)
+DESTINATION_CARD_SUMMARY = ("id", "name", "province_name", "thumbnail_url", "rating")
+
+# by-province: gps luôn là dict, images là ảnh đầu tiên của gallery (như trước, KHÔNG phải ảnh card:
+# card ưu tiên Destination.image_url và bỏ qua ảnh không phải web)
+PROVINCE_LISTING_SPEC = {
+    **DESTINATION_FIELDS,
+    "images": Field(("id",), lambda row, ctx: list(ctx.images.get(row.id, ()))[:1], needs_images=lambda row: True),
+    "gps": Field(("latitude", "longitude"), lambda row, ctx: {"lat": row.latitude, "lng": row.longitude}),
+}
+PROVINCE_LISTING_FIELDS = (
+    "id", "name", "type", "description_snippet", "images", "gps", "entry_fee", "tags",
+)
+PROVINCE_LISTING_SUMMARY = ("id", "name", "type", "images")
+
+def get_destination_projection(destination_ids, fields, spec=DESTINATION_FIELDS):
+    """Chỉ SELECT các cột cần cho `fields` (không hydrate ORM, chỉ đọc ảnh khi cần)."""
+    return project_destinations(
+        db.session, destination_ids, fields, spec,
+        (Destination, Province, Region, DestinationImage),
+        public_image_url, generate_random_weather
+    )
 
 # ----------------- Routes -----------------
 
@@ -510,22 +654,15 @@ def apply_heuristic_fallback(existing_result, compact_edited, raw_reply=None):
 
 
 # ----------------- AI Evaluation Route -----------------
-@app.route("/api/ai/evaluate_itinerary", methods=["POST"])
-def evaluate_itinerary():
-    """
-    Accepts JSON: { edited_itinerary: [...], original_itinerary?: [...], context?: {...} }
-    Returns AI evaluation as structured JSON or a text summary.
-    Note: Only edited_itinerary is required. original_itinerary is optional.
+def evaluate_itinerary_result(payload):
+    """Đánh giá lịch trình (AI + heuristic dự phòng) -> dict "result"; payload phải có edited_itinerary.
+
+    Dùng chung cho route đồng bộ và job nền (POST /api/ai/jobs/evaluate_itinerary).
     """
-    payload = request.get_json() or {}
     edited = payload.get("edited_itinerary")
     original = payload.get("original_itinerary")  # Optional - only used for comparison if provided
     context = payload.get("context") or {}
 
-    # ✅ CHỈ YÊU CẦU edited_itinerary (phần chỉnh sửa)
-    if edited is None:
-        return jsonify({"error": "edited_itinerary is required"}), 400
-    
     # If original_itinerary is not provided, use edited_itinerary as both (for backward compatibility)
     if original is None:
         original = edited
@@ -683,241 +820,256 @@ def evaluate_itinerary():
     user_content = json.dumps(user_payload, ensure_ascii=False)
 
     ai = OpenAIChatClient()
-    try:
-        reply = ai.generate_reply([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ])
+    reply = ai.generate_reply([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ])
 
-        parsed = try_parse_json_from_text(reply)
+    parsed = try_parse_json_from_text(reply)
 
-        # Helper to compute severity color
-        def severity_from_score(s):
-            try:
-                s = int(round(float(s)))
-            except Exception:
-                return "red"
-            if s <= 39:
-                return "red"
-            if s <= 59:
-                return "orange"
-            if s <= 79:
-                return "yellow"
-            return "green"
-
-        # Build a normalized strict response from parsed or heuristics
-        result = None
-        if parsed is not None and isinstance(parsed, dict):
-            result = parsed
-
-        if not result:
-            # fallback: heuristic evaluator
-            heuristic = apply_heuristic_fallback(None, compact_edited, raw_reply=reply)
-            # adapt heuristic keys into new strict schema
-            score = heuristic.get("score", 50)
-            decision = heuristic.get("decision", "balance")
-            summary = heuristic.get("summary", "Heuristic evaluation applied.")
-            suggestions = heuristic.get("suggestions", [])
-            # build details_per_day
-            details = []
-            for day in compact_edited:
-                dkey = f"day-{day.get('day')}"
-                notes = heuristic.get("details", {}).get(dkey, [])
-                details.append({"day": day.get("day"), "issues": [], "notes": ", ".join([n.get('note') if isinstance(n, dict) else str(n) for n in notes]) if notes else "", "recommended_actions": []})
+    # Helper to compute severity color
+    def severity_from_score(s):
+        try:
+            s = int(round(float(s)))
+        except Exception:
+            return "red"
+        if s <= 39:
+            return "red"
+        if s <= 59:
+            return "orange"
+        if s <= 79:
+            return "yellow"
+        return "green"
+
+    # Build a normalized strict response from parsed or heuristics
+    result = None
+    if parsed is not None and isinstance(parsed, dict):
+        result = parsed
+
+    if not result:
+        # fallback: heuristic evaluator
+        heuristic = apply_heuristic_fallback(None, compact_edited, raw_reply=reply)
+        # adapt heuristic keys into new strict schema
+        score = heuristic.get("score", 50)
+        decision = heuristic.get("decision", "balance")
+        summary = heuristic.get("summary", "Heuristic evaluation applied.")
+        suggestions = heuristic.get("suggestions", [])
+        # build details_per_day
+        details = []
+        for day in compact_edited:
+            dkey = f"day-{day.get('day')}"
+            notes = heuristic.get("details", {}).get(dkey, [])
+            details.append({"day": day.get("day"), "issues": [], "notes": ", ".join([n.get('note') if isinstance(n, dict) else str(n) for n in notes]) if notes else "", "recommended_actions": []})
 
-            # optimized_itinerary: as simple copy of edited (frontend will refine)
-            optimized = []
+        # optimized_itinerary: as simple copy of edited (frontend will refine)
+        optimized = []
+        for day in compact_edited:
+            items = []
+            for p in day.get("places", []):
+                items.append({
+                    "id": p.get("id") or None,
+                    "name": p.get("name") or "",
+                    "type": p.get("category") or "sightseeing",
+                    "lat": p.get("lat"),
+                    "lng": p.get("lon"),
+                    "start_time": p.get("time_slot") or None,
+                    "end_time": None,
+                    "duration_min": int((p.get("duration_hours") or 0) * 60),
+                    "distance_from_prev_km": 0,
+                    "needs_data": False,
+                    "why_this_here": "kept from edited itinerary",
+                })
+            optimized.append({"day": day.get("day"), "items": items})
+
+        # Ensure summary is 2-3 sentences max
+        summary_text = summary
+        if summary_text:
+            sentences = summary_text.split('. ')
+            if len(sentences) > 3:
+                summary_text = '. '.join(sentences[:3]) + '.'
+        
+        # Ensure suggestions are detailed and day-by-day
+        enhanced_suggestions = suggestions
+        if not enhanced_suggestions or len(enhanced_suggestions) == 0:
+            # Generate basic suggestions from days
+            enhanced_suggestions = []
             for day in compact_edited:
-                items = []
-                for p in day.get("places", []):
-                    items.append({
-                        "id": p.get("id") or None,
-                        "name": p.get("name") or "",
-                        "type": p.get("category") or "sightseeing",
-                        "lat": p.get("lat"),
-                        "lng": p.get("lon"),
-                        "start_time": p.get("time_slot") or None,
-                        "end_time": None,
-                        "duration_min": int((p.get("duration_hours") or 0) * 60),
-                        "distance_from_prev_km": 0,
-                        "needs_data": False,
-                        "why_this_here": "kept from edited itinerary",
-                    })
-                optimized.append({"day": day.get("day"), "items": items})
-
-            # Ensure summary is 2-3 sentences max
-            summary_text = summary
-            if summary_text:
-                sentences = summary_text.split('. ')
-                if len(sentences) > 3:
-                    summary_text = '. '.join(sentences[:3]) + '.'
-            
-            # Ensure suggestions are detailed and day-by-day
-            enhanced_suggestions = suggestions
-            if not enhanced_suggestions or len(enhanced_suggestions) == 0:
-                # Generate basic suggestions from days
-                enhanced_suggestions = []
-                for day in compact_edited:
-                    day_num = day.get("day", 1)
-                    places = day.get("places", [])
-                    if len(places) == 0:
-                        enhanced_suggestions.append(f"Day {day_num}: This day is empty. Consider adding activities or places to visit.")
-                    else:
-                        for idx, place in enumerate(places[:3]):  # Limit to first 3 places per day
-                            place_name = place.get("name", "Place")
-                            time_slot = place.get("time_slot", "morning")
-                            enhanced_suggestions.append(f"Day {day_num}: {time_slot} - Visit {place_name}. Allow adequate time for travel and rest.")
-            
-            result = {
-                "score": heuristic.get("score", 50),
-                "severity_color": severity_from_score(heuristic.get("score", 50)),
-                "decision": heuristic.get("decision", "balance"),
-                "summary": summary_text,
-                "suggestions": enhanced_suggestions,
-                "details_per_day": details,
-                "patch_preview": {"will_reorder": True, "will_fill_missing": True, "will_add_places_from_db": False, "days_affected": [d.get("day") for d in compact_edited]},
-                "optimized_itinerary": optimized,
-                "quality_checks": {"has_meals_each_day": False, "has_rest_blocks": True, "total_moves_reasonable": True, "overlaps_found": False, "missing_geo_count": sum(1 for d in compact_edited for p in d.get("places", []) if not p.get("lat") and not p.get("lon"))}
-            }
+                day_num = day.get("day", 1)
+                places = day.get("places", [])
+                if len(places) == 0:
+                    enhanced_suggestions.append(f"Day {day_num}: This day is empty. Consider adding activities or places to visit.")
+                else:
+                    for idx, place in enumerate(places[:3]):  # Limit to first 3 places per day
+                        place_name = place.get("name", "Place")
+                        time_slot = place.get("time_slot", "morning")
+                        enhanced_suggestions.append(f"Day {day_num}: {time_slot} - Visit {place_name}. Allow adequate time for travel and rest.")
+        
+        result = {
+            "score": heuristic.get("score", 50),
+            "severity_color": severity_from_score(heuristic.get("score", 50)),
+            "decision": heuristic.get("decision", "balance"),
+            "summary": summary_text,
+            "suggestions": enhanced_suggestions,
+            "details_per_day": details,
+            "patch_preview": {"will_reorder": True, "will_fill_missing": True, "will_add_places_from_db": False, "days_affected": [d.get("day") for d in compact_edited]},
+            "optimized_itinerary": optimized,
+            "quality_checks": {"has_meals_each_day": False, "has_rest_blocks": True, "total_moves_reasonable": True, "overlaps_found": False, "missing_geo_count": sum(1 for d in compact_edited for p in d.get("places", []) if not p.get("lat") and not p.get("lon"))}
+        }
 
-        else:
-            # parsed from AI — normalize to required keys, apply heuristics for missing pieces
-            score = result.get("score", 0)
-            severity = severity_from_score(score)
-            # decision mapping: ensure it's one of allowed
-            decision = result.get("decision") or "balance"
-            if decision not in ["add_days", "reorder", "fill_missing", "balance", "ok"]:
-                # map some common synonyms
-                mapping = {"accept": "ok", "revise": "balance", "add_days": "add_days", "reorder": "reorder", "fill_missing": "fill_missing"}
-                decision = mapping.get(decision, "balance")
-
-            # details_per_day: try to construct from result.details or result.details_per_day
-            details_per_day = []
-            raw_details = result.get("details_per_day") or result.get("details") or {}
-            if isinstance(raw_details, dict):
-                for k, v in raw_details.items():
-                    # extract day number
-                    m = re.search(r"(\d+)$", str(k))
-                    daynum = int(m.group(1)) if m else None
-                    notes = []
-                    if isinstance(v, list):
-                        for it in v:
-                            if isinstance(it, dict) and it.get("note"):
-                                notes.append(str(it.get("note")))
-                            else:
-                                notes.append(str(it))
-                    else:
-                        notes.append(str(v))
-                    details_per_day.append({"day": daynum, "issues": [], "notes": ", ".join(notes), "recommended_actions": []})
-            elif isinstance(raw_details, list):
-                for entry in raw_details:
-                    details_per_day.append(entry)
-
-            optimized = result.get("optimized_itinerary") or result.get("suggested_itinerary") or []
-
-            # Ensure summary is 3-5 sentences (3-5 lines) like an experienced tour guide
-            summary_text = result.get("summary", "")
-            if not summary_text or len(summary_text.strip()) < 20:
-                # Generate fallback summary if missing or too short
-                total_days = len(compact_edited)
-                empty_days = sum(1 for d in compact_edited if not d.get("places") or len(d.get("places", [])) == 0)
-                total_places = sum(len(d.get("places", [])) for d in compact_edited)
-                
-                summary_parts = []
-                summary_parts.append(f"Lịch trình có {total_days} ngày với tổng cộng {total_places} địa điểm tham quan.")
-                if empty_days > 0:
-                    summary_parts.append(f"Có {empty_days} ngày còn trống, nên bổ sung thêm địa điểm để tận dụng thời gian.")
-                summary_parts.append("Cần cân bằng giữa các hoạt động tham quan, ăn uống và nghỉ ngơi để có trải nghiệm tốt nhất.")
-                if total_places > 0:
-                    avg_per_day = total_places / total_days
-                    if avg_per_day > 4:
-                        summary_parts.append("Một số ngày có quá nhiều địa điểm, nên giảm bớt hoặc tăng thời gian tham quan.")
-                    elif avg_per_day < 1:
-                        summary_parts.append("Nên thêm nhiều địa điểm hơn để làm phong phú lịch trình.")
-                summary_text = " ".join(summary_parts)
-            elif summary_text:
-                sentences = summary_text.split('. ')
-                if len(sentences) > 5:
-                    summary_text = '. '.join(sentences[:5]) + '.'
+    else:
+        # parsed from AI — normalize to required keys, apply heuristics for missing pieces
+        score = result.get("score", 0)
+        severity = severity_from_score(score)
+        # decision mapping: ensure it's one of allowed
+        decision = result.get("decision") or "balance"
+        if decision not in ["add_days", "reorder", "fill_missing", "balance", "ok"]:
+            # map some common synonyms
+            mapping = {"accept": "ok", "revise": "balance", "add_days": "add_days", "reorder": "reorder", "fill_missing": "fill_missing"}
+            decision = mapping.get(decision, "balance")
+
+        # details_per_day: try to construct from result.details or result.details_per_day
+        details_per_day = []
+        raw_details = result.get("details_per_day") or result.get("details") or {}
+        if isinstance(raw_details, dict):
+            for k, v in raw_details.items():
+                # extract day number
+                m = re.search(r"(\d+)$", str(k))
+                daynum = int(m.group(1)) if m else None
+                notes = []
+                if isinstance(v, list):
+                    for it in v:
+                        if isinstance(it, dict) and it.get("note"):
+                            notes.append(str(it.get("note")))
+                        else:
+                            notes.append(str(it))
+                else:
+                    notes.append(str(v))
+                details_per_day.append({"day": daynum, "issues": [], "notes": ", ".join(notes), "recommended_actions": []})
+        elif isinstance(raw_details, list):
+            for entry in raw_details:
+                details_per_day.append(entry)
+
+        optimized = result.get("optimized_itinerary") or result.get("suggested_itinerary") or []
+
+        # Ensure summary is 3-5 sentences (3-5 lines) like an experienced tour guide
+        summary_text = result.get("summary", "")
+        if not summary_text or len(summary_text.strip()) < 20:
+            # Generate fallback summary if missing or too short
+            total_days = len(compact_edited)
+            empty_days = sum(1 for d in compact_edited if not d.get("places") or len(d.get("places", [])) == 0)
+            total_places = sum(len(d.get("places", [])) for d in compact_edited)
             
-            # Enhance suggestions if they're not detailed enough - generate complete timeline (8:00-17:00)
-            suggestions_list = result.get("suggestions", [])
-            if not suggestions_list or len(suggestions_list) == 0:
-                # Generate detailed day-by-day suggestions with complete timeline
-                suggestions_list = []
-                for day in compact_edited:
-                    day_num = day.get("day", 1)
-                    places = day.get("places", [])
-                    
-                    if len(places) == 0:
-                        # Empty day - suggest full schedule
-                        suggestions_list.extend([
-                            f"Day {day_num}: 08:00-10:00 - Tham quan địa điểm - Nên thêm địa điểm tham quan vào buổi sáng.",
-                            f"Day {day_num}: 10:00-10:30 - Di chuyển - Thời gian di chuyển giữa các địa điểm.",
-                            f"Day {day_num}: 10:30-12:30 - Tham quan địa điểm - Tiếp tục khám phá.",
-                            f"Day {day_num}: 12:30-13:00 - Ăn trưa - Nghỉ ngơi và thưởng thức bữa trưa (30 phút).",
-                            f"Day {day_num}: 13:00-13:30 - Nghỉ ngơi - Nghỉ giải lao sau bữa trưa (30 phút).",
-                            f"Day {day_num}: 13:30-15:30 - Tham quan địa điểm - Hoạt động buổi chiều.",
-                            f"Day {day_num}: 15:30-16:00 - Di chuyển - Quay về hoặc di chuyển đến điểm tiếp theo.",
-                            f"Day {day_num}: 16:00-17:00 - Nghỉ ngơi hoặc tự do - Thời gian tự do để nghỉ ngơi.",
-                        ])
-                    else:
-                        # Generate suggestions based on existing places with timeline
-                        current_time = 8 * 60  # Start at 8:00 AM (in minutes)
-                        for idx, place in enumerate(places):
-                            place_name = place.get("name", "Địa điểm")
-                            duration = place.get("duration_hours", 2) * 60  # Convert to minutes
-                            
-                            start_hour = current_time // 60
-                            start_min = current_time % 60
-                            end_time = current_time + duration
-                            end_hour = end_time // 60
-                            end_min = end_time % 60
-                            
-                            start_str = f"{start_hour:02d}:{start_min:02d}"
-                            end_str = f"{end_hour:02d}:{end_min:02d}"
-                            
+            summary_parts = []
+            summary_parts.append(f"Lịch trình có {total_days} ngày với tổng cộng {total_places} địa điểm tham quan.")
+            if empty_days > 0:
+                summary_parts.append(f"Có {empty_days} ngày còn trống, nên bổ sung thêm địa điểm để tận dụng thời gian.")
+            summary_parts.append("Cần cân bằng giữa các hoạt động tham quan, ăn uống và nghỉ ngơi để có trải nghiệm tốt nhất.")
+            if total_places > 0:
+                avg_per_day = total_places / total_days
+                if avg_per_day > 4:
+                    summary_parts.append("Một số ngày có quá nhiều địa điểm, nên giảm bớt hoặc tăng thời gian tham quan.")
+                elif avg_per_day < 1:
+                    summary_parts.append("Nên thêm nhiều địa điểm hơn để làm phong phú lịch trình.")
+            summary_text = " ".join(summary_parts)
+        elif summary_text:
+            sentences = summary_text.split('. ')
+            if len(sentences) > 5:
+                summary_text = '. '.join(sentences[:5]) + '.'
+        
+        # Enhance suggestions if they're not detailed enough - generate complete timeline (8:00-17:00)
+        suggestions_list = result.get("suggestions", [])
+        if not suggestions_list or len(suggestions_list) == 0:
+            # Generate detailed day-by-day suggestions with complete timeline
+            suggestions_list = []
+            for day in compact_edited:
+                day_num = day.get("day", 1)
+                places = day.get("places", [])
+                
+                if len(places) == 0:
+                    # Empty day - suggest full schedule
+                    suggestions_list.extend([
+                        f"Day {day_num}: 08:00-10:00 - Tham quan địa điểm - Nên thêm địa điểm tham quan vào buổi sáng.",
+                        f"Day {day_num}: 10:00-10:30 - Di chuyển - Thời gian di chuyển giữa các địa điểm.",
+                        f"Day {day_num}: 10:30-12:30 - Tham quan địa điểm - Tiếp tục khám phá.",
+                        f"Day {day_num}: 12:30-13:00 - Ăn trưa - Nghỉ ngơi và thưởng thức bữa trưa (30 phút).",
+                        f"Day {day_num}: 13:00-13:30 - Nghỉ ngơi - Nghỉ giải lao sau bữa trưa (30 phút).",
+                        f"Day {day_num}: 13:30-15:30 - Tham quan địa điểm - Hoạt động buổi chiều.",
+                        f"Day {day_num}: 15:30-16:00 - Di chuyển - Quay về hoặc di chuyển đến điểm tiếp theo.",
+                        f"Day {day_num}: 16:00-17:00 - Nghỉ ngơi hoặc tự do - Thời gian tự do để nghỉ ngơi.",
+                    ])
+                else:
+                    # Generate suggestions based on existing places with timeline
+                    current_time = 8 * 60  # Start at 8:00 AM (in minutes)
+                    for idx, place in enumerate(places):
+                        place_name = place.get("name", "Địa điểm")
+                        duration = place.get("duration_hours", 2) * 60  # Convert to minutes
+                        
+                        start_hour = current_time // 60
+                        start_min = current_time % 60
+                        end_time = current_time + duration
+                        end_hour = end_time // 60
+                        end_min = end_time % 60
+                        
+                        start_str = f"{start_hour:02d}:{start_min:02d}"
+                        end_str = f"{end_hour:02d}:{end_min:02d}"
+                        
+                        suggestions_list.append(
+                            f"Day {day_num}: {start_str}-{end_str} - {place_name} - Tham quan địa điểm này."
+                        )
+                        
+                        current_time = end_time
+                        
+                        # Add travel time if not last place
+                        if idx < len(places) - 1:
+                            current_time += 30  # 30 min travel
+                            travel_hour = current_time // 60
+                            travel_min = current_time % 60
+                            travel_str = f"{travel_hour:02d}:{travel_min:02d}"
                             suggestions_list.append(
-                                f"Day {day_num}: {start_str}-{end_str} - {place_name} - Tham quan địa điểm này."
+                                f"Day {day_num}: {end_str}-{travel_str} - Di chuyển - Khoảng cách giữa các địa điểm."
                             )
-                            
-                            current_time = end_time
-                            
-                            # Add travel time if not last place
-                            if idx < len(places) - 1:
-                                current_time += 30  # 30 min travel
-                                travel_hour = current_time // 60
-                                travel_min = current_time % 60
-                                travel_str = f"{travel_hour:02d}:{travel_min:02d}"
-                                suggestions_list.append(
-                                    f"Day {day_num}: {end_str}-{travel_str} - Di chuyển - Khoảng cách giữa các địa điểm."
-                                )
-                            
-                            # Add lunch break around 12:30
-                            if 12 * 60 <= current_time < 13 * 60 and idx < len(places) - 1:
-                                lunch_start = current_time
-                                lunch_end = lunch_start + 30
-                                lunch_start_str = f"{lunch_start // 60:02d}:{lunch_start % 60:02d}"
-                                lunch_end_str = f"{lunch_end // 60:02d}:{lunch_end % 60:02d}"
-                                suggestions_list.append(
-                                    f"Day {day_num}: {lunch_start_str}-{lunch_end_str} - Ăn trưa - Nghỉ ngơi và thưởng thức bữa trưa (30 phút)."
-                                )
-                                current_time = lunch_end
-            
-            result = {
-                "score": score,
-                "severity_color": severity,
-                "decision": decision,
-                "summary": summary_text,
-                "suggestions": suggestions_list,
-                "details_per_day": details_per_day,
-                "patch_preview": result.get("patch_preview", {"will_reorder": decision in ["reorder", "add_days"], "will_fill_missing": decision == "fill_missing", "will_add_places_from_db": False, "days_affected": [d.get("day") for d in compact_edited]}),
-                "optimized_itinerary": optimized,
-                "quality_checks": result.get("quality_checks", {"has_meals_each_day": True, "has_rest_blocks": True, "total_moves_reasonable": True, "overlaps_found": False, "missing_geo_count": 0})
-            }
+                        
+                        # Add lunch break around 12:30
+                        if 12 * 60 <= current_time < 13 * 60 and idx < len(places) - 1:
+                            lunch_start = current_time
+                            lunch_end = lunch_start + 30
+                            lunch_start_str = f"{lunch_start // 60:02d}:{lunch_start % 60:02d}"
+                            lunch_end_str = f"{lunch_end // 60:02d}:{lunch_end % 60:02d}"
+                            suggestions_list.append(
+                                f"Day {day_num}: {lunch_start_str}-{lunch_end_str} - Ăn trưa - Nghỉ ngơi và thưởng thức bữa trưa (30 phút)."
+                            )
+                            current_time = lunch_end
+        
+        result = {
+            "score": score,
+            "severity_color": severity,
+            "decision": decision,
+            "summary": summary_text,
+            "suggestions": suggestions_list,
+            "details_per_day": details_per_day,
+            "patch_preview": result.get("patch_preview", {"will_reorder": decision in ["reorder", "add_days"], "will_fill_missing": decision == "fill_missing", "will_add_places_from_db": False, "days_affected": [d.get("day") for d in compact_edited]}),
+            "optimized_itinerary": optimized,
+            "quality_checks": result.get("quality_checks", {"has_meals_each_day": True, "has_rest_blocks": True, "total_moves_reasonable": True, "overlaps_found": False, "missing_geo_count": 0})
+        }
+
+    return result
 
-        return jsonify({"ok": True, "result": result})
 
+@app.route("/api/ai/evaluate_itinerary", methods=["POST"])
+def evaluate_itinerary():
+    """
+    Accepts JSON: { edited_itinerary: [...], original_itinerary?: [...], context?: {...} }
+    Returns AI evaluation as structured JSON or a text summary.
+    Note: Only edited_itinerary is required. original_itinerary is optional.
+    """
+    payload = request.get_json() or {}
+
+    # ✅ CHỈ YÊU CẦU edited_itinerary (phần chỉnh sửa)
+    if payload.get("edited_itinerary") is None:
+        return jsonify({"error": "edited_itinerary is required"}), 400
+
+    try:
+        return jsonify({"ok": True, "result": evaluate_itinerary_result(payload)})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -937,22 +1089,15 @@ def evaluate_itinerary():
 
 
 # ----------------- AI Reorder Route -----------------
-@app.route("/api/ai/reorder_itinerary", methods=["POST"])
-def reorder_itinerary():
-    """
-    Accepts JSON: { edited_itinerary: [...], original_itinerary?: [...], context?: {...} }
-    Returns suggested_itinerary as structured JSON where only ordering of places may be changed.
-    Note: Only edited_itinerary is required. original_itinerary is optional.
+def reorder_itinerary_result(payload):
+    """Sắp xếp lại lịch trình bằng AI -> dict "result"; payload phải có edited_itinerary.
+
+    Dùng chung cho route đồng bộ và job nền (POST /api/ai/jobs/reorder_itinerary).
     """
-    payload = request.get_json() or {}
     edited = payload.get("edited_itinerary")
     original = payload.get("original_itinerary")  # Optional - only used for comparison if provided
     context = payload.get("context") or {}
 
-    # ✅ CHỈ YÊU CẦU edited_itinerary (phần chỉnh sửa)
-    if edited is None:
-        return jsonify({"error": "edited_itinerary is required"}), 400
-    
     # If original_itinerary is not provided, use edited_itinerary as both (for backward compatibility)
     if original is None:
         original = edited
@@ -1024,36 +1169,99 @@ def reorder_itinerary():
     )
 
     ai = OpenAIChatClient()
+    reply = ai.generate_reply([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ])
+
     try:
-        reply = ai.generate_reply([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ])
+        parsed = try_parse_json_from_text(reply) or None
+        if isinstance(parsed, dict):
+            if "optimized_itinerary" in parsed:
+                return parsed
+            if "suggested_itinerary" in parsed:
+                return parsed
+            # maybe the AI returned optimized_itinerary at top-level under different name
+            # if it contains an array at top level, wrap it
+            for k, v in parsed.items():
+                if isinstance(v, list) and all(isinstance(x, dict) for x in v):
+                    return {"suggested_itinerary": v}
+            return {"raw": reply}
+        elif isinstance(parsed, list):
+            return {"suggested_itinerary": parsed}
+        else:
+            return {"raw": reply}
+    except Exception:
+        return {"raw": reply}
 
-        try:
-            parsed = try_parse_json_from_text(reply) or None
-            if isinstance(parsed, dict):
-                if "optimized_itinerary" in parsed:
-                    return jsonify({"ok": True, "result": parsed})
-                if "suggested_itinerary" in parsed:
-                    return jsonify({"ok": True, "result": parsed})
-                # maybe the AI returned optimized_itinerary at top-level under different name
-                # if it contains an array at top level, wrap it
-                for k, v in parsed.items():
-                    if isinstance(v, list) and all(isinstance(x, dict) for x in v):
-                        return jsonify({"ok": True, "result": {"suggested_itinerary": v}})
-                return jsonify({"ok": True, "result": {"raw": reply}})
-            elif isinstance(parsed, list):
-                return jsonify({"ok": True, "result": {"suggested_itinerary": parsed}})
-            else:
-                return jsonify({"ok": True, "result": {"raw": reply}})
-        except Exception:
-            return jsonify({"ok": True, "result": {"raw": reply}})
 
+@app.route("/api/ai/reorder_itinerary", methods=["POST"])
+def reorder_itinerary():
+    """
+    Accepts JSON: { edited_itinerary: [...], original_itinerary?: [...], context?: {...} }
+    Returns suggested_itinerary as structured JSON where only ordering of places may be changed.
+    Note: Only edited_itinerary is required. original_itinerary is optional.
+    """
+    payload = request.get_json() or {}
+
+    # ✅ CHỈ YÊU CẦU edited_itinerary (phần chỉnh sửa)
+    if payload.get("edited_itinerary") is None:
+        return jsonify({"error": "edited_itinerary is required"}), 400
+
+    try:
+        return jsonify({"ok": True, "result": reorder_itinerary_result(payload)})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+# ----------------- AI Jobs (chạy nền) -----------------
+# Đánh giá / sắp xếp lại bằng AI không giữ request chờ rate limiter: POST trả job id ngay (202),
+# worker nền gọi OpenAI, client hỏi lại GET /api/ai/jobs/<id>?wait=<giây> (long poll)
+ai_job_queue.configure(app, db, AiJob)
+# Job gửi được qua API (routes.chat đăng ký thêm job nội bộ chat_summary)
+AI_JOB_ENDPOINTS = {
+    "evaluate_itinerary": evaluate_itinerary_result,
+    "reorder_itinerary": reorder_itinerary_result,
+}
+
+
+def _catalog_synced(handler):
+    # Worker nền không qua before_request: nhận thay đổi catalog của process khác trước khi chạy job
+    def run(payload):
+        sync_catalog_version(db.engine)
+        return handler(payload)
+    return run
+
+
+for _kind, _handler in AI_JOB_ENDPOINTS.items():
+    ai_job_queue.register(_kind, _catalog_synced(_handler))
+
+@app.route("/api/ai/jobs/<kind>", methods=["POST"])
+def submit_ai_job(kind):
+    """Accepts the same JSON as /api/ai/<kind>; returns {job_id, status, ...} with 202."""
+    if kind not in AI_JOB_ENDPOINTS:
+        return jsonify({"error": f"Unknown job type. Use one of: {', '.join(AI_JOB_ENDPOINTS)}."}), 404
+    payload = request.get_json() or {}
+    if payload.get("edited_itinerary") is None:
+        return jsonify({"error": "edited_itinerary is required"}), 400
+
+    job = ai_job_queue.submit(kind, payload)
+    return jsonify(job), 202, {"Location": url_for("get_ai_job", job_id=job["job_id"])}
+
+@app.route("/api/ai/jobs/<job_id>", methods=["GET"])
+def get_ai_job(job_id):
+    """Job state; ?wait=N (max 30) blocks until the job finishes or N seconds pass."""
+    try:
+        wait = _float_arg("wait", 0, 30, default=0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job = ai_job_queue.wait(job_id, wait) if wait else ai_job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
 # ----------------- DEV: Inspect AI Output -----------------
 @app.route("/api/dev/inspect_ai_output", methods=["POST"])
 def inspect_ai_output():
@@ -1178,19 +1386,35 @@ def inspect_ai_output():
 
 # -------- GET ALL DESTINATIONS --------
 @app.route("/api/destinations", methods=["GET"])
+@catalog_conditional
 def get_destinations():
     # Lấy các tham số từ query string
     search_term = request.args.get("search", "").strip()
     tags_string = request.args.get("tags")
+    try:
+        # Không có limit/cursor: trang đầu với DEFAULT_PAGE_SIZE, không trả cả bảng
+        limit, cursor = parse_page_args(request.args) or (DEFAULT_PAGE_SIZE, None)
+        fields = parse_fieldset(request.args, DESTINATION_CARD_FIELDS, DESTINATION_CARD_SUMMARY)
+    except (InvalidPageParams, InvalidFieldset) as e:
+        return jsonify({"message": str(e)}), 400
 
-    # Bắt đầu truy vấn
-    query = Destination.query.options(
-        db.joinedload(Destination.images), 
-        db.joinedload(Destination.province).joinedload(Province.region)
-    )
+    def render(destination_ids):
+        # Mặc định: card đầy đủ từ cache; có fields/view: chỉ chiếu các cột được yêu cầu
+        if fields is None:
+            return get_destination_cards(destination_ids)
+        return get_destination_projection(destination_ids, fields)
+
+    # Bắt đầu truy vấn (chỉ lấy id + rating, nội dung card lấy từ cache)
+    query = db.session.query(Destination.id, Destination.rating)
 
     # 1. Lọc theo Search Term (Tên địa điểm HOẶC Tên tỉnh)
-    if search_term:
+    fts = None
+    if search_term and search_index_available(db.session):
+        # Full-text (FTS5) trên tên địa điểm + tên tỉnh không dấu, xếp hạng BM25
+        fts = ranked_match_subquery(search_term, columns=("name", "province"))
+    if fts is not None:
+        query = query.join(fts, fts.c.destination_id == Destination.id).add_columns(fts.c.rank)
+    elif search_term:
         # BƯỚC 1: Chuẩn hóa chuỗi tìm kiếm từ client trong Python
         # Ví dụ: "Ha Noi" -> unidecode('Ha Noi').lower() -> "ha noi"
         normalized_search = unidecode(search_term).lower()
@@ -1208,54 +1432,132 @@ def get_destinations():
             )
         )
     
-    # 2. Lọc theo Tags (Filter - Giữ nguyên logic cũ)
-    if tags_string:
-        required_tags = tags_string.split(',')
-        
-        # Áp dụng bộ lọc cho TẤT CẢ các tag yêu cầu
-        for tag in required_tags:
-            # Giả định cột 'tags' là chuỗi JSON hoặc có thể dùng LIKE để tìm kiếm chuỗi con
-            query = query.filter(Destination.tags.ilike(f'%"{tag.strip()}"%')) 
-    
-    # Thực thi truy vấn đã được lọc
-    destinations = query.all()
+    # 2. Lọc theo Tags: giao các posting list trong inverted index (phải có TẤT CẢ tag)
+    required_tags = [tag.strip() for tag in (tags_string or "").split(',') if tag.strip()]
+    if required_tags:
+        tagged_ids = tag_index.ids_for(db.session, required_tags)
+        if not tagged_ids:
+            return jsonify({"items": [], "next_cursor": None, "limit": limit}), 200
+        query = query.filter(Destination.id.in_(tagged_ids))
     
-    result = []
-    for dest in destinations:
-        province = dest.province
-        region = province.region if province else None
-        region_name = region.name if region else "Miền Nam" 
-        
-        image_full_url = get_card_image_url(dest)
-            
-        result.append({
-            "id": dest.id,
-            "name": dest.name,
-            "province_name": province.name if province else None,
-            "region_name": region_name, 
-            "description": decode_db_json_string(dest.description),
-            "image_url": image_full_url, 
-            "latitude": dest.latitude,
-            "longitude": dest.longitude,
-            "rating": dest.rating or 0,
-            "category": dest.category,
-            "tags": decode_db_json_string(dest.tags, default_type='text'),
-            "weather": generate_random_weather(region_name),
-            
-            #TAO CẤM THẰNG NÀO XOÁ CỦA TAOOOOOO!!!!!!!!
-            "gps": {
-                "lat": dest.latitude,
-                "lng": dest.longitude
-            } if dest.latitude and dest.longitude else None,    
-            "images": [img.image_url for img in dest.images],
-            "type": dest.place_type,
-            "place_type": dest.place_type,
-            "opening_hours": dest.opening_hours,
-            "entry_fee": dest.entry_fee,
-            "source": dest.source
-            
-        })
-    return jsonify(result), 200
+    # Thực thi truy vấn đã được lọc: kết quả full-text giữ thứ tự BM25, còn lại theo (rating, id)
+    try:
+        if fts is not None:
+            rows, next_cursor = fetch_ranked_page(
+                query, fts.c.rank, Destination.id, cursor, limit,
+                key=lambda row: (row.rank, row.id)
+            )
+        else:
+            rows, next_cursor = fetch_keyset_page(
+                query, Destination.rating, Destination.id, cursor, limit,
+                key=lambda row: (row.rating, row.id)
+            )
+    except InvalidPageParams as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({
+        "items": render([row.id for row in rows]),
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
+
+# -------- GEO: NEARBY / BOUNDING BOX --------
+NEARBY_DEFAULT_RADIUS_KM = 10.0
+NEARBY_MAX_RADIUS_KM = 200.0
+GEO_DEFAULT_LIMIT = 50
+GEO_MAX_LIMIT = 500
+# Mặc định đủ để vẽ marker trên bản đồ
+GEO_SUMMARY_FIELDS = ("id", "name", "province_name", "thumbnail_url", "latitude", "longitude", "rating")
+
+def _float_arg(name, low, high, default=None):
+    raw = request.args.get(name, "").strip()
+    if not raw:
+        if default is None:
+            raise ValueError(f"{name} is required.")
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number.")
+    if not math.isfinite(value) or not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}.")
+    return value
+
+def _geo_args():
+    """limit + fields chung cho nearby/bbox (ValueError -> 400)."""
+    limit = int(_float_arg("limit", 1, GEO_MAX_LIMIT, GEO_DEFAULT_LIMIT))
+    fields = parse_fieldset(request.args, DESTINATION_CARD_FIELDS, GEO_SUMMARY_FIELDS)
+    if fields is None:
+        # Không có fields/view: trả về bản tóm tắt; view=full: card đầy đủ
+        fields = DESTINATION_CARD_FIELDS if request.args.get("view") else GEO_SUMMARY_FIELDS
+    return limit, fields
+
+def _geo_candidates(bbox):
+    """(id, latitude, longitude, rating) trong bbox: ứng viên lấy từ R*Tree nếu có."""
+    query = db.session.query(
+        Destination.id, Destination.latitude, Destination.longitude, Destination.rating
+    )
+    if geo_index_available(db.session):
+        geo = candidate_subquery(bbox)
+        return query.join(geo, geo.c.destination_id == Destination.id)
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return query.filter(
+        Destination.latitude.between(min_lat, max_lat),
+        Destination.longitude.between(min_lng, max_lng)
+    )
+
+@app.route("/api/destinations/nearby", methods=["GET"])
+@catalog_conditional
+def get_nearby_destinations():
+    try:
+        lat = _float_arg("lat", -90.0, 90.0)
+        lng = _float_arg("lng", -180.0, 180.0)
+        radius_km = _float_arg("radius_km", 0.0, NEARBY_MAX_RADIUS_KM, NEARBY_DEFAULT_RADIUS_KM)
+        limit, fields = _geo_args()
+        exclude_id = request.args.get("exclude_id", type=int)
+    except (ValueError, InvalidFieldset) as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Chỉ tính haversine chính xác cho các ứng viên R*Tree trả về
+    hits = []
+    for row in _geo_candidates(radius_bbox(lat, lng, radius_km)):
+        if row.id == exclude_id:
+            continue
+        distance = haversine_km(lat, lng, row.latitude, row.longitude)
+        if distance <= radius_km:
+            hits.append((distance, row.id))
+    hits.sort()
+
+    distance_by_id = {dest_id: distance for distance, dest_id in hits[:limit]}
+    # Projection bỏ qua id không còn trong DB: ghép khoảng cách theo id, không theo vị trí
+    items = get_destination_projection(list(distance_by_id), fields)
+    for item in items:
+        item["distance_km"] = round(distance_by_id[item["id"]], 2)
+    return jsonify({"items": items, "truncated": len(hits) > limit}), 200
+
+@app.route("/api/destinations/bbox", methods=["GET"])
+@catalog_conditional
+def get_destinations_in_bbox():
+    try:
+        bbox = (
+            _float_arg("min_lat", -90.0, 90.0), _float_arg("min_lng", -180.0, 180.0),
+            _float_arg("max_lat", -90.0, 90.0), _float_arg("max_lng", -180.0, 180.0),
+        )
+        limit, fields = _geo_args()
+    except (ValueError, InvalidFieldset) as e:
+        return jsonify({"message": str(e)}), 400
+    min_lat, min_lng, max_lat, max_lng = bbox
+    if min_lat > max_lat or min_lng > max_lng:
+        return jsonify({"message": "min_lat/min_lng must not exceed max_lat/max_lng."}), 400
+
+    # R*Tree lưu float32 (làm tròn ra ngoài) nên lọc lại chính xác trên tọa độ gốc
+    hits = [
+        (-(row.rating or 0), row.id)
+        for row in _geo_candidates(bbox)
+        if min_lat <= row.latitude <= max_lat and min_lng <= row.longitude <= max_lng
+    ]
+    hits.sort()
+    items = get_destination_projection([dest_id for _, dest_id in hits[:limit]], fields)
+    return jsonify({"items": items, "truncated": len(hits) > limit}), 200
 
 # ----------------- Test Route -----------------
 from flask_jwt_extended import jwt_required, get_jwt_identity
@@ -1267,59 +1569,98 @@ def test_jwt():
     return jsonify({"message": "JWT valid!", "user_id": user_id})
 
 # -------- GET HIERARCHICAL DESTINATIONS --------
-@app.route("/api/locations/vietnam", methods=["GET"])
-def get_vietnam_locations():
-    regions = Region.query.options(
-        joinedload(Region.provinces)
-          .joinedload(Province.destinations)
-          .joinedload(Destination.images)
-    ).all()
-    
-    result = []
-    
-    for region in regions:
-        region_data = {
-            "region_name": region.name,
-            "provinces": []
-        }
-        
-        for province in region.provinces:
+# Số destination đọc mỗi lượt (yield_per) khi stream cây địa điểm
+LOCATIONS_STREAM_BATCH_SIZE = 500
+
+
+def _iter_location_places(batch_size=None):
+    """Yield (province_id, place_data) theo thứ tự region -> province -> id, từng lô một."""
+    stmt = (
+        db.select(
+            Destination.id, Destination.province_id, Destination.name, Destination.place_type,
+            Destination.description, Destination.latitude, Destination.longitude,
+            Destination.opening_hours, Destination.entry_fee, Destination.tags, Destination.source,
+        )
+        .join(Province, Province.id == Destination.province_id)
+        .order_by(Province.region_id, Province.id, Destination.id)
+        .execution_options(yield_per=batch_size or LOCATIONS_STREAM_BATCH_SIZE)
+    )
+    for batch in db.session.execute(stmt).partitions():
+        # Ảnh của cả lô lấy bằng một truy vấn IN, không joinedload
+        images = {}
+        image_rows = db.session.execute(
+            db.select(DestinationImage.destination_id, DestinationImage.image_url)
+            .where(DestinationImage.destination_id.in_([row.id for row in batch]))
+            .order_by(DestinationImage.id)
+        )
+        for destination_id, image_url in image_rows:
+            images.setdefault(destination_id, []).append(image_url)
+
+        for row in batch:
+            yield row.province_id, {
+                "id": row.id,
+                "name": row.name,
+                "type": row.place_type,
+                "description": decode_db_json_string(row.description),
+                "images": images.get(row.id, []),
+                "gps": {
+                    "lat": row.latitude,
+                    "lng": row.longitude
+                },
+                "opening_hours": row.opening_hours,
+                "entry_fee": row.entry_fee,
+                "tags": decode_db_json_string(row.tags, default_type='text'),
+                "source": row.source
+            }
+
+
+def _stream_vietnam_locations(regions, provinces_by_region):
+    """Ghi JSON dần dần: mỗi province là một chunk, bộ nhớ chỉ giữ một lô destination."""
+    def dumps(value):
+        return app.json.dumps(value, separators=(",", ":"))
+
+    places = _iter_location_places()
+    pending = next(places, None)
+    yield "["
+    for region_index, region in enumerate(regions):
+        yield ("," if region_index else "") + '{"provinces":['
+        for province_index, province in enumerate(provinces_by_region.get(region.id, [])):
             province_data = {
                 "id": province.id,
                 "province_name": province.name,
                 "overview": province.overview,
-                "image_url": province.image_url, 
+                "image_url": province.image_url,
                 "places": []
             }
-            
-            for destination in province.destinations:
-                
-                place_data = {
-                    "id": destination.id,
-                    "name": destination.name,
-                    "type": destination.place_type,
-                    "description": decode_db_json_string(destination.description),
-                    
-                    "images": [img.image_url for img in destination.images],
-                    "gps": {
-                        "lat": destination.latitude,
-                        "lng": destination.longitude
-                    },
-                    "opening_hours": destination.opening_hours,
-                    "entry_fee": destination.entry_fee,
-                    "tags": decode_db_json_string(destination.tags, default_type='text'),
-                    "source": destination.source
-                }
-                province_data["places"].append(place_data)
-                
-            region_data["provinces"].append(province_data)
-        
-        result.append(region_data)
-        
-    return jsonify(result), 200
+            while pending is not None and pending[0] == province.id:
+                province_data["places"].append(pending[1])
+                pending = next(places, None)
+            yield ("," if province_index else "") + dumps(province_data)
+        yield '],"region_name":' + dumps(region.name) + "}"
+    yield "]\n"
+
+
+@app.route("/api/locations/vietnam", methods=["GET"])
+@catalog_conditional
+def get_vietnam_locations():
+    # Region/Province ít và nhỏ: đọc trước; destination được stream theo lô trong generator
+    regions = db.session.execute(
+        db.select(Region.id, Region.name).order_by(Region.id)
+    ).all()
+    provinces_by_region = {}
+    province_rows = db.session.execute(
+        db.select(Province.id, Province.region_id, Province.name, Province.overview, Province.image_url)
+        .order_by(Province.region_id, Province.id)
+    )
+    for province in province_rows:
+        provinces_by_region.setdefault(province.region_id, []).append(province)
+
+    return Response(
+        stream_with_context(_stream_vietnam_locations(regions, provinces_by_region)),
+        mimetype="application/json"
+    )
 
 import math
-from sqlalchemy import or_, func
 from models import db, Destination 
 import random 
 
@@ -1362,32 +1703,55 @@ def get_cost_from_entry_fee(destination_obj):
     except (ValueError, TypeError):
         return 0.0
 
-def generate_itinerary_optimized(
-    province_id, 
-    duration_days, 
+# Số ứng viên (rating cao nhất) đưa vào bước chọn theo ngân sách
+ITINERARY_CANDIDATE_POOL = 300
+# Số phương án tối đa cho /api/trips/<id>/variants
+MAX_ITINERARY_VARIANTS = 6
+
+def place_duration_minutes(destination_obj):
+    return int(round(get_place_duration(destination_obj) * 60))
+
+def place_utility(destination_obj):
+    """Giá trị của một địa điểm khi chọn cho lịch trình (mặc định: rating)."""
+    return getattr(destination_obj, 'rating', None) or 0.0
+
+# Ứng viên theo tỉnh giữ trong bộ nhớ (bản ghi gọn, đã sắp theo rating), hết hạn khi catalog đổi
+candidate_pool.configure(Destination, duration_minutes=place_duration_minutes)
+
+def prepare_itinerary(
+    province_id,
+    duration_days,
     max_budget,
-    must_include_place_ids=None, 
-    excluded_ids=None, 
+    must_include_place_ids=None,
+    excluded_ids=None,
     primary_accommodation_id=None
 ):
+    """Bước 0-1: khách sạn, điểm bắt buộc và nhóm ứng viên (lấy từ pool trong bộ nhớ)."""
     if must_include_place_ids is None: must_include_place_ids = []
     if excluded_ids is None: excluded_ids = []
 
     # --- BƯỚC 0: LẤY ĐỐI TƯỢNG KHÁCH SẠN ---
     hotel_obj_final = None
     TOTAL_HOTEL_COST = 0.0
+
+    # Toàn bộ ứng viên của tỉnh lấy từ pool trong bộ nhớ (chỉ truy vấn lần đầu / sau khi catalog đổi)
+    province_places = candidate_pool.province(db.session, province_id)
+    wanted_ids = set(must_include_place_ids)
+    if primary_accommodation_id:
+        wanted_ids.add(primary_accommodation_id)
+    places_by_id = candidate_pool.get_many(db.session, wanted_ids) if wanted_ids else {}
     
     # Ưu tiên lấy từ primary_accommodation_id
     target_hotel_id = primary_accommodation_id
     if not target_hotel_id:
         for pid in must_include_place_ids:
-            p = db.session.get(Destination, pid)
-            if p and any(kw in (p.place_type or '').lower() for kw in ['hotel', 'resort', 'accommodation']):
+            p = places_by_id.get(pid)
+            if p and p.is_accommodation:
                 target_hotel_id = pid
                 break
 
     if target_hotel_id:
-        hotel_obj = db.session.get(Destination, target_hotel_id)
+        hotel_obj = places_by_id.get(target_hotel_id)
         if hotel_obj:
             hotel_unit_price = get_cost_from_entry_fee(hotel_obj)
             nights = max(0, duration_days - 1)
@@ -1403,85 +1767,172 @@ def generate_itinerary_optimized(
     activity_must_ids = [pid for pid in must_include_place_ids if pid != (hotel_obj_final.id if hotel_obj_final else None)]
     
     selected_activities = []
-    EXCLUDED_TYPES = ['hotel', 'accommodation', 'resort', 'motel', 'homestay']
 
     # 1.1 Thêm các điểm bắt buộc
     for pid in activity_must_ids:
-        p = db.session.get(Destination, pid)
+        p = places_by_id.get(pid)
         if not p or p.id in excluded_ids: continue
         cost = get_cost_from_entry_fee(p)
         if max_budget == 0 or (TOTAL_HOTEL_COST + current_activities_cost + cost <= max_budget):
             selected_activities.append(p)
             current_activities_cost += cost
 
-    # 1.2 Lấy thêm điểm từ database (Sửa lỗi mất địa điểm: Lấy rộng hơn)
-    remaining_budget = max_budget - (TOTAL_HOTEL_COST + current_activities_cost) if max_budget > 0 else 999999999
+    # 1.2 Nhóm ứng viên cho bước chọn
+    remaining_budget = max_budget - (TOTAL_HOTEL_COST + current_activities_cost) if max_budget > 0 else None
     all_excluded = set(must_include_place_ids) | set(excluded_ids)
     if hotel_obj_final: all_excluded.add(hotel_obj_final.id)
 
-    potential_places = Destination.query.filter(
-        Destination.province_id == province_id,
-        Destination.id.notin_(all_excluded),
-        ~or_(*[func.lower(Destination.place_type).contains(t) for t in EXCLUDED_TYPES])
-    ).order_by(Destination.rating.desc()).all()
+    # Pool đã sắp theo rating: lấy nhóm ứng viên tốt nhất, bỏ khách sạn, điểm đắt hơn phần ngân sách
+    # còn lại và điểm không thể tham quan trọn trong khung giờ mở cửa của ngày
+    candidates = []
+    for p in province_places:
+        if p.is_accommodation or p.id in all_excluded:
+            continue
+        if remaining_budget is not None and get_cost_from_entry_fee(p) > remaining_budget:
+            continue
+        if not can_visit(p.windows, p.duration_minutes):
+            continue
+        candidates.append(p)
+        if len(candidates) == ITINERARY_CANDIDATE_POOL:
+            break
 
-    for p in potential_places:
-        if len(selected_activities) >= (duration_days * 4): break # Giới hạn 4 điểm/ngày
-        cost = get_cost_from_entry_fee(p)
-        if remaining_budget - cost >= 0:
-            selected_activities.append(p)
-            remaining_budget -= cost
-            current_activities_cost += cost
+    day_minutes = DAY_END_MIN - DAY_START_MIN - (30 if hotel_obj_final else 0)
+    return {
+        "province_places": province_places,
+        "duration_days": duration_days,
+        "hotel": hotel_obj_final,
+        "hotel_cost": TOTAL_HOTEL_COST,
+        "fixed": selected_activities,
+        "fixed_cost": current_activities_cost,
+        "candidates": candidates,
+        "remaining_budget": remaining_budget,
+        "time_left": duration_days * day_minutes - sum(
+            p.duration_minutes + TRAVEL_ALLOWANCE_MIN for p in selected_activities
+        ),
+    }
 
-    # --- BƯỚC 2: XÂY DỰNG LỊCH TRÌNH ---
-    # Hàm tạo dict chuẩn cho 1 địa điểm
-    def create_node(p, time_slot, est_cost=None):
-        return {
-            "id": p.id,
-            "name": p.name,
-            "category": getattr(p, 'category', 'General'),
-            "type": getattr(p, 'place_type', 'point_of_interest'),
-            "time_slot": time_slot,
-            "estimated_cost": est_cost if est_cost is not None else get_cost_from_entry_fee(p)
-        }
+def choose_trip_hotel(context, variant, max_budget, excluded_ids=()):
+    """Chọn khách sạn cho chuyến đi chưa có: tổng quãng đường tới tâm các ngày nhỏ nhất, trong ngân sách.
 
-    # Chuyển đổi danh sách tham quan sang dict và trộn ngẫu nhiên
-    unassigned_acts = []
-    for p in selected_activities:
-        unassigned_acts.append({
-            "obj": p,
-            "duration": get_place_duration(p)
-        })
-    random.shuffle(unassigned_acts)
+    Chỉ xét các điểm is_accommodation của tỉnh có tọa độ; giá phòng x số đêm phải vừa phần ngân sách
+    còn lại sau các điểm tham quan đã chọn.
+    """
+    nights = max(0, context["duration_days"] - 1)
+    if context["hotel"] or nights == 0:
+        return None
+    selected = context["fixed"] + [context["candidates"][i] for i in variant.chosen]
+    centroids = day_centroids([
+        [(selected[stop.index].latitude, selected[stop.index].longitude) for stop in day] for day in variant.days
+    ])
+    spent = context["fixed_cost"] + sum(get_cost_from_entry_fee(context["candidates"][i]) for i in variant.chosen)
+    money_left = max_budget - spent if max_budget > 0 else None
+    sites = [
+        p for p in context["province_places"]
+        if p.is_accommodation and p.id not in excluded_ids
+        and p.latitude is not None and p.longitude is not None
+        and (money_left is None or get_cost_from_entry_fee(p) * nights <= money_left)
+    ]
+    best = choose_base([(p.latitude, p.longitude) for p in sites], centroids)
+    return sites[best] if best is not None else None
+
+def itinerary_problem(context):
+    """Dữ liệu đã chuẩn bị -> VariantProblem (tuple thuần, gửi được sang process khác)."""
+    def to_place(p):
+        return VariantPlace(get_cost_from_entry_fee(p), p.duration_minutes, p.rating or 0.0,
+                            (p.latitude, p.longitude), p.windows)
+
+    hotel = context["hotel"]
+    return VariantProblem(
+        fixed=tuple(to_place(p) for p in context["fixed"]),
+        candidates=tuple(to_place(p) for p in context["candidates"]),
+        budget=context["remaining_budget"],
+        time_left=context["time_left"],
+        num_days=context["duration_days"],
+        start=(hotel.latitude, hotel.longitude) if hotel else None,
+        day_start=DAY_START_MIN + (30 if hotel else 0),
+    )
+
+def itinerary_node(p, time_slot, est_cost=None):
+    """Dict chuẩn cho 1 địa điểm trong lịch trình."""
+    return {
+        "id": p.id,
+        "name": p.name,
+        "category": getattr(p, 'category', 'General'),
+        "type": getattr(p, 'place_type', 'point_of_interest'),
+        "time_slot": time_slot,
+        "estimated_cost": est_cost if est_cost is not None else get_cost_from_entry_fee(p)
+    }
+
+def insert_place_into_day(day_places, place, hotel_id=None):
+    """Chèn một địa điểm vào ngày đã xếp lịch (cheapest insertion), chỉ xếp lại giờ các điểm phía sau.
+
+    Tọa độ, thời lượng, giờ mở cửa lấy từ candidate_pool; giờ của các điểm cũ đọc từ time_slot.
+    """
+    records = candidate_pool.get_many(db.session, [node.get("id") for node in day_places if node.get("id")])
+    hotel = records.get(hotel_id) if hotel_id else None
+    # Khách sạn đầu/cuối ngày giữ nguyên, chỉ chèn vào giữa
+    lead = 0
+    while hotel and lead < len(day_places) and day_places[lead].get("id") == hotel.id:
+        lead += 1
+    trail = len(day_places)
+    while hotel and trail > lead and day_places[trail - 1].get("id") == hotel.id:
+        trail -= 1
+    activities = day_places[lead:trail]
+
+    points, durations, windows, slots = [], [], [], []
+    for node in activities:
+        record = records.get(node.get("id"))
+        slot = parse_time_slot(node.get("time_slot"))
+        slots.append(slot)
+        points.append((record.latitude, record.longitude) if record else (None, None))
+        durations.append(slot[1] - slot[0] if slot else (record.duration_minutes if record else 120))
+        windows.append(record.windows if record else None)
+    points.append((place.latitude, place.longitude))
+    durations.append(place.duration_minutes)
+    windows.append(place.windows)
+
+    hotel_point = (hotel.latitude, hotel.longitude) if hotel else None
+    day_start = DAY_START_MIN + (30 if hotel else 0)
+    if all(slots):
+        day = [Stop(i, start, end, 0) for i, (start, end) in enumerate(slots)]
+    else:
+        # Lịch trình cũ/sửa tay không có giờ: xếp lại cả ngày theo thứ tự hiện có
+        day = schedule_stops(points, durations, range(len(activities)), hotel_point, day_start=day_start, windows=windows)
+    stops, _ = insert_stop(points, durations, day, len(activities), hotel_point, day_start=day_start, windows=windows)
+
+    placed = []
+    for stop in stops:
+        time_slot = format_time_slot(stop.start, stop.end)
+        if stop.index == len(activities):
+            placed.append(itinerary_node(place, time_slot))
+        else:
+            placed.append(dict(activities[stop.index], time_slot=time_slot))
+    return day_places[:lead] + placed + day_places[trail:]
+
+def render_itinerary(context, variant):
+    """Bước 2: phương án đã chọn + xếp lịch -> dict lịch trình trả về cho API."""
+    hotel_obj_final = context["hotel"]
+    TOTAL_HOTEL_COST = context["hotel_cost"]
+    selected_activities = context["fixed"] + [context["candidates"][i] for i in variant.chosen]
+    current_activities_cost = context["fixed_cost"] + sum(
+        get_cost_from_entry_fee(context["candidates"][i]) for i in variant.chosen
+    )
 
     final_itinerary = []
-    for day in range(1, duration_days + 1):
+    for day, stops in enumerate(variant.days, start=1):
         day_places = []
-        curr_time = 8.0
 
         # A. KHÁCH SẠN ĐẦU NGÀY
         if hotel_obj_final:
-            day_places.append(create_node(hotel_obj_final, "08:00 - 08:30", est_cost=0.0))
-            curr_time = 8.5
+            day_places.append(itinerary_node(hotel_obj_final, "08:00 - 08:30", est_cost=0.0))
 
         # B. CÁC ĐỊA ĐIỂM THAM QUAN
-        while unassigned_acts:
-            item = unassigned_acts.pop(0)
-            dur = item['duration']
-            if curr_time + dur <= 18.0:
-                start_str = f"{int(curr_time):02d}:{int((curr_time%1)*60):02d}"
-                end_t = curr_time + dur
-                end_str = f"{int(end_t):02d}:{int((end_t%1)*60):02d}"
-                
-                day_places.append(create_node(item['obj'], f"{start_str} - {end_str}"))
-                curr_time = end_t + 0.5 # 30p di chuyển
-            else:
-                unassigned_acts.insert(0, item)
-                break
+        for stop in stops:
+            day_places.append(itinerary_node(selected_activities[stop.index], format_time_slot(stop.start, stop.end)))
 
         # C. KHÁCH SẠN CUỐI NGÀY
         if hotel_obj_final:
-            day_places.append(create_node(hotel_obj_final, "19:00 - 22:00", est_cost=0.0))
+            day_places.append(itinerary_node(hotel_obj_final, "19:00 - 22:00", est_cost=0.0))
 
         final_itinerary.append({"day": day, "places": day_places})
 
@@ -1501,6 +1952,84 @@ def generate_itinerary_optimized(
         "hotel_info": hotel_info
     }
 
+def generate_itinerary_optimized(
+    province_id, 
+    duration_days, 
+    max_budget,
+    must_include_place_ids=None, 
+    excluded_ids=None, 
+    primary_accommodation_id=None,
+    utility=place_utility,
+    seed=None,
+    objective=None,
+    choose_hotel=False
+):
+    def solve(context):
+        # Chọn tập điểm có tổng utility lớn nhất trong ngân sách và quỹ thời gian còn lại (knapsack), chia ngày
+        # theo cụm địa lý, sắp thứ tự đi (nearest neighbour + 2-opt, hoặc chèn theo giờ mở cửa) và xếp giờ.
+        # Không có seed: kết quả chỉ phụ thuộc tham số + catalog. Có seed: xáo trộn nhẹ utility, tái lập được
+        utilities = None if objective else [utility(p) for p in context["candidates"]]
+        return solve_variant(itinerary_problem(context), objective or "rating", seed, utilities)
+
+    context = prepare_itinerary(
+        province_id, duration_days, max_budget, must_include_place_ids, excluded_ids, primary_accommodation_id
+    )
+    variant = solve(context)
+    if choose_hotel:
+        # Chưa có khách sạn: đặt khách sạn gần các cụm ngày nhất rồi xếp lại từ khách sạn đó
+        hotel = choose_trip_hotel(context, variant, max_budget, set(excluded_ids or ()))
+        if hotel is not None:
+            context = prepare_itinerary(
+                province_id, duration_days, max_budget, must_include_place_ids, excluded_ids, hotel.id
+            )
+            variant = solve(context)
+    return render_itinerary(context, variant)
+
+def build_itinerary_draft(
+    province_id,
+    duration_days,
+    max_budget,
+    must_include_place_ids=None,
+    excluded_ids=None,
+    primary_accommodation_id=None,
+    shuffle=False,
+    seed=None,
+    objective="rating",
+    choose_hotel=False
+):
+    """generate_itinerary_optimized qua cache LRU; shuffle/seed tạo bản khác (không cache).
+
+    Kết quả có thêm "seed" (None nếu không xáo trộn) để có thể tạo lại đúng bản nháp đó.
+    """
+    key = draft_key(province_id, duration_days, max_budget, must_include_place_ids,
+                    excluded_ids, primary_accommodation_id, objective, choose_hotel)
+    if seed is None and shuffle:
+        seed = draft_seed(key, salt=time.time_ns())
+    if seed is None:
+        cached = itinerary_draft_cache.get(key)
+        if cached is not None:
+            return cached
+
+    version = catalog_token()
+    result = generate_itinerary_optimized(
+        province_id,
+        duration_days,
+        max_budget,
+        must_include_place_ids=must_include_place_ids,
+        excluded_ids=excluded_ids,
+        primary_accommodation_id=primary_accommodation_id,
+        seed=seed,
+        objective=None if objective == "rating" else objective,
+        choose_hotel=choose_hotel
+    )
+    result["seed"] = seed
+    if seed is None:
+        itinerary_draft_cache.put(key, result, version)
+    return result
+
+def is_truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
 # -------------------------------------------------------------
 # ENDPOINT /api/trips (POST) 
 # -------------------------------------------------------------
@@ -1526,6 +2055,8 @@ def create_trip():
             primary_accommodation_id = int(primary_accommodation_id)
         except (ValueError, TypeError):
             primary_accommodation_id = None
+    # Không chọn khách sạn: metadata.choose_hotel = true để hệ thống tự đặt khách sạn gần các điểm tham quan
+    choose_hotel = is_truthy(metadata.get("choose_hotel", False))
 
     try:
         province_id = data.get("province_id")
@@ -1559,12 +2090,13 @@ def create_trip():
             return jsonify({"message": "Invalid start_date format. Use YYYY-MM-DD."}), 400
             
     try:
-        itinerary_result = generate_itinerary_optimized(
+        itinerary_result = build_itinerary_draft(
             province_id, 
             duration_days, 
             max_budget=max_budget,
             must_include_place_ids=must_include_place_ids, 
-            primary_accommodation_id=primary_accommodation_id
+            primary_accommodation_id=primary_accommodation_id,
+            choose_hotel=choose_hotel
         )
         
         itinerary_draft = itinerary_result.get("itinerary", [])
@@ -1676,12 +2208,19 @@ def add_place_to_trip(trip_id):
 
     if not place_id:
         return jsonify({"message": "Place ID is required."}), 400
+    try:
+        place_id = int(place_id)
+    except (ValueError, TypeError):
+        return jsonify({"message": "Invalid place ID."}), 400
 
     trip = db.session.get(Itinerary, trip_id)
-    place = db.session.get(Destination, place_id) 
 
     if not trip or trip.user_id != user_id:
         return jsonify({"message": "Trip not found."}), 404
+
+    # Tọa độ/thời lượng lấy từ pool ứng viên của tỉnh (không nạp object ORM)
+    candidate_pool.province(db.session, trip.province_id)
+    place = candidate_pool.get_many(db.session, [place_id]).get(place_id)
     if not place:
         return jsonify({"message": "Destination place not found."}), 404
         
@@ -1690,33 +2229,23 @@ def add_place_to_trip(trip_id):
         return jsonify({"message": "This destination does not belong to the trip's province."}), 400
 
     itinerary = json.loads(trip.itinerary_json) if trip.itinerary_json else []
+    metadata = json.loads(trip.metadata_json) if trip.metadata_json else {}
+    hotel_id = (metadata.get("hotel") or {}).get("id")
     
-    added = False
-    for day_plan in itinerary:
-        if day_plan.get("day") == target_day:
-            new_place_data = {
-                "id": place.id,
-                "name": place.name,
-                "category": place.category
-            }
-            # Prevent duplication
-            if not any(p['id'] == place.id for p in day_plan["places"]):
-                 day_plan["places"].append(new_place_data)
-                 added = True
-            else:
-                 return jsonify({"message": "This place is already in the itinerary for that day."}), 400
-            break
-            
-    if not added and target_day <= trip.duration:
-        itinerary.append({
-            "day": target_day,
-            "places": [{"id": place.id, "name": place.name, "category": place.category}]
-        })
+    day_plan = next((d for d in itinerary if d.get("day") == target_day), None)
+    if day_plan is None:
+        if not isinstance(target_day, int) or not 1 <= target_day <= (trip.duration or 0):
+            return jsonify({"message": f"Could not add destination. Day {target_day} is invalid or outside the trip duration ({trip.duration} days)."}), 400
+        day_plan = {"day": target_day, "places": []}
+        itinerary.append(day_plan)
         itinerary.sort(key=lambda x: x["day"])
-        added = True
-        
-    if not added:
-        return jsonify({"message": f"Could not add destination. Day {target_day} is invalid or outside the trip duration ({trip.duration} days)."}), 400
+
+    # Prevent duplication
+    if any(p.get('id') == place.id for p in day_plan["places"]):
+        return jsonify({"message": "This place is already in the itinerary for that day."}), 400
+
+    # Chèn vào vị trí tăng ít thời gian di chuyển nhất và xếp lại giờ các điểm sau đó
+    day_plan["places"] = insert_place_into_day(day_plan["places"], place, hotel_id)
         
     trip.itinerary_json = json.dumps(itinerary, ensure_ascii=False)
     # Assuming 'updated_at' field exists and is updated on save
@@ -1914,6 +2443,19 @@ def regenerate_trip_itinerary(trip_id):
     province_id = data.get("province_id", trip.province_id)
     duration_days = data.get("duration", trip.duration)
     must_include_place_ids = data.get("must_include_place_ids", [])
+    # shuffle=true (body hoặc query string): tạo bản lịch trình khác; seed: tạo lại đúng một bản đã xáo
+    shuffle = is_truthy(data.get("shuffle", request.args.get("shuffle", "")))
+    seed = data.get("seed")
+    if seed is not None:
+        try:
+            seed = int(seed)
+        except (ValueError, TypeError):
+            return jsonify({"message": "Invalid seed."}), 400
+    # objective: chọn lại một phương án từ /variants (rating | cheapest | least_travel)
+    objective = data.get("objective") or "rating"
+    if objective not in OBJECTIVES:
+        return jsonify({"message": f"Invalid objective. Use one of: {', '.join(OBJECTIVES)}."}), 400
+    choose_hotel = is_truthy(data.get("choose_hotel", old_metadata.get("choose_hotel", False)))
 
     # ✅ FIX 1: Luôn resolve max_budget rõ ràng
     max_budget = data.get("max_budget")
@@ -1924,12 +2466,16 @@ def regenerate_trip_itinerary(trip_id):
         return jsonify({"message": "Province ID and duration are required for regeneration."}), 400
 
     try:
-        itinerary_result = generate_itinerary_optimized(
+        itinerary_result = build_itinerary_draft(
             province_id=province_id,
             duration_days=duration_days,
             max_budget=max_budget,
             must_include_place_ids=must_include_place_ids,
-            primary_accommodation_id=old_metadata.get("primary_accommodation_id")
+            primary_accommodation_id=old_metadata.get("primary_accommodation_id"),
+            shuffle=shuffle,
+            seed=seed,
+            objective=objective,
+            choose_hotel=choose_hotel
         )
 
         itinerary_draft = itinerary_result.get("itinerary", [])
@@ -1947,6 +2493,10 @@ def regenerate_trip_itinerary(trip_id):
         new_metadata.update({
             "max_budget": max_budget,
             "total_estimated_cost": total_estimated_cost,
+            "shuffle_seed": itinerary_result.get("seed"),
+            "objective": objective,
+            "choose_hotel": choose_hotel,
+            "hotel": itinerary_result.get("hotel_info"),
             "primary_accommodation_id": (
                 old_metadata.get("primary_accommodation_id") if has_hotel else None
             )
@@ -1979,6 +2529,95 @@ def regenerate_trip_itinerary(trip_id):
             "message": f"An error occurred during itinerary regeneration: {str(e)}"
         }), 500
 
+# API: NHIỀU PHƯƠNG ÁN LỊCH TRÌNH ĐỂ SO SÁNH (KHÔNG LƯU)
+# Mỗi phương án có "objective" + "seed"; gửi lại hai giá trị này cho /regenerate để lưu phương án đã chọn
+@app.route("/api/trips/<int:trip_id>/variants", methods=["POST"])
+@jwt_required()
+def trip_itinerary_variants(trip_id):
+    data = request.get_json() or {}
+    user_id = int(get_jwt_identity())
+
+    trip = db.session.get(Itinerary, trip_id)
+
+    if not trip or trip.user_id != user_id:
+        return jsonify({"message": "Trip not found or unauthorized access."}), 404
+
+    old_metadata = json.loads(trip.metadata_json) if trip.metadata_json else {}
+
+    province_id = data.get("province_id", trip.province_id)
+    duration_days = data.get("duration", trip.duration)
+    must_include_place_ids = data.get("must_include_place_ids", [])
+    max_budget = data.get("max_budget")
+    if max_budget is None:
+        max_budget = old_metadata.get("max_budget", 0)
+    primary_accommodation_id = old_metadata.get("primary_accommodation_id")
+    choose_hotel = is_truthy(data.get("choose_hotel", old_metadata.get("choose_hotel", False)))
+
+    if not all([province_id, duration_days]):
+        return jsonify({"message": "Province ID and duration are required."}), 400
+    try:
+        count = int(data.get("count", len(OBJECTIVES)))
+    except (ValueError, TypeError):
+        return jsonify({"message": "Invalid count."}), 400
+    count = max(1, min(count, MAX_ITINERARY_VARIANTS))
+
+    # Trước hết mỗi mục tiêu một phương án, phần còn lại là các bản xáo trộn theo rating
+    key = draft_key(province_id, duration_days, max_budget, must_include_place_ids, None, primary_accommodation_id,
+                    choose_hotel=choose_hotel)
+    specs = [(objective, None) for objective in OBJECTIVES][:count]
+    nonce = time.time_ns()
+    specs += [("rating", draft_seed(key, salt=nonce + i)) for i in range(count - len(specs))]
+
+    try:
+        version = catalog_token()
+        context = prepare_itinerary(
+            province_id, duration_days, max_budget, must_include_place_ids,
+            primary_accommodation_id=primary_accommodation_id
+        )
+        # Phần tốn CPU (knapsack + xếp lịch) chạy song song trong ProcessPoolExecutor
+        solved = [(context, variant) for variant in solve_variants(itinerary_problem(context), specs)]
+        if choose_hotel:
+            # Như generate_itinerary_optimized: mỗi phương án đặt khách sạn gần các cụm ngày của nó rồi xếp lại
+            by_hotel = {}
+            for i, (_, variant) in enumerate(solved):
+                hotel = choose_trip_hotel(context, variant, max_budget)
+                if hotel is not None:
+                    by_hotel.setdefault(hotel.id, []).append(i)
+            for hotel_id, indexes in by_hotel.items():
+                hotel_context = prepare_itinerary(
+                    province_id, duration_days, max_budget, must_include_place_ids,
+                    primary_accommodation_id=hotel_id
+                )
+                redone = solve_variants(
+                    itinerary_problem(hotel_context), [(solved[i][1].objective, solved[i][1].seed) for i in indexes]
+                )
+                for i, variant in zip(indexes, redone):
+                    solved[i] = (hotel_context, variant)
+
+        variants = []
+        for variant_context, variant in solved:
+            result = render_itinerary(variant_context, variant)
+            result["seed"] = variant.seed
+            if variant.seed is None:
+                # Chọn lại phương án này qua /regenerate sẽ lấy ngay từ cache
+                itinerary_draft_cache.put(
+                    draft_key(province_id, duration_days, max_budget, must_include_place_ids, None,
+                              primary_accommodation_id, variant.objective, choose_hotel),
+                    result, version
+                )
+            result["objective"] = variant.objective
+            result["total_travel_minutes"] = sum(stop.travel_minutes for day in variant.days for stop in day)
+            variants.append(result)
+
+        return jsonify({"trip_id": trip.id, "variants": variants}), 200
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "message": f"An error occurred while generating itinerary variants: {str(e)}"
+        }), 500
+
 # API: MỞ RỘNG CHUYẾN ĐI (THÊM 1 NGÀY VÀO LỊCH TRÌNH)
 @app.route("/api/trips/<int:trip_id>/extend", methods=["POST"])
 @jwt_required()
@@ -2013,16 +2652,41 @@ def extend_trip_itinerary(trip_id):
             trip.status = 'COMPLETED'
 
     try:
-        # 1. Tái tạo lịch trình chỉ cho 1 ngày mới, loại trừ các địa điểm đã dùng
-        itinerary_draft_for_new_day = generate_itinerary_optimized(
-            province_id, 
-            1, 
-            must_include_place_ids=[], 
-            excluded_ids=used_place_ids # ⭐ TRUYỀN DANH SÁCH ĐÃ DÙNG VÀO HÀM LOGIC
-        ) 
+        current_itinerary = json.loads(trip.itinerary_json) if trip.itinerary_json else []
+        metadata = json.loads(trip.metadata_json) if trip.metadata_json else {}
+        hotel = metadata.get("hotel") or {}
+        hotel_id = hotel.get("id")
+        # Điểm đã dùng: lấy từ chính lịch trình đã lưu (cộng danh sách frontend gửi lên)
+        used_ids = set(used_place_ids) | {
+            p.get("id") for day in current_itinerary for p in day.get("places", []) if p.get("id")
+        }
+        used_ids.discard(hotel_id)
+
+        # Ngân sách còn lại = ngân sách chuyến - chi phí các ngày đã xếp - tiền khách sạn cho mọi đêm (kể cả đêm thêm)
+        max_budget = float(data.get("max_budget", metadata.get("max_budget")) or 0)
+        spent = sum(
+            float(p.get("estimated_cost") or 0)
+            for day in current_itinerary for p in day.get("places", []) if p.get("id") != hotel_id
+        )
+        spent += float(hotel.get("price_per_night") or 0) * max(0, duration_new - 1)
+        remaining_budget = max_budget - spent if max_budget > 0 else 0
+
+        # 1. Tạo lịch trình chỉ cho 1 ngày mới từ pool ứng viên trong bộ nhớ, loại trừ các địa điểm đã dùng,
+        # trong phần ngân sách còn lại (không qua cache bản nháp: tập loại trừ gần như không bao giờ lặp lại)
+        new_day_result = {}
+        if max_budget <= 0 or remaining_budget > 0:
+            new_day_result = generate_itinerary_optimized(
+                province_id,
+                1,
+                remaining_budget,
+                must_include_place_ids=[],
+                excluded_ids=used_ids,
+                primary_accommodation_id=hotel_id
+            )
+        itinerary_draft_for_new_day = new_day_result.get("itinerary", [])
         
         # 2. Kiểm tra nếu không có địa điểm mới nào được tạo
-        if not itinerary_draft_for_new_day or not itinerary_draft_for_new_day[0]['places']:
+        if not itinerary_draft_for_new_day or all(p.get('id') == hotel_id for p in itinerary_draft_for_new_day[0]['places']):
             db.session.commit() # Commit cập nhật duration/status
             # ⭐ TRẢ VỀ THÔNG BÁO CHO FRONTEND
             return jsonify({
@@ -2030,16 +2694,16 @@ def extend_trip_itinerary(trip_id):
                 "new_day_itinerary": json.loads(trip.itinerary_json) if trip.itinerary_json else []
             }), 200
             
-        current_itinerary = json.loads(trip.itinerary_json) if trip.itinerary_json else []
-        
         # 3. Nối lịch trình mới vào lịch trình cũ
         day_content = itinerary_draft_for_new_day[0]
         day_content['day'] = new_day_number
         current_itinerary.append(day_content)
         current_itinerary.sort(key=lambda x: x['day'])
             
-        # 4. Lưu lịch trình mới
+        # 4. Lưu lịch trình mới (tổng chi phí gồm cả ngày và đêm khách sạn vừa thêm)
         trip.itinerary_json = json.dumps(current_itinerary, ensure_ascii=False)
+        metadata["total_estimated_cost"] = spent + new_day_result.get("total_estimated_cost", 0)
+        trip.metadata_json = json.dumps(metadata, ensure_ascii=False)
         trip.updated_at = datetime.now()
         db.session.commit()
         
@@ -2094,34 +2758,43 @@ def get_destination_details(destination_id):
 
 @app.route("/api/destinations/by-province/<int:province_id>", methods=["GET"])
 @jwt_required()
+@catalog_conditional
 def get_destinations_by_province(province_id):
-    destinations = Destination.query.filter_by(province_id=province_id).options(
-        db.joinedload(Destination.images)
-    ).all()
+    try:
+        page = parse_page_args(request.args)
+        fields = parse_fieldset(request.args, PROVINCE_LISTING_FIELDS, PROVINCE_LISTING_SUMMARY)
+    except (InvalidPageParams, InvalidFieldset) as e:
+        return jsonify({"message": str(e)}), 400
+
+    query = db.session.query(Destination.id, Destination.rating).filter(
+        Destination.province_id == province_id
+    )
+    next_cursor = None
+    if page is None:
+        rows = query.order_by(Destination.id).all()
+    else:
+        limit, cursor = page
+        rows, next_cursor = fetch_keyset_page(
+            query, Destination.rating, Destination.id, cursor, limit,
+            key=lambda row: (row.rating, row.id)
+        )
     
-    if not destinations:
+    if not rows and (page is None or page[1] is None):
         return jsonify({"message": "No destinations found for this province."}), 404
 
-    result = []
-    for destination in destinations:
-        result.append({
-            "id": destination.id,
-            "name": destination.name,
-            "type": destination.place_type,
-            "description_snippet": (destination.description[:100] + '...') if destination.description else None,
-            "images": [img.image_url for img in destination.images][:1], # Chỉ lấy 1 ảnh đại diện
-            "gps": {
-                "lat": destination.latitude,
-                "lng": destination.longitude
-            },
-            "entry_fee": destination.entry_fee,
-            "tags": decode_db_json_string(destination.tags, default_type='text'),
-        })
+    result = get_destination_projection(
+        [row.id for row in rows], fields or PROVINCE_LISTING_FIELDS, PROVINCE_LISTING_SPEC
+    )
         
-    return jsonify(result), 200
+    if page is None:
+        return jsonify(result), 200
+    return jsonify({"items": result, "next_cursor": next_cursor, "limit": page[0]}), 200
 
 # ----------------- Main -----------------
 if __name__ == "__main__":
+    # Worker spawn của pool biến thể nạp lại __main__ (tức cả file này): giải trong process,
+    # dùng `python run.py` để có pool song song
+    os.environ.setdefault("ITINERARY_VARIANT_WORKERS", "0")
     with app.app_context():
         db.create_all()
     print("Server running at http://127.0.0.1:5000")
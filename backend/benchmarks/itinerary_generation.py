@@ -0,0 +1,255 @@
+"""Benchmark: itinerary generation endpoints on synthetic provinces.
+
+Run from ``backend/``::
+
+    python -m benchmarks.itinerary_generation                       # 100, 1k, 10k places
+    python -m benchmarks.itinerary_generation --sizes 1000 --days 3 7 --repeat 50
+    python -m benchmarks.itinerary_generation --output bench.json   # JSON for regression tracking
+
+The app runs on a temporary SQLite file (``DATABASE_URL``, set before
+``app`` is imported; ``--database`` to choose another one). The benchmark
+calls ``db.drop_all()`` on that database, so ``--database`` must be an
+in-memory SQLite URL or a SQLite file under the system temp directory
+unless ``--i-know-this-drops-tables`` is given. For every
+province size (:mod:`benchmarks.synthetic`) and trip length the real
+endpoints are called through the Flask test client:
+
+* ``generate_cold`` – ``POST /api/trips`` right after the catalog changed
+  (empty candidate pool and draft cache),
+* ``generate`` – ``POST /api/trips`` with a warm pool, draft cache cleared,
+* ``generate_cached`` – ``POST /api/trips`` served from the draft cache,
+* ``regenerate`` – ``POST /api/trips/<id>/regenerate`` with ``shuffle``,
+* ``extend`` – ``POST /api/trips/<id>/extend`` (trip reset between calls),
+* ``heuristic_fallback`` – ``apply_heuristic_fallback`` on the generated
+  itinerary with one emptied day (what ``/api/ai/evaluate_itinerary`` does
+  when the model reply is unusable).
+
+Each scenario reports p50/p95/max latency, SQL statements per call and the
+peak Python heap (``tracemalloc``, measured on one extra call so tracing
+does not skew the timings).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import SyntheticSpec
+
+SCENARIOS = ("generate_cold", "generate", "generate_cached", "regenerate", "extend", "heuristic_fallback")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the engine (``before_cursor_execute``)."""
+
+    def __init__(self, engine) -> None:
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+
+def _summary(timings, queries, peak_bytes):
+    return {
+        "calls": len(timings),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "queries_per_call": round(sum(queries) / len(queries), 2),
+        "max_queries": max(queries),
+        "peak_memory_kb": round(peak_bytes / 1024, 1),
+    }
+
+
+def _measure(counter, repeat, call, setup=None):
+    """Run ``setup`` (untimed) then ``call`` ``repeat`` times, plus one traced call for peak memory."""
+    timings, queries = [], []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        before = counter.count
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+        queries.append(counter.count - before)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return _summary(timings, queries, peak)
+
+
+def _checked(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.path}: {response.status_code} {response.get_data(as_text=True)[:200]}")
+    return response.get_json()
+
+
+def run(sizes, days_list, repeat, budget, seed, spec):
+    # Import muộn: DATABASE_URL phải được đặt trước khi app tạo engine
+    from flask_jwt_extended import create_access_token
+
+    from app import apply_heuristic_fallback, app
+    from models import Destination, Itinerary, Province, Region, User, db
+    from benchmarks.synthetic import populate_province
+    from utils.catalog_cache import invalidate_catalog
+    from utils.draft_cache import itinerary_draft_cache
+
+    results = []
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        counter = QueryCounter(db.engine)
+        user = User(username="bench", email="bench@example.com", password="x", is_email_verified=True)
+        db.session.add(user)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+        client = app.test_client()
+
+        # create_trip in dữ liệu nhận được ra stdout: tắt khi đo
+        def mute():
+            return contextlib.redirect_stdout(io.StringIO())
+
+        for size in sizes:
+            province_id = populate_province(
+                db.session, Region, Province, Destination, f"Benchmark {size}", size, spec, seed=seed
+            )
+            for days in days_list:
+                payload = {"name": "Bench", "province_id": province_id, "duration": days, "max_budget": budget}
+
+                def create():
+                    with mute():
+                        return _checked(client.post("/api/trips", json=payload, headers=headers), 201)
+
+                row = {"places": size, "days": days, "budget": budget}
+                row["generate_cold"] = _measure(counter, repeat, create, setup=invalidate_catalog)
+                row["generate"] = _measure(counter, repeat, create, setup=itinerary_draft_cache.clear)
+                row["generate_cached"] = _measure(counter, repeat, create)
+
+                trip = create()["trip"]
+                trip_id, original = trip["id"], json.dumps(trip["itinerary"], ensure_ascii=False)
+                row["regenerate"] = _measure(counter, repeat, lambda: _checked(client.post(
+                    f"/api/trips/{trip_id}/regenerate", json={"shuffle": True}, headers=headers
+                )))
+
+                def reset_trip():
+                    db.session.execute(
+                        Itinerary.__table__.update().where(Itinerary.id == trip_id)
+                        .values(duration=days, itinerary_json=original)
+                    )
+                    db.session.commit()
+
+                row["extend"] = _measure(counter, repeat, lambda: _checked(client.post(
+                    f"/api/trips/{trip_id}/extend", json={"duration": days + 1, "new_day": days + 1}, headers=headers
+                )), setup=reset_trip)
+
+                compact = json.loads(original)
+                if compact:
+                    compact[-1] = {"day": compact[-1]["day"], "places": []}
+
+                def fallback():
+                    with mute():
+                        apply_heuristic_fallback(None, compact, raw_reply="not json")
+
+                row["heuristic_fallback"] = _measure(counter, repeat, fallback)
+                results.append(row)
+        db.session.remove()
+    return results
+
+
+def is_disposable_database(url):
+    """True for in-memory SQLite or a SQLite file under the system temp directory."""
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return False
+    if parsed.database in (None, "", ":memory:"):
+        return True
+    if not os.path.isabs(parsed.database):
+        # Flask-SQLAlchemy đặt đường dẫn tương đối vào instance/ (CSDL thật), không theo cwd
+        return False
+    temp_root = os.path.realpath(tempfile.gettempdir())
+    return os.path.commonpath([os.path.realpath(parsed.database), temp_root]) == temp_root
+
+
+def _print_table(results):
+    print(f"{'places':>7} {'days':>4}  {'scenario':<19}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+    for row in results:
+        for name in SCENARIOS:
+            stats = row[name]
+            print(f"{row['places']:>7} {row['days']:>4}  {name:<19}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                  f"{stats['queries_per_call']:>9.1f}{stats['peak_memory_kb']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10_000], help="places per province")
+    parser.add_argument("--days", type=int, nargs="+", default=[3], help="trip lengths")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per scenario")
+    parser.add_argument("--budget", type=float, default=0, help="max_budget (0 = no limit)")
+    parser.add_argument("--spread-km", type=float, default=15.0, help="std deviation of place coordinates")
+    parser.add_argument("--hotel-share", type=float, default=0.1, help="share of accommodations")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--database",
+        help="SQLAlchemy URL (default: temporary SQLite file). WARNING: all tables are dropped; only in-memory "
+             "SQLite or a SQLite file under the temp directory is accepted without --i-know-this-drops-tables",
+    )
+    parser.add_argument(
+        "--i-know-this-drops-tables", dest="allow_drop", action="store_true",
+        help="allow --database to point anywhere (its tables are dropped and recreated)",
+    )
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.database and not args.allow_drop and not is_disposable_database(args.database):
+        parser.error(f"refusing to drop the tables of {args.database}; pass --i-know-this-drops-tables to allow it")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database or f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+        # Chỉ đo trong process hiện tại: không khởi động ProcessPool cho /variants
+        os.environ.setdefault("ITINERARY_VARIANT_WORKERS", "0")
+        spec = SyntheticSpec(spread_km=args.spread_km, hotel_share=args.hotel_share)
+        results = run(args.sizes, args.days, args.repeat, args.budget, args.seed, spec)
+
+    _print_table(results)
+    if args.output:
+        report = {
+            "benchmark": "itinerary_generation",
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "spec": {"spread_km": args.spread_km, "hotel_share": args.hotel_share},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
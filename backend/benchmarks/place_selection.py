@@ -0,0 +1,105 @@
+"""Benchmark: knapsack place selection vs the old rating-greedy selection.
+
+Run from ``backend/``::
+
+    python -m benchmarks.place_selection                   # 50, 150, 300 candidates
+    python -m benchmarks.place_selection --sizes 300 --days 3 7 14 --repeat 5
+
+Candidates get random ratings, entry fees and visit durations shaped like
+the seeded catalog. For each size the table shows the selection time of the
+NumPy DP, the pure-Python DP (only up to ``--python-limit`` candidates)
+and the value-density greedy, plus the total rating each one reaches
+compared with the old rating-order greedy.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from utils import place_selection
+from utils.place_selection import TRAVEL_ALLOWANCE_MIN, Candidate, select_places
+
+DAY_MINUTES = 570  # 08:30 - 18:00
+FEES = [0, 0, 0, 20_000, 50_000, 100_000, 150_000, 300_000, 800_000]
+DURATIONS = [60, 90, 120, 120, 180]
+
+
+def random_candidates(n, seed=42):
+    rng = random.Random(seed)
+    return [
+        Candidate(rng.choice(FEES), rng.choice(DURATIONS), round(rng.uniform(3.5, 5.0), 1))
+        for _ in range(n)
+    ]
+
+
+def rating_greedy(candidates, budget, minutes):
+    # Cách chọn cũ: duyệt theo rating giảm dần, lấy nếu còn đủ tiền và thời gian
+    chosen = []
+    for i in sorted(range(len(candidates)), key=lambda i: -candidates[i].utility):
+        need = candidates[i].minutes + TRAVEL_ALLOWANCE_MIN
+        if candidates[i].cost <= budget and need <= minutes:
+            chosen.append(i)
+            budget -= candidates[i].cost
+            minutes -= need
+    return chosen
+
+
+def _best_of(repeat, func):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _with_limits(dp_cells, python_cells, func):
+    saved = place_selection.MAX_DP_CELLS, place_selection.MAX_DP_CELLS_PYTHON
+    place_selection.MAX_DP_CELLS, place_selection.MAX_DP_CELLS_PYTHON = dp_cells, python_cells
+    try:
+        return func()
+    finally:
+        place_selection.MAX_DP_CELLS, place_selection.MAX_DP_CELLS_PYTHON = saved
+
+
+def run(sizes, days_list, budget, repeat, python_limit):
+    rows = []
+    for n in sizes:
+        candidates = random_candidates(n)
+        for days in days_list:
+            minutes = days * DAY_MINUTES
+            value = lambda chosen: sum(candidates[i].utility for i in chosen)
+            baseline = value(rating_greedy(candidates, budget, minutes))
+            timings = {}
+            if place_selection.np is not None:
+                timings["numpy"] = _best_of(repeat, lambda: select_places(candidates, budget, minutes, use_numpy=True))
+            if n <= python_limit:
+                # Luôn chạy DP thuần Python (bỏ giới hạn số ô) để so sánh
+                timings["python"] = _best_of(1, lambda: _with_limits(
+                    0, float("inf"), lambda: select_places(candidates, budget, minutes, use_numpy=False)
+                ))
+            timings["greedy"] = _best_of(
+                repeat, lambda: _with_limits(0, 0, lambda: select_places(candidates, budget, minutes))
+            )
+            rows.append((n, days, baseline, {k: (t, value(c)) for k, (t, c) in timings.items()}))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 150, 300])
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7])
+    parser.add_argument("--budget", type=float, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--python-limit", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'places':>7} {'days':>5} {'old rating':>11} {'method':>8} {'time':>10} {'rating':>8}")
+    for n, days, baseline, results in run(args.sizes, args.days, args.budget, args.repeat, args.python_limit):
+        for method, (seconds, total) in results.items():
+            print(f"{n:>7} {days:>5} {baseline:>11.1f} {method:>8} {seconds * 1000:>7.1f} ms {total:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Synthetic provinces for benchmarks.
+
+:func:`synthetic_places` returns ``destinations`` rows (plain dicts) for one
+province: points scattered around a centre (Gaussian, ``spread_km`` standard
+deviation), entry fees, visit durations, ratings and opening hours drawn
+from configurable distributions shaped like the seeded catalog, and a share
+of accommodations. :func:`populate_province` bulk-inserts them with Core
+``INSERT`` statements (no ORM objects, no per-row flush hooks), so 10k-place
+provinces are created in well under a second.
+"""
+from __future__ import annotations
+
+import math
+import random
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+
+from utils.opening_hours import encode_windows, parse_opening_hours
+
+KM_PER_DEGREE = 111.32
+
+FEES = (0, 0, 0, 20_000, 50_000, 100_000, 150_000, 300_000, 800_000)
+HOTEL_FEES = (300_000, 500_000, 800_000, 1_200_000, 2_500_000)
+DURATIONS_HOURS = (1.0, 1.5, 2.0, 2.0, 3.0)
+OPENING_HOURS = (None, None, "07:00 - 17:00", "Giờ hành chính", "Cả ngày", "08:00 - 21:30")
+CATEGORIES = ("Di tích lịch sử", "Thiên nhiên", "Văn hóa", "Ẩm thực", "Giải trí")
+
+
+class SyntheticSpec(NamedTuple):
+    center: Tuple[float, float] = (21.0285, 105.8542)  # Hà Nội
+    spread_km: float = 15.0
+    fees: Sequence[float] = FEES
+    hotel_fees: Sequence[float] = HOTEL_FEES
+    durations_hours: Sequence[Optional[float]] = DURATIONS_HOURS
+    opening_hours: Sequence[Optional[str]] = OPENING_HOURS
+    rating_range: Tuple[float, float] = (3.0, 5.0)
+    hotel_share: float = 0.1
+    missing_coordinates_share: float = 0.0
+
+
+def synthetic_places(count: int, province_id: int, spec: SyntheticSpec = SyntheticSpec(),
+                     seed: int = 42, name_prefix: str = "Điểm") -> List[Dict]:
+    """``count`` destination rows for ``province_id`` (same seed -> same rows)."""
+    rng = random.Random(seed)
+    lat0, lng0 = spec.center
+    lat_scale = spec.spread_km / KM_PER_DEGREE
+    lng_scale = lat_scale / max(math.cos(math.radians(lat0)), 1e-6)
+    windows = {text: encode_windows(parse_opening_hours(text)) for text in spec.opening_hours}
+
+    rows = []
+    for i in range(count):
+        is_hotel = rng.random() < spec.hotel_share
+        if rng.random() < spec.missing_coordinates_share:
+            lat = lng = None
+        else:
+            lat = round(lat0 + rng.gauss(0, lat_scale), 6)
+            lng = round(lng0 + rng.gauss(0, lng_scale), 6)
+        hours = None if is_hotel else rng.choice(spec.opening_hours)
+        rows.append({
+            "province_id": province_id,
+            "name": f"{'Khách sạn' if is_hotel else name_prefix} {province_id}-{i}",
+            "place_type": "hotel" if is_hotel else "tourist_attraction",
+            "is_accommodation": is_hotel,
+            "category": "Lưu trú" if is_hotel else rng.choice(CATEGORIES),
+            "estimated_duration_hours": None if is_hotel else rng.choice(spec.durations_hours),
+            "latitude": lat,
+            "longitude": lng,
+            "opening_hours": hours,
+            "opening_windows": windows[hours],
+            "entry_fee": rng.choice(spec.hotel_fees if is_hotel else spec.fees),
+            "rating": round(rng.uniform(*spec.rating_range), 1),
+        })
+    return rows
+
+
+def populate_province(session, region_model, province_model, destination_model, name: str, count: int,
+                      spec: SyntheticSpec = SyntheticSpec(), seed: int = 42) -> int:
+    """Create (or reuse) a province called ``name`` and insert ``count`` synthetic places; returns its id."""
+    region = session.query(region_model).filter_by(name="Benchmark").first()
+    if region is None:
+        region = region_model(name="Benchmark")
+        session.add(region)
+        session.flush()
+    province = province_model(name=name, region_id=region.id)
+    session.add(province)
+    session.flush()
+    rows = synthetic_places(count, province.id, spec, seed=seed)
+    if rows:
+        session.execute(insert(destination_model.__table__), rows)
+    session.commit()
+    return province.id
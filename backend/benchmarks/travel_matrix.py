@@ -0,0 +1,82 @@
+"""Benchmark: vectorized vs pure-Python distance / travel-time matrices.
+
+Run from ``backend/``::
+
+    python -m benchmarks.travel_matrix            # 50, 500, 5000 places
+    python -m benchmarks.travel_matrix --sizes 50 500 --repeat 5
+
+Random points are drawn inside Vietnam's bounding box. For large sizes the
+pure-Python path is timed on a sample of rows and scaled up (pass
+``--full-python`` to time every row).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from utils.travel_matrix import numpy_available, travel_time_matrices
+
+# Khung tọa độ xấp xỉ của Việt Nam
+LAT_RANGE = (8.4, 23.4)
+LNG_RANGE = (102.1, 109.5)
+PYTHON_SAMPLE_ROWS = 200
+
+
+def random_points(n, seed=42):
+    rng = random.Random(seed)
+    return [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(n)]
+
+
+def _best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, repeat, full_python=False):
+    rows = []
+    for n in sizes:
+        points = random_points(n)
+        vectorized = None
+        if numpy_available():
+            vectorized = _best_of(repeat, lambda: travel_time_matrices(points, use_numpy=True))
+
+        sample = points if full_python or n <= PYTHON_SAMPLE_ROWS else points[:PYTHON_SAMPLE_ROWS]
+        # Chỉ tính các hàng mẫu (với mọi cột) rồi nhân tỉ lệ lên n hàng
+        python = _best_of(1 if len(sample) < n else repeat, lambda: _python_rows(sample, points))
+        python *= n / len(sample)
+        rows.append((n, python, vectorized, len(sample) < n))
+    return rows
+
+
+def _python_rows(sample, points):
+    from utils.travel_matrix import TRAVEL_SPEEDS_KMH, distance_matrix, travel_time_matrix
+
+    distances = distance_matrix(sample, points, use_numpy=False)
+    for mode in TRAVEL_SPEEDS_KMH:
+        travel_time_matrix(distances, mode, use_numpy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--full-python", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'places':>8} {'pure python':>14} {'numpy':>10} {'speedup':>9}")
+    for n, python, vectorized, estimated in run(args.sizes, args.repeat, args.full_python):
+        python_label = f"{python * 1000:.1f} ms" + ("*" if estimated else "")
+        if vectorized is None:
+            print(f"{n:>8} {python_label:>14} {'n/a':>10} {'n/a':>9}")
+        else:
+            print(f"{n:>8} {python_label:>14} {vectorized * 1000:>7.1f} ms {python / vectorized:>8.0f}x")
+    print(f"* scaled from {PYTHON_SAMPLE_ROWS} sampled rows")
+
+
+if __name__ == "__main__":
+    main()
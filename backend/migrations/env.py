@@ -45,6 +45,17 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Bảng ảo FTS5/R*Tree (và các bảng shadow của chúng) do utils.search_index /
+# utils.geo_index quản lý, không nằm trong metadata: autogenerate bỏ qua
+VIRTUAL_TABLE_PREFIXES = ('destinations_fts', 'destinations_rtree')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and name.startswith(VIRTUAL_TABLE_PREFIXES):
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +105,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,141 @@
+"""catalog derived columns, tag/job tables and chat summary
+
+Adds what the models gained on top of the original schema, so a database
+created earlier with ``db.create_all()`` keeps working:
+
+* ``destinations``: ``is_accommodation``, ``opening_windows``,
+  ``card_image_url``, ``card_thumbnail_url`` and the keyset/candidate indexes,
+* ``chat_sessions``: ``summary``, ``summary_until_id``,
+* new tables ``tags``, ``destination_tags``, ``catalog_meta``, ``ai_jobs``.
+
+Every step is skipped when the table / column / index already exists (a
+database created by ``db.create_all()`` with the current models, or one that
+has none of the original tables yet). The derived columns start empty:
+run ``python seed.py`` (or the ``flask *-reindex`` / ``card-images-rebuild``
+commands) afterwards to fill them.
+
+Revision ID: a3c9e1f2b7d4
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e1f2b7d4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+NEW_COLUMNS = {
+    'destinations': [
+        sa.Column('is_accommodation', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('opening_windows', sa.String(length=100), nullable=True),
+        sa.Column('card_image_url', sa.String(length=255), nullable=True),
+        sa.Column('card_thumbnail_url', sa.String(length=255), nullable=True),
+    ],
+    'chat_sessions': [
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('summary_until_id', sa.Integer(), nullable=True),
+    ],
+}
+
+NEW_INDEXES = {
+    'destinations': [
+        ('ix_destinations_rating_id', ['rating', 'id']),
+        ('ix_destinations_province_rating_id', ['province_id', 'rating', 'id']),
+        ('ix_destinations_province_accommodation_rating', ['province_id', 'is_accommodation', 'rating']),
+    ],
+}
+
+
+def _create_new_tables(inspector, tables):
+    if 'tags' not in tables:
+        op.create_table(
+            'tags',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('name_key', sa.String(length=100), nullable=False),
+        )
+        op.create_index('ix_tags_name_key', 'tags', ['name_key'], unique=True)
+    if 'destination_tags' not in tables:
+        op.create_table(
+            'destination_tags',
+            sa.Column('destination_id', sa.Integer(),
+                      sa.ForeignKey('destinations.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+        )
+        op.create_index('ix_destination_tags_tag_id', 'destination_tags', ['tag_id', 'destination_id'])
+    if 'catalog_meta' not in tables:
+        op.create_table(
+            'catalog_meta',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('modified_at', sa.DateTime(), nullable=False),
+        )
+    if 'ai_jobs' not in tables:
+        op.create_table(
+            'ai_jobs',
+            sa.Column('id', sa.String(length=32), primary_key=True),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('payload_json', sa.Text(), nullable=False),
+            sa.Column('result_json', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_ai_jobs_status', 'ai_jobs', ['status'])
+        op.create_index('ix_ai_jobs_created_at', 'ai_jobs', ['created_at'])
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    # CSDL trống: db.create_all() / seed.py tạo mọi bảng với đủ cột
+    if 'destinations' not in tables:
+        return
+
+    for table, columns in NEW_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+    for table, indexes in NEW_INDEXES.items():
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        for name, columns in indexes:
+            if name not in existing:
+                op.create_index(name, table, columns)
+
+    _create_new_tables(inspector, tables)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table in ('destination_tags', 'tags', 'catalog_meta', 'ai_jobs'):
+        if table in tables:
+            op.drop_table(table)
+    for table, indexes in NEW_INDEXES.items():
+        if table not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        for name, _ in indexes:
+            if name in existing:
+                op.drop_index(name, table_name=table)
+    for table, columns in NEW_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                if column.name in existing:
+                    batch_op.drop_column(column.name)
@@ -101,21 +101,55 @@ class Destination(db.Model):
     name = db.Column(db.String(100), nullable=False)
     name_unaccented = db.Column(db.String(128), index=True)
     place_type = db.Column(db.String(50)) 
+    # Khách sạn/resort/homestay... (utils/place_types): tính sẵn khi ghi place_type
+    is_accommodation = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     description = db.Column(db.Text) 
     estimated_duration_hours = db.Column(db.Float, default=2.0, nullable=True)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     opening_hours = db.Column(db.String(100))
+    # Khung giờ mở cửa đã parse sẵn từ opening_hours (utils/opening_hours): JSON [[mở, đóng], ...] theo phút
+    opening_windows = db.Column(db.String(100))
     entry_fee = db.Column(db.Float)
     source = db.Column(db.String(255))
     image_url = db.Column(db.String(200)) 
+    # Ảnh card đã resolve sẵn khi ghi (utils/card_images): URL mạng hoặc 'images/<file>' trong static
+    card_image_url = db.Column(db.String(255))
+    card_thumbnail_url = db.Column(db.String(255))
     rating = db.Column(db.Float, default=0)
     tags = db.Column(db.Text) 
     category = db.Column(db.String(50)) 
 
+    # Index cho phân trang keyset theo (rating, id)
+    __table_args__ = (
+        db.Index('ix_destinations_rating_id', 'rating', 'id'),
+        db.Index('ix_destinations_province_rating_id', 'province_id', 'rating', 'id'),
+        # Ứng viên lịch trình: điểm tham quan (không phải chỗ ở) của một tỉnh theo rating
+        db.Index('ix_destinations_province_accommodation_rating', 'province_id', 'is_accommodation', 'rating'),
+    )
+
     reviews = db.relationship("Review", backref="destination", lazy=True)
     saved_by_users = db.relationship("SavedDestination", backref="destination", lazy=True)
 
+# Bảng tag chuẩn hóa (thay cho việc LIKE trên cột JSON Destination.tags)
+destination_tags = db.Table(
+    'destination_tags',
+    db.Column('destination_id', db.Integer, db.ForeignKey('destinations.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_destination_tags_tag_id', 'tag_id', 'destination_id'),
+)
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    name_key = db.Column(db.String(100), unique=True, nullable=False, index=True) # lower() để so khớp không phân biệt hoa thường
+
+    destinations = db.relationship("Destination", secondary=destination_tags, backref=db.backref("tag_items", lazy=True), lazy=True)
+
+    def __repr__(self):
+        return f"<Tag {self.name}>"
+
 class DestinationImage(db.Model):
     __tablename__ = 'destination_images' # <-- THÊM: Đồng bộ tên bảng
     id = db.Column(db.Integer, primary_key=True)
@@ -124,6 +158,13 @@ class DestinationImage(db.Model):
     destination_id = db.Column(db.Integer, db.ForeignKey('destinations.id'), nullable=False) 
     destination = db.relationship("Destination", backref=db.backref("images", lazy=True, cascade="all, delete-orphan"))
 
+class CatalogMeta(db.Model):
+    # Một dòng duy nhất (id=1): version catalog dùng chung cho mọi process, tăng cùng transaction ghi catalog
+    __tablename__ = 'catalog_meta'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    modified_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # UTC, làm tròn giây
+
 # -------------------------------------------------------------
 # CÁC MODEL MỚI VÀ QUAN HỆ KHÓA NGOẠI
 # -------------------------------------------------------------
@@ -187,6 +228,10 @@ class ChatSession(db.Model):
     title = db.Column(db.String(150), default="Cuộc trò chuyện mới")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Tóm tắt cuốn chiếu các tin nhắn cũ (id <= summary_until_id), cập nhật bởi job nền chat_summary
+    summary = db.Column(db.Text, nullable=True)
+    summary_until_id = db.Column(db.Integer, nullable=True)
     
     # Relationship to messages
     messages = db.relationship("ChatMessage", backref="session", lazy=True, cascade="all, delete-orphan")
@@ -216,4 +261,23 @@ class ChatAttachment(db.Model):
     message_id = db.Column(db.Integer, db.ForeignKey('chat_messages.id'), nullable=False)
     name = db.Column(db.String(255))
     data_url = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+# -------------------------------------------------------------
+# MODEL JOB NỀN (AI)
+# -------------------------------------------------------------
+
+class AiJob(db.Model):
+    __tablename__ = 'ai_jobs'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, client dùng để hỏi kết quả
+    kind = db.Column(db.String(50), nullable=False)  # evaluate_itinerary | reorder_itinerary
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued | running | done | failed
+    payload_json = db.Column(db.Text, nullable=False)
+    result_json = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AiJob {self.id} {self.kind}: {self.status}>"
@@ -1,15 +1,24 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import json
 import re
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from sqlalchemy import desc
 from sqlalchemy.orm import joinedload
 
-from models import db, ChatAttachment, ChatMessage, ChatSession, Destination, User
+from models import db, AiJob, ChatAttachment, ChatMessage, ChatSession, Destination, User
+from utils.chat_history import (
+    fit_history,
+    prompt_token_budget,
+    split_for_summary,
+    summary_chunk_size,
+    summary_messages,
+)
+from utils.job_queue import QUEUED, RUNNING, ai_job_queue
 from utils.openai_client import OpenAIChatClient
+from utils.tag_index import tag_index
 
 chat_bp = Blueprint("chat", __name__)
 chat_client = OpenAIChatClient()
@@ -129,7 +138,13 @@ def _build_prompt_messages(
     preferred_name: Optional[str] = None,
     page_context: Optional[str] = None,
     user_language: Optional[str] = None,
-) -> List[dict]:
+    summary: Optional[str] = None,
+    token_budget: Optional[int] = None,
+) -> Tuple[List[dict], int]:
+    """System prompt + rolling summary + the newest history that fits ``token_budget`` tokens.
+
+    Returns ``(messages, dropped)``: how many of ``history`` did not fit.
+    """
     travel_context = _build_destination_context()
     display_name = (preferred_name or "").strip() or getattr(user, "full_name", "") or user.username
     
@@ -236,10 +251,55 @@ Tham khảo các điểm đến gợi ý sẵn khi phù hợp:
 {context_block}
 """.strip()
 
-    messages = [{"role": "system", "content": system_prompt}]
-    for msg in history:
-        messages.append({"role": msg.role, "content": msg.content})
-    return messages
+    fixed = [{"role": "system", "content": system_prompt}]
+    if summary:
+        label = "Summary of the earlier conversation" if user_language == "en" else "Tóm tắt phần hội thoại trước"
+        fixed.append({"role": "system", "content": f"{label}:\n{summary}"})
+    turns = [{"role": msg.role, "content": msg.content} for msg in history]
+    return fit_history(fixed, turns, token_budget or prompt_token_budget())
+
+
+def _request_summary(session: ChatSession) -> None:
+    """Queue a chat_summary job for the session unless one is already waiting."""
+    payload = {"session_id": session.id}
+    pending = AiJob.query.filter(
+        AiJob.kind == "chat_summary",
+        AiJob.status.in_((QUEUED, RUNNING)),
+        AiJob.payload_json == json.dumps(payload, ensure_ascii=False),
+    ).first()
+    if pending is None:
+        ai_job_queue.submit("chat_summary", payload)
+
+
+def refresh_chat_summary(payload: dict) -> dict:
+    """Job handler: fold older unsummarized messages into ChatSession.summary."""
+    session = db.session.get(ChatSession, payload.get("session_id"))
+    if session is None:
+        return {"folded": 0}
+    pending = (
+        ChatMessage.query.filter(ChatMessage.session_id == session.id, ChatMessage.id > (session.summary_until_id or 0))
+        .order_by(ChatMessage.id.asc())
+        .all()
+    )
+    fold, _ = split_for_summary(pending)
+    if not fold:
+        return {"folded": 0}
+
+    # Gộp theo từng khúc vừa ngân sách token; lưu tiến độ sau mỗi khúc để lần thử lại chạy tiếp từ đó
+    folded = 0
+    while fold:
+        turns = [(m.role, m.content) for m in fold]
+        take = summary_chunk_size(session.summary, turns)
+        summary = chat_client.generate_reply(summary_messages(session.summary, turns[:take]))
+        session.summary = summary.strip()
+        session.summary_until_id = fold[take - 1].id
+        db.session.commit()
+        folded += take
+        fold = fold[take:]
+    return {"folded": folded, "summary_until_id": session.summary_until_id}
+
+
+ai_job_queue.register("chat_summary", refresh_chat_summary)
 
 
 def _persist_attachments(message: ChatMessage, attachments_payload) -> None:
@@ -265,6 +325,147 @@ def _persist_attachments(message: ChatMessage, attachments_payload) -> None:
         db.session.add(attachment)
 
 
+def _begin_reply(user_id: int, session: ChatSession, payload: dict, history_limit: int, retitle: bool = False):
+    """Validate the payload, store the user message and build the prompt.
+
+    Returns ``(user_msg, openai_messages, None)``, or ``(None, None, error_response)``.
+    """
+    content = (payload.get("message") or "").strip()
+    display_name = (payload.get("display_name") or "").strip()
+    page_context = (payload.get("page_context") or "").strip()
+    if not content:
+        return None, None, (jsonify({"message": "Message is required"}), 400)
+
+    if not chat_client.is_ready():
+        return None, None, (jsonify({"message": "OPENAI_API_KEY is missing on the server"}), 500)
+
+    user = session.user or User.query.get(user_id)
+    if not user:
+        return None, None, (jsonify({"message": "User not found"}), 404)
+
+    user_msg = ChatMessage(
+        user_id=user_id,
+        session_id=session.id,
+        role="user",
+        content=content,
+    )
+    db.session.add(user_msg)
+    db.session.flush()
+    _persist_attachments(user_msg, payload.get("attachments"))
+
+    if retitle and (session.title or "").startswith("Cuộc trò chuyện") and content:
+        session.title = content[:90] + ("…" if len(content) > 90 else "")
+
+    session.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    # Tin nhắn đã gộp vào summary không gửi lại nguyên văn
+    history = (
+        ChatMessage.query.filter(
+            ChatMessage.session_id == session.id, ChatMessage.id > (session.summary_until_id or 0)
+        )
+        .order_by(ChatMessage.created_at.desc())
+        .limit(history_limit)
+        .all()
+    )
+    history.reverse()
+    
+    # ✅ Detect language from the current user message
+    user_language = _detect_language(content)
+    
+    openai_messages, dropped = _build_prompt_messages(
+        user,
+        history,
+        preferred_name=display_name,
+        page_context=page_context,
+        user_language=user_language,
+        summary=session.summary,
+    )
+    if dropped:
+        # Lịch sử vượt ngân sách token: gộp phần cũ vào summary ở job nền cho các lượt sau
+        _request_summary(session)
+    return user_msg, openai_messages, None
+
+
+def _save_reply(user_id: int, session: ChatSession, reply_text: str) -> ChatMessage:
+    assistant_msg = ChatMessage(
+        user_id=user_id,
+        session_id=session.id,
+        role="assistant",
+        content=reply_text,
+    )
+    db.session.add(assistant_msg)
+    session.updated_at = datetime.utcnow()
+    db.session.commit()
+    return assistant_msg
+
+
+def _drop_user_message(user_msg: ChatMessage) -> None:
+    # Không có câu trả lời: bỏ luôn tin nhắn người dùng để lịch sử không lệch cặp
+    db.session.delete(user_msg)
+    db.session.commit()
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_reply(user_id: int, session: ChatSession, user_msg: ChatMessage, openai_messages, serialize):
+    """Relay the completion over SSE, then store it.
+
+    Events: ``token`` ({"text": delta}) for each delta, then ``done`` (``serialize(assistant_msg)``)
+    or ``error`` ({"message": ...}). A stream that ends without a saved reply (upstream error,
+    empty completion, client disconnect) drops the user message.
+    """
+    try:
+        tokens = chat_client.stream_reply(openai_messages)
+    except Exception as exc:  # pragma: no cover
+        _drop_user_message(user_msg)
+        return jsonify({"message": str(exc)}), 500
+
+    app = current_app._get_current_object()
+    user_msg_id = user_msg.id
+    settled = {"done": False}
+
+    def generate():
+        parts = []
+        try:
+            for delta in tokens:
+                parts.append(delta)
+                yield _sse("token", {"text": delta})
+        except Exception as exc:
+            _drop_user_message(user_msg)
+            settled["done"] = True
+            yield _sse("error", {"message": str(exc)})
+            return
+        reply_text = "".join(parts).strip()
+        if not reply_text:
+            _drop_user_message(user_msg)
+            settled["done"] = True
+            yield _sse("error", {"message": "The assistant returned an empty reply."})
+            return
+        assistant_msg = _save_reply(user_id, session, reply_text)
+        settled["done"] = True
+        yield _sse("done", serialize(assistant_msg))
+
+    def cleanup():
+        # Chạy khi response đóng, kể cả khi client ngắt trước token đầu (generator chưa từng chạy
+        # nên không nhận GeneratorExit); lúc này request context có thể đã bị pop
+        if settled["done"]:
+            return
+        with app.app_context():
+            pending = db.session.get(ChatMessage, user_msg_id)
+            if pending is not None:
+                _drop_user_message(pending)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: không gom buffer, gửi token ngay
+    response.call_on_close(tokens.close)
+    response.call_on_close(cleanup)
+    return response
+
+
 @chat_bp.route("/sessions", methods=["GET"])
 @jwt_required()
 def list_sessions():
@@ -357,78 +558,46 @@ def send_session_message(session_id: int):
     if not session:
         return jsonify({"message": "Session not found"}), 404
 
-    payload = request.get_json() or {}
-    content = (payload.get("message") or "").strip()
-    display_name = (payload.get("display_name") or "").strip()
-    page_context = (payload.get("page_context") or "").strip()
-    if not content:
-        return jsonify({"message": "Message is required"}), 400
-
-    if not chat_client.is_ready():
-        return jsonify({"message": "OPENAI_API_KEY is missing on the server"}), 500
-
-    user = session.user or User.query.get(user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    user_msg = ChatMessage(
-        user_id=user_id,
-        session_id=session.id,
-        role="user",
-        content=content,
-    )
-    db.session.add(user_msg)
-    db.session.flush()
-    _persist_attachments(user_msg, payload.get("attachments"))
-
-    if (session.title or "").startswith("Cuộc trò chuyện") and content:
-        session.title = content[:90] + ("…" if len(content) > 90 else "")
-
-    session.updated_at = datetime.utcnow()
-    db.session.commit()
-
-    history = (
-        ChatMessage.query.filter_by(session_id=session.id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(20)
-        .all()
-    )
-    history.reverse()
-    
-    # ✅ Detect language from the current user message
-    user_language = _detect_language(content)
-    
-    openai_messages = _build_prompt_messages(
-        user,
-        history,
-        preferred_name=display_name,
-        page_context=page_context,
-        user_language=user_language,
+    user_msg, openai_messages, error = _begin_reply(
+        user_id, session, request.get_json() or {}, history_limit=20, retitle=True
     )
+    if error:
+        return error
 
     try:
-        reply_text = chat_client.generate_reply(openai_messages)
+        # Hội thoại: không lấy câu trả lời từ cache (người dùng hỏi lại thì mong câu trả lời mới)
+        reply_text = chat_client.generate_reply(openai_messages, cache=False)
     except Exception as exc:  # pragma: no cover
-        db.session.delete(user_msg)
-        db.session.commit()
+        _drop_user_message(user_msg)
         return jsonify({"message": str(exc)}), 500
 
-    assistant_msg = ChatMessage(
-        user_id=user_id,
-        session_id=session.id,
-        role="assistant",
-        content=reply_text,
-    )
-    db.session.add(assistant_msg)
-    session.updated_at = datetime.utcnow()
-    db.session.commit()
-
+    assistant_msg = _save_reply(user_id, session, reply_text)
     return jsonify({
         "reply": _serialize_message(assistant_msg),
         "session": _serialize_session(session),
     })
 
 
+@chat_bp.route("/sessions/<int:session_id>/messages/stream", methods=["POST"])
+@jwt_required()
+def stream_session_message(session_id: int):
+    """Like send_session_message, but the reply arrives token by token as server-sent events."""
+    user_id = int(get_jwt_identity())
+    session = _get_session_or_404(user_id, session_id)
+    if not session:
+        return jsonify({"message": "Session not found"}), 404
+
+    user_msg, openai_messages, error = _begin_reply(
+        user_id, session, request.get_json() or {}, history_limit=20, retitle=True
+    )
+    if error:
+        return error
+    return _stream_reply(
+        user_id, session, user_msg, openai_messages,
+        lambda msg: {"reply": _serialize_message(msg), "session": _serialize_session(session)},
+    )
+
+
 @chat_bp.route("/widget/history", methods=["GET"])
 @jwt_required()
 def widget_history():
@@ -449,71 +618,33 @@ def widget_message():
     user_id = int(get_jwt_identity())
     session = _get_or_create_user_session(user_id)
 
-    payload = request.get_json() or {}
-    content = (payload.get("message") or "").strip()
-    page_context = (payload.get("page_context") or "").strip()
-    display_name = (payload.get("display_name") or "").strip()
-    if not content:
-        return jsonify({"message": "Message is required"}), 400
-
-    if not chat_client.is_ready():
-        return jsonify({"message": "OPENAI_API_KEY is missing on the server"}), 500
-
-    user = session.user or User.query.get(user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    user_msg = ChatMessage(
-        user_id=user_id,
-        session_id=session.id,
-        role="user",
-        content=content,
-    )
-    db.session.add(user_msg)
-    db.session.flush()
-    _persist_attachments(user_msg, payload.get("attachments"))
-    session.updated_at = datetime.utcnow()
-    db.session.commit()
-
-    history = (
-        ChatMessage.query.filter_by(session_id=session.id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(30)
-        .all()
-    )
-    history.reverse()
-    
-    # ✅ Detect language from the current user message
-    user_language = _detect_language(content)
-    
-    openai_messages = _build_prompt_messages(
-        user,
-        history,
-        preferred_name=display_name,
-        page_context=page_context,
-        user_language=user_language,
-    )
+    user_msg, openai_messages, error = _begin_reply(user_id, session, request.get_json() or {}, history_limit=30)
+    if error:
+        return error
 
     try:
-        reply_text = chat_client.generate_reply(openai_messages)
+        reply_text = chat_client.generate_reply(openai_messages, cache=False)
     except Exception as exc:  # pragma: no cover
-        db.session.delete(user_msg)
-        db.session.commit()
+        _drop_user_message(user_msg)
         return jsonify({"message": str(exc)}), 500
 
-    assistant_msg = ChatMessage(
-        user_id=user_id,
-        session_id=session.id,
-        role="assistant",
-        content=reply_text,
-    )
-    db.session.add(assistant_msg)
-    session.updated_at = datetime.utcnow()
-    db.session.commit()
-
+    assistant_msg = _save_reply(user_id, session, reply_text)
     return jsonify(_serialize_message(assistant_msg)), 201
 
 
+@chat_bp.route("/widget/message/stream", methods=["POST"])
+@jwt_required()
+def widget_message_stream():
+    """Like widget_message, but the reply arrives token by token as server-sent events."""
+    user_id = int(get_jwt_identity())
+    session = _get_or_create_user_session(user_id)
+
+    user_msg, openai_messages, error = _begin_reply(user_id, session, request.get_json() or {}, history_limit=30)
+    if error:
+        return error
+    return _stream_reply(user_id, session, user_msg, openai_messages, _serialize_message)
+
+
 @chat_bp.route("/widget/log", methods=["POST"])
 @jwt_required()
 def widget_log_messages():
@@ -572,33 +703,17 @@ def extract_tags():
     if not message:
         return jsonify({"ok": False, "error": "Message is required"}), 400
 
-    # Get valid tags and location names from database destinations
-    # Use limit to avoid loading all destinations (performance optimization)
-    destinations_sample = Destination.query.limit(200).all()
-    valid_tags_set = set()
-    location_names_set = set()
-    
-    for dest in destinations_sample:
-        # Extract tags from destination
-        tags_raw = dest.tags
-        if tags_raw:
-            try:
-                if isinstance(tags_raw, str):
-                    tags_list = json.loads(tags_raw.replace("'", '"'))
-                else:
-                    tags_list = tags_raw
-                if isinstance(tags_list, list):
-                    for tag in tags_list:
-                        if tag:
-                            valid_tags_set.add(str(tag).strip())
-            except (json.JSONDecodeError, TypeError, AttributeError):
-                pass
-        # Collect location names
-        if dest.name:
-            location_names_set.add(dest.name.lower().strip())
+    # Tag vocabulary comes from the in-memory tag index; names from a column-only query
+    tag_vocabulary = tag_index.vocabulary(db.session)  # most used first
+    valid_tags_set = set(tag_vocabulary)
+    location_names_set = {
+        name.lower().strip()
+        for (name,) in db.session.query(Destination.name).limit(200)
+        if name
+    }
 
     # Build system prompt for AI to extract tags and location names
-    valid_tags_list = sorted(list(valid_tags_set))[:50]  # Limit to avoid token overflow
+    valid_tags_list = tag_vocabulary[:50]  # Limit to avoid token overflow
     location_names_list = sorted(list(location_names_set))[:100]  # Limit to avoid token overflow
     
     system_prompt = f"""You are a travel destination analyzer. Extract travel-related information from user messages.
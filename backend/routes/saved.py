@@ -1,7 +1,8 @@
-from flask import Blueprint, request, jsonify, url_for
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, SavedDestination, Destination, Province
-import json
+from models import db, SavedDestination, Destination, DestinationImage, Province, Region
+from utils.card_images import public_image_url
+from utils.fieldsets import DESTINATION_FIELDS, InvalidFieldset, parse_fieldset, project_destinations
 import random
 
 saved_bp = Blueprint("saved", __name__)
@@ -19,32 +20,6 @@ def generate_random_weather(region_name):
     weather_type = random.choice(config["weather_types"])
     return f"{weather_type} {temp}°C"
 
-def decode_db_json_string(data_string, default_type='list'):
-    if not data_string:
-        return [] if default_type == 'list' else None
-    try:
-        return json.loads(data_string)
-    except (json.JSONDecodeError, TypeError):
-        return [data_string] if default_type == 'list' else data_string
-
-def get_card_image_url(destination):
-    """Lấy URL ảnh cho destination"""
-    if destination.image_url:
-        source_url = destination.image_url
-        if source_url and (source_url.startswith('http://') or source_url.startswith('https://')):
-            return source_url
-        else:
-            image_filename = source_url.split("/")[-1]
-            return request.host_url.rstrip('/') + url_for('static', filename=f'images/{image_filename}')
-
-    elif destination.images:
-        for image_obj in destination.images:
-            url = image_obj.image_url
-            if url and (url.startswith('http://') or url.startswith('https://')):
-                return url
-        
-    return None
-
 # -------- SAVED DESTINATIONS --------
 @saved_bp.route("/add", methods=["POST"])
 @jwt_required()
@@ -88,45 +63,32 @@ def remove_saved():
     db.session.commit()
     return jsonify({"message": "Removed from saved list"}), 200
 
+SAVED_CARD_FIELDS = (
+    "id", "name", "province_name", "region_name", "image_url", "thumbnail_url", "description", "latitude",
+    "longitude", "rating", "category", "tags", "weather", "images", "type", "place_type",
+    "opening_hours", "entry_fee", "source",
+)
+SAVED_CARD_SUMMARY = ("id", "name", "province_name", "thumbnail_url", "rating")
+
 @saved_bp.route("/list", methods=["GET"])
 @jwt_required()
 def get_saved_list():
     user_id = int(get_jwt_identity())
-    saved_items = SavedDestination.query.filter_by(user_id=user_id).all()
-    result = []
-
-    for item in saved_items:
-        destination = db.session.get(
-            Destination, 
-            item.destination_id, 
-            options=[db.joinedload(Destination.images), db.joinedload(Destination.province).joinedload(Province.region)]
-        )
-        
-        if destination:
-            province = destination.province
-            region = province.region if province else None
-            region_name = region.name if region else "Miền Nam"
-            
-            image_full_url = get_card_image_url(destination)
-
-            result.append({
-                "id": destination.id,
-                "name": destination.name,
-                "province_name": province.name if province else None,
-                "region_name": region_name,
-                "image_url": image_full_url,
-                "description": decode_db_json_string(destination.description),
-                "latitude": destination.latitude,
-                "longitude": destination.longitude,
-                "rating": destination.rating or 0,
-                "category": destination.category,
-                "tags": decode_db_json_string(destination.tags, default_type='text'),
-                "weather": generate_random_weather(region_name),
-                "images": [img.image_url for img in destination.images],
-                "type": destination.place_type,
-                "place_type": destination.place_type,
-                "opening_hours": destination.opening_hours,
-                "entry_fee": destination.entry_fee,
-                "source": destination.source,
-            })
-    return jsonify(result), 200
\ No newline at end of file
+    try:
+        fields = parse_fieldset(request.args, SAVED_CARD_FIELDS, SAVED_CARD_SUMMARY)
+    except InvalidFieldset as e:
+        return jsonify({"message": str(e)}), 400
+
+    destination_ids = [
+        destination_id for (destination_id,) in
+        db.session.query(SavedDestination.destination_id)
+        .filter(SavedDestination.user_id == user_id)
+        .order_by(SavedDestination.id)
+    ]
+    # Một lượt SELECT theo cột cho cả danh sách (trước đây: 1 query + joinedload cho mỗi item)
+    result = project_destinations(
+        db.session, destination_ids, fields or SAVED_CARD_FIELDS, DESTINATION_FIELDS,
+        (Destination, Province, Region, DestinationImage),
+        public_image_url, generate_random_weather
+    )
+    return jsonify(result), 200
@@ -6,10 +6,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from sqlalchemy import or_
 
-from models import Destination
+from models import Destination, db
 from utils.gemini import get_ai_recommendations
 from utils.openai_client import OpenAIChatClient
 from utils.image_recognition import OpenAIImageRecognizer
+from utils.search_index import ranked_match_subquery, search_index_available
+from utils.pagination import InvalidPageParams, fetch_keyset_page, fetch_ranked_page, parse_page_args
 
 search_bp = Blueprint("search", __name__)
 vision_client = OpenAIImageRecognizer()
@@ -71,27 +73,47 @@ def _format_confidence_pct(value: Optional[float]) -> Optional[str]:
     return f"{int(round(normalized * 100))}%"
 
 
+def _ranked_matches(query: str, columns):
+    """BM25-ranked FTS5 matches, or None when the index (or a searchable token) is missing."""
+    if not query or not search_index_available(db.session):
+        return None
+    return ranked_match_subquery(query, columns=columns)
+
+
 def _fallback_text_suggestions(query: str, limit: int = 5) -> list[dict]:
     if not query:
         return []
-    matches = (
-        Destination.query.filter(
-            or_(
-                Destination.name.ilike(f"%{query}%"),
-                Destination.description.ilike(f"%{query}%"),
-                Destination.tags.ilike(f"%{query}%"),
+    fts = _ranked_matches(query, ("name", "description", "tags"))
+    if fts is not None:
+        matches = (
+            Destination.query.join(fts, fts.c.destination_id == Destination.id)
+            .order_by(fts.c.rank, Destination.rating.desc())
+            .limit(limit)
+            .all()
+        )
+    else:
+        matches = (
+            Destination.query.filter(
+                or_(
+                    Destination.name.ilike(f"%{query}%"),
+                    Destination.description.ilike(f"%{query}%"),
+                    Destination.tags.ilike(f"%{query}%"),
+                )
             )
+            .order_by(Destination.rating.desc())
+            .limit(limit)
+            .all()
         )
-        .order_by(Destination.rating.desc())
-        .limit(limit)
-        .all()
-    )
     return [
         _serialize_destination_card(dest, dest.name, "Gợi ý theo từ khóa bạn nhập.", 0.55)
         for dest in matches
     ]
 
 
+def _serialize_search_hit(dest: Destination) -> dict:
+    return {"id": dest.id, "name": dest.name, "description": dest.description, "image_url": dest.image_url}
+
+
 def _compose_user_message(summary: Optional[str], suggestions: list[dict], predictions: Optional[list[dict]] = None) -> str:
     lines = []
     if summary:
@@ -235,11 +257,46 @@ def _build_vision_user_summary(summary: Optional[str], predictions: list[dict],
 @search_bp.route("", methods=["GET"])
 def search_destinations():
     query = request.args.get("q", "").lower()
-    results = Destination.query.filter(
-        (Destination.name.ilike(f"%{query}%")) |
-        (Destination.description.ilike(f"%{query}%"))
-    ).limit(20).all()
-    return jsonify([{"id": d.id, "name": d.name, "description": d.description, "image_url": d.image_url} for d in results])
+    try:
+        page = parse_page_args(request.args)
+    except InvalidPageParams as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    fts = _ranked_matches(query, ("name", "description"))
+    if fts is not None:
+        matches = Destination.query.join(fts, fts.c.destination_id == Destination.id)
+    else:
+        matches = Destination.query.filter(
+            (Destination.name.ilike(f"%{query}%")) |
+            (Destination.description.ilike(f"%{query}%"))
+        )
+    if page is None:
+        if fts is not None:
+            matches = matches.order_by(fts.c.rank, Destination.id)
+        results = matches.limit(20).all()
+        return jsonify([_serialize_search_hit(d) for d in results])
+
+    # Có FTS: phân trang theo hạng BM25 (cursor = rank, id); không có: theo (rating, id)
+    limit, cursor = page
+    try:
+        if fts is not None:
+            rows, next_cursor = fetch_ranked_page(
+                matches.add_columns(fts.c.rank), fts.c.rank, Destination.id, cursor, limit,
+                key=lambda row: (row.rank, row[0].id),
+            )
+            results = [row[0] for row in rows]
+        else:
+            results, next_cursor = fetch_keyset_page(
+                matches, Destination.rating, Destination.id, cursor, limit,
+                key=lambda dest: (dest.rating, dest.id),
+            )
+    except InvalidPageParams as exc:
+        return jsonify({"message": str(exc)}), 400
+    return jsonify({
+        "items": [_serialize_search_hit(d) for d in results],
+        "next_cursor": next_cursor,
+        "limit": limit,
+    })
 
 @search_bp.route("/recommend", methods=["POST"])
 def recommend():
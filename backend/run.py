@@ -0,0 +1,16 @@
+"""Development server entry point: ``python run.py``.
+
+Itinerary variants are solved in a ``spawn`` process pool
+(:mod:`utils.itinerary_variants`), and spawn re-imports the ``__main__``
+module in every pool worker. This module only imports the app under the
+``__main__`` guard, so that re-import is empty; started as ``python app.py``,
+each worker would rebuild the whole app (app creation, listeners, DB setup).
+"""
+
+if __name__ == "__main__":
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+    print("Server running at http://127.0.0.1:5000")
+    app.run(debug=True)
@@ -3,10 +3,16 @@ import json
 import os
 import random 
 from app import app
-from models import db, Region, Province, Destination, DestinationImage
+from models import db, Region, Province, Destination, DestinationImage, Tag, destination_tags
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 from unidecode import unidecode # Thư viện cần thiết
+from utils.search_index import rebuild_search_index
+from utils.tag_index import rebuild_destination_tags
+from utils.geo_index import rebuild_geo_index
+from utils.card_images import rebuild_card_images
+from utils.place_types import rebuild_accommodation_flags
+from utils.opening_hours import rebuild_opening_windows
 
 # Danh sách các file JSON cần đọc
 JSON_FILES = ["data/mienbac.json", "data/mientrung.json", "data/miennam.json"]
@@ -316,6 +322,60 @@ def seed_database():
             db.session.commit()
         except Exception:
             db.session.rollback()
+
+        # Dựng lại toàn bộ chỉ mục full-text (FTS5) cho tìm kiếm
+        try:
+            indexed = rebuild_search_index(db.session, Destination, Province)
+            db.session.commit()
+            print(f"Đã lập chỉ mục tìm kiếm cho {indexed} địa điểm.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi lập chỉ mục tìm kiếm: {e}")
+
+        # Dựng lại bảng tag chuẩn hóa (tags / destination_tags) từ cột JSON
+        try:
+            linked = rebuild_destination_tags(db.session, Destination, Tag, destination_tags)
+            db.session.commit()
+            print(f"Đã liên kết {linked} tag cho địa điểm.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi dựng bảng tag: {e}")
+
+        # Dựng lại chỉ mục không gian (R*Tree) cho tìm kiếm lân cận / theo khung bản đồ
+        try:
+            located = rebuild_geo_index(db.session, Destination)
+            db.session.commit()
+            print(f"Đã lập chỉ mục tọa độ cho {located} địa điểm.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi lập chỉ mục tọa độ: {e}")
+
+        # Resolve sẵn ảnh card + thumbnail để các API danh sách không phải đọc destination_images
+        try:
+            resolved = rebuild_card_images(db.session, Destination, DestinationImage, app.static_folder)
+            db.session.commit()
+            print(f"Đã resolve ảnh card cho {resolved} địa điểm.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi resolve ảnh card: {e}")
+
+        # Đánh dấu chỗ ở (khách sạn/resort/homestay...) cho các bản ghi có sẵn
+        try:
+            accommodations = rebuild_accommodation_flags(db.session, Destination)
+            db.session.commit()
+            print(f"Đã đánh dấu {accommodations} địa điểm lưu trú.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi đánh dấu địa điểm lưu trú: {e}")
+
+        # Parse giờ mở cửa (đã normalize_opening_hours) thành khung giờ theo phút cho bộ xếp lịch
+        try:
+            parsed = rebuild_opening_windows(db.session, Destination)
+            db.session.commit()
+            print(f"Đã parse giờ mở cửa cho {parsed} địa điểm.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi parse giờ mở cửa: {e}")
             
         print("\n--- Seeding/Cập nhật Dữ liệu Địa điểm HOÀN TẤT! ---")
 
@@ -0,0 +1,127 @@
+"""Process-wide, per-province pools of itinerary candidates.
+
+The itinerary generator (``POST /api/trips``, ``/regenerate``, ``/extend``)
+and ``/add-place`` only need a handful of columns of every destination in
+a province. :data:`candidate_pool` loads them once per province into
+compact ``__slots__`` records, sorted by rating (best first), and keeps
+them until the catalog version changes; that version follows the shared
+``catalog_meta`` row, so reseeds and reindexes done by other processes drop
+the pool too (see :func:`utils.catalog_cache.sync_catalog_version`). Once a
+province is warm a generation reads no database rows at all. Opening windows are decoded and
+visit durations computed at load time, not per request.
+"""
+from __future__ import annotations
+
+from threading import Lock
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .catalog_cache import get_catalog_version
+from .opening_hours import decode_windows
+
+_CHUNK_SIZE = 500
+
+# Cột của destinations được nạp vào mỗi bản ghi (cùng tên thuộc tính với model)
+PLACE_COLUMNS = (
+    "id", "province_id", "name", "category", "place_type", "entry_fee", "estimated_duration_hours",
+    "rating", "latitude", "longitude", "is_accommodation",
+)
+
+
+class PlaceRecord:
+    """Read-only itinerary view of one destination (same attribute names as the model)."""
+
+    __slots__ = PLACE_COLUMNS + ("windows", "duration_minutes")
+
+    def __init__(self, row, windows, duration_minutes: Optional[Callable] = None) -> None:
+        for name in PLACE_COLUMNS:
+            setattr(self, name, getattr(row, name))
+        self.windows = windows
+        self.duration_minutes = duration_minutes(self) if duration_minutes else None
+
+    def __repr__(self) -> str:
+        return f"<PlaceRecord {self.id} {self.name!r}>"
+
+
+def _rating_order(record: PlaceRecord):
+    # Giống ORDER BY rating DESC, id trên SQLite: rating NULL xếp cuối
+    return record.rating is None, -(record.rating or 0), record.id
+
+
+class CandidatePool:
+    """province id -> tuple of :class:`PlaceRecord`, plus an id -> record lookup."""
+
+    def __init__(self) -> None:
+        self._model = None
+        self._duration_minutes: Optional[Callable] = None
+        self._provinces: Dict[int, Tuple[PlaceRecord, ...]] = {}
+        self._by_id: Dict[int, PlaceRecord] = {}
+        self._version: Optional[int] = None
+        self._lock = Lock()
+
+    def configure(self, destination_model, duration_minutes: Optional[Callable] = None) -> None:
+        """``duration_minutes(record)`` is evaluated once per record when it is loaded."""
+        self._model = destination_model
+        self._duration_minutes = duration_minutes
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._provinces, self._by_id, self._version = {}, {}, None
+
+    def _select(self):
+        table = self._model.__table__
+        return select(*(table.c[name] for name in PLACE_COLUMNS), table.c.opening_windows)
+
+    def _load(self, rows) -> list:
+        records = [PlaceRecord(row, decode_windows(row.opening_windows), self._duration_minutes) for row in rows]
+        for record in records:
+            self._by_id[record.id] = record
+        return records
+
+    def _sync_version(self) -> None:
+        # Gọi khi đang giữ lock: catalog đổi thì bỏ toàn bộ pool cũ
+        version = get_catalog_version()
+        if self._version != version:
+            self._provinces, self._by_id, self._version = {}, {}, version
+
+    def province(self, session: Session, province_id) -> Tuple[PlaceRecord, ...]:
+        """Every destination of the province, highest rating first."""
+        # "5" (JSON/query string) và 5 là cùng một tỉnh: một mục trong pool
+        try:
+            province_id = int(province_id)
+        except (TypeError, ValueError):
+            return ()
+        if self._version == get_catalog_version():
+            places = self._provinces.get(province_id)
+            if places is not None:
+                return places
+        with self._lock:
+            self._sync_version()
+            places = self._provinces.get(province_id)
+            if places is None:
+                rows = session.execute(self._select().where(self._model.__table__.c.province_id == province_id))
+                places = self._provinces[province_id] = tuple(sorted(self._load(rows), key=_rating_order))
+            return places
+
+    def get_many(self, session: Session, ids: Iterable[int]) -> Dict[int, PlaceRecord]:
+        """Records for the given ids; only ids outside every loaded province hit the database."""
+        with self._lock:
+            self._sync_version()
+            found, missing = {}, []
+            for dest_id in set(ids):
+                record = self._by_id.get(dest_id)
+                if record is None:
+                    missing.append(dest_id)
+                else:
+                    found[dest_id] = record
+            id_column = self._model.__table__.c.id
+            for start in range(0, len(missing), _CHUNK_SIZE):
+                rows = session.execute(self._select().where(id_column.in_(missing[start:start + _CHUNK_SIZE])))
+                found.update((record.id, record) for record in self._load(rows))
+            return found
+
+
+candidate_pool = CandidatePool()
@@ -0,0 +1,208 @@
+"""Precomputed card image URLs for destinations.
+
+The card image of a destination is its ``image_url`` column, or else the
+first web (http/https) URL in its ``destination_images`` gallery. It is
+resolved when the destination or its gallery is written (flush hook,
+``seed.py``, ``flask card-images-rebuild``). The result goes into
+``Destination.card_image_url``, together with ``card_thumbnail_url``.
+List endpoints read those two columns and never load the gallery.
+
+Stored values are host-independent: web URLs are kept as-is and local files
+become static paths (``images/<file>``). :func:`public_image_url` turns
+either form into an absolute URL for the current request. For local images
+``seed.py`` / ``flask card-images-rebuild`` write a downscaled copy to
+``static/images/thumbs/`` (Pillow). The flush hook does no file I/O: it
+keeps the stored thumbnail while the card image is unchanged and otherwise
+uses the full image until the next rebuild.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import request, url_for
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from .catalog_cache import mark_catalog_changed
+from .sqlite_index import chunks
+
+try:
+    from PIL import Image
+except Exception:  # optional dependency
+    Image = None
+
+STATIC_IMAGE_DIR = "images"
+THUMBNAIL_DIR = "images/thumbs"
+THUMBNAIL_SIZE = (320, 320)
+
+_PENDING_KEY = "card_images_pending"
+_RESOLVED_KEY = "card_images_resolved"
+
+Resolved = Tuple[Optional[str], Optional[str]]  # (card_image_url, card_thumbnail_url)
+
+
+def is_web_url(url: Optional[str]) -> bool:
+    return bool(url) and (url.startswith("http://") or url.startswith("https://"))
+
+
+def static_image_path(url: str) -> str:
+    """Local image reference (``halong.png``, ``/static/images/halong.png``...) -> ``images/halong.png``."""
+    return f"{STATIC_IMAGE_DIR}/{url.split('/')[-1]}"
+
+
+def resolve_card_image(image_url: Optional[str], gallery: Iterable[Optional[str]] = ()) -> Optional[str]:
+    """Stored form of the card image: ``image_url`` first, then the first web gallery URL."""
+    if image_url:
+        return image_url if is_web_url(image_url) else static_image_path(image_url)
+    for url in gallery:
+        if is_web_url(url):
+            return url
+    return None
+
+
+def make_thumbnail(card_image: Optional[str], static_folder: Optional[str]) -> Optional[str]:
+    """Thumbnail for a stored card image (web URLs have no local variant)."""
+    if not card_image or is_web_url(card_image):
+        return card_image
+    filename = card_image.split("/")[-1]
+    thumbnail = f"{THUMBNAIL_DIR}/{filename}"
+    if Image is None or not static_folder:
+        return card_image
+    source = os.path.join(static_folder, card_image)
+    target = os.path.join(static_folder, thumbnail)
+    try:
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with Image.open(source) as img:
+                img.thumbnail(THUMBNAIL_SIZE)
+                img.save(target)
+    except OSError:
+        # Không đọc/ghi được ảnh gốc: dùng luôn ảnh gốc
+        return card_image
+    return thumbnail
+
+
+def public_image_url(stored: Optional[str]) -> Optional[str]:
+    """Absolute URL for a stored card image in the current request."""
+    if not stored:
+        return None
+    if is_web_url(stored):
+        return stored
+    if not stored.startswith(STATIC_IMAGE_DIR + "/"):
+        stored = static_image_path(stored)
+    return request.host_url.rstrip("/") + url_for("static", filename=stored)
+
+
+def _resolve_chunk(connection, destination_table, image_table, chunk, static_folder) -> Dict[int, Resolved]:
+    d, i = destination_table.c, image_table.c
+    current = {
+        row.id: row
+        for row in connection.execute(
+            select(d.id, d.image_url, d.card_image_url, d.card_thumbnail_url).where(d.id.in_(chunk))
+        )
+    }
+    galleries: Dict[int, list] = {}
+    for destination_id, url in connection.execute(
+        select(i.destination_id, i.image_url).where(i.destination_id.in_(chunk)).order_by(i.id)
+    ):
+        galleries.setdefault(destination_id, []).append(url)
+
+    resolved: Dict[int, Resolved] = {}
+    changed = []
+    for dest_id, row in current.items():
+        card = resolve_card_image(row.image_url, galleries.get(dest_id, ()))
+        if static_folder:
+            thumbnail = make_thumbnail(card, static_folder)
+        elif card == row.card_image_url and row.card_thumbnail_url:
+            thumbnail = row.card_thumbnail_url
+        else:
+            thumbnail = card
+        resolved[dest_id] = (card, thumbnail)
+        if (card, thumbnail) != (row.card_image_url, row.card_thumbnail_url):
+            changed.append({"_id": dest_id, "_card": card, "_thumb": thumbnail})
+    if changed:
+        connection.execute(
+            update(destination_table)
+            .where(d.id == bindparam("_id"))
+            .values(card_image_url=bindparam("_card"), card_thumbnail_url=bindparam("_thumb")),
+            changed,
+        )
+    return resolved
+
+
+def sync_card_images(connection, destination_table, image_table,
+                     ids: Optional[Iterable[int]] = None,
+                     static_folder: Optional[str] = None) -> Dict[int, Resolved]:
+    """Recompute the stored card image columns (``ids=None`` = every destination).
+
+    Thumbnails are (re)generated only when ``static_folder`` is given.
+    """
+    if ids is None:
+        ids = connection.execute(select(destination_table.c.id)).scalars().all()
+    resolved: Dict[int, Resolved] = {}
+    for chunk in chunks(sorted(set(ids))):
+        resolved.update(_resolve_chunk(connection, destination_table, image_table, chunk, static_folder))
+    return resolved
+
+
+def rebuild_card_images(session: Session, destination_model, image_model,
+                        static_folder: Optional[str] = None) -> int:
+    resolved = sync_card_images(
+        session.connection(), destination_model.__table__, image_model.__table__,
+        static_folder=static_folder,
+    )
+    mark_catalog_changed(session)
+    session.expire_all()
+    return sum(1 for card, _ in resolved.values() if card)
+
+
+def install_card_image_listeners(destination_model, image_model) -> None:
+    """Re-resolve card images when a destination's image_url or its gallery is flushed (no thumbnail I/O)."""
+    destination_table = destination_model.__table__
+    image_table = image_model.__table__
+
+    @event.listens_for(Session, "before_flush")
+    def _card_images_before_flush(session, flush_context, instances):
+        pending = session.info.setdefault(_PENDING_KEY, {"objects": [], "ids": set()})
+        for obj in session.new:
+            if isinstance(obj, destination_model):
+                pending["objects"].append(obj)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, image_model):
+                # destination_id có thể chưa có nếu ảnh được gắn qua relationship
+                pending["objects"].append(obj)
+                pending["ids"].add(obj.destination_id)
+            elif isinstance(obj, destination_model) and obj in session.dirty:
+                if session.is_modified(obj, include_collections=False):
+                    pending["objects"].append(obj)
+
+    @event.listens_for(Session, "after_flush")
+    def _card_images_after_flush(session, flush_context):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if not pending:
+            return
+        ids = set(pending["ids"])
+        for obj in pending["objects"]:
+            ids.add(obj.destination_id if isinstance(obj, image_model) else obj.id)
+        ids.discard(None)
+        if ids:
+            resolved = sync_card_images(session.connection(), destination_table, image_table, ids)
+            session.info.setdefault(_RESOLVED_KEY, {}).update(resolved)
+
+    @event.listens_for(Session, "after_flush_postexec")
+    def _card_images_postexec(session, flush_context):
+        # Cột được cập nhật bằng Core: đồng bộ lại giá trị trên các object đang nằm trong session
+        resolved = session.info.pop(_RESOLVED_KEY, None)
+        for dest_id, (card, thumbnail) in (resolved or {}).items():
+            obj = session.identity_map.get(identity_key(destination_model, dest_id))
+            if obj is not None:
+                set_committed_value(obj, "card_image_url", card)
+                set_committed_value(obj, "card_thumbnail_url", thumbnail)
+
+    @event.listens_for(Session, "after_soft_rollback")
+    def _card_images_after_rollback(session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_RESOLVED_KEY, None)
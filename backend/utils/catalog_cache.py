@@ -0,0 +1,291 @@
+"""Process-wide cache of serialized destination cards.
+
+The catalog (regions, provinces, destinations, images) is read far more often
+than it is written, so the card dicts built for list endpoints are kept in
+memory keyed by destination id. SQLAlchemy session hooks invalidate the
+affected ids whenever a catalog row is flushed/committed in this process, and
+every invalidation bumps a process-local version number that other caches use
+as part of their keys.
+
+Catalog writes usually happen in other processes (``seed.py``, the
+``flask *-reindex`` commands, other gunicorn workers), so the same hooks also
+increment a persisted version in the ``catalog_meta`` row, inside the writing
+transaction. :func:`sync_catalog_version` reads that row - one primary-key
+lookup - and drops every cached card when another process moved it. Before
+requests it runs throttled (at most once per ``CATALOG_SYNC_INTERVAL``
+seconds per process), so most requests, conditional 304s included, do not
+touch the database for it; another process's write is seen within that
+interval. Bulk Core writes that bypass the flush hooks call
+:func:`mark_catalog_changed`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from threading import Lock, RLock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Trả về danh sách destination id bị ảnh hưởng, hoặc None = toàn bộ catalog
+AffectedIdsResolver = Callable[[object], Optional[Iterable[int]]]
+
+_PENDING_KEY = "catalog_cache_pending"
+_FLUSH_KEY = "catalog_cache_flushed"
+_META_PENDING_KEY = "catalog_meta_pending"
+META_ROW_ID = 1
+DEFAULT_SYNC_INTERVAL = 0.5
+
+# engine -> lúc đọc catalog_meta gần nhất (time.monotonic)
+_last_sync: Dict[int, float] = {}
+_sync_lock = Lock()
+
+# (version, modified_at) đã lưu trong catalog_meta
+SharedState = Tuple[int, datetime]
+# Bảng catalog_meta (install_catalog_listeners), None = chỉ có version trong process
+_meta_table = None
+
+
+class DestinationCardCache:
+    """Thread-safe dict of destination id -> serialized card."""
+
+    def __init__(self) -> None:
+        self._cards: Dict[int, dict] = {}
+        self._lock = RLock()
+        self._version = 0
+        self._modified_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self._shared: Optional[SharedState] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def modified_at(self) -> datetime:
+        """UTC time (whole seconds, as in HTTP dates) of the last invalidation."""
+        return self._modified_at
+
+    @property
+    def shared_state(self) -> Optional[SharedState]:
+        """Persisted (version, modified_at) as of the last sync or own commit."""
+        return self._shared
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def get_many(self, ids: Iterable[int]) -> Tuple[Dict[int, dict], List[int]]:
+        """Return (cached cards, ids that still need to be built)."""
+        found: Dict[int, dict] = {}
+        missing: List[int] = []
+        with self._lock:
+            for dest_id in ids:
+                card = self._cards.get(dest_id)
+                if card is None:
+                    missing.append(dest_id)
+                else:
+                    found[dest_id] = card
+        return found, missing
+
+    def put(self, dest_id: int, card: dict, version: Optional[int] = None) -> dict:
+        """Store a card unless the catalog changed after it was read."""
+        with self._lock:
+            if version is None or version == self._version:
+                self._cards[dest_id] = card
+        return card
+
+    def invalidate(self, ids: Optional[Iterable[int]] = None) -> None:
+        """Drop the given ids (or everything) and bump the catalog version."""
+        with self._lock:
+            if ids is None:
+                self._cards.clear()
+            else:
+                for dest_id in ids:
+                    self._cards.pop(dest_id, None)
+            self._version += 1
+            self._modified_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def adopt_shared(self, state: SharedState, invalidate: bool = True) -> bool:
+        """Record the persisted state; if it moved and ``invalidate``, drop every card. Returns True if it moved."""
+        with self._lock:
+            if state == self._shared:
+                return False
+            self._shared = state
+            if invalidate:
+                self.invalidate()
+            return True
+
+
+destination_card_cache = DestinationCardCache()
+
+
+def get_catalog_version() -> int:
+    return destination_card_cache.version
+
+
+def get_catalog_last_modified() -> datetime:
+    return destination_card_cache.modified_at
+
+
+def get_shared_catalog_state() -> Optional[SharedState]:
+    return destination_card_cache.shared_state
+
+
+def invalidate_catalog(ids: Optional[Iterable[int]] = None) -> None:
+    destination_card_cache.invalidate(ids)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _read_shared(connection) -> Optional[SharedState]:
+    t = _meta_table
+    row = connection.execute(select(t.c.version, t.c.modified_at).where(t.c.id == META_ROW_ID)).first()
+    return None if row is None else (row.version, _as_utc(row.modified_at))
+
+
+def _bump_shared(session: Session) -> None:
+    """Increment catalog_meta inside the session's transaction; adopted locally after commit."""
+    t, connection = _meta_table, session.connection()
+    now = datetime.utcnow().replace(microsecond=0)
+    # UPDATE trước rồi mới đọc: lúc đọc đã giữ khóa ghi nên không process nào chen vào giữa
+    bumped = connection.execute(
+        update(t).where(t.c.id == META_ROW_ID).values(version=t.c.version + 1, modified_at=now)
+    ).rowcount
+    if not bumped:
+        connection.execute(insert(t).values(id=META_ROW_ID, version=1, modified_at=now))
+    state = _read_shared(connection)
+    # Lần flush trước trong cùng transaction đã tăng version: so với giá trị đó
+    known = session.info.get(_META_PENDING_KEY) or destination_card_cache.shared_state
+    if known is None or known[0] != state[0] - 1:
+        # Process khác đã đổi catalog mà process này chưa sync: bỏ toàn bộ cache khi commit
+        session.info.setdefault(_PENDING_KEY, {"all": False, "ids": set()})["all"] = True
+    session.info[_META_PENDING_KEY] = state
+
+
+def mark_catalog_changed(session: Session) -> None:
+    """For bulk/Core catalog writes that bypass the flush hooks: invalidate everything, in every process."""
+    pending = session.info.setdefault(_PENDING_KEY, {"all": False, "ids": set()})
+    pending["all"] = True
+    invalidate_catalog()
+    if _meta_table is not None:
+        _bump_shared(session)
+
+
+def sync_interval() -> float:
+    return float(os.getenv("CATALOG_SYNC_INTERVAL", str(DEFAULT_SYNC_INTERVAL)))
+
+
+def sync_catalog_version(bind, throttle: bool = False) -> bool:
+    """Adopt catalog changes committed by other processes; returns True when the caches were dropped.
+
+    With ``throttle`` the row is read at most once per :func:`sync_interval` for ``bind``.
+    """
+    if _meta_table is None:
+        return False
+    key = id(getattr(bind, "engine", bind))
+    now = time.monotonic()
+    with _sync_lock:
+        if throttle and now - _last_sync.get(key, float("-inf")) < sync_interval():
+            return False
+        _last_sync[key] = now
+    try:
+        with bind.connect() as connection:
+            state = _read_shared(connection)
+    except SQLAlchemyError as exc:  # chưa có bảng catalog_meta (CSDL chưa migrate): chỉ dùng version trong process
+        logger.debug("catalog_meta unavailable: %s", exc)
+        return False
+    if state is None:
+        return False
+    return destination_card_cache.adopt_shared(state)
+
+
+def _collect_affected(session: Session, resolvers: Dict[type, AffectedIdsResolver]) -> None:
+    pending = session.info.get(_PENDING_KEY)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        resolver = resolvers.get(type(obj))
+        if resolver is None:
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        session.info[_FLUSH_KEY] = True
+        if pending is None:
+            pending = session.info[_PENDING_KEY] = {"all": False, "ids": set()}
+        if pending["all"]:
+            continue
+        ids = resolver(obj)
+        if ids is None:
+            pending["all"] = True
+        else:
+            pending["ids"].update(i for i in ids if i is not None)
+
+
+def _apply(pending) -> None:
+    # Kể cả khi không có id cũ nào (chỉ thêm mới) vẫn phải tăng version
+    if not pending:
+        return
+    if pending["all"]:
+        invalidate_catalog()
+    else:
+        invalidate_catalog(pending["ids"])
+
+
+def install_catalog_listeners(metadata, resolvers: Dict[type, AffectedIdsResolver], meta_table=None) -> None:
+    """Wire session/metadata events so catalog writes invalidate the cache.
+
+    ``resolvers`` maps a model class to a function returning the destination
+    ids touched by an instance of that class (None means "everything").
+    Invalidation runs after flush (so the writing session sees fresh data)
+    and again after commit/rollback (so a card rebuilt in between from rows
+    that are no longer current is discarded). With ``meta_table`` (the
+    ``catalog_meta`` table) every flush that writes catalog rows also bumps
+    the persisted version.
+    """
+    global _meta_table
+    _meta_table = meta_table
+
+    @event.listens_for(Session, "before_flush")
+    def _catalog_before_flush(session, flush_context, instances):
+        _collect_affected(session, resolvers)
+
+    @event.listens_for(Session, "after_flush")
+    def _catalog_after_flush(session, flush_context):
+        if session.info.pop(_FLUSH_KEY, False) and _meta_table is not None:
+            _bump_shared(session)
+        _apply(session.info.get(_PENDING_KEY))
+
+    @event.listens_for(Session, "after_commit")
+    def _catalog_after_commit(session):
+        _apply(session.info.pop(_PENDING_KEY, None))
+        state = session.info.pop(_META_PENDING_KEY, None)
+        if state is not None:
+            # Thay đổi của chính process này: cache đã được làm mất hiệu lực ở trên
+            destination_card_cache.adopt_shared(state, invalidate=False)
+
+    @event.listens_for(Session, "after_soft_rollback")
+    def _catalog_after_rollback(session, previous_transaction):
+        session.info.pop(_FLUSH_KEY, None)
+        session.info.pop(_META_PENDING_KEY, None)
+        _apply(session.info.pop(_PENDING_KEY, None))
+
+    # create_all/drop_all (tests, fresh databases) replace the whole catalog
+    @event.listens_for(metadata, "after_create")
+    def _catalog_after_create(target, connection, **kw):
+        invalidate_catalog()
+
+    @event.listens_for(metadata, "after_drop")
+    def _catalog_after_drop(target, connection, **kw):
+        invalidate_catalog()
+
+    if meta_table is not None:
+        @event.listens_for(meta_table, "after_create")
+        def _catalog_meta_after_create(target, connection, **kw):
+            connection.execute(
+                insert(target).values(id=META_ROW_ID, version=1, modified_at=datetime.utcnow().replace(microsecond=0))
+            )
@@ -0,0 +1,147 @@
+"""Token-budgeted chat history with a rolling per-session summary.
+
+Each chat turn sends the system prompt, the session's rolling summary (if
+any) and as many of the most recent messages as fit in
+``CHAT_PROMPT_TOKEN_BUDGET`` tokens; the newest message is always kept.
+Token counts are a local estimate: ``tiktoken`` when it is installed,
+otherwise a byte-length heuristic that errs on the high side for
+Vietnamese text (diacritics cost extra tokens).
+
+Messages that no longer fit are folded into ``ChatSession.summary`` by a
+background job (``routes.chat``); :func:`summary_messages` builds that
+summarisation prompt and :func:`split_for_summary` decides which messages
+are folded, keeping the last ``CHAT_SUMMARY_KEEP_RECENT`` verbatim. A long
+backlog is folded in chunks (:func:`summary_chunk_size`) so each
+summarisation prompt also stays within the token budget.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except Exception:  # ImportError hoặc lỗi khi import
+    tiktoken = None
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 3000
+DEFAULT_SUMMARY_MAX_TOKENS = 250
+DEFAULT_KEEP_RECENT = 6
+# Mỗi message trong chat completion tốn thêm vài token định dạng (role, phân cách)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Ước lượng không có tokenizer: ~4 byte UTF-8 một token (chữ có dấu 2-3 byte/ký tự)
+BYTES_PER_TOKEN = 4
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_encoding = None
+
+
+def prompt_token_budget() -> int:
+    return int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", str(DEFAULT_PROMPT_TOKEN_BUDGET)))
+
+
+def summary_max_tokens() -> int:
+    return int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", str(DEFAULT_SUMMARY_MAX_TOKENS)))
+
+
+def keep_recent() -> int:
+    return int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", str(DEFAULT_KEEP_RECENT)))
+
+
+def _tiktoken_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:  # chưa tải được bảng mã (offline): dùng ước lượng
+            _encoding = False
+    return _encoding or None
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count of ``text``."""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Mỗi từ ít nhất 1 token, từ dài / có dấu tính theo số byte; dấu câu 1 token
+    return sum(max(1, math.ceil(len(piece.encode("utf-8")) / BYTES_PER_TOKEN)) for piece in _PIECE_RE.findall(text))
+
+
+def message_tokens(message: dict) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content"))
+
+
+def fit_history(fixed: Sequence[dict], turns: Sequence[dict], budget: int) -> Tuple[List[dict], int]:
+    """``fixed`` + the newest ``turns`` that fit in ``budget`` tokens; returns (messages, dropped count).
+
+    The last turn (the message being answered) is always kept, even over budget.
+    """
+    used = sum(message_tokens(m) for m in fixed)
+    kept: List[dict] = []
+    for turn in reversed(turns):
+        cost = message_tokens(turn)
+        if kept and used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    return list(fixed) + kept, len(turns) - len(kept)
+
+
+def split_for_summary(messages: Sequence, recent: Optional[int] = None) -> Tuple[list, list]:
+    """(messages to fold into the summary, the most recent ones to keep verbatim)."""
+    recent = keep_recent() if recent is None else recent
+    if len(messages) <= recent:
+        return [], list(messages)
+    cut = len(messages) - recent
+    return list(messages[:cut]), list(messages[cut:])
+
+
+def _transcript_line(role: str, content: Optional[str]) -> str:
+    return f"{'Người dùng' if role == 'user' else 'Trợ lý'}: {content}"
+
+
+def summary_chunk_size(previous: Optional[str], turns: Sequence[Tuple[str, str]], budget: Optional[int] = None
+                       ) -> int:
+    """How many leading ``turns`` fit in one :func:`summary_messages` prompt of ``budget`` tokens.
+
+    At least one turn is taken so folding always makes progress.
+    """
+    budget = prompt_token_budget() if budget is None else budget
+    used = sum(message_tokens(m) for m in summary_messages(previous, []))
+    count = 0
+    for role, content in turns:
+        # +1 cho ký tự xuống dòng giữa các dòng transcript
+        cost = estimate_tokens(_transcript_line(role, content)) + 1
+        if count and used + cost > budget:
+            break
+        used += cost
+        count += 1
+    return count
+
+
+def summary_messages(previous: Optional[str], turns: Sequence[Tuple[str, str]], max_tokens: Optional[int] = None
+                     ) -> List[dict]:
+    """Prompt that folds ``turns`` ((role, content) pairs) into the previous rolling summary."""
+    max_tokens = summary_max_tokens() if max_tokens is None else max_tokens
+    words = max(40, int(max_tokens * 0.6))
+    transcript = "\n".join(_transcript_line(role, content) for role, content in turns)
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Bạn tóm tắt hội thoại giữa người dùng và trợ lý du lịch WonderAI. "
+                f"Viết bản tóm tắt mới (tối đa khoảng {words} từ, cùng ngôn ngữ với hội thoại) gộp tóm tắt cũ "
+                "và đoạn hội thoại mới: giữ điểm đến, ngày đi, ngân sách, sở thích, quyết định đã chốt và câu hỏi "
+                "còn bỏ ngỏ; bỏ lời chào và chi tiết thừa. Chỉ trả về bản tóm tắt."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Tóm tắt cũ:\n{previous or '(chưa có)'}\n\nĐoạn hội thoại mới:\n{transcript}",
+        },
+    ]
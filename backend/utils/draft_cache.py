@@ -0,0 +1,108 @@
+"""LRU cache of generated itinerary drafts.
+
+Without ``shuffle`` the itinerary generator is a pure function of its
+inputs (province, days, budget, must-include / excluded ids, hotel,
+objective, hotel placement) and of
+the catalog, so popular combinations ("Hà Nội, 3 days, no budget") are
+generated once and then served from :data:`itinerary_draft_cache`. Entries
+expire after a TTL and the whole cache is dropped when the catalog changes:
+drafts are tied to :func:`catalog_token`, the shared ``catalog_meta``
+version (moved by writes in any process, e.g. ``seed.py``) plus this
+process's own version. Drafts are stored as JSON text: every hit returns a fresh copy that
+callers may modify (e.g. renumber a day) without touching the cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Optional, Tuple
+
+from .catalog_cache import get_catalog_version, get_shared_catalog_state
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 600.0
+
+
+def draft_key(province_id, duration_days, max_budget, must_include_ids: Optional[Iterable] = None,
+              excluded_ids: Optional[Iterable] = None, accommodation_id=None, objective: str = "rating",
+              choose_hotel: bool = False) -> Tuple:
+    """Normalized cache key for one generation request."""
+    # Thứ tự điểm bắt buộc có ý nghĩa (khách sạn đầu tiên được chọn), điểm loại trừ thì không
+    return (
+        str(province_id), int(duration_days), float(max_budget or 0),
+        tuple(must_include_ids or ()), tuple(sorted(set(excluded_ids or ()), key=str)),
+        accommodation_id, objective, bool(choose_hotel),
+    )
+
+
+def catalog_token() -> Tuple:
+    """Catalog state drafts are built from; pass it to :meth:`DraftCache.put`."""
+    return get_shared_catalog_state(), get_catalog_version()
+
+
+def draft_seed(key: Tuple, salt: object = "") -> int:
+    """Stable 32-bit seed derived from a draft key (same inputs -> same seed, in every process)."""
+    digest = hashlib.sha1(repr((key, salt)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+class DraftCache:
+    """Thread-safe LRU of draft key -> JSON-encoded draft, with TTL and catalog versioning."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+        self._version: Optional[Tuple] = None
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _sync_version(self) -> Tuple:
+        version = catalog_token()
+        if self._version != version:
+            self._entries.clear()
+            self._version = version
+        return version
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        with self._lock:
+            self._sync_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    def put(self, key: Tuple, draft: dict, version: Optional[Tuple] = None) -> None:
+        """Store a draft unless the catalog changed after ``version`` (a :func:`catalog_token`) was read."""
+        payload = json.dumps(draft, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            current = self._sync_version()
+            if version is not None and version != current:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+itinerary_draft_cache = DraftCache(
+    int(os.getenv("ITINERARY_DRAFT_CACHE_SIZE", str(DEFAULT_MAX_ENTRIES))),
+    float(os.getenv("ITINERARY_DRAFT_CACHE_TTL", str(DEFAULT_TTL_SECONDS))),
+)
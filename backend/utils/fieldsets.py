@@ -0,0 +1,178 @@
+"""Sparse fieldsets (``fields=`` / ``view=summary|full``) for destination listings.
+
+Each output field declares the columns it needs. A projection selects only
+those columns with a Core ``select`` (no ORM hydration). Provinces and
+regions are joined only when a province/region field is requested, and
+``destination_images`` is read (one ``IN`` query per chunk) only for the
+full ``images`` gallery; card images come from precomputed columns.
+Endpoints pass their own field table and model classes, so this module
+does not import ``models``.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from .sqlite_index import chunks
+
+VIEWS = ("summary", "full")
+DEFAULT_REGION_NAME = "Miền Nam"
+
+
+class InvalidFieldset(ValueError):
+    """Raised when ``fields``/``view`` query parameters cannot be honoured."""
+
+
+class ProjectionContext(NamedTuple):
+    images: Dict[int, List[str]]
+    public_image_url: Callable[[Optional[str]], Optional[str]]
+    weather: Callable[[str], str]
+
+
+class Field(NamedTuple):
+    # Khóa trong dict trả về của destination_columns()
+    columns: Tuple[str, ...]
+    render: Callable[[Any, ProjectionContext], Any]
+    # row -> có cần danh sách ảnh của destination này không (None = không bao giờ)
+    needs_images: Optional[Callable[[Any], bool]] = None
+
+
+def _decode_json(data_string, default_type="list"):
+    if not data_string:
+        return [] if default_type == "list" else None
+    try:
+        return json.loads(data_string)
+    except (json.JSONDecodeError, TypeError):
+        return [data_string] if default_type == "list" else data_string
+
+
+def _region_name(row) -> str:
+    return row.region_name or DEFAULT_REGION_NAME
+
+
+def _column(name: str, render=None) -> Field:
+    return Field((name,), render or (lambda row, ctx: getattr(row, name)))
+
+
+DESTINATION_FIELDS: Dict[str, Field] = {
+    "id": _column("id"),
+    "name": _column("name"),
+    "province_name": _column("province_name"),
+    "region_name": Field(("region_name",), lambda row, ctx: _region_name(row)),
+    # Ảnh card/thumbnail đã resolve sẵn khi ghi (utils/card_images): không cần đọc destination_images
+    "image_url": Field(("card_image_url",), lambda row, ctx: ctx.public_image_url(row.card_image_url)),
+    "thumbnail_url": Field(("card_thumbnail_url",), lambda row, ctx: ctx.public_image_url(row.card_thumbnail_url)),
+    "description": Field(("description",), lambda row, ctx: _decode_json(row.description)),
+    "description_snippet": Field(
+        ("description",),
+        lambda row, ctx: (row.description[:100] + "...") if row.description else None,
+    ),
+    "latitude": _column("latitude"),
+    "longitude": _column("longitude"),
+    "rating": Field(("rating",), lambda row, ctx: row.rating or 0),
+    "category": _column("category"),
+    "tags": Field(("tags",), lambda row, ctx: _decode_json(row.tags, default_type="text")),
+    "weather": Field(("region_name",), lambda row, ctx: ctx.weather(_region_name(row))),
+    "gps": Field(
+        ("latitude", "longitude"),
+        lambda row, ctx: {"lat": row.latitude, "lng": row.longitude} if row.latitude and row.longitude else None,
+    ),
+    "images": Field(("id",), lambda row, ctx: list(ctx.images.get(row.id, ())), needs_images=lambda row: True),
+    "type": _column("place_type"),
+    "place_type": _column("place_type"),
+    "opening_hours": _column("opening_hours"),
+    "entry_fee": _column("entry_fee"),
+    "source": _column("source"),
+}
+
+
+def parse_fieldset(args: Mapping[str, Any], full: Sequence[str], summary: Sequence[str]) -> Optional[List[str]]:
+    """Return the requested field names (in ``full`` order) or None for the default payload."""
+    view = (args.get("view") or "").strip().lower()
+    raw_fields = (args.get("fields") or "").strip()
+    if view and view not in VIEWS:
+        raise InvalidFieldset(f"view must be one of: {', '.join(VIEWS)}.")
+
+    if raw_fields:
+        requested = {name.strip() for name in raw_fields.split(",") if name.strip()}
+        unknown = sorted(requested - set(full))
+        if unknown:
+            raise InvalidFieldset(
+                f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(full)}."
+            )
+        requested.add("id")  # id luôn có: client cần làm khóa, cursor cũng cần
+        return [name for name in full if name in requested]
+    if view == "summary":
+        return list(summary)
+    return None
+
+
+def destination_columns(destination_model, province_model, region_model) -> Dict[str, Any]:
+    """Column name -> selectable column, as referenced by :class:`Field`."""
+    d = destination_model
+    columns = {
+        name: getattr(d, name)
+        for name in (
+            "id", "name", "description", "card_image_url", "card_thumbnail_url", "latitude",
+            "longitude", "rating", "category", "tags", "place_type", "opening_hours", "entry_fee", "source",
+        )
+    }
+    columns["province_name"] = province_model.name.label("province_name")
+    columns["region_name"] = region_model.name.label("region_name")
+    return columns
+
+
+def load_image_urls(session, image_model, ids: Iterable[int]) -> Dict[int, List[str]]:
+    """destination id -> image URLs (in insertion order), one IN query per chunk."""
+    images: Dict[int, List[str]] = {}
+    for chunk in chunks(sorted(set(ids))):
+        rows = session.execute(
+            select(image_model.destination_id, image_model.image_url)
+            .where(image_model.destination_id.in_(chunk))
+            .order_by(image_model.id)
+        )
+        for destination_id, url in rows:
+            images.setdefault(destination_id, []).append(url)
+    return images
+
+
+def project_destinations(session, destination_ids: Sequence[int], fields: Sequence[str],
+                         spec: Mapping[str, Field], models: Tuple[Any, Any, Any, Any],
+                         public_image_url: Callable, weather: Callable) -> List[dict]:
+    """Build one dict per id (same order) containing only ``fields``.
+
+    ``models`` is ``(Destination, Province, Region, DestinationImage)``.
+    """
+    destination_model, province_model, region_model, image_model = models
+    available = destination_columns(destination_model, province_model, region_model)
+    needed = ["id"]
+    for name in fields:
+        for column in spec[name].columns:
+            if column not in needed:
+                needed.append(column)
+
+    stmt = select(*(available[name] for name in needed))
+    if "province_name" in needed or "region_name" in needed:
+        stmt = stmt.outerjoin(province_model, province_model.id == destination_model.province_id)
+    if "region_name" in needed:
+        stmt = stmt.outerjoin(region_model, region_model.id == province_model.region_id)
+
+    rows = {}
+    for chunk in chunks(list(destination_ids)):
+        for row in session.execute(stmt.where(destination_model.id.in_(chunk))):
+            rows[row.id] = row
+
+    image_checks = [spec[name].needs_images for name in fields if spec[name].needs_images]
+    image_ids = [row_id for row_id, row in rows.items() if any(check(row) for check in image_checks)]
+    ctx = ProjectionContext(
+        images=load_image_urls(session, image_model, image_ids) if image_ids else {},
+        public_image_url=public_image_url,
+        weather=weather,
+    )
+    return [
+        {name: spec[name].render(rows[row_id], ctx) for name in fields}
+        for row_id in destination_ids
+        if row_id in rows
+    ]
@@ -0,0 +1,143 @@
+"""SQLite R*Tree spatial index over destination coordinates.
+
+``destinations_rtree`` holds one point box per destination with coordinates
+(rowid = destination id). Like the FTS index it is kept in sync by
+SQLAlchemy flush hooks, rebuilt by ``seed.py`` and ``flask geo-reindex``.
+Nearby / bounding-box lookups take their candidates from
+:func:`candidate_subquery` (an index range search) and only compute exact
+haversine distances for those survivors. On databases without R*Tree
+support callers fall back to a plain range filter on the coordinate columns.
+"""
+from __future__ import annotations
+
+import math
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .sqlite_index import VirtualTableIndex, chunks
+from .travel_matrix import EARTH_RADIUS_KM, haversine_km
+
+RTREE_TABLE = "destinations_rtree"
+# 1 độ vĩ tuyến ~ 111.2 km ở mọi nơi
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+_index = VirtualTableIndex(
+    RTREE_TABLE,
+    "id",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    pending_key="geo_index_pending",
+)
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> BBox:
+    """Smallest lat/lng box containing every point within ``radius_km`` of (lat, lng)."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    # Gần cực hoặc bán kính quá lớn: lấy trọn vòng kinh độ
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 1e-9 or radius_km / (KM_PER_DEGREE_LAT * cos_lat) >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    dlng = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    return min_lat, max(-180.0, lng - dlng), max_lat, min(180.0, lng + dlng)
+
+
+def candidate_subquery(bbox: BBox, name: str = "geo"):
+    """Subquery of ``destination_id`` for indexed points inside ``bbox``."""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return (
+        text(
+            f"SELECT id AS destination_id FROM {RTREE_TABLE} "
+            "WHERE min_lat <= :max_lat AND max_lat >= :min_lat "
+            "AND min_lng <= :max_lng AND max_lng >= :min_lng"
+        )
+        .bindparams(min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng)
+        .columns(destination_id=Integer)
+        .subquery(name)
+    )
+
+
+def geo_index_available(session: Session) -> bool:
+    return _index.available(session.connection())
+
+
+def create_geo_index(connection) -> bool:
+    return _index.create(connection)
+
+
+def drop_geo_index(connection) -> None:
+    _index.drop(connection)
+
+
+def _point_rows(connection, destination_table, where=None):
+    d = destination_table.c
+    stmt = select(d.id, d.latitude, d.longitude).where(d.latitude.isnot(None), d.longitude.isnot(None))
+    if where is not None:
+        stmt = stmt.where(where)
+    for row in connection.execute(stmt):
+        yield row.id, row.latitude, row.latitude, row.longitude, row.longitude
+
+
+def _insert_points(connection, rows: Iterable[tuple]) -> int:
+    rows = list(rows)
+    if rows:
+        connection.exec_driver_sql(
+            f"INSERT INTO {RTREE_TABLE}(id, min_lat, max_lat, min_lng, max_lng) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
+
+def index_destinations(connection, destination_table, ids: Optional[Iterable[int]] = None) -> int:
+    """(Re)index the given destinations; ``ids=None`` = full rebuild."""
+    if not _index.available(connection):
+        return 0
+    if ids is None:
+        _index.clear(connection)
+        return _insert_points(connection, _point_rows(connection, destination_table))
+
+    count = 0
+    id_list = sorted(set(ids))
+    _index.remove(connection, id_list)
+    for chunk in chunks(id_list):
+        count += _insert_points(connection, _point_rows(connection, destination_table, destination_table.c.id.in_(chunk)))
+    return count
+
+
+def rebuild_geo_index(session: Session, destination_model) -> int:
+    connection = session.connection()
+    create_geo_index(connection)
+    return index_destinations(connection, destination_model.__table__)
+
+
+def _coordinates_changed(obj) -> bool:
+    attrs = inspect(obj).attrs
+    return attrs.latitude.history.has_changes() or attrs.longitude.history.has_changes()
+
+
+def install_geo_index_listeners(metadata, destination_model) -> None:
+    """Keep ``destinations_rtree`` in sync with flushed Destination coordinates."""
+    destination_table = destination_model.__table__
+
+    def collect(session, pending):
+        for obj in session.new:
+            if isinstance(obj, destination_model):
+                pending["upsert"].append(obj)
+        for obj in session.dirty:
+            if isinstance(obj, destination_model) and _coordinates_changed(obj):
+                pending["upsert"].append(obj)
+        for obj in session.deleted:
+            if isinstance(obj, destination_model) and obj.id is not None:
+                pending["delete"].add(obj.id)
+
+    def apply(connection, pending):
+        upsert_ids = {obj.id for obj in pending["upsert"] if obj.id is not None} - pending["delete"]
+        if pending["delete"]:
+            _index.remove(connection, pending["delete"])
+        if upsert_ids:
+            index_destinations(connection, destination_table, ids=upsert_ids)
+
+    _index.install_listeners(metadata, lambda: {"upsert": [], "delete": set()}, collect, apply)
@@ -0,0 +1,173 @@
+"""Conditional GET and response compression for catalog endpoints.
+
+Catalog responses only change when the catalog version (see
+:mod:`utils.catalog_cache`) is bumped, so :func:`catalog_conditional` tags
+them with a strong ETag derived from the persisted ``catalog_meta`` version
+and the request URL, plus ``Last-Modified`` from the same row: every worker
+process gives the same validators for the same rows, whenever it started.
+The validators are computed from this process's copy of that row, which the
+throttled :func:`~utils.catalog_cache.sync_catalog_version` refreshes, so a
+matching ``If-None-Match`` / ``If-Modified-Since`` is answered with 304
+before the view runs, without any SQL.
+Bodies are then compressed with brotli (if the optional ``brotli`` package
+is installed) or gzip, per ``Accept-Encoding``.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Iterable, Iterator, Optional, Tuple
+
+from flask import Response, make_response, request
+
+from .catalog_cache import get_catalog_last_modified, get_catalog_version, get_shared_catalog_state
+
+try:
+    import brotli
+except Exception:  # optional dependency
+    brotli = None
+
+# Dưới ngưỡng này nén không đáng (header + CPU lớn hơn phần tiết kiệm)
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Khi không có catalog_meta, version chỉ có ý nghĩa trong một process: thêm id process vào ETag
+_INSTANCE_TAG = os.urandom(4).hex()
+
+
+def available_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding) -> Optional[str]:
+    """Pick the best supported coding from an ``Accept-Encoding`` header."""
+    best, best_q = None, 0.0
+    for coding in available_encodings():
+        q = accept_encoding.quality(coding) if accept_encoding else 0
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def catalog_validators() -> Tuple[str, datetime]:
+    """(ETag version part, modification time) of the catalog, shared by every process when possible."""
+    shared = get_shared_catalog_state()
+    if shared is not None:
+        version, modified_at = shared
+        # Thêm thời điểm sửa: CSDL tạo lại từ đầu bắt đầu lại từ version 1
+        return f"{version}.{int(modified_at.timestamp())}", modified_at
+    return f"{_INSTANCE_TAG}-{get_catalog_version()}", get_catalog_last_modified()
+
+
+def catalog_etag(version: Optional[str] = None) -> str:
+    """ETag for the current request URL at the given catalog version."""
+    if version is None:
+        version = catalog_validators()[0]
+    # host_url có trong image_url tuyệt đối nên cũng là một phần của nội dung
+    digest = hashlib.sha1(f"{request.host_url}|{request.full_path}".encode("utf-8")).hexdigest()[:16]
+    return f"{version}-{digest}"
+
+
+def _matching_etag(etag: str) -> Optional[str]:
+    """The variant of ``etag`` (plain or per-encoding) named in ``If-None-Match``."""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    for tag in [etag] + [f"{etag}-{coding}" for coding in available_encodings()]:
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def _http_last_modified(modified_at: datetime) -> Optional[datetime]:
+    # Trong cùng giây có thể còn thay đổi nữa, chưa dùng Last-Modified được
+    if modified_at >= datetime.now(timezone.utc).replace(microsecond=0):
+        return None
+    return modified_at
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> Optional[str]:
+    """Return the ETag to echo in a 304, or None when the view must run."""
+    if request.if_none_match:
+        return _matching_etag(etag)
+    since = request.if_modified_since
+    if last_modified is not None and since is not None and last_modified <= since:
+        return etag
+    return None
+
+
+def _stream_compressor(chunks: Iterable[bytes], coding: str) -> Iterator[bytes]:
+    if coding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response: Response) -> Response:
+    """Encode ``response`` per the request's ``Accept-Encoding`` (in place)."""
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    coding = choose_encoding(request.accept_encodings)
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream_compressor(response.iter_encoded(), coding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < MIN_COMPRESS_SIZE:
+            return response
+        if coding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        response.set_data(body)
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # ETag mạnh phải khác nhau giữa các bản mã hóa khác nhau
+        response.set_etag(f"{etag}-{coding}")
+    return response
+
+
+def catalog_conditional(view):
+    """Decorator: ETag/Last-Modified revalidation + compression for catalog GETs."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Đọc version TRƯỚC khi truy vấn: nếu catalog đổi giữa chừng, ETag cũ hơn nội dung (an toàn)
+        version, modified_at = catalog_validators()
+        etag = catalog_etag(version)
+        last_modified = _http_last_modified(modified_at)
+        matched = _not_modified(etag, last_modified)
+        if matched is not None:
+            response = Response(status=304)
+            response.set_etag(matched)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True  # luôn hỏi lại server, nhưng được dùng 304
+        return compress_response(response)
+
+    return wrapper
@@ -0,0 +1,536 @@
+"""Route-aware day planning for generated itineraries.
+
+``generate_itinerary_optimized`` in ``app.py`` decides *which* places go into
+a trip; this module decides which day each place goes to and in what order:
+
+1. the places are clustered into ``num_days`` geographic groups (k-means on
+   lat/lng, with at most ``ceil(n / num_days)`` places per group);
+2. each day's stops are picked by nearest neighbour from the day's start
+   (the hotel, if any) and their order is then improved with 2-opt;
+3. stops are scheduled with real travel times from :mod:`utils.travel_matrix`.
+   Places that no longer fit before the end of the day move to the next day.
+
+When some of a day's places have opening windows (see
+:mod:`utils.opening_hours`), steps 2-3 are replaced by a time-window
+insertion heuristic: stops wait for their site to open, and a site is
+never visited outside its windows.
+
+All of this works on one precomputed distance matrix, so planning a trip
+takes milliseconds. Editing a saved day (:func:`insert_stop`) is
+incremental: one cheapest insertion, re-timing only the stops after it.
+:func:`choose_base` picks a hotel for a trip that has none (facility
+location over the day centroids). Places are passed in as plain ``(lat, lng)`` points and
+come back as indices; this module does not import ``models``.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .travel_matrix import distance_matrix, travel_time_matrix
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+DAY_START_MIN = 8 * 60
+DAY_END_MIN = 18 * 60
+# Không có tọa độ: coi như ~30 phút đi xe (bằng mức cố định trước đây)
+UNKNOWN_DISTANCE_KM = 25.0
+KMEANS_MAX_ITER = 20
+TWO_OPT_MAX_PASSES = 50
+# Số điểm tối đa xét chèn trong một ngày có ràng buộc giờ mở cửa
+MAX_INSERTION_CANDIDATES = 24
+MINUTES_PER_DAY = 24 * 60
+
+Point = Tuple[Optional[float], Optional[float]]  # (lat, lng)
+Window = Tuple[int, int]  # (mở cửa, đóng cửa) tính bằng phút trong ngày
+
+
+class Stop(NamedTuple):
+    index: int           # vị trí trong danh sách points truyền vào
+    start: int           # phút tính từ 00:00
+    end: int
+    travel_minutes: int  # từ điểm trước đó (hoặc từ khách sạn)
+
+
+def format_clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_time_slot(start: int, end: int) -> str:
+    return f"{format_clock(start)} - {format_clock(end)}"
+
+
+def parse_time_slot(text) -> Optional[Tuple[int, int]]:
+    """Inverse of :func:`format_time_slot` ("08:00 - 10:00" -> (480, 600)); None if unreadable."""
+    try:
+        start, end = (part.strip() for part in str(text).split("-"))
+        (sh, sm), (eh, em) = (map(int, start.split(":")), map(int, end.split(":")))
+    except (ValueError, TypeError):
+        return None
+    return sh * 60 + sm, eh * 60 + em
+
+
+def _has_coords(point: Optional[Point]) -> bool:
+    return point is not None and point[0] is not None and point[1] is not None
+
+
+def _clean_matrix(distances) -> List[List[float]]:
+    """Matrix as lists of floats, unknown distances replaced by UNKNOWN_DISTANCE_KM."""
+    rows = distances.tolist() if hasattr(distances, "tolist") else distances
+    cleaned = [
+        [UNKNOWN_DISTANCE_KM if d is None or d != d else d for d in row]  # d != d: nan
+        for row in rows
+    ]
+    for i, row in enumerate(cleaned):
+        row[i] = 0.0
+    return cleaned
+
+
+# ------------------------------------------------------------ clustering
+def _planar(points: Sequence[Point], indices: Sequence[int]) -> List[Tuple[float, float]]:
+    # Trong phạm vi một tỉnh: co kinh độ theo cos(vĩ độ) là đủ để dùng khoảng cách Euclid
+    mean_lat = sum(points[i][0] for i in indices) / len(indices)
+    scale = math.cos(math.radians(mean_lat))
+    return [(points[i][0], points[i][1] * scale) for i in indices]
+
+
+def _sq_dist(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2
+
+
+def _farthest_first(coords: List[Tuple[float, float]], k: int) -> List[Tuple[float, float]]:
+    # Khởi tạo tất định: điểm đầu tiên (rating cao nhất) rồi lần lượt điểm xa nhất
+    centroids = [coords[0]]
+    nearest = [_sq_dist(c, coords[0]) for c in coords]
+    while len(centroids) < k:
+        far = max(range(len(coords)), key=nearest.__getitem__)
+        if nearest[far] == 0:
+            break
+        centroids.append(coords[far])
+        nearest = [min(d, _sq_dist(c, coords[far])) for d, c in zip(nearest, coords)]
+    return centroids
+
+
+def _kmeans(coords: List[Tuple[float, float]], centroids: List[Tuple[float, float]],
+            max_iter: int) -> List[Tuple[float, float]]:
+    """Lloyd iterations from the given centroids (vectorized when NumPy is installed)."""
+    if np is not None:
+        xy = np.array(coords)
+        cent = np.array(centroids)
+        assignment = None
+        for _ in range(max_iter):
+            new_assignment = ((xy[:, None, :] - cent[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+            if assignment is not None and (new_assignment == assignment).all():
+                break
+            assignment = new_assignment
+            counts = np.bincount(assignment, minlength=len(cent))
+            for axis in (0, 1):
+                sums = np.bincount(assignment, weights=xy[:, axis], minlength=len(cent))
+                np.divide(sums, counts, out=cent[:, axis], where=counts > 0)
+        return [tuple(c) for c in cent.tolist()]
+
+    centroids = list(centroids)
+    assignment = None
+    for _ in range(max_iter):
+        new_assignment = [
+            min(range(len(centroids)), key=lambda c: _sq_dist(coord, centroids[c])) for coord in coords
+        ]
+        if new_assignment == assignment:
+            break
+        assignment = new_assignment
+        for c in range(len(centroids)):
+            members = [coords[j] for j, label in enumerate(assignment) if label == c]
+            if members:
+                centroids[c] = (
+                    sum(m[0] for m in members) / len(members),
+                    sum(m[1] for m in members) / len(members),
+                )
+    return centroids
+
+
+def _nearest_pairs(coords: List[Tuple[float, float]], centroids: List[Tuple[float, float]]):
+    """(point, centroid) index pairs, closest first."""
+    if np is not None:
+        d2 = ((np.array(coords)[:, None, :] - np.array(centroids)[None, :, :]) ** 2).sum(axis=2)
+        order = np.argsort(d2, axis=None, kind="stable")
+        return zip(*(a.tolist() for a in np.unravel_index(order, d2.shape)))
+    pairs = sorted(
+        (_sq_dist(coord, centroid), j, c)
+        for j, coord in enumerate(coords)
+        for c, centroid in enumerate(centroids)
+    )
+    return ((j, c) for _, j, c in pairs)
+
+
+def cluster_points(points: Sequence[Point], k: int, max_iter: int = KMEANS_MAX_ITER) -> List[int]:
+    """Cluster label (``0..k-1``) per point; no cluster gets more than ``ceil(n / k)`` points."""
+    n = len(points)
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+    capacity = -(-n // k)
+    labels = [-1] * n
+    located = [i for i, point in enumerate(points) if _has_coords(point)]
+
+    if located:
+        coords = _planar(points, located)
+        centroids = _farthest_first(coords, k)
+        sizes = [0] * k
+        # Gán lại có giới hạn sức chứa: cặp (điểm, cụm) gần nhất được ưu tiên
+        for j, c in _nearest_pairs(coords, _kmeans(coords, centroids, max_iter)):
+            if labels[located[j]] == -1 and sizes[c] < capacity:
+                labels[located[j]] = c
+                sizes[c] += 1
+    else:
+        sizes = [0] * k
+
+    for i in range(n):
+        if labels[i] == -1:
+            c = min(range(k), key=sizes.__getitem__)
+            labels[i] = c
+            sizes[c] += 1
+    return labels
+
+
+def _order_groups(groups: List[List[int]], points: Sequence[Point], start: Optional[Point]) -> List[List[int]]:
+    """Chain the day groups by nearest centroid, starting near ``start`` (if known)."""
+    centroids = []
+    for group in groups:
+        located = [points[i] for i in group if _has_coords(points[i])]
+        centroids.append(
+            (sum(p[0] for p in located) / len(located), sum(p[1] for p in located) / len(located))
+            if located else None
+        )
+    remaining = [g for g in range(len(groups)) if centroids[g] is not None]
+    ordered = []
+    current = (start[0], start[1]) if _has_coords(start) else None
+    while remaining:
+        if current is None:
+            nxt = remaining[0]
+        else:
+            nxt = min(remaining, key=lambda g: _sq_dist(centroids[g], current))
+        remaining.remove(nxt)
+        ordered.append(groups[nxt])
+        current = centroids[nxt]
+    ordered.extend(groups[g] for g in range(len(groups)) if centroids[g] is None)
+    return ordered
+
+
+# -------------------------------------------------------------- routing
+def nearest_neighbor_tour(nodes: Sequence[int], dist: Sequence[Sequence[float]],
+                          start: Optional[int] = None) -> List[int]:
+    """Greedy tour over ``nodes``; ``start`` (not included in the result) is the origin."""
+    remaining = list(nodes)
+    tour: List[int] = []
+    current = start
+    if current is None and remaining:
+        current = remaining.pop(0)
+        tour.append(current)
+    while remaining:
+        row = dist[current]
+        nxt = min(remaining, key=row.__getitem__)
+        remaining.remove(nxt)
+        tour.append(nxt)
+        current = nxt
+    return tour
+
+
+def _two_opt_cycle(tour: List[int], d: Sequence[Sequence[float]]) -> List[int]:
+    # tour[0] cố định; đảo tour[i..j]: cạnh (a, c) + (e, b) -> (a, e) + (c, b)
+    n = len(tour)
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(1, n - 1):
+            da = d[tour[i - 1]]
+            c = tour[i]
+            dc = d[c]
+            for j in range(i + 1, n):
+                e = tour[j]
+                b = tour[j + 1] if j + 1 < n else tour[0]
+                if da[e] + dc[b] < da[c] + d[e][b] - 1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1]
+                    improved = True
+                    c = tour[i]
+                    dc = d[c]
+        if not improved:
+            break
+    return tour
+
+
+def two_opt(route: Sequence[int], dist: Sequence[Sequence[float]], closed: bool = False) -> List[int]:
+    """Improve ``route`` by reversing segments while that shortens it.
+
+    ``closed`` routes start and end at ``route[0]`` (the depot), which stays
+    in place; open routes may start and end anywhere.
+    """
+    nodes = list(route)
+    if len(nodes) < 3:
+        return nodes
+    # Làm việc trên ma trận con của các điểm trong route (chỉ số 0..m-1)
+    local = [[dist[a][b] for b in nodes] for a in nodes]
+    if closed:
+        tour = _two_opt_cycle(list(range(len(nodes))), local)
+        return [nodes[k] for k in tour]
+    # Đường mở = chu trình qua một depot ảo cách mọi điểm 0 km
+    for row in local:
+        row.append(0.0)
+    local.append([0.0] * (len(nodes) + 1))
+    tour = _two_opt_cycle([len(nodes)] + list(range(len(nodes))), local)
+    return [nodes[k] for k in tour[1:]]
+
+
+def route_length(route: Sequence[int], dist: Sequence[Sequence[float]]) -> float:
+    return sum(dist[a][b] for a, b in zip(route, route[1:]))
+
+
+def order_day(nodes: Sequence[int], dist: Sequence[Sequence[float]], depot: Optional[int] = None) -> List[int]:
+    """Visiting order for one day (nearest neighbour + 2-opt), depot excluded."""
+    if not nodes:
+        return []
+    if depot is None:
+        return two_opt(nearest_neighbor_tour(nodes, dist), dist)
+    route = [depot] + nearest_neighbor_tour(nodes, dist, start=depot)
+    # Ngày bắt đầu và kết thúc ở khách sạn
+    return two_opt(route, dist, closed=True)[1:]
+
+
+def _visit_start(arrive: int, duration: int, windows: Optional[Sequence[Window]]) -> Optional[int]:
+    """Earliest start >= ``arrive`` with the whole visit inside one opening window."""
+    if windows is None:
+        return arrive
+    for opens, closes in windows:
+        start = max(arrive, opens)
+        if start + duration <= closes:
+            return start
+    return None
+
+
+def can_visit(windows: Optional[Sequence[Window]], duration: int,
+              day_start: int = DAY_START_MIN, day_end: int = DAY_END_MIN) -> bool:
+    """Whether a visit of ``duration`` fits inside the windows on some day at all."""
+    start = _visit_start(day_start, duration, windows)
+    return start is not None and start + duration <= day_end
+
+
+def schedule_day(route: Sequence[int], durations: Sequence[int], travel: Sequence[Sequence[int]],
+                 depot: Optional[int] = None, day_start: int = DAY_START_MIN,
+                 day_end: int = DAY_END_MIN,
+                 windows: Optional[Sequence[Optional[Sequence[Window]]]] = None) -> Tuple[List[Stop], List[int]]:
+    """(stops that fit between day_start and day_end, leftover indices in route order).
+
+    With ``windows`` a stop waits for its site to open and is left over if
+    the visit cannot finish inside an opening window.
+    """
+    stops: List[Stop] = []
+    leftover: List[int] = []
+    clock = day_start
+    previous = depot
+    for index in route:
+        hop = travel[previous][index] if previous is not None else 0
+        start = _visit_start(clock + hop, durations[index], windows[index] if windows else None)
+        if start is None or start + durations[index] > day_end:
+            leftover.append(index)
+            continue
+        stops.append(Stop(index, start, start + durations[index], hop))
+        clock = start + durations[index]
+        previous = index
+    return stops, leftover
+
+
+def _simulate(route: Sequence[int], durations, travel, windows, depot, day_start, day_end) -> Optional[List[Stop]]:
+    stops, leftover = schedule_day(route, durations, travel, depot, day_start, day_end, windows)
+    return None if leftover else stops
+
+
+def insert_with_windows(nodes: Sequence[int], durations: Sequence[int], travel: Sequence[Sequence[int]],
+                        windows: Sequence[Optional[Sequence[Window]]], depot: Optional[int] = None,
+                        day_start: int = DAY_START_MIN,
+                        day_end: int = DAY_END_MIN) -> Tuple[List[Stop], List[int]]:
+    """Time-window-feasible day route built by cheapest insertion (VRPTW-style).
+
+    Each round inserts the (place, position) pair that adds the least travel
+    time while every stop still opens in time; the rest is left over.
+    """
+    # Điểm đóng cửa sớm được xét trước; giới hạn số ứng viên để mỗi ngày vẫn tính trong vài ms
+    pending = sorted(nodes, key=lambda i: (windows[i][-1][1] if windows[i] else MINUTES_PER_DAY, i))
+    pending = pending[:MAX_INSERTION_CANDIDATES]
+    route: List[int] = []
+    stops: List[Stop] = []
+    while pending:
+        best = None
+        for node in pending:
+            for pos in range(len(route) + 1):
+                prev = route[pos - 1] if pos > 0 else depot
+                nxt = route[pos] if pos < len(route) else depot
+                added = (travel[prev][node] if prev is not None else 0) + (travel[node][nxt] if nxt is not None else 0)
+                if prev is not None and nxt is not None:
+                    added -= travel[prev][nxt]
+                if best is not None and added > best[0][0]:
+                    continue
+                trial = _simulate(route[:pos] + [node] + route[pos:], durations, travel, windows,
+                                  depot, day_start, day_end)
+                if trial is None:
+                    continue
+                key = (added, trial[-1].end)
+                if best is None or key < best[0]:
+                    best = (key, node, pos, trial)
+        if best is None:
+            break
+        _, node, pos, stops = best
+        route.insert(pos, node)
+        pending.remove(node)
+    routed = set(route)
+    return stops, [i for i in nodes if i not in routed]
+
+
+def _restricts(windows: Optional[Sequence[Window]], day_start: int, day_end: int) -> bool:
+    return windows is not None and not any(opens <= day_start and day_end <= closes for opens, closes in windows)
+
+
+def plan_days(points: Sequence[Point], durations: Sequence[int], num_days: int,
+              start: Optional[Point] = None, transport_mode: str = "car",
+              day_start: int = DAY_START_MIN, day_end: int = DAY_END_MIN,
+              use_numpy: Optional[bool] = None,
+              windows: Optional[Sequence[Optional[Sequence[Window]]]] = None) -> List[List[Stop]]:
+    """Split ``points`` (durations in minutes) into ``num_days`` routed, scheduled days.
+
+    ``start`` is where every day starts and ends (the hotel). ``windows``
+    gives each place's opening windows (None = always open). Places that do
+    not fit into the last day are left out.
+    """
+    if num_days <= 0:
+        return []
+    n = len(points)
+    depot = n if start is not None else None
+    all_points = list(points) + ([start] if start is not None else [])
+    dist = _clean_matrix(distance_matrix(all_points, use_numpy=use_numpy)) if all_points else []
+    travel = travel_time_matrix(dist, transport_mode, use_numpy=False)
+    if windows is not None:
+        windows = list(windows) + [None]  # depot luôn "mở"
+
+    groups: List[List[int]] = [[] for _ in range(num_days)]
+    for index, label in enumerate(cluster_points(points, num_days)):
+        groups[label].append(index)
+    groups = _order_groups(groups, points, start)
+
+    days: List[List[Stop]] = []
+    carry: List[int] = []
+    for group in groups:
+        nodes = carry + group
+        if windows is not None and any(_restricts(windows[i], day_start, day_end) for i in nodes):
+            stops, carry = insert_with_windows(nodes, durations, travel, windows, depot, day_start, day_end)
+            days.append(stops)
+            continue
+        # Chọn điểm vừa trong ngày theo nearest neighbour (rẻ), rồi mới 2-opt trên các điểm đã chọn
+        greedy = nearest_neighbor_tour(nodes, dist, start=depot)
+        stops, carry = schedule_day(greedy, durations, travel, depot, day_start, day_end)
+        route = order_day([stop.index for stop in stops], dist, depot)
+        stops, extra = schedule_day(route, durations, travel, depot, day_start, day_end)
+        carry = extra + carry
+        days.append(stops)
+    return days
+
+
+# ------------------------------------------------------------ hotel choice
+def day_centroids(days: Sequence[Sequence[Point]]) -> List[Point]:
+    """Mean (lat, lng) of each day's stops; days without coordinates are skipped."""
+    centroids: List[Point] = []
+    for points in days:
+        located = [point for point in points if _has_coords(point)]
+        if located:
+            centroids.append((sum(p[0] for p in located) / len(located), sum(p[1] for p in located) / len(located)))
+    return centroids
+
+
+def choose_base(sites: Sequence[Point], targets: Sequence[Point], use_numpy: Optional[bool] = None) -> Optional[int]:
+    """Index of the site with the least summed distance to ``targets`` (1-median facility location).
+
+    Every day starts and ends at the base, so ``targets`` are the day
+    centroids and the objective is proportional to the daily start/end
+    travel. One vectorized sites x targets distance matrix; ties go to the
+    earliest site. Sites without coordinates never win.
+    """
+    if not sites or not targets:
+        return None
+    distances = distance_matrix(sites, targets, use_numpy=use_numpy)
+    if np is not None and not isinstance(distances, list):
+        totals = np.where(np.isnan(distances), np.inf, distances).sum(axis=1)
+        best = int(np.argmin(totals))
+        return best if np.isfinite(totals[best]) else None
+    totals = [math.inf if any(d is None for d in row) else sum(row) for row in distances]
+    best = min(range(len(totals)), key=totals.__getitem__)
+    return best if totals[best] != math.inf else None
+
+
+# --------------------------------------------------------- incremental edits
+def _leg_minutes(a: Optional[Point], b: Optional[Point], transport_mode: str) -> int:
+    if a is None or b is None:
+        return 0
+    km = distance_matrix([a], [b], use_numpy=False)[0][0]
+    return travel_time_matrix([[UNKNOWN_DISTANCE_KM if km is None else km]], transport_mode, use_numpy=False)[0][0]
+
+
+def _retime(points, durations, windows, nodes, previous, clock, transport_mode, day_end) -> Optional[List[Stop]]:
+    # day_end=None: không giới hạn cuối ngày, điểm không vừa khung giờ mở cửa thì xếp ngay khi tới
+    stops: List[Stop] = []
+    for index in nodes:
+        hop = _leg_minutes(previous, points[index], transport_mode)
+        start = _visit_start(clock + hop, durations[index], windows[index] if windows else None)
+        if day_end is not None and (start is None or start + durations[index] > day_end):
+            return None
+        if start is None:
+            start = clock + hop
+        stops.append(Stop(index, start, start + durations[index], hop))
+        clock, previous = start + durations[index], points[index]
+    return stops
+
+
+def schedule_stops(points: Sequence[Point], durations: Sequence[int], route: Sequence[int],
+                   start: Optional[Point] = None, transport_mode: str = "car",
+                   day_start: int = DAY_START_MIN,
+                   windows: Optional[Sequence[Optional[Sequence[Window]]]] = None) -> List[Stop]:
+    """Back-to-back schedule of ``route`` from ``day_start``; unlike :func:`schedule_day` no stop is dropped."""
+    return _retime(points, durations, windows, route, start, day_start, transport_mode, None)
+
+
+def insert_stop(points: Sequence[Point], durations: Sequence[int], day: Sequence[Stop], new: int,
+                start: Optional[Point] = None, transport_mode: str = "car",
+                day_start: int = DAY_START_MIN, day_end: int = DAY_END_MIN,
+                windows: Optional[Sequence[Optional[Sequence[Window]]]] = None) -> Tuple[List[Stop], bool]:
+    """Insert ``points[new]`` into an already scheduled day (cheapest insertion).
+
+    The new stop goes where it adds the least travel time (``start`` is the
+    hotel, where the day begins and ends). Stops before it keep their
+    times; only the new stop and the ones after it are re-timed. Only the
+    legs around each gap are evaluated, so an edit costs O(stops in the
+    day) instead of a replan. Returns ``(stops, fits)``: when no position
+    fits the day and the opening windows, the place goes to the cheapest
+    position anyway and ``fits`` is False.
+    """
+    leg = lambda a, b: _leg_minutes(a, b, transport_mode)
+    new_point = points[new]
+    previous = [start] + [points[stop.index] for stop in day]
+    costs = []
+    for pos in range(len(day) + 1):
+        added = leg(previous[pos], new_point)
+        following = points[day[pos].index] if pos < len(day) else start
+        if following is not None:
+            added += leg(new_point, following) - (leg(previous[pos], following) if previous[pos] is not None else 0)
+        costs.append((added, pos))
+    costs.sort()
+
+    def attempt(pos, limit):
+        prefix = list(day[:pos])
+        clock = prefix[-1].end if prefix else day_start
+        tail = _retime(points, durations, windows, [new] + [stop.index for stop in day[pos:]],
+                       previous[pos], clock, transport_mode, limit)
+        return None if tail is None else prefix + tail
+
+    for _, pos in costs:
+        stops = attempt(pos, day_end)
+        if stops is not None:
+            return stops, True
+    return attempt(costs[0][1], None), False
@@ -0,0 +1,170 @@
+"""Alternative itinerary drafts, computed in parallel worker processes.
+
+Generating a draft has a cheap, database-bound preparation step (candidate
+pool, must-include places, hotel, remaining budget and time; done in the
+request process by ``app.py``) and a CPU-bound part: the knapsack
+selection (:mod:`utils.place_selection`) and the day planning
+(:mod:`utils.itinerary_planner`). :class:`VariantProblem` holds the
+prepared data as plain tuples, so the CPU-bound part can run anywhere.
+
+:func:`solve_variant` solves one problem for an objective:
+
+* ``rating`` – highest total rating (the default draft),
+* ``cheapest`` – rating discounted by entry fee,
+* ``least_travel`` – rating discounted by distance from the trip's anchor
+  (hotel, else the must-include places, else the best-rated candidate),
+
+optionally with a seeded random jitter on the utilities (``shuffle``).
+:func:`solve_variants` fans several (objective, seed) specs out on a shared
+``ProcessPoolExecutor`` and falls back to solving in-process for a single
+spec, when ``ITINERARY_VARIANT_WORKERS=0`` or when no pool can be used.
+Spawned workers re-import the ``__main__`` module, so the pool expects an
+entry point that is cheap to import (``run.py``, a WSGI server);
+``python app.py`` turns the pool off.
+"""
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .itinerary_planner import DAY_START_MIN, UNKNOWN_DISTANCE_KM, Point, Stop, Window, plan_days
+from .place_selection import Candidate, select_places
+from .travel_matrix import distance_matrix
+
+OBJECTIVES = ("rating", "cheapest", "least_travel")
+# "cheapest": một điểm có phí bằng mức này chỉ còn một nửa giá trị
+CHEAP_COST_SCALE = 100_000.0
+# "least_travel": một điểm cách điểm neo chừng này km chỉ còn một nửa giá trị
+TRAVEL_SCALE_KM = 5.0
+# shuffle: utility của mỗi ứng viên nhân ngẫu nhiên (theo seed) trong khoảng 1 ± hệ số này
+SHUFFLE_JITTER = 0.3
+
+
+class VariantPlace(NamedTuple):
+    cost: float
+    minutes: int
+    rating: float
+    point: Point
+    windows: Optional[Sequence[Window]]
+
+
+class VariantProblem(NamedTuple):
+    fixed: Tuple[VariantPlace, ...]       # điểm bắt buộc, luôn có trong lịch trình
+    candidates: Tuple[VariantPlace, ...]  # ứng viên cho bước chọn (đã lọc khách sạn, ngân sách, giờ mở cửa)
+    budget: Optional[float]               # ngân sách còn lại (None = không giới hạn)
+    time_left: int                        # phút còn lại cho các điểm được chọn
+    num_days: int
+    start: Optional[Point] = None         # khách sạn
+    day_start: int = DAY_START_MIN
+
+
+class Variant(NamedTuple):
+    objective: str
+    seed: Optional[int]
+    chosen: List[int]               # chỉ số trong problem.candidates
+    days: List[List[Stop]]          # Stop.index: fixed trước, sau đó các điểm được chọn theo thứ tự chosen
+
+
+def _anchor(problem: VariantProblem) -> Optional[Point]:
+    if problem.start is not None:
+        return problem.start
+    fixed = [p.point for p in problem.fixed if p.point[0] is not None and p.point[1] is not None]
+    if fixed:
+        return sum(lat for lat, _ in fixed) / len(fixed), sum(lng for _, lng in fixed) / len(fixed)
+    for place in problem.candidates:
+        if place.point[0] is not None and place.point[1] is not None:
+            return place.point
+    return None
+
+
+def objective_utilities(problem: VariantProblem, objective: str = "rating") -> List[float]:
+    """Per-candidate utility for the given objective."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    ratings = [max(place.rating or 0.0, 0.0) for place in problem.candidates]
+    if objective == "cheapest":
+        return [r / (1 + max(p.cost, 0.0) / CHEAP_COST_SCALE) for r, p in zip(ratings, problem.candidates)]
+    if objective == "least_travel":
+        anchor = _anchor(problem)
+        if anchor is None or not problem.candidates:
+            return ratings
+        column = distance_matrix([p.point for p in problem.candidates], [anchor])
+        distances = [row[0] for row in column]
+        return [
+            r / (1 + (UNKNOWN_DISTANCE_KM if d is None or math.isnan(d) else d) / TRAVEL_SCALE_KM)
+            for r, d in zip(ratings, distances)
+        ]
+    return ratings
+
+
+def solve_variant(problem: VariantProblem, objective: str = "rating", seed: Optional[int] = None,
+                  utilities: Optional[Sequence[float]] = None) -> Variant:
+    """Select and schedule one draft; ``utilities`` overrides the objective's values."""
+    values = list(utilities) if utilities is not None else objective_utilities(problem, objective)
+    if seed is not None:
+        rng = random.Random(seed)
+        values = [u * rng.uniform(1 - SHUFFLE_JITTER, 1 + SHUFFLE_JITTER) for u in values]
+    chosen = select_places(
+        [Candidate(place.cost, place.minutes, value) for place, value in zip(problem.candidates, values)],
+        problem.budget,
+        problem.time_left,
+    )
+    places = list(problem.fixed) + [problem.candidates[i] for i in chosen]
+    days = plan_days(
+        [place.point for place in places],
+        [place.minutes for place in places],
+        problem.num_days,
+        start=problem.start,
+        day_start=problem.day_start,
+        windows=[place.windows for place in places],
+    )
+    return Variant(objective, seed, chosen, days)
+
+
+def variant_workers() -> int:
+    return int(os.getenv("ITINERARY_VARIANT_WORKERS", str(min(len(OBJECTIVES), os.cpu_count() or 1))))
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: không fork process web đang chạy nhiều thread. Mỗi worker nạp lại module __main__
+            # (dưới tên __mp_main__) nên server phải chạy từ run.py / gunicorn, không phải `python app.py`
+            _executor = ProcessPoolExecutor(
+                max_workers=variant_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def solve_variants(problem: VariantProblem, specs: Sequence[Tuple[str, Optional[int]]]) -> List[Variant]:
+    """Solve every (objective, seed) spec, in parallel when more than one is asked for."""
+    specs = list(specs)
+    if len(specs) <= 1 or variant_workers() <= 0:
+        return [solve_variant(problem, objective, seed) for objective, seed in specs]
+    try:
+        executor = _get_executor()
+        futures = [executor.submit(solve_variant, problem, objective, seed) for objective, seed in specs]
+        return [future.result() for future in futures]
+    except (BrokenProcessPool, OSError, RuntimeError):
+        # Pool hỏng (worker bị kill, hết tài nguyên...): bỏ pool, giải ngay trong process này
+        shutdown_executor()
+        return [solve_variant(problem, objective, seed) for objective, seed in specs]
@@ -0,0 +1,217 @@
+"""Background jobs for slow AI endpoints, persisted in the app database.
+
+``/api/ai/evaluate_itinerary`` and ``/api/ai/reorder_itinerary`` wait for
+OpenAI inside the request thread, and while the shared rate limiter is
+saturated ``acquire()`` sleeps there for up to a minute. With the job API a
+POST only stores a row (``AiJob``, status ``queued``) and returns its id;
+a small pool of worker threads runs the handlers (still under the same
+rate limiter) and the client polls or long-polls ``GET`` for the result.
+
+Jobs are claimed with a conditional ``UPDATE ... WHERE status = 'queued'``,
+so several worker processes can share one database. Because the state
+lives in the database, queued jobs survive a restart; a job left
+``running`` by a dead worker is picked up again once it is older than
+``AI_JOB_STALE_SECONDS`` and fails after ``MAX_ATTEMPTS`` tries. Workers are
+started lazily on the first submit (``AI_JOB_WORKERS``, ``0`` = none;
+:meth:`JobQueue.run_pending` then runs jobs in the calling thread).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+DEFAULT_WORKERS = 2
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 3
+MAX_WAIT_SECONDS = 30.0
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class JobQueue:
+    """Database-backed job queue with in-process worker threads."""
+
+    def __init__(self) -> None:
+        self._app = None
+        self._db = None
+        self._model = None
+        self._handlers: Dict[str, Callable[[dict], dict]] = {}
+        self.workers = int(os.getenv("AI_JOB_WORKERS", str(DEFAULT_WORKERS)))
+        self.stale_seconds = float(os.getenv("AI_JOB_STALE_SECONDS", "600"))
+        self._threads: List[threading.Thread] = []
+        self._changed = threading.Condition()
+        self._stopping = False
+
+    def configure(self, app, db, job_model) -> None:
+        self._app, self._db, self._model = app, db, job_model
+
+    def register(self, kind: str, handler: Callable[[dict], dict]) -> None:
+        """``handler(payload) -> result``; runs inside an app context, exceptions fail the job."""
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self):
+        return tuple(self._handlers)
+
+    # ----------------- API -----------------
+    def submit(self, kind: str, payload: dict) -> dict:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        job = self._model(
+            id=uuid.uuid4().hex, kind=kind, status=QUEUED, attempts=0,
+            payload_json=json.dumps(payload, ensure_ascii=False), created_at=datetime.utcnow(),
+        )
+        session = self._db.session
+        session.add(job)
+        session.commit()
+        self._start_workers()
+        with self._changed:
+            self._changed.notify_all()
+        return self.describe(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        # populate_existing: đọc lại trạng thái mới nhất (worker ghi bằng session khác)
+        job = self._db.session.get(self._model, job_id, populate_existing=True)
+        return self.describe(job) if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long poll: the job once it is finished, or its current state after ``timeout`` seconds."""
+        deadline = time.monotonic() + min(max(timeout, 0.0), MAX_WAIT_SECONDS)
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            # Worker cùng process báo ngay khi xong; job của process khác thì thấy ở lần đọc kế tiếp
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_SECONDS))
+
+    @staticmethod
+    def describe(job) -> dict:
+        return {
+            "job_id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "result": json.loads(job.result_json) if job.result_json else None,
+            "error": job.error,
+            "attempts": job.attempts,
+            "created_at": _iso(job.created_at),
+            "started_at": _iso(job.started_at),
+            "finished_at": _iso(job.finished_at),
+        }
+
+    # ----------------- xử lý job -----------------
+    def _claimable(self, stale_before: datetime):
+        model = self._model
+        return or_(
+            model.status == QUEUED,
+            and_(model.status == RUNNING, model.started_at < stale_before, model.attempts < MAX_ATTEMPTS),
+        )
+
+    def _claim(self) -> Optional[str]:
+        model, session = self._model, self._db.session
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.stale_seconds)
+        # Worker chết giữa chừng quá MAX_ATTEMPTS lần: bỏ hẳn job
+        session.execute(
+            update(model)
+            .where(model.status == RUNNING, model.started_at < stale_before, model.attempts >= MAX_ATTEMPTS)
+            .values(status=FAILED, error="Job was interrupted too many times.", finished_at=now)
+        )
+        candidates = session.scalars(
+            select(model.id).where(self._claimable(stale_before)).order_by(model.created_at).limit(5)
+        ).all()
+        for job_id in candidates:
+            claimed = session.execute(
+                update(model)
+                .where(model.id == job_id, self._claimable(stale_before))
+                .values(status=RUNNING, started_at=now, attempts=model.attempts + 1)
+            ).rowcount
+            if claimed:
+                session.commit()
+                return job_id
+        session.commit()
+        return None
+
+    def _run(self, job_id: str) -> None:
+        session = self._db.session
+        job = session.get(self._model, job_id, populate_existing=True)
+        try:
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"Unknown job type: {job.kind}")
+            result = handler(json.loads(job.payload_json))
+            status, result_json, error = DONE, json.dumps(result, ensure_ascii=False), None
+        except Exception as exc:
+            logger.exception("AI job %s (%s) failed", job_id, job.kind)
+            session.rollback()
+            status, result_json, error = FAILED, None, str(exc) or exc.__class__.__name__
+        session.execute(
+            update(self._model).where(self._model.id == job_id)
+            .values(status=status, result_json=result_json, error=error, finished_at=datetime.utcnow())
+        )
+        session.commit()
+        with self._changed:
+            self._changed.notify_all()
+
+    def run_pending(self, limit: Optional[int] = None) -> int:
+        """Claim and run queued jobs in this thread (needs an app context); returns how many ran."""
+        ran = 0
+        while limit is None or ran < limit:
+            job_id = self._claim()
+            if job_id is None:
+                break
+            self._run(job_id)
+            ran += 1
+        return ran
+
+    # ----------------- worker threads -----------------
+    def _worker(self) -> None:
+        with self._app.app_context():
+            while not self._stopping:
+                try:
+                    ran = self.run_pending()
+                except Exception:
+                    logger.exception("AI job worker error")
+                    self._db.session.rollback()
+                    ran = 0
+                finally:
+                    self._db.session.remove()
+                if not ran:
+                    with self._changed:
+                        self._changed.wait(POLL_SECONDS)
+
+    def _start_workers(self) -> None:
+        with self._changed:
+            if self._threads or self.workers <= 0:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ai-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+
+ai_job_queue = JobQueue()
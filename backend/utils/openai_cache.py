@@ -0,0 +1,176 @@
+"""Two-tier response cache for OpenAI chat completions.
+
+Tag extraction, travel-planner search and itinerary evaluation send the
+same prompts over and over, and with ``OPENAI_RPM_LIMIT`` at a few calls a
+minute every duplicate can cost a user tens of seconds in
+``SimpleRateLimiter.acquire``. :class:`ResponseCache` keeps replies keyed on
+(model, temperature, hash of the messages):
+
+* an in-process LRU (``OPENAI_CACHE_SIZE`` entries, ``0`` disables the cache),
+* optionally a SQLite file shared by every worker process
+  (``OPENAI_CACHE_PATH``; ``OPENAI_CACHE_DISK_SIZE`` rows, least recently
+  used rows are pruned first).
+
+Both tiers expire entries after ``OPENAI_CACHE_TTL`` seconds. A disk hit is
+copied into the memory tier. Disk errors are logged and treated as misses:
+the cache never fails a request. Hit/miss counters are per process
+(:meth:`ResponseCache.stats`).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_DISK_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 3600.0
+
+
+def response_cache_key(model: str, temperature: float, messages: List[Dict]) -> str:
+    """sha256 of (model, temperature, messages); dict key order in messages does not matter."""
+    payload = json.dumps([model, temperature, messages], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU of key -> reply text, backed by an optional SQLite file."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 path: Optional[str] = None, disk_max_entries: int = DEFAULT_DISK_MAX_ENTRIES) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+        self.disk_max_entries = max(disk_max_entries, 1)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "disk_errors": 0}
+        if self.path:
+            self._disk(self._create_table)
+
+    # ----------------- disk tier -----------------
+    def _disk(self, operation, *args):
+        # Mỗi thao tác một connection ngắn: dùng được từ mọi thread và mọi worker process
+        try:
+            conn = sqlite3.connect(self.path, timeout=5)
+            try:
+                with conn:
+                    return operation(conn, *args)
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            with self._lock:
+                self._counters["disk_errors"] += 1
+            logger.warning("OpenAI response cache (%s): %s", self.path, exc)
+            return None
+
+    @staticmethod
+    def _create_table(conn) -> None:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS openai_responses ("
+            " key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def _disk_get(conn, key: str) -> Optional[Tuple[float, str]]:
+        now = time.time()
+        row = conn.execute(
+            "SELECT reply, expires_at FROM openai_responses WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE openai_responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[1], row[0]
+
+    def _disk_put(self, conn, key: str, reply: str) -> None:
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO openai_responses (key, reply, expires_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, reply, now + self.ttl_seconds, now),
+        )
+        conn.execute(
+            "DELETE FROM openai_responses WHERE expires_at <= ? OR key IN ("
+            " SELECT key FROM openai_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (now, self.disk_max_entries),
+        )
+
+    # ----------------- memory tier -----------------
+    def _remember(self, key: str, expires_at: float, reply: str) -> None:
+        # Gọi khi đang giữ lock; expires_at theo time.monotonic()
+        self._entries[key] = (expires_at, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+        found = self._disk(self._disk_get, key) if self.path else None
+        with self._lock:
+            if found is None:
+                self._counters["misses"] += 1
+                return None
+            expires_at, reply = found
+            # Hạn trên đĩa tính theo time.time(), đổi sang đồng hồ monotonic của tầng bộ nhớ
+            self._remember(key, time.monotonic() + (expires_at - time.time()), reply)
+            self._counters["disk_hits"] += 1
+            return reply
+
+    def put(self, key: str, reply: str) -> None:
+        with self._lock:
+            self._remember(key, time.monotonic() + self.ttl_seconds, reply)
+            self._counters["stores"] += 1
+        if self.path:
+            self._disk(self._disk_put, key, reply)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._disk(lambda conn: conn.execute("DELETE FROM openai_responses"))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries))
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        return stats
+
+
+_shared_cache: ResponseCache | None = None
+_shared_cache_loaded = False
+
+
+def get_shared_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache configured from the environment (``None`` when ``OPENAI_CACHE_SIZE=0``)."""
+    global _shared_cache, _shared_cache_loaded
+    if not _shared_cache_loaded:
+        max_entries = int(os.getenv("OPENAI_CACHE_SIZE", str(DEFAULT_MAX_ENTRIES)))
+        if max_entries > 0:
+            _shared_cache = ResponseCache(
+                max_entries,
+                float(os.getenv("OPENAI_CACHE_TTL", str(DEFAULT_TTL_SECONDS))),
+                path=os.getenv("OPENAI_CACHE_PATH") or None,
+                disk_max_entries=int(os.getenv("OPENAI_CACHE_DISK_SIZE", str(DEFAULT_DISK_MAX_ENTRIES))),
+            )
+        _shared_cache_loaded = True
+    return _shared_cache
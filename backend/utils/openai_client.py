@@ -1,6 +1,6 @@
 import os
 import time
-from typing import List, Dict
+from typing import Dict, Iterator, List
 
 try:
     from openai import OpenAI
@@ -15,9 +15,30 @@ except Exception:  # ImportError or other import-time issues
     APITimeoutError = Exception
     RateLimitError = Exception
 
+from .openai_cache import get_shared_response_cache, response_cache_key
 from .openai_rate_limiter import get_shared_openai_limiter
 
 
+class ReplyStream:
+    """Text deltas of a streamed chat completion; ``close()`` cancels the upstream HTTP request."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def close(self) -> None:
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+
 class OpenAIChatClient:
     """Wrapper around the OpenAI chat completion API."""
 
@@ -26,6 +47,7 @@ class OpenAIChatClient:
         self._model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         self._temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.4"))
         self._rate_limiter = get_shared_openai_limiter()
+        self._cache = get_shared_response_cache()
         self._max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
         self._retry_delay = float(os.getenv("OPENAI_RETRY_DELAY", "5"))
 
@@ -80,11 +102,19 @@ class OpenAIChatClient:
 
         raise RuntimeError("Không thể hoàn thành yêu cầu OpenAI.") from last_exc
 
-    def generate_reply(self, messages: List[Dict[str, str]]) -> str:
+    def generate_reply(self, messages: List[Dict[str, str]], cache: bool = True) -> str:
+        """Chat completion; identical prompts are answered from the response cache unless ``cache=False``."""
         client = self._load_client()
         if client is None:
             raise RuntimeError("OPENAI_API_KEY chưa được cấu hình trên server")
 
+        key = None
+        if cache and self._cache is not None:
+            key = response_cache_key(self._model, self._temperature, messages)
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+
         response = self._run_with_retry(
             lambda: client.chat.completions.create(
                 model=self._model,
@@ -92,7 +122,26 @@ class OpenAIChatClient:
                 temperature=self._temperature,
             )
         )
-        return (response.choices[0].message.content or "").strip()
+        reply = (response.choices[0].message.content or "").strip()
+        if key is not None and reply:
+            self._cache.put(key, reply)
+        return reply
+
+    def stream_reply(self, messages: List[Dict[str, str]]) -> ReplyStream:
+        """Open a streamed chat completion (never cached); rate limiting and retries apply to opening it."""
+        client = self._load_client()
+        if client is None:
+            raise RuntimeError("OPENAI_API_KEY chưa được cấu hình trên server")
+
+        stream = self._run_with_retry(
+            lambda: client.chat.completions.create(
+                model=self._model,
+                messages=messages,
+                temperature=self._temperature,
+                stream=True,
+            )
+        )
+        return ReplyStream(stream)
 
     def generate_multimodal_reply(
         self,
@@ -1,12 +1,30 @@
-"""Lightweight process-wide rate limiter for OpenAI requests."""
+"""Rate limiters for OpenAI requests.
+
+:class:`SimpleRateLimiter` (the default) is a sliding window kept in the
+process, so under gunicorn with N workers the real rate is N times
+``OPENAI_RPM_LIMIT``. With ``OPENAI_RATE_LIMITER=sqlite`` every process on
+the host shares one :class:`SQLiteTokenBucketLimiter` instead: a token
+bucket (``OPENAI_RPM_LIMIT`` tokens, refilled over ``OPENAI_RPM_WINDOW``
+seconds) stored in a SQLite file (``OPENAI_RATE_LIMIT_PATH``, default in the
+temp directory) and updated under ``BEGIN IMMEDIATE``. If the file cannot
+be used the limiter logs the error and falls back to an in-process window,
+so a broken file never blocks requests forever.
+"""
 from __future__ import annotations
 
+import logging
 import os
+import sqlite3
+import tempfile
 import time
 from collections import deque
 from threading import Lock
 from typing import Deque
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT_FILE = "wonderai_openai_rate_limit.sqlite3"
+
 
 class SimpleRateLimiter:
     def __init__(self, max_calls: int, window_seconds: float) -> None:
@@ -34,13 +52,98 @@ class SimpleRateLimiter:
             time.sleep(max(wait_time, 0.05))
 
 
-_shared_limiter: SimpleRateLimiter | None = None
+class SQLiteTokenBucketLimiter:
+    """Token bucket shared by every process that opens the same SQLite file."""
+
+    def __init__(self, max_calls: int, window_seconds: float, path: str, name: str = "openai") -> None:
+        if max_calls <= 0:
+            raise ValueError("max_calls must be positive")
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        self.max_calls = max_calls
+        self.window_seconds = window_seconds
+        self.path = path
+        self.name = name
+        self._refill_per_second = max_calls / window_seconds
+        # Dự phòng khi file SQLite lỗi: vẫn giới hạn trong process
+        self._fallback = SimpleRateLimiter(max_calls, window_seconds)
+        self._connect(self._create_table)
+
+    def _connect(self, operation):
+        # Mỗi lần một connection ngắn (dùng được từ mọi thread); isolation_level=None để tự BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            return operation(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create_table(conn) -> None:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _take(self, conn) -> float:
+        """Take one token; returns 0 on success, otherwise seconds until the next token."""
+        # BEGIN IMMEDIATE giữ khóa ghi: các process khác chờ đến khi giao dịch này xong
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = float(self.max_calls) if row is None else row[0] + max(now - row[1], 0.0) * self._refill_per_second
+            tokens = min(tokens, float(self.max_calls))
+            wait_time = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait_time = (1.0 - tokens) / self._refill_per_second
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+            return wait_time
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self) -> None:
+        """Block until a token is available in the shared bucket."""
+        while True:
+            try:
+                wait_time = self._connect(self._take)
+            except sqlite3.Error as exc:
+                logger.warning("OpenAI rate limiter (%s): %s; using the in-process limiter", self.path, exc)
+                self._fallback.acquire()
+                return
+            if wait_time <= 0:
+                return
+            time.sleep(max(wait_time, 0.05))
+
+
+_shared_limiter: SimpleRateLimiter | SQLiteTokenBucketLimiter | None = None
 
 
-def get_shared_openai_limiter() -> SimpleRateLimiter:
+def get_shared_openai_limiter() -> SimpleRateLimiter | SQLiteTokenBucketLimiter:
     global _shared_limiter
     if _shared_limiter is None:
         max_calls = int(os.getenv("OPENAI_RPM_LIMIT", "3"))
         window = float(os.getenv("OPENAI_RPM_WINDOW", "60"))
-        _shared_limiter = SimpleRateLimiter(max_calls, window)
+        backend = os.getenv("OPENAI_RATE_LIMITER", "memory").strip().lower()
+        if backend == "sqlite":
+            path = os.getenv("OPENAI_RATE_LIMIT_PATH") or os.path.join(
+                tempfile.gettempdir(), DEFAULT_RATE_LIMIT_FILE
+            )
+            try:
+                _shared_limiter = SQLiteTokenBucketLimiter(max_calls, window, path)
+            except sqlite3.Error as exc:
+                logger.warning("OpenAI rate limiter (%s): %s; using the in-process limiter", path, exc)
+        elif backend != "memory":
+            logger.warning("Unknown OPENAI_RATE_LIMITER=%r; using the in-process limiter", backend)
+        if _shared_limiter is None:
+            _shared_limiter = SimpleRateLimiter(max_calls, window)
     return _shared_limiter
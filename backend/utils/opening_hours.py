@@ -0,0 +1,130 @@
+"""Opening-hours parsing into precompiled minute-of-day time windows.
+
+``Destination.opening_hours`` is free text ("07:00 - 17:00",
+"Thứ Hai-Chủ Nhật: 08:00-17:00", "Sáng: 07:30 - 11:30, Chiều: 13:30 -
+17:00", "Cả ngày"...). It is parsed once, when the destination is written
+(flush hook) or by ``seed.py`` / ``flask opening-hours-reindex``, into
+``Destination.opening_windows``: a compact JSON array of ``[open, close]``
+minute-of-day pairs such as ``[[450,690],[810,1020]]``. The itinerary
+scheduler only decodes that array; free text is never parsed on the
+request path.
+
+Weekday qualifiers are ignored (trips are not bound to weekdays yet), so
+the windows are the union of every time range in the text. Text without a
+recognisable range gives ``None`` (no constraint), except for "all day"
+wording, which gives ``[[0, 1440]]``.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .catalog_cache import mark_catalog_changed
+
+MINUTES_PER_DAY = 24 * 60
+ALL_DAY = ((0, MINUTES_PER_DAY),)
+# Giờ hành chính: 07:30 - 11:30, 13:30 - 17:00
+OFFICE_HOURS = ((450, 690), (810, 1020))
+
+Window = Tuple[int, int]
+
+# 7:00, 07:30, 7h30, 7h:30, 22h00, 7h
+_TIME = r"(\d{1,2})\s*(?:h\s*:?\s*|:\s*)(\d{2})?\s*h?"
+_RANGE_RE = re.compile(_TIME + r"\s*(?:-|–|—|đến|to)\s*" + _TIME, re.IGNORECASE)
+_ALL_DAY_RE = re.compile(r"cả ngày|24/7|24/24|tự do|không giới hạn", re.IGNORECASE)
+_OFFICE_RE = re.compile(r"giờ hành chính", re.IGNORECASE)
+
+
+def _minute(hours: str, minutes: Optional[str]) -> Optional[int]:
+    h, m = int(hours), int(minutes or 0)
+    if h > 24 or m > 59 or (h == 24 and m):
+        return None
+    return h * 60 + m
+
+
+def merge_windows(windows: Sequence[Window]) -> List[Window]:
+    merged: List[Window] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_opening_hours(text: Optional[str]) -> Optional[List[Window]]:
+    """Free-text opening hours -> sorted, merged ``(open, close)`` minute windows (or None)."""
+    if not text or not str(text).strip() or str(text).strip().lower() == "none":
+        return None
+    text = str(text)
+    windows: List[Window] = []
+    for match in _RANGE_RE.finditer(text):
+        start = _minute(match.group(1), match.group(2))
+        end = _minute(match.group(3), match.group(4))
+        if start is None or end is None or start == end:
+            continue
+        if end < start:
+            # Qua nửa đêm (vd. 18:00 - 02:00): tách thành hai khoảng trong ngày
+            windows.extend([(start, MINUTES_PER_DAY), (0, end)])
+        else:
+            windows.append((start, end))
+    if windows:
+        return merge_windows(windows)
+    if _ALL_DAY_RE.search(text) or text.strip().lower() in ("mở cả ngày", "mở cửa cả ngày"):
+        return list(ALL_DAY)
+    if _OFFICE_RE.search(text):
+        return list(OFFICE_HOURS)
+    return None
+
+
+def encode_windows(windows: Optional[Sequence[Window]]) -> Optional[str]:
+    if windows is None:
+        return None
+    return json.dumps([[start, end] for start, end in windows], separators=(",", ":"))
+
+
+def decode_windows(value: Optional[str]) -> Optional[List[Window]]:
+    if not value:
+        return None
+    try:
+        return [(int(start), int(end)) for start, end in json.loads(value)]
+    except (ValueError, TypeError):
+        return None
+
+
+def rebuild_opening_windows(session: Session, destination_model) -> int:
+    """Re-parse ``opening_hours`` for every destination; returns how many have windows."""
+    table = destination_model.__table__
+    connection = session.connection()
+    changed = []
+    count = 0
+    for row in connection.execute(select(table.c.id, table.c.opening_hours, table.c.opening_windows)):
+        encoded = encode_windows(parse_opening_hours(row.opening_hours))
+        count += encoded is not None
+        if encoded != row.opening_windows:
+            changed.append({"_id": row.id, "_windows": encoded})
+    if changed:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(opening_windows=bindparam("_windows")),
+            changed,
+        )
+        mark_catalog_changed(session)
+    session.expire_all()
+    return count
+
+
+def install_opening_hours_listeners(destination_model) -> None:
+    """Recompute ``opening_windows`` whenever ``opening_hours`` is flushed."""
+
+    @event.listens_for(Session, "before_flush")
+    def _opening_hours_before_flush(session, flush_context, instances):
+        for obj in session.new:
+            if isinstance(obj, destination_model):
+                obj.opening_windows = encode_windows(parse_opening_hours(obj.opening_hours))
+        for obj in session.dirty:
+            if isinstance(obj, destination_model) and inspect(obj).attrs.opening_hours.history.has_changes():
+                obj.opening_windows = encode_windows(parse_opening_hours(obj.opening_hours))
@@ -0,0 +1,104 @@
+"""Keyset (cursor) pagination helpers for destination listings.
+
+Pages are ordered by ``rating DESC, id DESC`` and the cursor is the
+(rating, id) pair of the last row returned, so every page is a range scan on
+the (rating, id) index instead of an OFFSET over the whole table.
+
+Full-text results keep their BM25 order instead: :func:`fetch_ranked_page`
+pages on ``rank ASC, id ASC`` and its cursor carries the (rank, id) pair.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Mapping, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPageParams(ValueError):
+    """Raised when ``limit``/``cursor`` query parameters cannot be parsed."""
+
+
+def encode_cursor(rating: Optional[float], row_id: int) -> str:
+    raw = json.dumps([rating, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[float], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rating, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if rating is not None:
+            rating = float(rating)
+        if not isinstance(row_id, int):
+            raise TypeError("id must be an integer")
+        return rating, row_id
+    except (ValueError, TypeError, UnicodeEncodeError) as exc:
+        raise InvalidPageParams("Invalid cursor.") from exc
+
+
+def parse_page_args(args: Mapping[str, Any]) -> Optional[Tuple[int, Optional[Tuple[Optional[float], int]]]]:
+    """Return (limit, decoded cursor) or None when the client did not ask for paging."""
+    raw_limit = args.get("limit")
+    raw_cursor = args.get("cursor")
+    if raw_limit in (None, "") and not raw_cursor:
+        return None
+
+    limit = DEFAULT_PAGE_SIZE
+    if raw_limit not in (None, ""):
+        try:
+            limit = int(raw_limit)
+        except (TypeError, ValueError) as exc:
+            raise InvalidPageParams("limit must be an integer.") from exc
+        if limit <= 0:
+            raise InvalidPageParams("limit must be positive.")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = decode_cursor(raw_cursor) if raw_cursor else None
+    return limit, cursor
+
+
+def fetch_keyset_page(query, rating_col, id_col, cursor, limit: int, key):
+    """Fetch one page ordered by (rating DESC, id DESC) and return (rows, next_cursor).
+
+    Rows with a rating are read with a row-value range seek on the index;
+    rows whose rating is NULL come after them (ordered by id) and are only
+    queried once the rated rows run out, so neither query needs an OR that
+    would turn the seek into a scan.
+    """
+    rows = []
+    if cursor is None or cursor[0] is not None:
+        rated = query.filter(rating_col.isnot(None))
+        if cursor is not None:
+            rated = rated.filter(tuple_(rating_col, id_col) < tuple_(*cursor))
+        rows = rated.order_by(rating_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        unrated = query.filter(rating_col.is_(None))
+        if cursor is not None and cursor[0] is None:
+            unrated = unrated.filter(id_col < cursor[1])
+        rows += unrated.order_by(id_col.desc()).limit(limit + 1 - len(rows)).all()
+    return split_page(rows, limit, key)
+
+
+def fetch_ranked_page(query, rank_col, id_col, cursor, limit: int, key):
+    """Fetch one page of full-text matches ordered by (rank ASC, id ASC); lower rank is better."""
+    if cursor is not None:
+        if cursor[0] is None:
+            raise InvalidPageParams("Invalid cursor.")
+        query = query.filter(tuple_(rank_col, id_col) > tuple_(*cursor))
+    rows = query.order_by(rank_col, id_col).limit(limit + 1).all()
+    return split_page(rows, limit, key)
+
+
+def split_page(rows, limit: int, key):
+    """Trim the look-ahead row and build ``next_cursor`` from the last kept row."""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    rating, row_id = key(rows[-1])
+    return rows, encode_cursor(rating, row_id)
@@ -0,0 +1,155 @@
+"""Budget- and time-constrained place selection for generated itineraries.
+
+Picking places greedily by rating lets one expensive top-rated place crowd
+out several good cheap ones. :func:`select_places` instead maximizes the
+total utility (rating by default) subject to
+
+* the remaining budget (``None`` = unlimited), and
+* the time available over all days (visit duration plus a travel allowance
+  per stop),
+
+with a 0/1 knapsack DP over discretized costs and time units. Costs and
+durations are rounded *up* into buckets, so a DP solution always fits the
+real limits. Any capacity left over from rounding is then filled greedily.
+The DP is vectorized with NumPy when installed; inputs too large for the DP
+(see ``MAX_DP_CELLS``) use a value-density greedy instead.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, NamedTuple, Optional, Sequence
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+COST_BUCKETS = 100
+TIME_UNIT_MIN = 15
+# Thời gian di chuyển dự trù cho mỗi điểm khi chọn (xếp lịch thật ở utils/itinerary_planner)
+TRAVEL_ALLOWANCE_MIN = 15
+# Số ô DP tối đa (số ứng viên x mức thời gian x mức chi phí) trước khi chuyển sang greedy
+MAX_DP_CELLS = 30_000_000
+MAX_DP_CELLS_PYTHON = 500_000
+
+
+class Candidate(NamedTuple):
+    cost: float
+    minutes: int
+    utility: float
+
+
+def _weights(candidate: Candidate, budget: Optional[float], buckets: int) -> tuple:
+    time_units = math.ceil((candidate.minutes + TRAVEL_ALLOWANCE_MIN) / TIME_UNIT_MIN)
+    if budget is None:
+        return time_units, 0
+    # Làm tròn lên: tổng chi phí theo bucket không vượt ngân sách thì chi phí thật cũng vậy
+    cost_units = math.ceil(max(candidate.cost, 0.0) * buckets / budget - 1e-9) if budget > 0 else (
+        0 if candidate.cost <= 0 else buckets + 1
+    )
+    return time_units, cost_units
+
+
+def _dp_numpy(weights, values, time_cap: int, cost_cap: int) -> List[int]:
+    best = np.zeros((time_cap + 1, cost_cap + 1))
+    taken = []
+    for (wt, wc), value in zip(weights, values):
+        if wt > time_cap or wc > cost_cap:
+            taken.append(None)
+            continue
+        with_item = best[:time_cap + 1 - wt, :cost_cap + 1 - wc] + value
+        take = np.zeros(best.shape, dtype=bool)
+        take[wt:, wc:] = with_item > best[wt:, wc:]
+        best[wt:, wc:] = np.maximum(best[wt:, wc:], with_item)
+        taken.append(take)
+    chosen = []
+    t, c = time_cap, cost_cap
+    for index in range(len(weights) - 1, -1, -1):
+        take = taken[index]
+        if take is not None and take[t, c]:
+            chosen.append(index)
+            t -= weights[index][0]
+            c -= weights[index][1]
+    return chosen
+
+
+def _dp_python(weights, values, time_cap: int, cost_cap: int) -> List[int]:
+    width = cost_cap + 1
+    best = [0.0] * ((time_cap + 1) * width)
+    taken = []
+    for (wt, wc), value in zip(weights, values):
+        take = set()
+        if wt <= time_cap and wc <= cost_cap:
+            # Duyệt ngược để mỗi điểm chỉ được chọn một lần
+            for t in range(time_cap, wt - 1, -1):
+                row, src = t * width, (t - wt) * width
+                for c in range(cost_cap, wc - 1, -1):
+                    candidate = best[src + c - wc] + value
+                    if candidate > best[row + c]:
+                        best[row + c] = candidate
+                        take.add(row + c)
+        taken.append(take)
+    chosen = []
+    t, c = time_cap, cost_cap
+    for index in range(len(weights) - 1, -1, -1):
+        if t * width + c in taken[index]:
+            chosen.append(index)
+            t -= weights[index][0]
+            c -= weights[index][1]
+    return chosen
+
+
+def _greedy(weights, values, time_cap: int, cost_cap: int) -> List[int]:
+    # Mật độ giá trị: utility / phần tài nguyên (thời gian + ngân sách) mà điểm chiếm
+    def density(i):
+        wt, wc = weights[i]
+        return values[i] / (wt / max(time_cap, 1) + wc / max(cost_cap, 1) + 1e-9)
+
+    chosen = []
+    t, c = time_cap, cost_cap
+    for i in sorted(range(len(weights)), key=density, reverse=True):
+        wt, wc = weights[i]
+        if wt <= t and wc <= c:
+            chosen.append(i)
+            t -= wt
+            c -= wc
+    return chosen
+
+
+def select_places(candidates: Sequence[Candidate], budget: Optional[float], time_capacity_minutes: int,
+                  cost_buckets: int = COST_BUCKETS, use_numpy: Optional[bool] = None) -> List[int]:
+    """Indices (ascending) of the candidates that maximize total utility within both limits."""
+    if not candidates or time_capacity_minutes <= 0:
+        return []
+    if budget is not None and budget < 0:
+        budget = 0.0
+    time_cap = time_capacity_minutes // TIME_UNIT_MIN
+    cost_cap = cost_buckets if budget is not None else 0
+    weights = [_weights(candidate, budget, cost_buckets) for candidate in candidates]
+    values = [max(candidate.utility, 0.0) for candidate in candidates]
+
+    numpy_ok = np is not None if use_numpy is None else (use_numpy and np is not None)
+    cells = len(candidates) * (time_cap + 1) * (cost_cap + 1)
+    if numpy_ok and cells <= MAX_DP_CELLS:
+        chosen = set(_dp_numpy(weights, values, time_cap, cost_cap))
+    elif cells <= MAX_DP_CELLS_PYTHON:
+        chosen = set(_dp_python(weights, values, time_cap, cost_cap))
+    else:
+        chosen = set(_greedy(weights, values, time_cap, cost_cap))
+
+    # Lấp phần dư (do làm tròn bucket, hoặc điểm utility 0) theo thứ tự ưu tiên ban đầu
+    minutes_left = time_capacity_minutes - sum(
+        candidates[i].minutes + TRAVEL_ALLOWANCE_MIN for i in chosen
+    )
+    money_left = None if budget is None else budget - sum(max(candidates[i].cost, 0.0) for i in chosen)
+    for i, candidate in enumerate(candidates):
+        if i in chosen:
+            continue
+        need = candidate.minutes + TRAVEL_ALLOWANCE_MIN
+        cost = max(candidate.cost, 0.0)
+        if need <= minutes_left and (money_left is None or cost <= money_left + 1e-9):
+            chosen.add(i)
+            minutes_left -= need
+            if money_left is not None:
+                money_left -= cost
+    return sorted(chosen)
@@ -0,0 +1,57 @@
+"""Precomputed place-type classification for destinations.
+
+Whether a destination is somewhere to stay (hotel, resort, homestay...) used
+to be decided per request with ``lower(place_type) LIKE`` chains. It is now
+stored in the indexed ``Destination.is_accommodation`` column, set by a
+flush hook whenever ``place_type`` is written and recomputed by ``seed.py``
+and ``flask accommodation-reindex``.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .catalog_cache import mark_catalog_changed
+
+ACCOMMODATION_KEYWORDS = ("hotel", "accommodation", "resort", "motel", "homestay")
+
+
+def is_accommodation_type(place_type: Optional[str]) -> bool:
+    value = (place_type or "").lower()
+    return any(keyword in value for keyword in ACCOMMODATION_KEYWORDS)
+
+
+def rebuild_accommodation_flags(session: Session, destination_model) -> int:
+    """Recompute ``is_accommodation`` for every destination; returns the number of accommodations."""
+    table = destination_model.__table__
+    connection = session.connection()
+    changed = []
+    count = 0
+    for row in connection.execute(select(table.c.id, table.c.place_type, table.c.is_accommodation)):
+        flag = is_accommodation_type(row.place_type)
+        count += flag
+        if flag != row.is_accommodation:
+            changed.append({"_id": row.id, "_flag": flag})
+    if changed:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(is_accommodation=bindparam("_flag")),
+            changed,
+        )
+        mark_catalog_changed(session)
+    session.expire_all()
+    return count
+
+
+def install_accommodation_listeners(destination_model) -> None:
+    """Keep ``is_accommodation`` in sync with ``place_type`` on flush."""
+
+    @event.listens_for(Session, "before_flush")
+    def _accommodation_before_flush(session, flush_context, instances):
+        for obj in session.new:
+            if isinstance(obj, destination_model):
+                obj.is_accommodation = is_accommodation_type(obj.place_type)
+        for obj in session.dirty:
+            if isinstance(obj, destination_model) and inspect(obj).attrs.place_type.history.has_changes():
+                obj.is_accommodation = is_accommodation_type(obj.place_type)
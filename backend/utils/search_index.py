@@ -0,0 +1,182 @@
+"""SQLite FTS5 full-text index over the destination catalog.
+
+``destinations_fts`` holds one row per destination (rowid = destination id)
+with unaccented, lower-cased text for the name, province name, flattened
+description and tags. It is kept in sync by SQLAlchemy flush hooks (API
+writes and ``seed.py``) and can be rebuilt with ``flask search-reindex``.
+Search call sites join against :func:`ranked_match_subquery` and order by
+BM25; on databases without FTS5 they keep their ILIKE fallback.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import Float, Integer, select, text
+from sqlalchemy.orm import Session
+from unidecode import unidecode
+
+from .sqlite_index import VirtualTableIndex, chunks
+
+FTS_TABLE = "destinations_fts"
+FTS_COLUMNS = ("name", "province", "description", "tags")
+# Trọng số BM25 theo thứ tự cột: tên > tỉnh > tags > mô tả
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_index = VirtualTableIndex(
+    FTS_TABLE,
+    "rowid",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{', '.join(FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')",
+    pending_key="search_index_pending",
+)
+
+
+def normalize_text(value) -> str:
+    """Flatten JSON lists/strings into unaccented lower-case text."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped[:1] in ("[", "{", '"'):
+            try:
+                value = json.loads(stripped)
+            except (json.JSONDecodeError, TypeError):
+                pass
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(normalize_text(item) for item in value if item)
+    return unidecode(str(value)).lower()
+
+
+def build_match_expression(term: str, columns: Optional[Sequence[str]] = None) -> Optional[str]:
+    """Turn free text into an FTS5 prefix query (every token must match)."""
+    tokens = _TOKEN_RE.findall(unidecode(term or "").lower())
+    if not tokens:
+        return None
+    expression = " AND ".join(f'"{token}"*' for token in tokens)
+    if columns:
+        return "{%s} : (%s)" % (" ".join(columns), expression)
+    return expression
+
+
+def ranked_match_subquery(term: str, columns: Optional[Sequence[str]] = None, name: str = "fts"):
+    """Subquery of (destination_id, rank) for rows matching ``term``; lower rank is better."""
+    expression = build_match_expression(term, columns)
+    if expression is None:
+        return None
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return (
+        text(
+            f"SELECT rowid AS destination_id, bm25({FTS_TABLE}, {weights}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query"
+        )
+        .bindparams(fts_query=expression)
+        .columns(destination_id=Integer, rank=Float)
+        .subquery(name)
+    )
+
+
+def search_index_available(session: Session) -> bool:
+    return _index.available(session.connection())
+
+
+def create_search_index(connection) -> bool:
+    return _index.create(connection)
+
+
+def drop_search_index(connection) -> None:
+    _index.drop(connection)
+
+
+def _document_rows(connection, destination_table, province_table, where=None):
+    d, p = destination_table.c, province_table.c
+    stmt = select(
+        d.id, d.name, d.name_unaccented, d.description, d.tags,
+        p.name.label("province_name"), p.name_unaccented.label("province_unaccented"),
+    ).select_from(destination_table.outerjoin(province_table, p.id == d.province_id))
+    if where is not None:
+        stmt = stmt.where(where)
+    for row in connection.execute(stmt):
+        yield (
+            row.id,
+            row.name_unaccented or normalize_text(row.name),
+            row.province_unaccented or normalize_text(row.province_name),
+            normalize_text(row.description),
+            normalize_text(row.tags),
+        )
+
+
+def _insert_documents(connection, rows: Iterable[tuple]) -> int:
+    rows = list(rows)
+    if rows:
+        connection.exec_driver_sql(
+            f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
+
+def index_destinations(connection, destination_table, province_table,
+                       ids: Optional[Iterable[int]] = None,
+                       province_ids: Optional[Iterable[int]] = None) -> int:
+    """(Re)index the given destinations / provinces; no filters = full rebuild."""
+    if not _index.available(connection):
+        return 0
+    if ids is None and province_ids is None:
+        _index.clear(connection)
+        return _insert_documents(connection, _document_rows(connection, destination_table, province_table))
+
+    count = 0
+    for province_chunk in chunks(sorted(set(province_ids or ()))):
+        where = destination_table.c.province_id.in_(province_chunk)
+        rows = list(_document_rows(connection, destination_table, province_table, where))
+        _index.remove(connection, [row[0] for row in rows])
+        count += _insert_documents(connection, rows)
+    id_list = sorted(set(ids or ()))
+    if id_list:
+        _index.remove(connection, id_list)
+        for chunk in chunks(id_list):
+            where = destination_table.c.id.in_(chunk)
+            count += _insert_documents(connection, _document_rows(connection, destination_table, province_table, where))
+    return count
+
+
+def rebuild_search_index(session: Session, destination_model, province_model) -> int:
+    connection = session.connection()
+    create_search_index(connection)
+    return index_destinations(connection, destination_model.__table__, province_model.__table__)
+
+
+def install_search_index_listeners(metadata, destination_model, province_model) -> None:
+    """Keep ``destinations_fts`` in sync with flushed Destination/Province rows."""
+    destination_table = destination_model.__table__
+    province_table = province_model.__table__
+
+    def collect(session, pending):
+        for obj in list(session.new) + list(session.dirty):
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            if isinstance(obj, destination_model):
+                pending["upsert"].append(obj)
+            elif isinstance(obj, province_model) and obj not in session.new:
+                pending["provinces"].add(obj.id)
+        for obj in session.deleted:
+            if isinstance(obj, destination_model) and obj.id is not None:
+                pending["delete"].add(obj.id)
+
+    def apply(connection, pending):
+        # id của bản ghi mới chỉ có sau khi flush
+        upsert_ids = {obj.id for obj in pending["upsert"] if obj.id is not None} - pending["delete"]
+        if pending["delete"]:
+            _index.remove(connection, pending["delete"])
+        index_destinations(connection, destination_table, province_table,
+                           ids=upsert_ids, province_ids=pending["provinces"])
+
+    _index.install_listeners(
+        metadata, lambda: {"upsert": [], "delete": set(), "provinces": set()}, collect, apply
+    )
@@ -0,0 +1,107 @@
+"""Shared plumbing for the catalog's SQLite virtual-table indexes.
+
+:mod:`utils.search_index` (FTS5) and :mod:`utils.geo_index` (R*Tree) each
+keep one virtual table keyed by destination id. :class:`VirtualTableIndex`
+holds what they share: the per-engine "does the table exist" check,
+create/drop, deleting rows by id, and the flush hooks that collect changed
+rows before a flush and re-index them after it. :func:`chunks` splits id
+lists for ``IN`` queries and is used by other batched loaders as well.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Giới hạn số tham số trong mệnh đề IN của SQLite
+CHUNK_SIZE = 500
+
+
+def chunks(ids: Sequence, size: Optional[int] = None) -> Iterator[Sequence]:
+    size = size or CHUNK_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class VirtualTableIndex:
+    """One SQLite virtual table (rowid/``key_column`` = destination id) kept in sync on flush."""
+
+    def __init__(self, table: str, key_column: str, create_sql: str, pending_key: str) -> None:
+        self.table = table
+        self.key_column = key_column
+        self.create_sql = create_sql
+        self.pending_key = pending_key
+        # Engine đã thấy có bảng. Chỉ nhớ kết quả "có": bảng có thể được tạo sau khi server
+        # đã chạy (seed.py, lệnh reindex ở process khác), khi đó lần kiểm tra sau sẽ thấy
+        self._available: Dict[int, bool] = {}
+
+    def available(self, connection) -> bool:
+        if connection.dialect.name != "sqlite":
+            return False
+        key = id(connection.engine)
+        if key not in self._available:
+            row = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.table,)
+            ).first()
+            if row is None:
+                return False
+            self._available[key] = True
+        return True
+
+    def create(self, connection) -> bool:
+        if connection.dialect.name != "sqlite":
+            return False
+        connection.exec_driver_sql(self.create_sql)
+        self._available[id(connection.engine)] = True
+        return True
+
+    def drop(self, connection) -> None:
+        if connection.dialect.name != "sqlite":
+            return
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {self.table}")
+        self._available.pop(id(connection.engine), None)
+
+    def clear(self, connection) -> None:
+        connection.exec_driver_sql(f"DELETE FROM {self.table}")
+
+    def remove(self, connection, ids: Iterable[int]) -> None:
+        for chunk in chunks(sorted(set(ids))):
+            placeholders = ", ".join("?" for _ in chunk)
+            connection.exec_driver_sql(
+                f"DELETE FROM {self.table} WHERE {self.key_column} IN ({placeholders})", tuple(chunk)
+            )
+
+    def install_listeners(self, metadata, new_pending: Callable[[], dict],
+                          collect: Callable[[Session, dict], None],
+                          apply: Callable[[object, dict], None]) -> None:
+        """Flush hooks: ``collect(session, pending)`` before a flush, ``apply(connection, pending)`` after it.
+
+        ``apply`` only runs when something was collected and the table exists; the
+        table is created / dropped together with ``metadata``.
+        """
+
+        @event.listens_for(Session, "before_flush")
+        def _index_before_flush(session, flush_context, instances):
+            collect(session, session.info.setdefault(self.pending_key, new_pending()))
+
+        @event.listens_for(Session, "after_flush")
+        def _index_after_flush(session, flush_context):
+            pending = session.info.pop(self.pending_key, None)
+            if not pending or not any(pending.values()):
+                return
+            connection = session.connection()
+            if self.available(connection):
+                apply(connection, pending)
+
+        @event.listens_for(Session, "after_soft_rollback")
+        def _index_after_rollback(session, previous_transaction):
+            session.info.pop(self.pending_key, None)
+
+        @event.listens_for(metadata, "after_create")
+        def _index_after_create(target, connection, **kw):
+            self.create(connection)
+
+        @event.listens_for(metadata, "before_drop")
+        def _index_before_drop(target, connection, **kw):
+            self.drop(connection)
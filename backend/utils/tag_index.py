@@ -0,0 +1,221 @@
+"""Normalized destination tags and an in-memory inverted index over them.
+
+``Destination.tags`` stays the JSON column used for display; the ``tags`` /
+``destination_tags`` tables are derived from it by a flush hook (API writes
+and ``seed.py``). :data:`tag_index` maps each tag (case-insensitive) to a
+sorted array of destination ids, so multi-tag filters are set intersections
+and the tag vocabulary is a dictionary read. The index is rebuilt lazily
+whenever the catalog version changes - including rebuilds done by
+``seed.py`` or ``flask tags-reindex`` in another process, which bump the
+shared ``catalog_meta`` version (:func:`rebuild_destination_tags` calls
+:func:`~utils.catalog_cache.mark_catalog_changed`).
+"""
+from __future__ import annotations
+
+import json
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from .catalog_cache import get_catalog_version, mark_catalog_changed
+
+_PENDING_KEY = "tag_index_pending"
+_CHUNK_SIZE = 500
+
+
+def parse_tags(raw) -> List[str]:
+    """Decode the JSON ``tags`` column into a de-duplicated list of names."""
+    if not raw:
+        return []
+    values = raw
+    if isinstance(raw, str):
+        try:
+            values = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            values = raw.split(",")
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, (list, tuple)):
+        return []
+    names, seen = [], set()
+    for value in values:
+        name = str(value).strip() if value is not None else ""
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def _intersect_sorted(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    """Intersect two sorted id arrays, binary-searching the longer one."""
+    if len(a) > len(b):
+        a, b = b, a
+    result, lo = [], 0
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == len(b):
+            break
+        if b[lo] == value:
+            result.append(value)
+    return result
+
+
+class TagIndex:
+    """tag key (lower-case) -> sorted ``array('l')`` of destination ids."""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, array] = {}
+        self._names: Dict[str, str] = {}
+        self._version: Optional[int] = None
+        self._lock = Lock()
+        self._tag_table = None
+        self._link_table = None
+
+    def configure(self, tag_table, link_table) -> None:
+        self._tag_table = tag_table
+        self._link_table = link_table
+        self._version = None
+
+    def invalidate(self) -> None:
+        self._version = None
+
+    def _ensure_loaded(self, session: Session) -> None:
+        version = get_catalog_version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version == version:
+                return
+            t, link = self._tag_table.c, self._link_table.c
+            rows = session.execute(
+                select(t.name_key, t.name, link.destination_id)
+                .select_from(self._link_table.join(self._tag_table, t.id == link.tag_id))
+                .order_by(t.name_key, link.destination_id)
+            )
+            postings: Dict[str, array] = {}
+            names: Dict[str, str] = {}
+            for key, name, dest_id in rows:
+                if key not in postings:
+                    postings[key] = array("l")
+                    names[key] = name
+                postings[key].append(dest_id)
+            self._postings, self._names, self._version = postings, names, version
+
+    def ids_for(self, session: Session, tags: Iterable[str]) -> List[int]:
+        """Sorted ids of destinations carrying ALL the given tags."""
+        self._ensure_loaded(session)
+        keys = {tag.strip().lower() for tag in tags if tag and tag.strip()}
+        if not keys:
+            return []
+        lists = [self._postings.get(key) for key in keys]
+        if any(ids is None for ids in lists):
+            return []
+        lists.sort(key=len)
+        result = list(lists[0])
+        for ids in lists[1:]:
+            result = _intersect_sorted(result, ids)
+            if not result:
+                break
+        return result
+
+    def vocabulary(self, session: Session) -> List[str]:
+        """All tag names, most used first."""
+        self._ensure_loaded(session)
+        return [
+            self._names[key]
+            for key in sorted(self._postings, key=lambda k: (-len(self._postings[k]), k))
+        ]
+
+
+tag_index = TagIndex()
+
+
+def _tag_ids(connection, tag_table, names: Iterable[str]) -> Dict[str, int]:
+    """Map tag key -> id, creating missing ``tags`` rows."""
+    by_key = {}
+    for name in names:
+        by_key.setdefault(name.lower(), name)
+    if not by_key:
+        return {}
+    t = tag_table.c
+    keys = sorted(by_key)
+    found: Dict[str, int] = {}
+    for start in range(0, len(keys), _CHUNK_SIZE):
+        chunk = keys[start:start + _CHUNK_SIZE]
+        found.update(connection.execute(select(t.name_key, t.id).where(t.name_key.in_(chunk))).all())
+    missing = [{"name": by_key[key], "name_key": key} for key in keys if key not in found]
+    if missing:
+        connection.execute(insert(tag_table), missing)
+        for start in range(0, len(missing), _CHUNK_SIZE):
+            chunk = [row["name_key"] for row in missing[start:start + _CHUNK_SIZE]]
+            found.update(connection.execute(select(t.name_key, t.id).where(t.name_key.in_(chunk))).all())
+    return found
+
+
+def sync_destination_tags(connection, destination_table, tag_table, link_table,
+                          ids: Optional[Iterable[int]] = None) -> int:
+    """Rewrite ``destination_tags`` from ``destinations.tags`` (None = every row)."""
+    d, link = destination_table.c, link_table.c
+    stmt = select(d.id, d.tags)
+    if ids is None:
+        connection.execute(delete(link_table))
+        rows = connection.execute(stmt).all()
+    else:
+        id_list = sorted(set(ids))
+        rows = []
+        for start in range(0, len(id_list), _CHUNK_SIZE):
+            chunk = id_list[start:start + _CHUNK_SIZE]
+            connection.execute(delete(link_table).where(link.destination_id.in_(chunk)))
+            rows.extend(connection.execute(stmt.where(d.id.in_(chunk))).all())
+
+    parsed = [(dest_id, parse_tags(raw)) for dest_id, raw in rows]
+    tag_ids = _tag_ids(connection, tag_table, (name for _, names in parsed for name in names))
+    links = [
+        {"destination_id": dest_id, "tag_id": tag_ids[name.lower()]}
+        for dest_id, names in parsed
+        for name in names
+    ]
+    if links:
+        connection.execute(insert(link_table), links)
+    return len(links)
+
+
+def rebuild_destination_tags(session: Session, destination_model, tag_model, link_table) -> int:
+    count = sync_destination_tags(
+        session.connection(), destination_model.__table__, tag_model.__table__, link_table
+    )
+    mark_catalog_changed(session)
+    tag_index.invalidate()
+    return count
+
+
+def install_tag_listeners(destination_model, tag_model, link_table) -> None:
+    """Keep ``destination_tags`` in sync with flushed ``Destination.tags`` values."""
+    destination_table = destination_model.__table__
+    tag_table = tag_model.__table__
+    tag_index.configure(tag_table, link_table)
+
+    @event.listens_for(Session, "before_flush")
+    def _tags_before_flush(session, flush_context, instances):
+        pending = session.info.setdefault(_PENDING_KEY, [])
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, destination_model):
+                continue
+            if obj in session.new or inspect(obj).attrs.tags.history.has_changes():
+                pending.append(obj)
+
+    @event.listens_for(Session, "after_flush")
+    def _tags_after_flush(session, flush_context):
+        pending = session.info.pop(_PENDING_KEY, None)
+        ids = {obj.id for obj in pending or () if obj.id is not None and obj not in session.deleted}
+        if ids:
+            sync_destination_tags(session.connection(), destination_table, tag_table, link_table, ids)
+
+    @event.listens_for(Session, "after_soft_rollback")
+    def _tags_after_rollback(session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
+
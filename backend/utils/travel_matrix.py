@@ -0,0 +1,138 @@
+"""All-pairs distance and travel-time matrices for sets of places.
+
+:func:`haversine_km` is the one great-circle formula of the backend
+(``app.py``, :mod:`utils.geo_index` import it); :func:`haversine_distance` /
+``estimate_travel_time_km`` in ``app.py`` handle one pair per call, while
+itinerary and nearby features that need every pair should build the whole
+matrix here instead. With NumPy installed a matrix is a
+handful of vectorized array operations; without it the same numbers are
+produced by a pure-Python loop (lists of lists).
+
+Distances are in km rounded to 2 decimals and travel times are whole
+minutes, exactly like the scalar helpers, so results can be mixed freely.
+Missing coordinates give ``nan`` (NumPy) / ``None`` (fallback) distances
+and 0-minute travel times.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+# Giống estimate_travel_time_km trong app.py
+TRAVEL_SPEEDS_KMH: Dict[str, float] = {
+    "car": 50,
+    "walk": 5,
+    "bike": 15,
+}
+DEFAULT_SPEED_KMH = 50
+
+Point = Tuple[Optional[float], Optional[float]]  # (lat, lng)
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def _use_numpy(use_numpy: Optional[bool]) -> bool:
+    if use_numpy is None:
+        return np is not None
+    if use_numpy and np is None:
+        raise RuntimeError("NumPy is not installed.")
+    return use_numpy
+
+
+def _coords(points: Iterable[Point]) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    lats, lngs = [], []
+    for lat, lng in points:
+        lats.append(lat)
+        lngs.append(lng)
+    return lats, lngs
+
+
+# ---------------------------------------------------------------- NumPy
+def _np_radians(values):
+    # None -> nan để phép tính lan truyền nan thay vì lỗi
+    return np.radians(np.array([np.nan if v is None else v for v in values], dtype=float))
+
+
+def _np_distance_matrix(points: Sequence[Point], others: Sequence[Point]):
+    lat1, lng1 = (_np_radians(c) for c in _coords(points))
+    lat2, lng2 = (_np_radians(c) for c in _coords(others))
+    # Haversine dạng ma trận: broadcast (n, 1) với (1, m), không có vòng lặp Python
+    a = np.sin(np.subtract.outer(lat1, lat2) / 2) ** 2
+    a += np.multiply.outer(np.cos(lat1), np.cos(lat2)) * np.sin(np.subtract.outer(lng1, lng2) / 2) ** 2
+    np.clip(a, 0.0, 1.0, out=a)
+    distances = 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.round(distances, 2, out=distances)
+
+
+def _np_travel_times(distances, speed_kmh: float):
+    # int() trong bản scalar cắt phần thập phân, floor tương đương với số dương
+    with np.errstate(invalid="ignore"):
+        minutes = np.floor(distances / speed_kmh * 60)
+        minutes[~(minutes > 0)] = 0  # nan / khoảng cách 0
+    return minutes.astype(np.int64)
+
+
+# ---------------------------------------------------------- pure Python
+def haversine_km(lat1, lng1, lat2, lng2) -> Optional[float]:
+    """Great-circle distance in km (unrounded); ``None`` when a coordinate is missing."""
+    if lat1 is None or lng1 is None or lat2 is None or lng2 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    a = min(1.0, max(0.0, a))
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_distance(lat1, lng1, lat2, lng2) -> Optional[float]:
+    """:func:`haversine_km` rounded to 2 decimals, the form stored in itineraries."""
+    distance = haversine_km(lat1, lng1, lat2, lng2)
+    return None if distance is None else round(distance, 2)
+
+
+def _py_distance_matrix(points: Sequence[Point], others: Sequence[Point]) -> List[List[Optional[float]]]:
+    return [[haversine_distance(lat1, lng1, lat2, lng2) for lat2, lng2 in others] for lat1, lng1 in points]
+
+
+def _py_travel_times(distances, speed_kmh: float) -> List[List[int]]:
+    return [
+        [int(d / speed_kmh * 60) if d is not None and d > 0 else 0 for d in row]
+        for row in distances
+    ]
+
+
+# --------------------------------------------------------------- public
+def distance_matrix(points: Sequence[Point], others: Optional[Sequence[Point]] = None,
+                    use_numpy: Optional[bool] = None):
+    """km between every ``points[i]`` and ``others[j]`` (``others`` defaults to ``points``)."""
+    others = points if others is None else others
+    if _use_numpy(use_numpy):
+        return _np_distance_matrix(points, others)
+    return _py_distance_matrix(points, others)
+
+
+def travel_time_matrix(distances, transport_mode: str = "car", use_numpy: Optional[bool] = None):
+    """Minutes for each entry of a :func:`distance_matrix` result."""
+    speed = TRAVEL_SPEEDS_KMH.get(transport_mode, DEFAULT_SPEED_KMH)
+    if _use_numpy(use_numpy) and not isinstance(distances, list):
+        return _np_travel_times(distances, speed)
+    return _py_travel_times(distances, speed)
+
+
+def travel_time_matrices(points: Sequence[Point], modes: Optional[Iterable[str]] = None,
+                         use_numpy: Optional[bool] = None):
+    """(distance matrix, {mode: travel-time matrix}) for all pairs of ``points``."""
+    distances = distance_matrix(points, use_numpy=use_numpy)
+    return distances, {
+        mode: travel_time_matrix(distances, mode, use_numpy=use_numpy)
+        for mode in (modes or TRAVEL_SPEEDS_KMH)
+    }
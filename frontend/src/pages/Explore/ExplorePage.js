@@ -1,5 +1,6 @@
 import React, { useEffect, useState, useRef, useMemo } from "react";
 import API from "../../untils/axios";
+import { fetchAllDestinations } from "../../untils/destinations";
 import { TAG_CATEGORIES } from "../../data/tags.js";
 import { toast } from "react-toastify";
 import AuthRequiredModal from "../../components/AuthRequiredModal/AuthRequired.js";
@@ -462,9 +463,8 @@ export default function ExplorePage({ savedIds = new Set(), handleToggleSave })
 
   // --- CALL API ---
   useEffect(() => {
-    API.get("/destinations")
-      .then((res) => {
-        const allData = res.data;
+    fetchAllDestinations((url) => API.get(url), "/destinations")
+      .then((allData) => {
         const popular = [];
         const regular = [];
 
@@ -1,6 +1,7 @@
 import React, { useCallback, useEffect, useMemo, useState } from "react";
 import { toast } from "react-toastify";
 import API from "../../untils/axios";
+import { fetchAllDestinations } from "../../untils/destinations";
 import { usePageContext } from "../../context/PageContext";
 import { resizeImageTo128 } from "../../untils/imageResizer";
 
@@ -113,8 +114,8 @@ export default function HomePage({ savedIds, handleToggleSave }) {
   }, []);
 
   useEffect(() => {
-    API.get("/destinations")
-      .then((res) => setAllDestinations(res.data))
+    fetchAllDestinations((url) => API.get(url), "/destinations")
+      .then(setAllDestinations)
       .catch(console.error);
   }, []);
 
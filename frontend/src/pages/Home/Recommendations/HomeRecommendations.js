@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import RecommendCard from "./RecommendCard";
 import axios from "axios";
+import { fetchAllDestinations } from "../../../untils/destinations";
 
 export default function HomeRecommendations({
   savedIds,
@@ -13,9 +14,8 @@ export default function HomeRecommendations({
   // Nếu không có destinations props thì mới fetch từ API
   useEffect(() => {
     if (!destinations) {
-      axios
-        .get("/api/destinations")
-        .then((res) => setFetchedDestinations(res.data))
+      fetchAllDestinations((url) => axios.get(url), "/api/destinations")
+        .then(setFetchedDestinations)
         .catch((err) => {
           if (process.env.NODE_ENV === 'development') {
             console.error("Error fetching destinations:", err);
@@ -3,6 +3,7 @@ import { useNavigate } from "react-router-dom";
 import { FaChevronLeft, FaChevronRight } from "react-icons/fa";
 import RecommendCard from "../Recommendations/RecommendCard";
 import API from "../../../untils/axios";
+import { fetchAllDestinations } from "../../../untils/destinations";
 import "./WildlifeSection.css";
 
 export default function WildlifeSection({ savedIds, handleToggleSave, onCreateTrip }) {
@@ -14,8 +15,9 @@ export default function WildlifeSection({ savedIds, handleToggleSave, onCreateTr
   useEffect(() => {
     const fetchWildlifePlaces = async () => {
       try {
-        const response = await API.get("/destinations");
-        const allDestinations = response.data || [];
+        const allDestinations = await fetchAllDestinations((url) => API.get(url), "/destinations", {
+          tags: "Wildlife Watching",
+        });
         const filtered = allDestinations.filter((dest) => {
           if (!dest.tags || !Array.isArray(dest.tags)) return false;
           return dest.tags.includes("Wildlife Watching");
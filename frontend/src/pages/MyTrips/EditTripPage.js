@@ -10,6 +10,7 @@ import DestinationPickerModal from './DestinationPickerModal';
 // 🔑 IMPORT LOGIC VÀ AUTO-TIME TỪ FILE RIÊNG
 import { reorder, move, rebuildDay, recalculateTimeSlots } from "./dndLogic";
 import ItemCard from "./ItemCard";
+import { fetchAllDestinations } from "../../untils/destinations";
 import "./EditTripPage.css";
 
 // --- HÀM GIẢ ĐỊNH: Lấy token JWT
@@ -41,6 +42,20 @@ const apiCall = async (method, url, data = null) => {
     }
 };
 
+// ✅ Helper: GET /api/destinations theo từng trang (next_cursor), cùng định dạng với apiCall
+const fetchDestinationsCall = async (url) => {
+    try {
+        const data = await fetchAllDestinations((pageUrl) => axios.get(pageUrl, getAuthHeaders()), url);
+        return { success: true, data };
+    } catch (error) {
+        return {
+            success: false,
+            error: error.response?.data || error.message,
+            status: error.response?.status
+        };
+    }
+};
+
 const peopleOptions = ["1 person", "2-4 people", "5-10 people", "10+ people"];
 const budgetOptions = [
     "< 500k VND",
@@ -1381,7 +1396,7 @@ export default function EditTripPage() {
                 // Fetch trip details và destinations song song
                 const [tripResult, destResult] = await Promise.all([
                     apiCall('get', `/api/trips/${tripId}`),
-                    apiCall('get', '/api/destinations')
+                    fetchDestinationsCall('/api/destinations')
                 ]);
 
                 if (!tripResult.success) {
@@ -1485,7 +1500,7 @@ export default function EditTripPage() {
         const fetchProvincePlaces = async () => {
             if (!editableData.provinceId) return;
 
-            const result = await apiCall('get', `/api/destinations?province_id=${editableData.provinceId}&top=100`);
+            const result = await fetchDestinationsCall(`/api/destinations?province_id=${editableData.provinceId}&top=100`);
             if (result.success && Array.isArray(result.data)) {
                 setAllProvincePlaces(result.data.map(p => ({
                     ...p,
@@ -0,0 +1,27 @@
+/**
+ * Unit tests for the paged destinations helper
+ */
+
+import { fetchAllDestinations, DESTINATION_PAGE_SIZE } from '../destinations';
+
+describe('fetchAllDestinations', () => {
+  test('follows next_cursor until the last page', async () => {
+    const get = jest.fn()
+      .mockResolvedValueOnce({ data: { items: [{ id: 1 }, { id: 2 }], next_cursor: 'abc' } })
+      .mockResolvedValueOnce({ data: { items: [{ id: 3 }], next_cursor: null } });
+
+    const items = await fetchAllDestinations(get, '/destinations');
+
+    expect(items).toEqual([{ id: 1 }, { id: 2 }, { id: 3 }]);
+    expect(get).toHaveBeenNthCalledWith(1, `/destinations?limit=${DESTINATION_PAGE_SIZE}`);
+    expect(get).toHaveBeenNthCalledWith(2, `/destinations?limit=${DESTINATION_PAGE_SIZE}&cursor=abc`);
+  });
+
+  test('keeps existing query parameters', async () => {
+    const get = jest.fn().mockResolvedValue({ data: { items: [], next_cursor: null } });
+
+    await fetchAllDestinations(get, '/api/destinations?province_id=3', { tags: 'Beach' });
+
+    expect(get).toHaveBeenCalledWith(`/api/destinations?province_id=3&tags=Beach&limit=${DESTINATION_PAGE_SIZE}`);
+  });
+});
@@ -0,0 +1,18 @@
+// GET /destinations trả về từng trang { items, next_cursor, limit } (keyset cursor).
+// Helper này đọc lần lượt các trang theo next_cursor và gộp items lại.
+export const DESTINATION_PAGE_SIZE = 100;
+
+export const fetchAllDestinations = async (get, url, params = {}) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const query = new URLSearchParams({ ...params, limit: DESTINATION_PAGE_SIZE });
+    if (cursor) query.set("cursor", cursor);
+    const separator = url.includes("?") ? "&" : "?";
+    const response = await get(`${url}${separator}${query.toString()}`);
+    const page = response.data || {};
+    items.push(...(page.items || []));
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+};
@@ -153,6 +153,17 @@ def test_itinerary(app, test_user, test_province):
         return itinerary
 
 
+@pytest.fixture(autouse=True)
+def clear_openai_response_cache():
+    """Cached OpenAI replies must not leak from one test into another."""
+    from utils.openai_cache import get_shared_response_cache
+
+    cache = get_shared_response_cache()
+    if cache is not None:
+        cache.clear()
+    yield
+
+
 @pytest.fixture
 def mock_openai_client():
     """Mock OpenAI client."""
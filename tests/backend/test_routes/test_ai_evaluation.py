@@ -124,3 +124,73 @@ class TestAIEvaluation:
         # Should handle error gracefully
         assert response.status_code in [200, 500, 503]
 
+
+
+class TestAIJobs:
+    """Tests for the /api/ai/jobs background job API."""
+
+    PAYLOAD = {"edited_itinerary": [{"day": 1, "places": [{"id": 1, "name": "Place A"}]}]}
+
+    @pytest.fixture(autouse=True)
+    def inline_queue(self, monkeypatch):
+        """Run jobs explicitly with run_pending instead of worker threads."""
+        from utils.job_queue import ai_job_queue
+        monkeypatch.setattr(ai_job_queue, "workers", 0)
+        return ai_job_queue
+
+    @patch('app.OpenAIChatClient')
+    def test_submit_returns_job_id_then_result(self, mock_openai_class, client, inline_queue):
+        """Test POST answers 202 at once and GET returns the result after a worker ran the job."""
+        mock_openai_class.return_value.generate_reply.return_value = json.dumps({
+            "score": 90, "decision": "ok", "summary": "Lịch trình hợp lý, các điểm gần nhau và có thời gian nghỉ."
+        })
+
+        response = client.post('/api/ai/jobs/evaluate_itinerary', json=self.PAYLOAD)
+        assert response.status_code == 202
+        job = response.get_json()
+        assert job["status"] == "queued"
+        assert response.headers["Location"].endswith(f"/api/ai/jobs/{job['job_id']}")
+        mock_openai_class.return_value.generate_reply.assert_not_called()
+
+        assert inline_queue.run_pending() == 1
+
+        data = client.get(f"/api/ai/jobs/{job['job_id']}?wait=5").get_json()
+        assert data["status"] == "done"
+        assert data["result"]["score"] == 90
+        assert data["attempts"] == 1
+
+    @patch('app.OpenAIChatClient')
+    def test_failed_job_reports_error(self, mock_openai_class, client, inline_queue):
+        """Test a handler exception marks the job failed with its message."""
+        mock_openai_class.return_value.generate_reply.side_effect = RuntimeError("OpenAI quá tải")
+
+        job_id = client.post('/api/ai/jobs/reorder_itinerary', json=self.PAYLOAD).get_json()["job_id"]
+        inline_queue.run_pending()
+
+        data = client.get(f"/api/ai/jobs/{job_id}").get_json()
+        assert data["status"] == "failed"
+        assert "quá tải" in data["error"]
+
+    def test_interrupted_job_is_picked_up_again(self, app, client, inline_queue):
+        """Test a job left running by a dead worker is claimed again once stale."""
+        from datetime import datetime, timedelta
+        from models import db, AiJob
+
+        job = AiJob(id="stale", kind="evaluate_itinerary", status="running", attempts=1,
+                    payload_json=json.dumps(self.PAYLOAD),
+                    started_at=datetime.utcnow() - timedelta(seconds=inline_queue.stale_seconds + 1))
+        db.session.add(job)
+        db.session.commit()
+
+        with patch.dict(inline_queue._handlers, {"evaluate_itinerary": lambda payload: {"ok": 1}}):
+            assert inline_queue.run_pending() == 1
+
+        data = client.get('/api/ai/jobs/stale').get_json()
+        assert (data["status"], data["result"], data["attempts"]) == ("done", {"ok": 1}, 2)
+
+    def test_validation(self, client):
+        """Test unknown job types, missing itineraries and unknown ids."""
+        assert client.post('/api/ai/jobs/translate', json=self.PAYLOAD).status_code == 404
+        assert client.post('/api/ai/jobs/evaluate_itinerary', json={}).status_code == 400
+        assert client.get('/api/ai/jobs/missing').status_code == 404
+        assert client.get('/api/ai/jobs/missing?wait=abc').status_code == 400
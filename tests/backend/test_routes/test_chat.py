@@ -5,6 +5,7 @@ import pytest
 from flask import json
 from datetime import datetime
 from unittest.mock import patch, MagicMock
+from werkzeug.test import EnvironBuilder
 from models import ChatSession, ChatMessage, ChatAttachment, User, db
 
 
@@ -551,3 +552,220 @@ class TestSendSessionMessage:
         
         assert response.status_code == 400
 
+
+
+def _sse_events(body):
+    """Parse a text/event-stream body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestStreamMessages:
+    """Tests for the server-sent-events chat endpoints"""
+
+    @patch('routes.chat.chat_client')
+    def test_widget_stream_relays_tokens_then_saves_reply(self, mock_chat_client, client, auth_headers, test_user):
+        """Test tokens arrive as SSE events and the full reply is stored once the stream ends"""
+        mock_chat_client.is_ready.return_value = True
+        tokens = MagicMock()
+        tokens.__iter__.return_value = iter(["Xin ", "chào ", "bạn"])
+        mock_chat_client.stream_reply.return_value = tokens
+
+        response = client.post('/api/chat/widget/message/stream', json={'message': 'Hello'}, headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = _sse_events(response.get_data(as_text=True))
+        assert [data["text"] for name, data in events if name == "token"] == ["Xin ", "chào ", "bạn"]
+        assert events[-1][0] == "done"
+        assert events[-1][1]["content"] == "Xin chào bạn"
+        with client.application.app_context():
+            roles = [m.role for m in ChatMessage.query.order_by(ChatMessage.id).all()]
+            assert roles == ["user", "assistant"]
+
+    @patch('routes.chat.chat_client')
+    def test_session_stream_error_event(self, mock_chat_client, client, auth_headers, test_user):
+        """Test an upstream failure mid-stream sends an error event and stores nothing"""
+        mock_chat_client.is_ready.return_value = True
+
+        def broken():
+            yield "Xin "
+            raise RuntimeError("OpenAI lỗi")
+
+        tokens = MagicMock()
+        tokens.__iter__.side_effect = lambda: broken()
+        mock_chat_client.stream_reply.return_value = tokens
+        with client.application.app_context():
+            session = ChatSession(user_id=test_user.id)
+            db.session.add(session)
+            db.session.commit()
+            session_id = session.id
+
+        response = client.post(f'/api/chat/sessions/{session_id}/messages/stream',
+                               json={'message': 'Hello'}, headers=auth_headers)
+
+        events = _sse_events(response.get_data(as_text=True))
+        assert events[-1] == ("error", {"message": "OpenAI lỗi"})
+        with client.application.app_context():
+            assert ChatMessage.query.filter_by(session_id=session_id).count() == 0
+
+    @patch('routes.chat.chat_client')
+    def test_client_disconnect_cancels_upstream(self, mock_chat_client, client, auth_headers, test_user):
+        """Test closing the response mid-stream closes the upstream stream and stores no reply"""
+        mock_chat_client.is_ready.return_value = True
+        tokens = MagicMock()
+        tokens.__iter__.return_value = iter(["Xin ", "chào ", "bạn"])
+        mock_chat_client.stream_reply.return_value = tokens
+
+        response = client.post('/api/chat/widget/message/stream', json={'message': 'Hello'},
+                               headers=auth_headers, buffered=False)
+        first = next(iter(response.response))
+        response.close()
+
+        assert b"token" in first
+        tokens.close.assert_called_once()
+        with client.application.app_context():
+            assert ChatMessage.query.filter_by(role="assistant").count() == 0
+
+    @patch('routes.chat.chat_client')
+    def test_disconnect_before_first_token_drops_user_message(self, mock_chat_client, client, auth_headers,
+                                                               test_user):
+        """Test a stream closed before it was ever read leaves no unanswered user message"""
+        mock_chat_client.is_ready.return_value = True
+        tokens = MagicMock()
+        tokens.__iter__.return_value = iter(["Xin "])
+        mock_chat_client.stream_reply.return_value = tokens
+
+        # Gọi WSGI trực tiếp: test client luôn đọc trước chunk đầu tiên
+        environ = EnvironBuilder('/api/chat/widget/message/stream', method='POST', json={'message': 'Hello'},
+                                 headers=auth_headers).get_environ()
+        app_iter = client.application(environ, lambda status, headers, exc_info=None: None)
+        with client.application.app_context():
+            assert ChatMessage.query.count() == 1
+        app_iter.close()
+
+        tokens.close.assert_called_once()
+        with client.application.app_context():
+            assert ChatMessage.query.count() == 0
+
+    @patch('routes.chat.chat_client')
+    def test_empty_stream_sends_error_and_stores_nothing(self, mock_chat_client, client, auth_headers, test_user):
+        """Test a completion without text is reported as an error instead of an empty reply"""
+        mock_chat_client.is_ready.return_value = True
+        tokens = MagicMock()
+        tokens.__iter__.return_value = iter(["", "  "])
+        mock_chat_client.stream_reply.return_value = tokens
+
+        response = client.post('/api/chat/widget/message/stream', json={'message': 'Hello'}, headers=auth_headers)
+
+        events = _sse_events(response.get_data(as_text=True))
+        assert events[-1][0] == "error"
+        assert "done" not in [name for name, _ in events]
+        with client.application.app_context():
+            assert ChatMessage.query.count() == 0
+
+    def test_stream_missing_content(self, client, auth_headers):
+        """Test the streaming endpoint validates like the regular one"""
+        response = client.post('/api/chat/widget/message/stream', json={}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestTokenBudgetedHistory:
+    """Tests for the token budget and rolling summary of chat history"""
+
+    @pytest.fixture(autouse=True)
+    def inline_queue(self, monkeypatch):
+        """Run summary jobs explicitly with run_pending instead of worker threads."""
+        from utils.job_queue import ai_job_queue
+        monkeypatch.setattr(ai_job_queue, "workers", 0)
+        monkeypatch.setenv("CHAT_PROMPT_TOKEN_BUDGET", "1500")
+        monkeypatch.setenv("CHAT_SUMMARY_KEEP_RECENT", "2")
+        return ai_job_queue
+
+    def _session_with_history(self, user_id, turns, filler="Đà Lạt " * 60):
+        session = ChatSession(user_id=user_id)
+        db.session.add(session)
+        db.session.flush()
+        for i in range(turns):
+            role = "user" if i % 2 == 0 else "assistant"
+            db.session.add(ChatMessage(user_id=user_id, session_id=session.id, role=role,
+                                       content=f"Tin nhắn {i} {filler}"))
+        db.session.commit()
+        return session.id
+
+    @patch('routes.chat.chat_client')
+    def test_long_history_is_trimmed_and_summarized(self, mock_chat_client, client, auth_headers, test_user,
+                                                    inline_queue):
+        """Test the prompt stays within budget and older turns are folded into the session summary"""
+        from models import AiJob
+        mock_chat_client.is_ready.return_value = True
+        mock_chat_client.generate_reply.return_value = "Mock AI response"
+        with client.application.app_context():
+            session_id = self._session_with_history(test_user.id, 10)
+
+        response = client.post(f'/api/chat/sessions/{session_id}/messages', json={'message': 'Hello'},
+                               headers=auth_headers)
+        assert response.status_code == 200
+        prompt = mock_chat_client.generate_reply.call_args[0][0]
+        assert len(prompt) < 12
+        assert prompt[-1] == {"role": "user", "content": "Hello"}
+
+        # Lượt thứ hai khi job chưa chạy: không xếp thêm job trùng
+        client.post(f'/api/chat/sessions/{session_id}/messages', json={'message': 'Hi'}, headers=auth_headers)
+        with client.application.app_context():
+            assert AiJob.query.filter_by(kind="chat_summary").count() == 1
+
+        mock_chat_client.generate_reply.return_value = "Người dùng lên kế hoạch đi Đà Lạt."
+        with client.application.app_context():
+            assert inline_queue.run_pending() == 1
+            session = db.session.get(ChatSession, session_id)
+            assert session.summary == "Người dùng lên kế hoạch đi Đà Lạt."
+            assert ChatMessage.query.filter(ChatMessage.session_id == session_id,
+                                            ChatMessage.id > session.summary_until_id).count() == 2
+
+        client.post(f'/api/chat/sessions/{session_id}/messages', json={'message': 'Next'}, headers=auth_headers)
+        prompt = mock_chat_client.generate_reply.call_args[0][0]
+        assert "Người dùng lên kế hoạch đi Đà Lạt." in prompt[1]["content"]
+        assert [m["content"] for m in prompt[-1:]] == ["Next"]
+
+    @patch('routes.chat.chat_client')
+    def test_long_backlog_is_summarized_in_chunks(self, mock_chat_client, client, test_user, monkeypatch):
+        """Test each summary prompt fits the budget and progress is kept when a later chunk fails"""
+        from routes.chat import refresh_chat_summary
+        from utils.chat_history import message_tokens
+        with client.application.app_context():
+            session_id = self._session_with_history(test_user.id, 40)
+            ids = [m.id for m in ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.id)]
+
+            mock_chat_client.generate_reply.side_effect = ["Tóm tắt 1", RuntimeError("context length exceeded")]
+            with pytest.raises(RuntimeError):
+                refresh_chat_summary({"session_id": session_id})
+            session = db.session.get(ChatSession, session_id)
+            assert session.summary == "Tóm tắt 1"
+            first_chunk_end = session.summary_until_id
+            assert ids[0] < first_chunk_end < ids[-3]
+
+            mock_chat_client.generate_reply.side_effect = None
+            mock_chat_client.generate_reply.return_value = "Tóm tắt"
+            result = refresh_chat_summary({"session_id": session_id})
+            assert result == {"folded": ids.index(ids[-3]) - ids.index(first_chunk_end), "summary_until_id": ids[-3]}
+            assert mock_chat_client.generate_reply.call_count > 3
+            for call in mock_chat_client.generate_reply.call_args_list:
+                assert sum(message_tokens(m) for m in call[0][0]) <= 1500
+
+    @patch('routes.chat.chat_client')
+    def test_short_history_sends_everything(self, mock_chat_client, client, auth_headers, test_user):
+        """Test no summary job is queued while history fits the budget"""
+        from models import AiJob
+        mock_chat_client.is_ready.return_value = True
+        mock_chat_client.generate_reply.return_value = "Mock AI response"
+        with client.application.app_context():
+            session_id = self._session_with_history(test_user.id, 1, filler="Đà Lạt")
+
+        client.post(f'/api/chat/sessions/{session_id}/messages', json={'message': 'Hello'}, headers=auth_headers)
+        assert len(mock_chat_client.generate_reply.call_args[0][0]) == 3
+        with client.application.app_context():
+            assert AiJob.query.filter_by(kind="chat_summary").count() == 0
@@ -73,3 +73,525 @@ class TestGetDestinationsByProvince:
         
         assert response.status_code == 401
 
+
+
+class TestGetDestinations:
+    """Tests for GET /api/destinations (card cache)."""
+    
+    def test_get_destinations_returns_cards(self, client, test_destination):
+        """Test listing returns full cards with per-request fields."""
+        response = client.get('/api/destinations')
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)['items']
+        assert len(data) == 1
+        card = data[0]
+        assert card["id"] == test_destination.id
+        assert card["province_name"] == 'Hà Nội'
+        assert card["tags"] == ["Beach", "Adventure"]
+        assert "°C" in card["weather"]
+        assert "image_url" in card
+        assert "image_source" not in card
+    
+    def test_get_destinations_reflects_updates(self, client, app, test_destination):
+        """Test that a destination write invalidates its cached card."""
+        from models import db, Destination
+        
+        first = json.loads(client.get('/api/destinations').data)['items']
+        assert first[0]["name"] == 'Vịnh Hạ Long'
+        
+        with app.app_context():
+            dest = db.session.get(Destination, test_destination.id)
+            dest.name = 'Vịnh Lan Hạ'
+            db.session.commit()
+        
+        second = json.loads(client.get('/api/destinations').data)['items']
+        assert second[0]["name"] == 'Vịnh Lan Hạ'
+    
+    def test_get_destinations_search_filter(self, client, test_destination):
+        """Test unaccented search still filters the cached listing."""
+        response = client.get('/api/destinations?search=ha long')
+        assert len(json.loads(response.data)['items']) == 1
+        
+        response = client.get('/api/destinations?search=sapa')
+        assert json.loads(response.data)['items'] == []
+    
+    def test_get_destinations_tag_filter(self, client, test_destination):
+        """Test tag filters require every tag, case-insensitively."""
+        response = client.get('/api/destinations?tags=beach,Adventure')
+        assert [card["id"] for card in json.loads(response.data)['items']] == [test_destination.id]
+        
+        response = client.get('/api/destinations?tags=Beach,Mountain')
+        assert json.loads(response.data)['items'] == []
+    
+    def test_get_destinations_tag_filter_follows_updates(self, client, app, test_destination):
+        """Test retagging a destination updates the tag index."""
+        from models import db, Destination
+        
+        assert len(json.loads(client.get('/api/destinations?tags=Beach').data)['items']) == 1
+        
+        with app.app_context():
+            dest = db.session.get(Destination, test_destination.id)
+            dest.tags = '["Mountain"]'
+            db.session.commit()
+        
+        assert json.loads(client.get('/api/destinations?tags=Beach').data)['items'] == []
+        assert len(json.loads(client.get('/api/destinations?tags=mountain').data)['items']) == 1
+
+
+class TestSparseFieldsets:
+    """Tests for fields= / view=summary|full on destination listings."""
+    
+    def _count_image_queries(self, app, func):
+        from sqlalchemy import event
+        from models import db
+        
+        statements = []
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            result = func()
+        finally:
+            event.remove(engine, 'before_cursor_execute', _record)
+        return result, [stmt for stmt in statements if 'destination_images' in stmt]
+    
+    def test_summary_view(self, client, app, test_destination):
+        """Test view=summary returns the precomputed thumbnail without touching images."""
+        from models import db, Destination
+        with app.app_context():
+            db.session.get(Destination, test_destination.id).image_url = 'https://img/halong.jpg'
+            db.session.commit()
+        
+        response, image_queries = self._count_image_queries(
+            app, lambda: client.get('/api/destinations?view=summary')
+        )
+        data = json.loads(response.data)['items']
+        assert data == [{
+            'id': test_destination.id, 'name': 'Vịnh Hạ Long', 'province_name': 'Hà Nội',
+            'thumbnail_url': 'https://img/halong.jpg', 'rating': 4.5
+        }]
+        assert image_queries == []
+    
+    def test_fields_with_paging(self, client, test_destination):
+        """Test fields= works together with keyset pagination."""
+        response = client.get('/api/destinations?fields=name,weather&limit=1')
+        data = json.loads(response.data)
+        assert set(data['items'][0]) == {'id', 'name', 'weather'}
+        assert '°C' in data['items'][0]['weather']
+    
+    def test_image_fallback_resolved_on_write(self, client, app, test_destination):
+        """Test image_url falls back to the first web gallery image, resolved when the image is saved."""
+        from models import db, DestinationImage
+        with app.app_context():
+            db.session.add(DestinationImage(destination_id=test_destination.id, image_url='https://img/1.jpg'))
+            db.session.commit()
+        
+        response, image_queries = self._count_image_queries(
+            app, lambda: client.get('/api/destinations?fields=image_url,thumbnail_url')
+        )
+        assert json.loads(response.data)['items'] == [{
+            'id': test_destination.id, 'image_url': 'https://img/1.jpg', 'thumbnail_url': 'https://img/1.jpg'
+        }]
+        assert image_queries == []
+    
+    def test_card_image_follows_gallery_changes(self, app, test_destination):
+        """Test adding and deleting gallery images re-resolves the stored card image."""
+        from models import db, Destination, DestinationImage
+        with app.app_context():
+            first = DestinationImage(destination_id=test_destination.id, image_url='https://img/1.jpg')
+            db.session.add_all([first, DestinationImage(destination_id=test_destination.id, image_url='https://img/2.jpg')])
+            db.session.commit()
+            dest = db.session.get(Destination, test_destination.id)
+            assert (dest.card_image_url, dest.card_thumbnail_url) == ('https://img/1.jpg', 'https://img/1.jpg')
+
+            db.session.delete(first)
+            db.session.commit()
+            assert db.session.get(Destination, test_destination.id).card_image_url == 'https://img/2.jpg'
+
+            dest.image_url = 'halong.png'
+            db.session.commit()
+            assert dest.card_image_url == 'images/halong.png'
+
+    def test_view_full_matches_default(self, client, test_destination):
+        """Test view=full keeps the default card payload."""
+        full = json.loads(client.get('/api/destinations?view=full').data)['items']
+        default = json.loads(client.get('/api/destinations').data)['items']
+        for card in full + default:
+            card.pop('weather')
+        assert full == default
+    
+    def test_by_province_fields(self, client, auth_headers, test_province, test_destination):
+        """Test by-province projections use its own field set."""
+        url = f'/api/destinations/by-province/{test_province.id}'
+        data = json.loads(client.get(f'{url}?view=summary', headers=auth_headers).data)
+        assert data == [{'id': test_destination.id, 'name': 'Vịnh Hạ Long', 'type': None, 'images': []}]
+        
+        data = json.loads(client.get(f'{url}?fields=gps', headers=auth_headers).data)
+        assert set(data[0]) == {'id', 'gps'}
+
+    def test_by_province_images_is_first_gallery_image(self, client, app, auth_headers, test_province,
+                                                       test_destination):
+        """Test by-province images keeps returning gallery[0], not the card image."""
+        from models import db, Destination, DestinationImage
+        with app.app_context():
+            db.session.get(Destination, test_destination.id).image_url = 'https://img/card.jpg'
+            db.session.add_all([
+                DestinationImage(destination_id=test_destination.id, image_url='halong_1.jpg'),
+                DestinationImage(destination_id=test_destination.id, image_url='https://img/2.jpg'),
+            ])
+            db.session.commit()
+
+        url = f'/api/destinations/by-province/{test_province.id}?fields=images'
+        data = json.loads(client.get(url, headers=auth_headers).data)
+        assert data == [{'id': test_destination.id, 'images': ['halong_1.jpg']}]
+    
+    def test_invalid_parameters(self, client, auth_headers, test_province):
+        """Test unknown fields and views are rejected with 400."""
+        assert client.get('/api/destinations?view=compact').status_code == 400
+        assert client.get('/api/destinations?fields=name,secret').status_code == 400
+        response = client.get(
+            f'/api/destinations/by-province/{test_province.id}?fields=weather', headers=auth_headers
+        )
+        assert response.status_code == 400
+
+
+class TestDestinationPagination:
+    """Tests for keyset pagination (limit/cursor) on destination listings."""
+    
+    @pytest.fixture
+    def many_destinations(self, app, test_province):
+        from models import db, Destination
+        with app.app_context():
+            for idx, rating in enumerate([4.9, 4.5, 4.5, 3.0, None]):
+                db.session.add(Destination(
+                    name=f'Place {idx}',
+                    name_unaccented=f'place {idx}',
+                    province_id=test_province.id,
+                    rating=rating
+                ))
+            db.session.commit()
+        return test_province
+    
+    def _walk(self, client, url, headers=None):
+        names, cursor = [], None
+        while True:
+            page_url = f"{url}{'&' if '?' in url else '?'}limit=2"
+            if cursor:
+                page_url += f"&cursor={cursor}"
+            data = json.loads(client.get(page_url, headers=headers).data)
+            assert len(data["items"]) <= 2
+            names.extend(item["name"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                return names
+    
+    def test_destinations_pages_cover_all_rows(self, client, many_destinations):
+        """Test that walking the cursor returns every row once, best rated first."""
+        names = self._walk(client, '/api/destinations')
+        
+        assert names == ['Place 0', 'Place 2', 'Place 1', 'Place 3', 'Place 4']
+    
+    def test_by_province_pages(self, client, auth_headers, many_destinations):
+        """Test pagination on the by-province listing."""
+        names = self._walk(client, f'/api/destinations/by-province/{many_destinations.id}', auth_headers)
+        
+        assert len(names) == 5
+        assert names[0] == 'Place 0'
+    
+    def test_search_pages(self, client, many_destinations):
+        """Test pagination on /api/search."""
+        names = self._walk(client, '/api/search?q=place')
+        
+        assert len(names) == 5
+    
+    def test_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        response = client.get('/api/destinations?cursor=not-a-cursor')
+        
+        assert response.status_code == 400
+    
+    def test_invalid_limit(self, client):
+        """Test that a non-numeric limit is rejected."""
+        response = client.get('/api/destinations?limit=abc')
+        
+        assert response.status_code == 400
+    
+    def test_without_params_returns_first_page(self, client, monkeypatch, many_destinations):
+        """Test that a request without limit/cursor is capped at DEFAULT_PAGE_SIZE."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'DEFAULT_PAGE_SIZE', 2)
+        data = json.loads(client.get('/api/destinations').data)
+        
+        assert [item['name'] for item in data['items']] == ['Place 0', 'Place 2']
+        assert data['limit'] == 2
+        assert data['next_cursor']
+    
+    def test_search_pages_keep_bm25_order(self, client, app, many_destinations):
+        """Test that paged full-text search follows the BM25 rank, not the rating."""
+        from models import db, Destination
+        with app.app_context():
+            db.session.add(Destination(
+                name='Hồ Gươm', name_unaccented='ho guom', province_id=many_destinations.id,
+                rating=1.0, description='Hồ Gươm giữa phố cổ, hồ Gươm về đêm'
+            ))
+            db.session.add(Destination(
+                name='Chợ đêm', name_unaccented='cho dem', province_id=many_destinations.id,
+                rating=5.0, description='Đi bộ ra hồ Gươm'
+            ))
+            db.session.commit()
+        
+        assert self._walk(client, '/api/search?q=ho guom') == ['Hồ Gươm', 'Chợ đêm']
+        assert self._walk(client, '/api/destinations?search=ho guom') == ['Hồ Gươm']
+
+
+class TestVietnamLocationsStream:
+    """Tests for the streamed GET /api/locations/vietnam hierarchy."""
+    
+    @pytest.fixture
+    def two_provinces(self, app, test_province):
+        from models import db, Destination, DestinationImage, Province
+        with app.app_context():
+            empty = Province(name='Lào Cai', region_id=test_province.region_id)
+            db.session.add(empty)
+            for idx in range(5):
+                dest = Destination(name=f'Place {idx}', province_id=test_province.id)
+                dest.images.append(DestinationImage(image_url=f'/img/{idx}.jpg'))
+                db.session.add(dest)
+            db.session.commit()
+            return test_province.id, empty.id
+    
+    def test_streams_nested_hierarchy(self, client, app, monkeypatch, two_provinces):
+        """Test places are grouped per province across several yield_per batches."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'LOCATIONS_STREAM_BATCH_SIZE', 2)
+        full_id, empty_id = two_provinces
+        
+        response = client.get('/api/locations/vietnam')
+        assert response.status_code == 200
+        assert response.is_streamed
+        data = json.loads(response.data)
+        
+        assert [region['region_name'] for region in data] == ['Miền Bắc']
+        provinces = {p['id']: p for p in data[0]['provinces']}
+        assert provinces[empty_id]['places'] == []
+        places = provinces[full_id]['places']
+        assert [place['name'] for place in places] == [f'Place {idx}' for idx in range(5)]
+        assert places[3]['images'] == ['/img/3.jpg']
+        assert set(places[0]) == {
+            'id', 'name', 'type', 'description', 'images', 'gps',
+            'opening_hours', 'entry_fee', 'tags', 'source'
+        }
+    
+    def test_empty_catalog(self, client):
+        """Test an empty database streams an empty JSON array."""
+        response = client.get('/api/locations/vietnam')
+        assert json.loads(response.data) == []
+
+
+class TestGeoQueries:
+    """Tests for GET /api/destinations/nearby and /api/destinations/bbox."""
+    
+    @pytest.fixture
+    def hanoi_places(self, app, test_province):
+        from models import db, Destination
+        points = {
+            'Hồ Gươm': (21.0288, 105.8525, 4.9),
+            'Văn Miếu': (21.0277, 105.8355, 4.7),
+            'Ba Vì': (21.0750, 105.3660, 4.2),
+            'Hạ Long': (20.9101, 107.1839, 4.8),
+            'No GPS': (None, None, 5.0),
+        }
+        with app.app_context():
+            rows = {}
+            for name, (lat, lng, rating) in points.items():
+                rows[name] = Destination(name=name, province_id=test_province.id,
+                                         latitude=lat, longitude=lng, rating=rating)
+            db.session.add_all(rows.values())
+            db.session.commit()
+            return {name: dest.id for name, dest in rows.items()}
+    
+    def test_nearby_sorted_by_distance(self, client, hanoi_places):
+        """Test only places within the radius come back, nearest first."""
+        response = client.get('/api/destinations/nearby?lat=21.0285&lng=105.8542&radius_km=5')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [item['name'] for item in data['items']] == ['Hồ Gươm', 'Văn Miếu']
+        assert data['items'][0]['distance_km'] < data['items'][1]['distance_km'] <= 5
+        assert data['truncated'] is False
+    
+    def test_nearby_distance_matched_by_id(self, client, hanoi_places, monkeypatch):
+        """Test a hit missing from the projection (deleted meanwhile) does not shift distances."""
+        import app as app_module
+        projection = app_module.get_destination_projection
+        deleted = hanoi_places['Hồ Gươm']
+        monkeypatch.setattr(app_module, 'get_destination_projection',
+                            lambda ids, fields: projection([i for i in ids if i != deleted], fields))
+
+        data = json.loads(client.get('/api/destinations/nearby?lat=21.0285&lng=105.8542&radius_km=5').data)
+        assert [item['name'] for item in data['items']] == ['Văn Miếu']
+        assert data['items'][0]['distance_km'] > 1
+
+    def test_nearby_exclude_and_limit(self, client, hanoi_places):
+        """Test exclude_id skips the origin place and limit truncates."""
+        url = f"/api/destinations/nearby?lat=21.0288&lng=105.8525&radius_km=100&exclude_id={hanoi_places['Hồ Gươm']}&limit=1"
+        data = json.loads(client.get(url).data)
+        assert [item['name'] for item in data['items']] == ['Văn Miếu']
+        assert data['truncated'] is True
+    
+    def test_nearby_follows_coordinate_updates(self, client, app, hanoi_places):
+        """Test moving a destination updates the spatial index."""
+        from models import db, Destination
+        with app.app_context():
+            dest = db.session.get(Destination, hanoi_places['Hạ Long'])
+            dest.latitude, dest.longitude = 21.0290, 105.8530
+            db.session.commit()
+        
+        data = json.loads(client.get('/api/destinations/nearby?lat=21.0285&lng=105.8542&radius_km=1').data)
+        assert {item['name'] for item in data['items']} == {'Hồ Gươm', 'Hạ Long'}
+    
+    def test_bbox_sorted_by_rating(self, client, hanoi_places):
+        """Test the bounding box returns contained places, best rated first."""
+        data = json.loads(client.get(
+            '/api/destinations/bbox?min_lat=20.5&min_lng=105.3&max_lat=21.5&max_lng=106&fields=name'
+        ).data)
+        assert data['items'] == [
+            {'id': hanoi_places['Hồ Gươm'], 'name': 'Hồ Gươm'},
+            {'id': hanoi_places['Văn Miếu'], 'name': 'Văn Miếu'},
+            {'id': hanoi_places['Ba Vì'], 'name': 'Ba Vì'},
+        ]
+    
+    def test_invalid_parameters(self, client):
+        """Test missing or out-of-range coordinates are rejected."""
+        assert client.get('/api/destinations/nearby?lat=21').status_code == 400
+        assert client.get('/api/destinations/nearby?lat=91&lng=105').status_code == 400
+        assert client.get('/api/destinations/nearby?lat=21&lng=105&radius_km=abc').status_code == 400
+        assert client.get('/api/destinations/bbox?min_lat=22&min_lng=105&max_lat=21&max_lng=106').status_code == 400
+
+
+class TestCatalogConditionalGet:
+    """Tests for ETag/Last-Modified revalidation and compression on catalog endpoints."""
+    
+    @pytest.fixture
+    def large_catalog(self, app, test_province):
+        from models import db, Destination
+        with app.app_context():
+            for idx in range(20):
+                db.session.add(Destination(
+                    name=f'Place {idx}',
+                    province_id=test_province.id,
+                    description='["Một địa điểm rất đẹp để tham quan"]'
+                ))
+            db.session.commit()
+        return test_province
+    
+    def test_etag_revalidation_skips_database(self, client, app, test_destination, monkeypatch):
+        """Test a matching If-None-Match gets 304 without any SQL (catalog version synced on a throttle)."""
+        from sqlalchemy import event
+        from models import db
+        
+        monkeypatch.setenv('CATALOG_SYNC_INTERVAL', '3600')
+        first = client.get('/api/destinations')
+        etag = first.headers['ETag']
+        assert first.status_code == 200
+        assert 'no-cache' in first.headers['Cache-Control']
+        
+        statements = []
+        def _count(*args):
+            statements.append(args[2])
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            second = client.get('/api/destinations', headers={'If-None-Match': etag})
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == etag
+        assert statements == []
+    
+    def test_etag_changes_with_catalog(self, client, app, test_destination):
+        """Test a catalog write invalidates previously issued ETags."""
+        from models import db, Destination
+        
+        etag = client.get('/api/locations/vietnam').headers['ETag']
+        with app.app_context():
+            dest = db.session.get(Destination, test_destination.id)
+            dest.name = 'Vịnh Lan Hạ'
+            db.session.commit()
+        
+        response = client.get('/api/locations/vietnam', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert json.loads(response.data)[0]['provinces'][0]['places'][0]['name'] == 'Vịnh Lan Hạ'
+    
+    def test_validators_shared_between_workers(self, client, app, test_destination, monkeypatch):
+        """Test another worker (own process state) gives the same validators, and sees other writes."""
+        from sqlalchemy import text
+        from models import db
+        from utils import http_cache
+        from utils.catalog_cache import invalidate_catalog
+
+        first = client.get('/api/locations/vietnam')
+        etag, last_modified = first.headers['ETag'], first.headers.get('Last-Modified')
+        first.close()
+
+        # "Worker khác": id process khác, version trong process khác
+        monkeypatch.setattr(http_cache, '_INSTANCE_TAG', 'other')
+        invalidate_catalog()
+        same = client.get('/api/locations/vietnam', headers={'If-None-Match': etag})
+        assert same.status_code == 304
+        assert same.headers.get('Last-Modified') == last_modified
+
+        # seed.py ghi catalog trong process riêng; request sau khoảng đồng bộ sẽ thấy
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text("UPDATE catalog_meta SET version = version + 1"))
+        monkeypatch.setenv('CATALOG_SYNC_INTERVAL', '0')
+        changed = client.get('/api/locations/vietnam', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        changed.close()
+
+    def test_etag_depends_on_query(self, client, test_destination):
+        """Test different filters never share an ETag."""
+        etag = client.get('/api/destinations').headers['ETag']
+        response = client.get('/api/destinations?search=sapa', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['items'] == []
+    
+    def test_by_province_requires_auth_before_304(self, client, auth_headers, test_province, test_destination):
+        """Test revalidation still runs the JWT check first."""
+        url = f'/api/destinations/by-province/{test_province.id}'
+        etag = client.get(url, headers=auth_headers).headers['ETag']
+        
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 401
+        response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+    
+    def test_gzip_negotiation(self, client, large_catalog):
+        """Test large bodies are gzip-encoded with a per-encoding ETag."""
+        import gzip
+        
+        plain = client.get('/api/locations/vietnam')
+        encoded = client.get('/api/locations/vietnam', headers={'Accept-Encoding': 'gzip'})
+        
+        assert 'Content-Encoding' not in plain.headers
+        assert encoded.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in encoded.headers['Vary']
+        assert gzip.decompress(encoded.data) == plain.data
+        assert encoded.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+        
+        revalidated = client.get('/api/locations/vietnam', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': encoded.headers['ETag']
+        })
+        assert revalidated.status_code == 304
+    
+    def test_identity_when_not_accepted(self, client, large_catalog):
+        """Test clients refusing gzip get the plain body."""
+        response = client.get('/api/locations/vietnam', headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in response.headers
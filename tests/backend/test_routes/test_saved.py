@@ -214,6 +214,35 @@ class TestGetSavedList:
         for field in required_fields:
             assert field in item
 
+    def test_get_saved_list_summary_view(self, client, auth_headers, test_user, test_destination):
+        """Test view=summary returns only the summary projection"""
+        with client.application.app_context():
+            db.session.add(SavedDestination(user_id=test_user.id, destination_id=test_destination.id))
+            db.session.commit()
+        
+        response = client.get('/api/saved/list?view=summary', headers=auth_headers)
+        
+        assert response.status_code == 200
+        item = json.loads(response.data)[0]
+        assert set(item) == {'id', 'name', 'province_name', 'thumbnail_url', 'rating'}
+        assert item['province_name'] == 'Hà Nội'
+
+    def test_get_saved_list_fields(self, client, auth_headers, test_user, test_destination):
+        """Test fields= selects the listed fields plus id"""
+        with client.application.app_context():
+            db.session.add(SavedDestination(user_id=test_user.id, destination_id=test_destination.id))
+            db.session.commit()
+        
+        response = client.get('/api/saved/list?fields=tags,name', headers=auth_headers)
+        
+        item = json.loads(response.data)[0]
+        assert item == {'id': test_destination.id, 'name': 'Vịnh Hạ Long', 'tags': ['Beach', 'Adventure']}
+
+    def test_get_saved_list_unknown_field(self, client, auth_headers):
+        """Test unknown fields are rejected"""
+        response = client.get('/api/saved/list?fields=password', headers=auth_headers)
+        assert response.status_code == 400
+
     def test_get_saved_list_unauthorized(self, client):
         """Test getting saved list without authentication"""
         response = client.get('/api/saved/list')
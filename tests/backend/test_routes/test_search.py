@@ -273,3 +273,33 @@ class TestSearchByPhoto:
         
         assert response.status_code == 401
 
+
+
+class TestFullTextIndex:
+    """Tests for the FTS5 index behind destination search"""
+
+    def test_search_matches_description(self, client, test_destination):
+        """Test unaccented words from the description are searchable"""
+        response = client.get('/api/search?q=thien nhien')
+
+        data = json.loads(response.data)
+        assert [item['id'] for item in data] == [test_destination.id]
+
+    def test_index_follows_updates(self, client, app, test_destination):
+        """Test renaming a destination re-indexes it"""
+        with app.app_context():
+            dest = db.session.get(Destination, test_destination.id)
+            dest.name = 'Phố cổ Hội An'
+            dest.name_unaccented = 'pho co hoi an'
+            db.session.commit()
+
+        assert json.loads(client.get('/api/search?q=hoi an').data)[0]['id'] == test_destination.id
+        assert json.loads(client.get('/api/destinations?search=ha long').data)['items'] == []
+
+    def test_index_follows_deletes(self, client, app, test_destination):
+        """Test deleted destinations disappear from search"""
+        with app.app_context():
+            db.session.delete(db.session.get(Destination, test_destination.id))
+            db.session.commit()
+
+        assert json.loads(client.get('/api/search?q=vinh').data) == []
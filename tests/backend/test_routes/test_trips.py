@@ -93,6 +93,120 @@ class TestCreateTrip:
         # Would need to create test destinations first
         assert response.status_code in [201, 400]  # 400 if no destinations
     
+    def test_create_trip_groups_days_by_area(self, client, app, auth_headers, test_province):
+        """Test generated days are geographic clusters scheduled in time order."""
+        from models import db, Destination
+        coords = [(21.00, 105.50), (21.00, 106.00), (21.01, 105.51), (21.01, 106.01)]
+        with app.app_context():
+            for i, (lat, lng) in enumerate(coords):
+                db.session.add(Destination(
+                    name=f'Place {i}', province_id=test_province.id, category='City', place_type='attraction',
+                    latitude=lat, longitude=lng, rating=5 - i,
+                ))
+            db.session.commit()
+
+        response = client.post(
+            '/api/trips',
+            data=json.dumps({"name": "Geo Trip", "province_id": test_province.id, "duration": 2}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 201
+        days = json.loads(response.data)['trip']['itinerary']
+        assert [len(day['places']) for day in days] == [2, 2]
+        for day in days:
+            assert {int(place['name'][-1]) % 2 for place in day['places']} in ({0}, {1})
+            slots = [place['time_slot'] for place in day['places']]
+            assert slots == sorted(slots)
+
+    def test_generator_reads_candidates_from_pool(self, app, test_province):
+        """Test one query warms the province pool, later generations hit no database rows"""
+        from sqlalchemy import event
+        from models import db, Destination
+        from app import generate_itinerary_optimized
+        with app.app_context():
+            hotel = Destination(name='Hotel', province_id=test_province.id, place_type='Luxury Hotel',
+                                entry_fee=100, latitude=21.0, longitude=105.8)
+            places = [
+                Destination(name=f'Place {i}', province_id=test_province.id, rating=i,
+                            latitude=21.0 + i / 100, longitude=105.8)
+                for i in range(12)
+            ]
+            db.session.add_all([hotel] + places)
+            db.session.commit()
+            assert hotel.is_accommodation is True and places[0].is_accommodation is False
+
+            statements = []
+            record = lambda conn, cursor, statement, *args: statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                result = generate_itinerary_optimized(
+                    test_province.id, 2, 0, must_include_place_ids=[hotel.id, places[0].id]
+                )
+                assert len(statements) == 1
+                again = generate_itinerary_optimized(
+                    test_province.id, 2, 0, must_include_place_ids=[hotel.id, places[0].id]
+                )
+                assert len(statements) == 1
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+
+            assert again == result
+            assert result['hotel_info']['id'] == hotel.id
+            names = [p['name'] for day in result['itinerary'] for p in day['places'] if p['name'] != 'Hotel']
+            # Điểm bắt buộc + 7 điểm rating cao nhất (tối đa 4 điểm/ngày)
+            assert sorted(names) == sorted(['Place 0'] + [f'Place {i}' for i in range(5, 12)])
+
+            # Ghi catalog làm pool hết hạn: điểm mới rating cao được chọn ngay
+            db.session.add(Destination(name='New Place', province_id=test_province.id, rating=20,
+                                       latitude=21.2, longitude=105.8))
+            db.session.commit()
+            result = generate_itinerary_optimized(test_province.id, 1, 0)
+            assert 'New Place' in [p['name'] for p in result['itinerary'][0]['places']]
+
+    def test_generator_respects_opening_hours(self, app, test_province):
+        """Test opening hours are parsed on write and honoured by the schedule."""
+        from models import db, Destination
+        from app import generate_itinerary_optimized
+        with app.app_context():
+            evening = Destination(name='Night Market', province_id=test_province.id, rating=5,
+                                  opening_hours='14:00 - 18:00', latitude=21.0, longitude=105.8)
+            morning = Destination(name='Temple', province_id=test_province.id, rating=4,
+                                  opening_hours='Sáng: 07:30 - 11:30', latitude=21.01, longitude=105.8)
+            db.session.add_all([evening, morning])
+            db.session.commit()
+            assert evening.opening_windows == '[[840,1080]]'
+
+            result = generate_itinerary_optimized(test_province.id, 1, 0)
+            slots = {p['name']: p['time_slot'] for p in result['itinerary'][0]['places']}
+            assert slots['Temple'] == '08:00 - 10:00'
+            assert slots['Night Market'] >= '14:00'
+
+    def test_generator_places_hotel_near_days(self, app, test_province):
+        """Test choose_hotel picks the affordable hotel closest to the day clusters"""
+        from models import db, Destination
+        from app import generate_itinerary_optimized
+        with app.app_context():
+            db.session.add_all([
+                Destination(name=f'Sight {i}', province_id=test_province.id, rating=5, latitude=lat, longitude=105.8)
+                for i, lat in enumerate([21.00, 21.01, 21.20, 21.21])
+            ] + [
+                Destination(name='Far Hotel', province_id=test_province.id, place_type='Hotel', entry_fee=100,
+                            latitude=22.0, longitude=105.8),
+                Destination(name='Central Hotel', province_id=test_province.id, place_type='Hotel', entry_fee=100,
+                            latitude=21.1, longitude=105.8),
+                Destination(name='Luxury Hotel', province_id=test_province.id, place_type='Hotel', entry_fee=10_000,
+                            latitude=21.1, longitude=105.81),
+            ])
+            db.session.commit()
+
+            assert generate_itinerary_optimized(test_province.id, 2, 0)['hotel_info'] is None
+            result = generate_itinerary_optimized(test_province.id, 2, 5_000, choose_hotel=True)
+            assert result['hotel_info']['name'] == 'Central Hotel'
+            assert result['total_estimated_cost'] == 100
+            assert all(day['places'][0]['name'] == 'Central Hotel' for day in result['itinerary'])
+
     def test_create_trip_validation_errors(self, client, auth_headers):
         """Test trip creation with invalid data."""
         data = {
@@ -113,6 +227,289 @@ class TestCreateTrip:
         assert "message" in data
 
 
+class TestRegenerateTrip:
+    """Tests for POST /api/trips/<id>/regenerate."""
+
+    def _seed_places(self, app, province_id):
+        from models import db, Destination
+        with app.app_context():
+            db.session.add_all([
+                Destination(name=f'Place {i}', province_id=province_id, rating=4.0 + (i % 3) / 10,
+                            latitude=21.0 + i / 100, longitude=105.8)
+                for i in range(20)
+            ])
+            db.session.commit()
+
+    def _regenerate(self, client, auth_headers, trip_id, **payload):
+        response = client.post(
+            f'/api/trips/{trip_id}/regenerate',
+            data=json.dumps(dict({"duration": 1}, **payload)),
+            content_type='application/json',
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        trip = json.loads(response.data)['trip']
+        return [p['name'] for p in trip['itinerary'][0]['places']], trip['metadata']
+
+    def test_same_inputs_give_cached_draft(self, client, app, auth_headers, test_itinerary, test_province):
+        """Test regenerating with the same inputs is deterministic and served from the draft cache"""
+        from utils.draft_cache import itinerary_draft_cache
+        self._seed_places(app, test_province.id)
+        first, metadata = self._regenerate(client, auth_headers, test_itinerary.id)
+        assert metadata['shuffle_seed'] is None
+        assert len(itinerary_draft_cache) == 1
+        assert self._regenerate(client, auth_headers, test_itinerary.id)[0] == first
+
+    def test_shuffle_gives_reproducible_variety(self, client, app, auth_headers, test_itinerary, test_province):
+        """Test shuffle=true varies the draft and its stored seed reproduces it"""
+        self._seed_places(app, test_province.id)
+        plain, _ = self._regenerate(client, auth_headers, test_itinerary.id)
+        drafts = {}
+        for _ in range(5):
+            names, metadata = self._regenerate(client, auth_headers, test_itinerary.id, shuffle=True)
+            drafts[metadata['shuffle_seed']] = names
+        assert any(set(names) != set(plain) for names in drafts.values())
+        seed, names = next(iter(drafts.items()))
+        assert self._regenerate(client, auth_headers, test_itinerary.id, seed=seed)[0] == names
+
+
+class TestTripVariants:
+    """Tests for POST /api/trips/<id>/variants."""
+
+    def test_variants_then_pick_one(self, client, app, auth_headers, test_itinerary, test_province, monkeypatch):
+        """Test K variants are returned without saving and one is persisted through regenerate"""
+        from models import db, Destination, Itinerary
+        monkeypatch.setenv("ITINERARY_VARIANT_WORKERS", "0")
+        with app.app_context():
+            db.session.add_all([
+                Destination(name=f'Paid {i}', province_id=test_province.id, rating=5, entry_fee=500_000,
+                            latitude=21.0 + i / 100, longitude=105.8)
+                for i in range(4)
+            ] + [
+                Destination(name=f'Free {i}', province_id=test_province.id, rating=4, entry_fee=0,
+                            latitude=21.0 + i / 100, longitude=105.9)
+                for i in range(4)
+            ])
+            db.session.commit()
+            saved_json = db.session.get(Itinerary, test_itinerary.id).itinerary_json
+
+        response = client.post(
+            f'/api/trips/{test_itinerary.id}/variants',
+            data=json.dumps({"count": 4}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        variants = json.loads(response.data)['variants']
+        assert [v['objective'] for v in variants] == ['rating', 'cheapest', 'least_travel', 'rating']
+        assert [v['seed'] is None for v in variants] == [True, True, True, False]
+        names = lambda v: {p['name'] for p in v['itinerary'][0]['places']}
+        assert all(name.startswith('Paid') for name in names(variants[0]))
+        assert all(name.startswith('Free') for name in names(variants[1]))
+        assert variants[1]['total_estimated_cost'] == 0
+        with app.app_context():
+            assert db.session.get(Itinerary, test_itinerary.id).itinerary_json == saved_json
+
+        response = client.post(
+            f'/api/trips/{test_itinerary.id}/regenerate',
+            data=json.dumps({"objective": "cheapest"}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        trip = json.loads(response.data)['trip']
+        assert trip['itinerary'] == variants[1]['itinerary']
+        assert trip['metadata']['objective'] == 'cheapest'
+
+    def test_variants_follow_choose_hotel(self, client, app, auth_headers, test_user, test_province, monkeypatch):
+        """Test a choose_hotel trip gets a hotel in every variant and picking one is served from the cache"""
+        from models import db, Destination, Itinerary
+        monkeypatch.setenv("ITINERARY_VARIANT_WORKERS", "0")
+        with app.app_context():
+            db.session.add_all([
+                Destination(name=f'Sight {i}', province_id=test_province.id, rating=5, latitude=lat, longitude=105.8)
+                for i, lat in enumerate([21.00, 21.01, 21.20, 21.21])
+            ] + [
+                Destination(name='Central Hotel', province_id=test_province.id, place_type='Hotel', entry_fee=100,
+                            latitude=21.1, longitude=105.8),
+            ])
+            trip = Itinerary(user_id=test_user.id, name='Trip', province_id=test_province.id, duration=2,
+                             metadata_json=json.dumps({"max_budget": 0, "choose_hotel": True}))
+            db.session.add(trip)
+            db.session.commit()
+            trip_id = trip.id
+
+        response = client.post(f'/api/trips/{trip_id}/variants', json={"count": 3}, headers=auth_headers)
+        assert response.status_code == 200
+        variants = json.loads(response.data)['variants']
+        assert all(v['hotel_info']['name'] == 'Central Hotel' for v in variants)
+
+        import app as app_module
+        monkeypatch.setattr(app_module, "generate_itinerary_optimized",
+                            lambda *a, **kw: pytest.fail("cache miss for the picked variant"))
+        response = client.post(f'/api/trips/{trip_id}/regenerate', json={"objective": "least_travel"},
+                               headers=auth_headers)
+        assert response.status_code == 200
+        assert json.loads(response.data)['trip']['itinerary'] == variants[2]['itinerary']
+
+    def test_invalid_objective(self, client, auth_headers, test_itinerary):
+        """Test regenerate rejects an unknown objective"""
+        response = client.post(
+            f'/api/trips/{test_itinerary.id}/regenerate',
+            data=json.dumps({"objective": "fastest"}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+
+class TestAddPlace:
+    """Tests for POST /api/trips/<id>/add-place."""
+
+    def test_add_place_inserts_between_neighbours(self, client, app, auth_headers, test_user, test_province):
+        """Test the place is inserted where it adds least travel and later stops are re-timed"""
+        from models import db, Destination, Itinerary
+        with app.app_context():
+            north = Destination(name='North', province_id=test_province.id, latitude=21.2, longitude=105.8)
+            south = Destination(name='South', province_id=test_province.id, latitude=21.0, longitude=105.8)
+            middle = Destination(name='Middle', province_id=test_province.id, latitude=21.1, longitude=105.8,
+                                 estimated_duration_hours=1)
+            db.session.add_all([north, south, middle])
+            db.session.flush()
+            trip = Itinerary(user_id=test_user.id, name='Trip', province_id=test_province.id, duration=1,
+                             itinerary_json=json.dumps([{"day": 1, "places": [
+                                 {"id": south.id, "name": "South", "time_slot": "08:00 - 10:00"},
+                                 {"id": north.id, "name": "North", "time_slot": "10:30 - 12:30"},
+                             ]}]))
+            db.session.add(trip)
+            db.session.commit()
+            trip_id, middle_id = trip.id, middle.id
+
+        response = client.post(
+            f'/api/trips/{trip_id}/add-place',
+            data=json.dumps({"place_id": middle_id, "day": 1}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        with app.app_context():
+            places = json.loads(db.session.get(Itinerary, trip_id).itinerary_json)[0]['places']
+        assert [p['name'] for p in places] == ['South', 'Middle', 'North']
+        assert places[0]['time_slot'] == '08:00 - 10:00'
+        assert places[1]['time_slot'] == '10:13 - 11:13'
+        assert places[2]['time_slot'] == '11:26 - 13:26'
+
+    def test_add_place_duplicate(self, client, app, auth_headers, test_user, test_province):
+        """Test a place already on that day is rejected"""
+        from models import db, Destination, Itinerary
+        with app.app_context():
+            place = Destination(name='Only', province_id=test_province.id)
+            db.session.add(place)
+            db.session.flush()
+            trip = Itinerary(user_id=test_user.id, name='Trip', province_id=test_province.id, duration=2,
+                             itinerary_json=json.dumps([{"day": 1, "places": [{"id": place.id, "name": "Only"}]}]))
+            db.session.add(trip)
+            db.session.commit()
+            trip_id, place_id = trip.id, place.id
+
+        post = lambda day: client.post(
+            f'/api/trips/{trip_id}/add-place',
+            data=json.dumps({"place_id": place_id, "day": day}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+        assert post(1).status_code == 400
+        assert post(2).status_code == 200
+        assert post(3).status_code == 400
+
+
+class TestExtendTrip:
+    """Tests for POST /api/trips/<id>/extend."""
+
+    def test_extend_adds_day_without_used_places(self, client, app, auth_headers, test_itinerary, test_province):
+        """Test the new day is generated from unused places of the trip's province"""
+        from models import db, Destination
+        with app.app_context():
+            used = Destination(name='Used', province_id=test_province.id, rating=5,
+                               latitude=21.0, longitude=105.8)
+            fresh = Destination(name='Fresh', province_id=test_province.id, rating=4,
+                                latitude=21.01, longitude=105.8)
+            db.session.add_all([used, fresh])
+            db.session.commit()
+            used_id = used.id
+
+        response = client.post(
+            f'/api/trips/{test_itinerary.id}/extend',
+            data=json.dumps({"duration": 2, "new_day": 2, "used_place_ids": [used_id]}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        days = json.loads(response.data)['new_day_itinerary']
+        assert [p['name'] for p in days[-1]['places']] == ['Fresh']
+        assert [day['day'] for day in days] == [1, 2]
+
+
+    def test_extend_skips_places_already_in_trip(self, client, app, auth_headers, test_user, test_province):
+        """Test places saved in earlier days are excluded even if the client sends no used ids"""
+        from models import db, Destination, Itinerary
+        with app.app_context():
+            first = Destination(name='First', province_id=test_province.id, rating=5)
+            second = Destination(name='Second', province_id=test_province.id, rating=4)
+            db.session.add_all([first, second])
+            db.session.flush()
+            trip = Itinerary(user_id=test_user.id, name='Trip', province_id=test_province.id, duration=1,
+                             itinerary_json=json.dumps([{"day": 1, "places": [{"id": first.id, "name": "First"}]}]))
+            db.session.add(trip)
+            db.session.commit()
+            trip_id = trip.id
+
+        response = client.post(
+            f'/api/trips/{trip_id}/extend',
+            data=json.dumps({"duration": 2, "new_day": 2}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        days = json.loads(response.data)['new_day_itinerary']
+        assert [p['name'] for p in days[1]['places']] == ['Second']
+
+    def test_extend_respects_remaining_budget(self, client, app, auth_headers, test_user, test_province):
+        """Test the new day only spends what is left of the trip's max_budget"""
+        from models import db, Destination, Itinerary
+        with app.app_context():
+            first = Destination(name='First', province_id=test_province.id, rating=5, entry_fee=60)
+            pricey = Destination(name='Pricey', province_id=test_province.id, rating=5, entry_fee=80)
+            cheap = Destination(name='Cheap', province_id=test_province.id, rating=3, entry_fee=20)
+            db.session.add_all([first, pricey, cheap])
+            db.session.flush()
+            trip = Itinerary(user_id=test_user.id, name='Trip', province_id=test_province.id, duration=1,
+                             itinerary_json=json.dumps([{"day": 1, "places": [
+                                 {"id": first.id, "name": "First", "estimated_cost": 60}]}]),
+                             metadata_json=json.dumps({"max_budget": 100, "total_estimated_cost": 60}))
+            db.session.add(trip)
+            db.session.commit()
+            trip_id = trip.id
+
+        response = client.post(
+            f'/api/trips/{trip_id}/extend',
+            data=json.dumps({"duration": 2, "new_day": 2}),
+            content_type='application/json',
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        days = json.loads(response.data)['new_day_itinerary']
+        assert [p['name'] for p in days[1]['places']] == ['Cheap']
+        with app.app_context():
+            metadata = json.loads(db.session.get(Itinerary, trip_id).metadata_json)
+        assert metadata['total_estimated_cost'] == 80
+
+
 class TestGetTrips:
     """Tests for GET /api/trips."""
     
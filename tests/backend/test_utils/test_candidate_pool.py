@@ -0,0 +1,97 @@
+"""
+Unit tests for the in-memory itinerary candidate pool
+"""
+from sqlalchemy import event
+
+from utils.candidate_pool import PlaceRecord, candidate_pool
+
+
+def _count_statements(engine):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', listener)
+
+
+class TestCandidatePool:
+    """Tests for CandidatePool"""
+
+    def test_province_sorted_by_rating_and_cached(self, app, test_province):
+        """Test records are sorted best-first, decoded once and reused until the catalog changes"""
+        from models import db, Destination
+        with app.app_context():
+            db.session.add_all([
+                Destination(name='Unrated', province_id=test_province.id, latitude=21.0, longitude=105.8),
+                Destination(name='Good', province_id=test_province.id, rating=4.5, opening_hours='07:30 - 17:00'),
+                Destination(name='Best', province_id=test_province.id, rating=5, estimated_duration_hours=1.5),
+            ])
+            db.session.commit()
+
+            statements, stop = _count_statements(db.engine)
+            try:
+                places = candidate_pool.province(db.session, test_province.id)
+                assert candidate_pool.province(db.session, test_province.id) is places
+            finally:
+                stop()
+            assert len(statements) == 1
+            assert [p.name for p in places] == ['Best', 'Good', 'Unrated']
+            assert all(isinstance(p, PlaceRecord) for p in places)
+            assert places[0].duration_minutes == 90
+            assert places[1].windows == [(450, 1020)]
+
+            assert not hasattr(places[0], '__dict__')
+
+            db.session.get(Destination, places[2].id).rating = 5.5
+            db.session.commit()
+            assert candidate_pool.province(db.session, test_province.id)[0].name == 'Unrated'
+
+    def test_get_many_uses_loaded_provinces(self, app, test_province):
+        """Test id lookups only query ids outside the loaded provinces"""
+        from models import db, Destination, Province
+        with app.app_context():
+            other = Province(name='Other Province', region_id=test_province.region_id)
+            db.session.add(other)
+            db.session.flush()
+            inside = Destination(name='Inside', province_id=test_province.id)
+            outside = Destination(name='Outside', province_id=other.id)
+            db.session.add_all([inside, outside])
+            db.session.commit()
+            inside_id, outside_id = inside.id, outside.id
+
+            candidate_pool.province(db.session, test_province.id)
+            statements, stop = _count_statements(db.engine)
+            try:
+                found = candidate_pool.get_many(db.session, [inside_id, outside_id, 99999])
+                candidate_pool.get_many(db.session, [inside_id, outside_id])
+            finally:
+                stop()
+            assert len(statements) == 1
+            assert {dest_id: p.name for dest_id, p in found.items()} == {inside_id: 'Inside', outside_id: 'Outside'}
+
+    def test_province_id_normalized(self, app, test_province):
+        """Test "5" and 5 share one pool entry and invalid ids are empty"""
+        from models import db, Destination
+        with app.app_context():
+            db.session.add(Destination(name='Only', province_id=test_province.id))
+            db.session.commit()
+
+            places = candidate_pool.province(db.session, test_province.id)
+            assert candidate_pool.province(db.session, str(test_province.id)) is places
+            assert candidate_pool.province(db.session, 'abc') == ()
+
+    def test_out_of_process_reseed_drops_pool(self, app, test_province):
+        """Test a catalog change committed by another process (seed.py) reloads the province"""
+        from sqlalchemy import text
+        from models import db, Destination
+        from utils.catalog_cache import sync_catalog_version
+        with app.app_context():
+            db.session.add(Destination(name='Old', province_id=test_province.id, rating=4))
+            db.session.commit()
+            assert [p.name for p in candidate_pool.province(db.session, test_province.id)] == ['Old']
+
+            with db.engine.begin() as connection:
+                connection.execute(text("UPDATE destinations SET name = 'Reseeded'"))
+                connection.execute(text("UPDATE catalog_meta SET version = version + 1"))
+            sync_catalog_version(db.engine)  # before_request / đầu mỗi job nền
+
+            assert [p.name for p in candidate_pool.province(db.session, test_province.id)] == ['Reseeded']
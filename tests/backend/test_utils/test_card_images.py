@@ -0,0 +1,88 @@
+"""
+Unit tests for the precomputed card image helpers
+"""
+import pytest
+from utils import card_images
+from utils.card_images import make_thumbnail, resolve_card_image, static_image_path
+
+
+class TestResolveCardImage:
+    """Tests for resolve_card_image"""
+
+    def test_image_url_wins(self):
+        """Test the destination's own image_url is preferred over the gallery"""
+        assert resolve_card_image("https://img/own.jpg", ["https://img/1.jpg"]) == "https://img/own.jpg"
+
+    def test_local_image_url_becomes_static_path(self):
+        """Test local image references are stored as static paths"""
+        assert resolve_card_image("/static/images/halong.png") == "images/halong.png"
+        assert static_image_path("halong.png") == "images/halong.png"
+
+    def test_first_web_gallery_image(self):
+        """Test the fallback skips non-web gallery entries"""
+        gallery = ["local.png", None, "https://img/2.jpg", "https://img/3.jpg"]
+        assert resolve_card_image(None, gallery) == "https://img/2.jpg"
+
+    def test_no_image(self):
+        """Test None when nothing usable exists"""
+        assert resolve_card_image("", ["local.png"]) is None
+
+
+class TestMakeThumbnail:
+    """Tests for make_thumbnail"""
+
+    def test_web_url_is_its_own_thumbnail(self, tmp_path):
+        """Test remote images have no local variant"""
+        assert make_thumbnail("https://img/1.jpg", str(tmp_path)) == "https://img/1.jpg"
+        assert make_thumbnail(None, str(tmp_path)) is None
+
+    def test_falls_back_without_pillow(self, tmp_path, monkeypatch):
+        """Test the full image is used when Pillow is missing"""
+        monkeypatch.setattr(card_images, "Image", None)
+        assert make_thumbnail("images/halong.png", str(tmp_path)) == "images/halong.png"
+
+    def test_falls_back_when_source_missing(self, tmp_path):
+        """Test a missing source file does not raise"""
+        if card_images.Image is None:
+            pytest.skip("Pillow not installed")
+        assert make_thumbnail("images/missing.png", str(tmp_path)) == "images/missing.png"
+
+    def test_writes_downscaled_copy(self, tmp_path):
+        """Test a local image gets a thumbnail under images/thumbs"""
+        if card_images.Image is None:
+            pytest.skip("Pillow not installed")
+        (tmp_path / "images").mkdir()
+        card_images.Image.new("RGB", (1200, 800)).save(tmp_path / "images" / "halong.png")
+
+        assert make_thumbnail("images/halong.png", str(tmp_path)) == "images/thumbs/halong.png"
+        with card_images.Image.open(tmp_path / "images" / "thumbs" / "halong.png") as thumb:
+            assert max(thumb.size) <= card_images.THUMBNAIL_SIZE[0]
+
+
+class TestCardImageFlush:
+    """Tests for the card image flush hook"""
+
+    def test_flush_keeps_thumbnail_without_image_processing(self, app, test_province, monkeypatch):
+        """Test writes never generate thumbnails; an unchanged card keeps its rebuilt thumbnail"""
+        from models import db, Destination
+
+        def fail(*args):
+            raise AssertionError("make_thumbnail called inside a flush")
+
+        monkeypatch.setattr(card_images, "make_thumbnail", fail)
+        with app.app_context():
+            dest = Destination(name='Hạ Long', province_id=test_province.id, image_url='halong.png')
+            db.session.add(dest)
+            db.session.commit()
+            assert (dest.card_image_url, dest.card_thumbnail_url) == ('images/halong.png', 'images/halong.png')
+
+            # Như sau flask card-images-rebuild
+            dest.card_thumbnail_url = 'images/thumbs/halong.png'
+            db.session.commit()
+            dest.name = 'Vịnh Hạ Long'
+            db.session.commit()
+            assert dest.card_thumbnail_url == 'images/thumbs/halong.png'
+
+            dest.image_url = 'sapa.png'
+            db.session.commit()
+            assert (dest.card_image_url, dest.card_thumbnail_url) == ('images/sapa.png', 'images/sapa.png')
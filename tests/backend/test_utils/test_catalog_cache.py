@@ -0,0 +1,138 @@
+"""
+Unit tests for the destination card cache
+"""
+import pytest
+from utils.catalog_cache import DestinationCardCache
+
+
+class TestDestinationCardCache:
+    """Tests for DestinationCardCache class"""
+
+    def test_get_many_splits_hits_and_misses(self):
+        """Test get_many returns cached cards and the missing ids"""
+        cache = DestinationCardCache()
+        cache.put(1, {"id": 1})
+
+        found, missing = cache.get_many([1, 2])
+
+        assert found == {1: {"id": 1}}
+        assert missing == [2]
+
+    def test_invalidate_ids_bumps_version(self):
+        """Test invalidating specific ids drops only those cards"""
+        cache = DestinationCardCache()
+        cache.put(1, {"id": 1})
+        cache.put(2, {"id": 2})
+        version = cache.version
+
+        cache.invalidate([1])
+
+        assert cache.version == version + 1
+        found, missing = cache.get_many([1, 2])
+        assert list(found) == [2]
+        assert missing == [1]
+
+    def test_invalidate_all(self):
+        """Test invalidating without ids clears the cache"""
+        cache = DestinationCardCache()
+        cache.put(1, {"id": 1})
+
+        cache.invalidate()
+
+        assert len(cache) == 0
+
+    def test_put_skips_stale_version(self):
+        """Test a card built before an invalidation is not stored"""
+        cache = DestinationCardCache()
+        version = cache.version
+        cache.invalidate([1])
+
+        cache.put(1, {"id": 1}, version)
+
+        assert len(cache) == 0
+
+    def test_modified_at_is_utc_whole_seconds(self):
+        """Test modified_at is usable as an HTTP Last-Modified value"""
+        cache = DestinationCardCache()
+        before = cache.modified_at
+        cache.invalidate()
+        assert cache.modified_at.tzinfo is not None
+        assert cache.modified_at.microsecond == 0
+        assert cache.modified_at >= before
+
+
+class TestSharedCatalogVersion:
+    """Tests for the catalog_meta version shared between processes"""
+
+    def _bump_elsewhere(self, db):
+        # Giống seed.py / worker khác: ghi thẳng vào CSDL, không qua cache của process này
+        from sqlalchemy import text
+        with db.engine.begin() as connection:
+            connection.execute(text("UPDATE catalog_meta SET version = version + 1"))
+
+    def test_out_of_process_write_drops_cached_cards(self, app):
+        """Test a version bumped by another process is picked up by the next sync"""
+        from models import db
+        from utils.catalog_cache import destination_card_cache, get_catalog_version, sync_catalog_version
+
+        sync_catalog_version(db.engine)
+        destination_card_cache.put(1, {"id": 1})
+        version = get_catalog_version()
+
+        assert sync_catalog_version(db.engine) is False
+        self._bump_elsewhere(db)
+        assert sync_catalog_version(db.engine) is True
+
+        assert get_catalog_version() > version
+        assert destination_card_cache.get_many([1]) == ({}, [1])
+
+    def test_throttled_sync_reads_at_most_once_per_interval(self, app, monkeypatch):
+        """Test throttled syncs skip the catalog_meta read until the interval has passed"""
+        from models import db
+        from utils.catalog_cache import sync_catalog_version
+
+        monkeypatch.setenv("CATALOG_SYNC_INTERVAL", "3600")
+        sync_catalog_version(db.engine)
+        self._bump_elsewhere(db)
+        assert sync_catalog_version(db.engine, throttle=True) is False
+
+        monkeypatch.setenv("CATALOG_SYNC_INTERVAL", "0")
+        assert sync_catalog_version(db.engine, throttle=True) is True
+
+    def test_own_write_bumps_shared_version(self, app, test_province):
+        """Test a committed catalog write increments catalog_meta in the same transaction"""
+        from models import db, CatalogMeta, Destination
+        from utils.catalog_cache import get_shared_catalog_state, sync_catalog_version
+
+        sync_catalog_version(db.engine)
+        before = db.session.get(CatalogMeta, 1).version
+
+        db.session.add(Destination(name="Hồ Gươm", province_id=test_province.id))
+        db.session.commit()
+
+        assert db.session.get(CatalogMeta, 1).version == before + 1
+        assert get_shared_catalog_state()[0] == before + 1
+        # Process này đã biết version mới: không bỏ cache lần nữa
+        assert sync_catalog_version(db.engine) is False
+
+    def test_rolled_back_write_keeps_shared_version(self, app, test_province):
+        """Test a rolled back catalog write leaves catalog_meta unchanged"""
+        from models import db, CatalogMeta, Destination
+
+        before = db.session.get(CatalogMeta, 1).version
+        db.session.add(Destination(name="Hồ Gươm", province_id=test_province.id))
+        db.session.flush()
+        db.session.rollback()
+
+        assert db.session.get(CatalogMeta, 1).version == before
+
+    def test_mark_catalog_changed_bumps_shared_version(self, app):
+        """Test Core rebuilds (seed.py, flask *-reindex) bump the shared version too"""
+        from models import db, CatalogMeta
+        from utils.catalog_cache import mark_catalog_changed
+
+        before = db.session.get(CatalogMeta, 1).version
+        mark_catalog_changed(db.session)
+        db.session.commit()
+
+        assert db.session.get(CatalogMeta, 1).version == before + 1
@@ -0,0 +1,81 @@
+"""
+Unit tests for token-budgeted chat history
+"""
+from unittest.mock import patch
+
+from utils.chat_history import (
+    estimate_tokens,
+    fit_history,
+    message_tokens,
+    split_for_summary,
+    summary_chunk_size,
+    summary_messages,
+)
+
+
+def _turn(content, role="user"):
+    return {"role": role, "content": content}
+
+
+class TestEstimateTokens:
+    """Tests for estimate_tokens"""
+
+    def test_empty_text(self):
+        """Test empty text costs nothing"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens(None) == 0
+
+    @patch('utils.chat_history._tiktoken_encoding', return_value=None)
+    def test_heuristic_grows_with_text(self, _):
+        """Test the fallback estimate counts words, punctuation and long accented words"""
+        assert estimate_tokens("Hà Nội, Huế!") == 7
+        assert estimate_tokens("Đà Lạt " * 10) == 30
+        assert estimate_tokens("a" * 40) == 10
+
+
+class TestFitHistory:
+    """Tests for fit_history"""
+
+    def test_keeps_newest_turns_within_budget(self):
+        """Test the oldest turns are dropped first"""
+        fixed = [_turn("system", "system")]
+        turns = [_turn(f"tin nhắn {i}") for i in range(10)]
+        budget = message_tokens(fixed[0]) + 3 * message_tokens(turns[0])
+        messages, dropped = fit_history(fixed, turns, budget)
+        assert dropped == 7
+        assert messages == fixed + turns[-3:]
+
+    def test_last_turn_always_kept(self):
+        """Test the message being answered is sent even when it alone exceeds the budget"""
+        messages, dropped = fit_history([], [_turn("cũ"), _turn("Đà Lạt " * 200)], 10)
+        assert dropped == 1
+        assert len(messages) == 1
+
+
+class TestSummary:
+    """Tests for split_for_summary and summary_messages"""
+
+    def test_split_keeps_recent(self):
+        """Test only messages older than the recent window are folded"""
+        assert split_for_summary([1, 2, 3, 4, 5], recent=2) == ([1, 2, 3], [4, 5])
+        assert split_for_summary([1, 2], recent=2) == ([], [1, 2])
+
+    def test_summary_prompt_includes_previous_summary_and_turns(self):
+        """Test the summarizer sees the old summary and the new transcript"""
+        messages = summary_messages("Đi Huế 3 ngày.", [("user", "Thêm Hội An"), ("assistant", "Được")])
+        assert messages[0]["role"] == "system"
+        assert "Đi Huế 3 ngày." in messages[1]["content"]
+        assert "Người dùng: Thêm Hội An" in messages[1]["content"]
+        assert "Trợ lý: Được" in messages[1]["content"]
+
+    def test_chunk_size_fits_prompt_budget(self):
+        """Test a long backlog is split so each summary prompt stays within budget"""
+        turns = [("user", "Đà Lạt " * 50)] * 10
+        base = sum(message_tokens(m) for m in summary_messages("Đi Huế.", []))
+        take = summary_chunk_size("Đi Huế.", turns, budget=base + 3 * (estimate_tokens("Người dùng: " + turns[0][1]) + 1))
+        assert take == 3
+        assert summary_chunk_size("Đi Huế.", turns, budget=10 ** 6) == 10
+
+    def test_chunk_size_always_takes_one_turn(self):
+        """Test folding makes progress even when a single turn exceeds the budget"""
+        assert summary_chunk_size(None, [("user", "Đà Lạt " * 500), ("assistant", "Được")], budget=10) == 1
@@ -0,0 +1,79 @@
+"""
+Unit tests for the itinerary draft LRU cache
+"""
+from utils import draft_cache
+from utils.catalog_cache import invalidate_catalog
+from utils.draft_cache import DraftCache, draft_key, draft_seed
+
+
+class TestDraftKey:
+    """Tests for draft_key / draft_seed"""
+
+    def test_excluded_order_does_not_matter(self):
+        """Test excluded ids are a set while must-include order is kept"""
+        assert draft_key(1, 3, 0, [1, 2], [5, 4]) == draft_key("1", 3, 0.0, [1, 2], [4, 5, 5])
+        assert draft_key(1, 3, 0, [1, 2]) != draft_key(1, 3, 0, [2, 1])
+
+    def test_seed_is_stable(self):
+        """Test the same inputs always give the same seed"""
+        key = draft_key(1, 3, 0)
+        assert draft_seed(key) == draft_seed(draft_key(1, 3, None))
+        assert draft_seed(key) != draft_seed(key, salt=1)
+        assert 0 <= draft_seed(key) < 2 ** 32
+
+
+class TestDraftCache:
+    """Tests for DraftCache"""
+
+    def test_hit_returns_independent_copy(self):
+        """Test callers can modify a cached draft without changing the cache"""
+        cache = DraftCache()
+        cache.put("k", {"itinerary": [{"day": 1}]})
+        first = cache.get("k")
+        first["itinerary"][0]["day"] = 9
+        assert cache.get("k") == {"itinerary": [{"day": 1}]}
+
+    def test_lru_eviction(self):
+        """Test the least recently used draft is evicted first"""
+        cache = DraftCache(max_entries=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1} and cache.get("c") == {"n": 3}
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Test drafts older than the TTL are not served"""
+        now = [1000.0]
+        monkeypatch.setattr(draft_cache.time, "monotonic", lambda: now[0])
+        cache = DraftCache(ttl_seconds=60)
+        cache.put("k", {"n": 1})
+        now[0] += 59
+        assert cache.get("k") == {"n": 1}
+        now[0] += 2
+        assert cache.get("k") is None
+        assert len(cache) == 0
+
+    def test_catalog_change_drops_drafts(self):
+        """Test a catalog write invalidates cached drafts and stale puts are ignored"""
+        cache = DraftCache()
+        version = draft_cache.catalog_token()
+        cache.put("k", {"n": 1}, version)
+        assert cache.get("k") == {"n": 1}
+        invalidate_catalog([1])
+        assert cache.get("k") is None
+        cache.put("k", {"n": 1}, version)
+        assert cache.get("k") is None
+
+    def test_shared_catalog_change_drops_drafts(self, monkeypatch):
+        """Test drafts are tied to the shared catalog_meta version (writes by other processes)"""
+        from datetime import datetime, timezone
+        state = [(1, datetime(2026, 1, 1, tzinfo=timezone.utc))]
+        monkeypatch.setattr(draft_cache, "get_shared_catalog_state", lambda: state[0])
+        cache = DraftCache()
+        cache.put("k", {"n": 1}, draft_cache.catalog_token())
+        assert cache.get("k") == {"n": 1}
+
+        state[0] = (2, datetime(2026, 1, 2, tzinfo=timezone.utc))
+        assert cache.get("k") is None
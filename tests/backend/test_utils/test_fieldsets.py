@@ -0,0 +1,48 @@
+"""
+Unit tests for sparse fieldset parsing
+"""
+import pytest
+from utils.fieldsets import DESTINATION_FIELDS, InvalidFieldset, parse_fieldset
+
+FULL = ("id", "name", "rating", "tags")
+SUMMARY = ("id", "name")
+
+
+class TestParseFieldset:
+    """Tests for parse_fieldset"""
+
+    def test_default_payload(self):
+        """Test no parameters (or view=full) keep the default payload"""
+        assert parse_fieldset({}, FULL, SUMMARY) is None
+        assert parse_fieldset({"view": "full"}, FULL, SUMMARY) is None
+
+    def test_summary(self):
+        """Test view=summary selects the summary fields"""
+        assert parse_fieldset({"view": "Summary"}, FULL, SUMMARY) == ["id", "name"]
+
+    def test_fields_keep_canonical_order_and_id(self):
+        """Test fields are returned in payload order and always include id"""
+        assert parse_fieldset({"fields": "tags, rating"}, FULL, SUMMARY) == ["id", "rating", "tags"]
+
+    def test_fields_override_view(self):
+        """Test fields= wins over view="""
+        assert parse_fieldset({"fields": "tags", "view": "summary"}, FULL, SUMMARY) == ["id", "tags"]
+
+    def test_unknown_field(self):
+        """Test unknown field names are rejected"""
+        with pytest.raises(InvalidFieldset):
+            parse_fieldset({"fields": "name,password"}, FULL, SUMMARY)
+
+    def test_unknown_view(self):
+        """Test unknown views are rejected"""
+        with pytest.raises(InvalidFieldset):
+            parse_fieldset({"view": "compact"}, FULL, SUMMARY)
+
+
+class TestDestinationFields:
+    """Tests for the DESTINATION_FIELDS table"""
+
+    def test_only_gallery_needs_images(self):
+        """Test image rows are only loaded for the full gallery (card images are precomputed)"""
+        needing = {name for name, field in DESTINATION_FIELDS.items() if field.needs_images}
+        assert needing == {"images"}
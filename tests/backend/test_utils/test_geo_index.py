@@ -0,0 +1,61 @@
+"""
+Unit tests for the R*Tree geo index helpers
+"""
+import pytest
+from utils.geo_index import haversine_km, radius_bbox
+
+
+class TestHaversineKm:
+    """Tests for haversine_km"""
+
+    def test_same_point(self):
+        """Test distance to itself is zero"""
+        assert haversine_km(21.0, 105.8, 21.0, 105.8) == 0
+
+    def test_hanoi_to_ho_chi_minh_city(self):
+        """Test a known long distance"""
+        assert haversine_km(21.0285, 105.8542, 10.8231, 106.6297) == pytest.approx(1138, abs=5)
+
+
+class TestRadiusBbox:
+    """Tests for radius_bbox"""
+
+    def test_box_contains_circle(self):
+        """Test points exactly radius_km away in each direction stay inside the box"""
+        lat, lng, radius = 21.0, 105.8, 25.0
+        min_lat, min_lng, max_lat, max_lng = radius_bbox(lat, lng, radius)
+        assert haversine_km(lat, lng, max_lat, lng) == pytest.approx(radius, rel=1e-6)
+        assert haversine_km(lat, lng, min_lat, lng) == pytest.approx(radius, rel=1e-6)
+        assert haversine_km(lat, lng, lat, max_lng) >= radius
+        assert haversine_km(lat, lng, lat, min_lng) >= radius
+
+    def test_polar_radius_spans_all_longitudes(self):
+        """Test boxes touching a pole cover every longitude"""
+        _, min_lng, _, max_lng = radius_bbox(89.9, 10.0, 50.0)
+        assert (min_lng, max_lng) == (-180.0, 180.0)
+
+
+class TestGeoIndexAvailable:
+    """Tests for geo_index_available"""
+
+    def test_table_created_later_is_picked_up(self, app):
+        """Test a missing R*Tree table is re-checked, so one created by seed.py later is used"""
+        from models import db
+        from utils.geo_index import RTREE_TABLE, create_geo_index, drop_geo_index, geo_index_available
+
+        with db.engine.begin() as connection:
+            drop_geo_index(connection)
+        assert geo_index_available(db.session) is False
+        db.session.rollback()
+
+        # Process khác (seed.py / flask geo-reindex) tạo bảng
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+            )
+        assert geo_index_available(db.session) is True
+        db.session.rollback()
+
+        with db.engine.begin() as connection:
+            drop_geo_index(connection)
+            create_geo_index(connection)
@@ -0,0 +1,52 @@
+"""
+Unit tests for catalog conditional-GET and compression helpers
+"""
+import gzip
+
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from utils import http_cache
+from utils.http_cache import _stream_compressor, choose_encoding
+
+
+def _accept(value):
+    return parse_accept_header(value, Accept)
+
+
+class TestChooseEncoding:
+    """Tests for choose_encoding"""
+
+    def test_gzip(self):
+        """Test gzip is chosen when accepted"""
+        assert choose_encoding(_accept("gzip, deflate")) == "gzip"
+
+    def test_refused(self):
+        """Test q=0 refuses an encoding"""
+        assert choose_encoding(_accept("gzip;q=0")) is None
+
+    def test_missing_header(self):
+        """Test no Accept-Encoding means identity"""
+        assert choose_encoding(_accept("")) is None
+
+    def test_brotli_preferred_when_available(self, monkeypatch):
+        """Test br wins over gzip when the brotli module is importable"""
+        monkeypatch.setattr(http_cache, "brotli", object())
+        assert choose_encoding(_accept("gzip, br")) == "br"
+        assert choose_encoding(_accept("gzip, br;q=0.5")) == "gzip"
+
+    def test_brotli_ignored_when_missing(self, monkeypatch):
+        """Test br is never chosen without the brotli module"""
+        monkeypatch.setattr(http_cache, "brotli", None)
+        assert choose_encoding(_accept("br")) is None
+
+
+class TestStreamCompressor:
+    """Tests for _stream_compressor"""
+
+    def test_gzip_stream_round_trip(self):
+        """Test chunked gzip output decodes to the original body"""
+        chunks = [b'{"a": 1}', b", " * 500, b"]"]
+        body = b"".join(_stream_compressor(iter(chunks), "gzip"))
+        assert gzip.decompress(body) == b"".join(chunks)
@@ -0,0 +1,244 @@
+"""
+Unit tests for the route-aware itinerary planner
+"""
+import random
+
+import pytest
+from utils import itinerary_planner
+from utils.itinerary_planner import (
+    DAY_END_MIN, DAY_START_MIN, Stop, can_visit, choose_base, cluster_points, day_centroids, format_time_slot,
+    insert_stop,
+    insert_with_windows, nearest_neighbor_tour, order_day, parse_time_slot, plan_days, route_length,
+    schedule_day, schedule_stops, two_opt,
+)
+
+# Hai cụm cách nhau ~50 km quanh Hà Nội
+WEST = [(21.00, 105.50), (21.01, 105.51), (21.02, 105.49)]
+EAST = [(21.00, 106.00), (21.01, 106.01), (20.99, 106.02)]
+
+
+class TestClusterPoints:
+    """Tests for cluster_points"""
+
+    def test_separates_geographic_groups(self):
+        """Test places in the same area share a day"""
+        points = [WEST[0], EAST[0], WEST[1], EAST[1], WEST[2], EAST[2]]
+        labels = cluster_points(points, 2)
+        assert labels[0] == labels[2] == labels[4]
+        assert labels[1] == labels[3] == labels[5]
+        assert labels[0] != labels[1]
+
+    def test_capacity_is_balanced(self):
+        """Test no cluster exceeds ceil(n / k)"""
+        points = WEST * 3 + [EAST[0]]
+        labels = cluster_points(points, 2)
+        assert max(labels.count(0), labels.count(1)) <= 5
+
+    def test_missing_coordinates(self):
+        """Test places without coordinates are still assigned"""
+        labels = cluster_points([WEST[0], (None, None), EAST[0]], 2)
+        assert sorted(set(labels)) == [0, 1]
+        assert all(label in (0, 1) for label in labels)
+
+    def test_empty(self):
+        """Test empty input"""
+        assert cluster_points([], 3) == []
+
+    def test_pure_python_matches_numpy(self, monkeypatch):
+        """Test the fallback without NumPy gives the same clusters"""
+        rng = random.Random(3)
+        points = [(21 + rng.random(), 105 + rng.random()) for _ in range(50)]
+        expected = cluster_points(points, 4)
+        monkeypatch.setattr(itinerary_planner, "np", None)
+        assert cluster_points(points, 4) == expected
+
+
+class TestRouting:
+    """Tests for nearest_neighbor_tour / two_opt"""
+
+    def _line_matrix(self, xs):
+        return [[abs(a - b) for b in xs] for a in xs]
+
+    def test_two_opt_removes_crossing(self):
+        """Test 2-opt untangles a zig-zag route on a line"""
+        dist = self._line_matrix([0, 1, 2, 3, 4])
+        route = two_opt([0, 3, 1, 4, 2], dist)
+        assert route_length(route, dist) == 4
+
+    def test_two_opt_keeps_depot(self):
+        """Test a fixed start stays first"""
+        dist = self._line_matrix([0, 5, 1, 4, 2])
+        route = two_opt([2, 0, 1, 3, 4], dist, closed=True)
+        assert route[0] == 2
+
+    def test_nearest_neighbor_from_start(self):
+        """Test the greedy tour starts next to the origin and excludes it"""
+        dist = self._line_matrix([0, 10, 1, 2])
+        assert nearest_neighbor_tour([1, 2, 3], dist, start=0) == [2, 3, 1]
+
+    def test_order_day_not_worse_than_nearest_neighbor(self):
+        """Test 2-opt never lengthens the greedy tour"""
+        rng = random.Random(7)
+        pts = [(rng.random(), rng.random()) for _ in range(40)]
+        dist = [[((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5 for b in pts] for a in pts]
+        greedy = nearest_neighbor_tour(range(40), dist)
+        assert route_length(order_day(range(40), dist), dist) <= route_length(greedy, dist) + 1e-9
+
+
+class TestSchedule:
+    """Tests for schedule_day / plan_days"""
+
+    def test_schedule_uses_travel_time(self):
+        """Test each stop starts after the travel time from the previous one"""
+        travel = [[0, 20], [20, 0]]
+        stops, leftover = schedule_day([0, 1], [60, 60], travel)
+        assert [(s.start, s.end, s.travel_minutes) for s in stops] == [
+            (DAY_START_MIN, DAY_START_MIN + 60, 0),
+            (DAY_START_MIN + 80, DAY_START_MIN + 140, 20),
+        ]
+        assert leftover == []
+
+    def test_schedule_leftover(self):
+        """Test stops that would end after day_end are left over"""
+        stops, leftover = schedule_day([0, 1], [500, 200], [[0, 0], [0, 0]])
+        assert [s.index for s in stops] == [0]
+        assert leftover == [1]
+        assert stops[0].end <= DAY_END_MIN
+
+    def test_plan_days_groups_by_area(self):
+        """Test each day stays within one area"""
+        points = [WEST[0], EAST[0], WEST[1], EAST[1], WEST[2], EAST[2]]
+        days = plan_days(points, [60] * 6, 2)
+        assert len(days) == 2
+        for stops in days:
+            assert len({points[s.index][1] > 105.75 for s in stops}) == 1
+        assert sorted(s.index for stops in days for s in stops) == list(range(6))
+
+    def test_plan_days_real_travel(self):
+        """Test travel between distant stops is longer than between close ones"""
+        days = plan_days([WEST[0], EAST[0]], [60, 60], 1)
+        assert days[0][1].travel_minutes > 30
+
+    def test_plan_days_from_hotel(self):
+        """Test the first stop includes travel from the hotel"""
+        days = plan_days([EAST[0]], [60], 1, start=WEST[0])
+        assert days[0][0].travel_minutes > 0
+
+    def test_plan_days_without_places(self):
+        """Test empty days are still returned"""
+        assert plan_days([], [], 3) == [[], [], []]
+
+    @pytest.mark.parametrize("start,end,expected", [(480, 540, "08:00 - 09:00"), (515, 1079, "08:35 - 17:59")])
+    def test_format_time_slot(self, start, end, expected):
+        """Test time slot formatting"""
+        assert format_time_slot(start, end) == expected
+
+
+class TestOpeningWindows:
+    """Tests for time-window-aware scheduling"""
+
+    def test_schedule_waits_for_opening(self):
+        """Test a stop starts when its site opens, not on arrival"""
+        stops, leftover = schedule_day([0], [60], [[0]], windows=[[(600, 1020)]])
+        assert (stops[0].start, stops[0].end) == (600, 660)
+        assert leftover == []
+
+    def test_schedule_skips_closed_site(self):
+        """Test a site that closes before the visit can finish is left over"""
+        stops, leftover = schedule_day([0], [120], [[0]], windows=[[(420, 500)]])
+        assert stops == [] and leftover == [0]
+
+    def test_insertion_respects_windows(self):
+        """Test the morning-only site is visited before the afternoon-only site"""
+        travel = [[0, 10, 10], [10, 0, 10], [10, 10, 0]]
+        windows = [[(780, 1080)], [(480, 660)], None]
+        stops, leftover = insert_with_windows([0, 1, 2], [60, 60, 60], travel, windows)
+        assert leftover == []
+        by_index = {s.index: s for s in stops}
+        assert by_index[1].end <= 660
+        assert by_index[0].start >= 780
+        assert [s.start for s in stops] == sorted(s.start for s in stops)
+
+    def test_plan_days_with_windows(self):
+        """Test windows are honoured by plan_days"""
+        points = [WEST[0], WEST[1], WEST[2]]
+        windows = [[(840, 1080)], None, [(480, 600)]]
+        days = plan_days(points, [90, 90, 90], 1, windows=windows)
+        for stop in days[0]:
+            if windows[stop.index]:
+                opens, closes = windows[stop.index][0]
+                assert opens <= stop.start and stop.end <= closes
+        assert sorted(s.index for s in days[0]) == [0, 1, 2]
+
+    def test_can_visit(self):
+        """Test visits longer than every window are rejected up front"""
+        assert can_visit(None, 600) is True
+        assert can_visit([(450, 690)], 180) is True
+        assert can_visit([(450, 690)], 240) is False
+        assert can_visit([(1140, 1320)], 60) is False
+
+
+class TestInsertStop:
+    """Tests for incremental cheapest insertion into a scheduled day"""
+
+    # Ba điểm trên một đường thẳng bắc-nam, điểm mới nằm giữa hai điểm đầu
+    LINE = [(21.00, 105.8), (21.10, 105.8), (21.20, 105.8), (21.05, 105.8)]
+
+    def test_inserts_in_the_cheapest_gap(self):
+        """Test the new stop goes between its neighbours and earlier stops keep their times"""
+        day = schedule_stops(self.LINE, [60] * 4, [0, 1, 2])
+        stops, fits = insert_stop(self.LINE, [60] * 4, day, 3)
+        assert fits
+        assert [s.index for s in stops] == [0, 3, 1, 2]
+        assert stops[0] == day[0]
+        assert [s.start for s in stops] == sorted(s.start for s in stops)
+        assert stops[1].start == day[0].end + stops[1].travel_minutes
+
+    def test_keeps_existing_times_before_insertion(self):
+        """Test hand-set times before the insertion point are not rescheduled"""
+        day = [Stop(0, 540, 600, 0), Stop(1, 700, 760, 0)]
+        stops, _ = insert_stop(self.LINE[:2] + [(21.2, 105.8)], [60, 60, 60], day, 2)
+        assert stops[:2] == day
+        assert stops[2].start == 760 + stops[2].travel_minutes
+
+    def test_respects_windows_and_overflow(self):
+        """Test a closed gap is skipped and a full day still accepts the place"""
+        windows = [None, None, None, [(900, 1080)]]
+        day = schedule_stops(self.LINE, [60] * 4, [0, 1, 2])
+        stops, fits = insert_stop(self.LINE, [60] * 4, day, 3, windows=windows)
+        assert fits and next(s for s in stops if s.index == 3).start >= 900
+
+        full = schedule_stops(self.LINE, [240] * 4, [0, 1])
+        stops, fits = insert_stop(self.LINE, [240] * 4, full, 3)
+        assert not fits and len(stops) == 3
+
+    def test_empty_day_from_hotel(self):
+        """Test inserting into an empty day starts after travel from the hotel"""
+        stops, fits = insert_stop(self.LINE, [60] * 4, [], 1, start=self.LINE[0], day_start=510)
+        assert fits and stops[0].start == 510 + stops[0].travel_minutes > 510
+
+    @pytest.mark.parametrize("text,expected", [("08:00 - 10:00", (480, 600)), ("08:30-09:15", (510, 555)),
+                                               ("Cả ngày", None), (None, None)])
+    def test_parse_time_slot(self, text, expected):
+        """Test time slots written by format_time_slot (or by hand) are read back"""
+        assert parse_time_slot(text) == expected
+
+
+class TestChooseBase:
+    """Tests for hotel placement over day centroids"""
+
+    def test_day_centroids(self):
+        """Test centroids ignore stops without coordinates and empty days"""
+        assert day_centroids([[(21.0, 105.0), (21.2, 105.2)], [(None, None)], []]) == [(21.1, 105.1)]
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_picks_site_between_days(self, use_numpy):
+        """Test the site closest to both day clusters wins, sites without coordinates never do"""
+        if use_numpy and itinerary_planner.np is None:
+            pytest.skip("NumPy not installed")
+        targets = day_centroids([WEST, EAST])
+        sites = [(None, None), (21.0, 105.2), (21.0, 105.75), (21.0, 106.3)]
+        assert choose_base(sites, targets, use_numpy=use_numpy) == 2
+        assert choose_base([(None, None)], targets, use_numpy=use_numpy) is None
+        assert choose_base([], targets, use_numpy=use_numpy) is None
+
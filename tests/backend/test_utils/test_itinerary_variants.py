@@ -0,0 +1,82 @@
+"""
+Unit tests for multi-objective itinerary variants
+"""
+import pytest
+
+from utils import itinerary_variants
+from utils.itinerary_variants import (
+    OBJECTIVES, VariantPlace, VariantProblem, objective_utilities, solve_variant, solve_variants
+)
+
+
+def _problem(**overrides):
+    # Hai điểm xa, đắt, rating cao và hai điểm gần khách sạn, miễn phí, rating thấp hơn
+    candidates = (
+        VariantPlace(300_000, 120, 5.0, (21.50, 105.80), None),
+        VariantPlace(300_000, 120, 4.9, (21.51, 105.80), None),
+        VariantPlace(0, 120, 4.0, (21.00, 105.80), None),
+        VariantPlace(0, 120, 3.9, (21.01, 105.80), None),
+    )
+    values = dict(fixed=(), candidates=candidates, budget=None, time_left=2 * 135, num_days=1,
+                  start=(21.0, 105.8))
+    values.update(overrides)
+    return VariantProblem(**values)
+
+
+class TestObjectives:
+    """Tests for objective_utilities / solve_variant"""
+
+    def test_objectives_pick_different_places(self):
+        """Test rating prefers top-rated, cheapest and least_travel prefer the free nearby places"""
+        problem = _problem()
+        assert solve_variant(problem, "rating").chosen == [0, 1]
+        assert solve_variant(problem, "cheapest").chosen == [2, 3]
+        assert solve_variant(problem, "least_travel").chosen == [2, 3]
+
+    def test_least_travel_without_hotel_uses_fixed_places(self):
+        """Test the must-include places anchor least_travel when there is no hotel"""
+        fixed = (VariantPlace(0, 60, 4.0, (21.50, 105.80), None),)
+        values = objective_utilities(_problem(start=None, fixed=fixed), "least_travel")
+        assert values[0] > values[2]
+
+    def test_unknown_objective(self):
+        """Test an unknown objective is rejected"""
+        with pytest.raises(ValueError):
+            objective_utilities(_problem(), "fastest")
+
+    def test_seed_is_reproducible(self):
+        """Test the same seed always gives the same variant"""
+        problem = _problem(candidates=_problem().candidates * 3, time_left=5 * 135)
+        assert solve_variant(problem, seed=7) == solve_variant(problem, seed=7)
+
+    def test_days_index_fixed_then_chosen(self):
+        """Test stop indices cover the fixed places followed by the chosen candidates"""
+        fixed = (VariantPlace(0, 60, 4.0, (21.02, 105.80), None),)
+        variant = solve_variant(_problem(fixed=fixed, time_left=2 * 135), "cheapest")
+        assert sorted(stop.index for day in variant.days for stop in day) == [0, 1, 2]
+
+
+class TestSolveVariants:
+    """Tests for solve_variants"""
+
+    def test_process_pool_matches_in_process(self, monkeypatch):
+        """Test variants solved in worker processes equal the in-process results"""
+        problem = _problem()
+        specs = [(objective, None) for objective in OBJECTIVES] + [("rating", 3)]
+        monkeypatch.setenv("ITINERARY_VARIANT_WORKERS", "2")
+        try:
+            parallel = solve_variants(problem, specs)
+        finally:
+            itinerary_variants.shutdown_executor()
+        monkeypatch.setenv("ITINERARY_VARIANT_WORKERS", "0")
+        assert parallel == solve_variants(problem, specs)
+        assert [variant.objective for variant in parallel] == list(OBJECTIVES) + ["rating"]
+
+    def test_broken_pool_falls_back(self, monkeypatch):
+        """Test a pool that cannot be used still returns every variant"""
+        def broken():
+            raise OSError("no processes")
+
+        monkeypatch.setenv("ITINERARY_VARIANT_WORKERS", "2")
+        monkeypatch.setattr(itinerary_variants, "_get_executor", broken)
+        assert len(solve_variants(_problem(), [("rating", None), ("cheapest", None)])) == 2
@@ -0,0 +1,124 @@
+"""
+Unit tests for the OpenAI response cache
+"""
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils.openai_cache import ResponseCache, response_cache_key
+from utils.openai_client import OpenAIChatClient
+
+
+class TestResponseCacheKey:
+    """Tests for response_cache_key"""
+
+    def test_key_covers_model_temperature_and_messages(self):
+        """Test every part of the request changes the key"""
+        messages = [{"role": "user", "content": "Hà Nội"}]
+        key = response_cache_key("gpt-4o-mini", 0.4, messages)
+        assert key == response_cache_key("gpt-4o-mini", 0.4, [{"content": "Hà Nội", "role": "user"}])
+        assert key != response_cache_key("gpt-4o", 0.4, messages)
+        assert key != response_cache_key("gpt-4o-mini", 0.5, messages)
+        assert key != response_cache_key("gpt-4o-mini", 0.4, [{"role": "user", "content": "Huế"}])
+
+
+class TestResponseCache:
+    """Tests for ResponseCache"""
+
+    def test_lru_eviction_and_counters(self):
+        """Test the least recently used reply is evicted and hits/misses are counted"""
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        assert cache.get("a") == "1"
+        cache.put("c", "3")
+        assert cache.get("b") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 1, 2)
+
+    def test_invalid_sizes_rejected(self):
+        """Test non-positive sizes are rejected"""
+        with pytest.raises(ValueError):
+            ResponseCache(max_entries=0)
+        with pytest.raises(ValueError):
+            ResponseCache(ttl_seconds=0)
+
+    def test_entries_expire(self):
+        """Test replies older than the TTL are misses"""
+        cache = ResponseCache(ttl_seconds=10)
+        with patch("utils.openai_cache.time.monotonic", return_value=100.0):
+            cache.put("a", "1")
+        with patch("utils.openai_cache.time.monotonic", return_value=111.0):
+            assert cache.get("a") is None
+
+    def test_disk_tier_is_shared(self, tmp_path):
+        """Test a reply stored by one cache is served from disk to another (another worker)"""
+        path = str(tmp_path / "openai.sqlite3")
+        ResponseCache(path=path).put("a", "1")
+        other = ResponseCache(path=path)
+        assert other.get("a") == "1"
+        assert other.get("a") == "1"
+        stats = other.stats()
+        assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+    def test_disk_tier_prunes_least_recently_used(self, tmp_path):
+        """Test the disk tier keeps at most disk_max_entries rows"""
+        path = str(tmp_path / "openai.sqlite3")
+        for key in ("a", "b", "c"):
+            ResponseCache(path=path, disk_max_entries=2).put(key, key)
+        fresh = ResponseCache(path=path)
+        assert fresh.get("a") is None
+        assert fresh.get("c") == "c"
+
+    def test_disk_errors_are_misses(self, tmp_path):
+        """Test an unusable cache file never breaks a request"""
+        cache = ResponseCache(path=str(tmp_path / "missing" / "openai.sqlite3"))
+        cache.put("a", "1")
+        cache._entries.clear()
+        assert cache.get("a") is None
+        assert cache.stats()["disk_errors"] >= 1
+
+
+class TestClientCaching:
+    """Tests for OpenAIChatClient.generate_reply with the response cache"""
+
+    @patch('utils.openai_client.OpenAI')
+    def test_duplicate_prompt_skips_api_and_rate_limiter(self, mock_openai_class):
+        """Test a byte-identical prompt is answered from the cache"""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value.choices = [MagicMock()]
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "Cached answer"
+        mock_openai_class.return_value = mock_client
+
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            client = OpenAIChatClient()
+            client._cache = ResponseCache()
+            client._rate_limiter = MagicMock()
+            messages = [{'role': 'user', 'content': 'Đà Lạt'}]
+
+            assert client.generate_reply(messages) == "Cached answer"
+            assert client.generate_reply(messages) == "Cached answer"
+
+            assert mock_client.chat.completions.create.call_count == 1
+            assert client._rate_limiter.acquire.call_count == 1
+
+    @patch('utils.openai_client.OpenAI')
+    def test_opt_out_always_calls_api(self, mock_openai_class):
+        """Test cache=False neither reads nor writes the cache"""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value.choices = [MagicMock()]
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "Fresh"
+        mock_openai_class.return_value = mock_client
+
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            client = OpenAIChatClient()
+            client._cache = ResponseCache()
+            client._rate_limiter = MagicMock()
+            messages = [{'role': 'user', 'content': 'Đà Lạt'}]
+
+            client.generate_reply(messages, cache=False)
+            client.generate_reply(messages, cache=False)
+
+            assert mock_client.chat.completions.create.call_count == 2
+            assert client._cache.stats()["stores"] == 0
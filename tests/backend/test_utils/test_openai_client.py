@@ -131,3 +131,28 @@ class TestOpenAIChatClient:
             image_count = sum(1 for item in user_content if item.get('type') == 'image_url')
             assert image_count == 2
 
+    @patch('utils.openai_client.OpenAI')
+    def test_stream_reply_yields_text_deltas(self, mock_openai_class):
+        """Test stream_reply skips empty chunks and close() closes the upstream stream"""
+        def chunk(text, has_choice=True):
+            item = MagicMock()
+            item.choices = [MagicMock()] if has_choice else []
+            if has_choice:
+                item.choices[0].delta.content = text
+            return item
+
+        upstream = MagicMock()
+        upstream.__iter__.return_value = iter([chunk("Xin "), chunk(None), chunk("", False), chunk("chào")])
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = upstream
+        mock_openai_class.return_value = mock_client
+
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            client = OpenAIChatClient()
+            client._rate_limiter = MagicMock()
+            stream = client.stream_reply([{'role': 'user', 'content': 'Hello'}])
+
+            assert list(stream) == ["Xin ", "chào"]
+            assert mock_client.chat.completions.create.call_args[1]['stream'] is True
+            stream.close()
+            upstream.close.assert_called_once()
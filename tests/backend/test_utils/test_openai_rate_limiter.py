@@ -4,7 +4,7 @@ Unit tests for OpenAI Rate Limiter
 import pytest
 import time
 from unittest.mock import patch
-from utils.openai_rate_limiter import SimpleRateLimiter, get_shared_openai_limiter
+from utils.openai_rate_limiter import SQLiteTokenBucketLimiter, SimpleRateLimiter, get_shared_openai_limiter
 
 
 class TestSimpleRateLimiter:
@@ -109,3 +109,75 @@ class TestGetSharedOpenAILimiter:
         assert limiter.max_calls == 3  # Default from code
         assert limiter.window_seconds == 60.0  # Default from code
 
+
+    @patch.dict('os.environ', {'OPENAI_RATE_LIMITER': 'sqlite', 'OPENAI_RPM_LIMIT': '5'})
+    def test_get_shared_limiter_sqlite_backend(self, tmp_path):
+        """Test OPENAI_RATE_LIMITER=sqlite selects the cross-process token bucket"""
+        import os
+        import utils.openai_rate_limiter
+        utils.openai_rate_limiter._shared_limiter = None
+        os.environ['OPENAI_RATE_LIMIT_PATH'] = str(tmp_path / "limiter.sqlite3")
+
+        limiter = get_shared_openai_limiter()
+        utils.openai_rate_limiter._shared_limiter = None
+
+        assert isinstance(limiter, SQLiteTokenBucketLimiter)
+        assert limiter.max_calls == 5
+
+
+def _acquire_from_process(path, result_queue):
+    limiter = SQLiteTokenBucketLimiter(max_calls=4, window_seconds=60.0, path=path)
+    start = time.monotonic()
+    limiter.acquire()
+    result_queue.put(time.monotonic() - start)
+
+
+class TestSQLiteTokenBucketLimiter:
+    """Tests for SQLiteTokenBucketLimiter"""
+
+    def test_init_invalid_params(self, tmp_path):
+        """Test invalid limits are rejected like SimpleRateLimiter"""
+        with pytest.raises(ValueError):
+            SQLiteTokenBucketLimiter(max_calls=0, window_seconds=60.0, path=str(tmp_path / "l.sqlite3"))
+        with pytest.raises(ValueError):
+            SQLiteTokenBucketLimiter(max_calls=1, window_seconds=0, path=str(tmp_path / "l.sqlite3"))
+
+    def test_bucket_is_shared_between_instances(self, tmp_path):
+        """Test two limiters on one file (two workers) draw from the same bucket"""
+        path = str(tmp_path / "limiter.sqlite3")
+        first = SQLiteTokenBucketLimiter(max_calls=2, window_seconds=0.2, path=path)
+        second = SQLiteTokenBucketLimiter(max_calls=2, window_seconds=0.2, path=path)
+
+        first.acquire()
+        second.acquire()
+        start = time.monotonic()
+        first.acquire()  # Bucket rỗng: chờ ~0.1s cho 1 token
+        assert time.monotonic() - start >= 0.05
+
+    def test_bucket_is_shared_between_processes(self, tmp_path):
+        """Test worker processes together stay within max_calls"""
+        import multiprocessing
+
+        path = str(tmp_path / "limiter.sqlite3")
+        SQLiteTokenBucketLimiter(max_calls=4, window_seconds=60.0, path=path)
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_acquire_from_process, args=(path, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+        assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+
+        # Cả 4 token đã dùng hết: lượt tiếp theo phải chờ ~15s
+        limiter = SQLiteTokenBucketLimiter(max_calls=4, window_seconds=60.0, path=path)
+        assert limiter._connect(limiter._take) > 10
+
+    def test_unusable_file_falls_back_to_process_limiter(self, tmp_path):
+        """Test SQLite errors never block requests"""
+        limiter = SQLiteTokenBucketLimiter(max_calls=1, window_seconds=60.0, path=str(tmp_path / "l.sqlite3"))
+        limiter.path = str(tmp_path / "missing" / "l.sqlite3")
+
+        limiter.acquire()
+
+        assert len(limiter._fallback._timestamps) == 1
@@ -0,0 +1,60 @@
+"""
+Unit tests for opening-hours parsing
+"""
+import pytest
+from utils.opening_hours import decode_windows, encode_windows, merge_windows, parse_opening_hours
+
+
+class TestParseOpeningHours:
+    """Tests for parse_opening_hours"""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("07:00 - 17:00", [(420, 1020)]),
+        ("7h:30 - 17:00", [(450, 1020)]),
+        ("Thứ Hai-Chủ Nhật: 08:00-17:30", [(480, 1050)]),
+        ("05:00 đến 18:00", [(300, 1080)]),
+        ("06:00 – 17:00 hàng ngày", [(360, 1020)]),
+        ("Sáng: 07:30 - 11:30, Chiều: 13:30 - 17:00 (Thường đóng cửa Thứ Hai)", [(450, 690), (810, 1020)]),
+        ("Thứ hai - Thứ bảy: 09:30 - 22h00, CN: 09:00 - 22h00", [(540, 1320)]),
+    ])
+    def test_time_ranges(self, text, expected):
+        """Test common range formats from the catalog"""
+        assert parse_opening_hours(text) == expected
+
+    def test_overnight_range_is_split(self):
+        """Test ranges past midnight become two same-day windows"""
+        assert parse_opening_hours("Hoạt động: 18:00 - 02:00 sáng") == [(0, 120), (1080, 1440)]
+
+    @pytest.mark.parametrize("text", ["Cả ngày", "Mở cửa cả ngày (Nên tham quan ban ngày)", "Mở cửa 24/7"])
+    def test_all_day(self, text):
+        """Test all-day wording"""
+        assert parse_opening_hours(text) == [(0, 1440)]
+
+    def test_office_hours(self):
+        """Test 'giờ hành chính' maps to office hours"""
+        assert parse_opening_hours("Giờ hành chính") == [(450, 690), (810, 1020)]
+
+    @pytest.mark.parametrize("text", [None, "", "None", "Buổi tối", "Giờ lễ: Ngày thường 5:30, 18:30"])
+    def test_unknown(self, text):
+        """Test text without a range means no constraint"""
+        assert parse_opening_hours(text) is None
+
+
+class TestWindowEncoding:
+    """Tests for encode_windows / decode_windows / merge_windows"""
+
+    def test_round_trip(self):
+        """Test the compact JSON form round-trips"""
+        encoded = encode_windows([(450, 690), (810, 1020)])
+        assert encoded == "[[450,690],[810,1020]]"
+        assert decode_windows(encoded) == [(450, 690), (810, 1020)]
+
+    def test_none_and_garbage(self):
+        """Test missing or corrupt values decode to None"""
+        assert encode_windows(None) is None
+        assert decode_windows(None) is None
+        assert decode_windows("not json") is None
+
+    def test_merge(self):
+        """Test overlapping windows are merged"""
+        assert merge_windows([(600, 700), (420, 650), (800, 900)]) == [(420, 700), (800, 900)]
@@ -0,0 +1,57 @@
+"""
+Unit tests for keyset pagination helpers
+"""
+import pytest
+from utils.pagination import (
+    InvalidPageParams,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    fetch_ranked_page,
+    parse_page_args,
+)
+
+
+class TestCursor:
+    """Tests for cursor encoding"""
+
+    def test_roundtrip(self):
+        """Test a cursor decodes back to (rating, id)"""
+        assert decode_cursor(encode_cursor(4.5, 12)) == (4.5, 12)
+
+    def test_roundtrip_null_rating(self):
+        """Test a NULL rating survives the roundtrip"""
+        assert decode_cursor(encode_cursor(None, 3)) == (None, 3)
+
+    def test_garbage_cursor(self):
+        """Test malformed cursors raise InvalidPageParams"""
+        with pytest.raises(InvalidPageParams):
+            decode_cursor("%%%")
+
+
+class TestParsePageArgs:
+    """Tests for parse_page_args"""
+
+    def test_no_paging_requested(self):
+        """Test None is returned without limit/cursor"""
+        assert parse_page_args({}) is None
+
+    def test_limit_is_capped(self):
+        """Test limit is capped to MAX_PAGE_SIZE"""
+        limit, cursor = parse_page_args({"limit": "100000"})
+        assert limit == MAX_PAGE_SIZE
+        assert cursor is None
+
+    def test_non_positive_limit(self):
+        """Test zero/negative limits are rejected"""
+        with pytest.raises(InvalidPageParams):
+            parse_page_args({"limit": "0"})
+
+
+class TestFetchRankedPage:
+    """Tests for fetch_ranked_page"""
+
+    def test_rating_cursor_without_rank(self):
+        """Test a (NULL, id) cursor from a rating-ordered page is rejected"""
+        with pytest.raises(InvalidPageParams):
+            fetch_ranked_page(None, None, None, (None, 3), 10, key=None)
@@ -0,0 +1,73 @@
+"""
+Unit tests for knapsack place selection
+"""
+import random
+
+import pytest
+from utils import place_selection
+from utils.place_selection import TRAVEL_ALLOWANCE_MIN, Candidate, select_places
+
+DAY = 600
+
+
+def _random_candidates(n, seed=5):
+    rng = random.Random(seed)
+    return [
+        Candidate(rng.choice([0, 0, 50, 100, 250, 400]), rng.choice([60, 90, 120, 180]), rng.uniform(3, 5))
+        for _ in range(n)
+    ]
+
+
+class TestSelectPlaces:
+    """Tests for select_places"""
+
+    def test_expensive_place_does_not_crowd_out_cheap_ones(self):
+        """Test three good cheap places beat one top-rated expensive place"""
+        candidates = [Candidate(300, 60, 5.0), Candidate(100, 60, 4.5), Candidate(100, 60, 4.4), Candidate(100, 60, 4.3)]
+        assert select_places(candidates, 300, DAY) == [1, 2, 3]
+
+    def test_unlimited_budget_is_time_bound(self):
+        """Test budget=None only applies the time limit"""
+        candidates = [Candidate(10_000, 120, 5.0 - i / 10) for i in range(10)]
+        chosen = select_places(candidates, None, DAY)
+        assert chosen == [0, 1, 2, 3]
+        assert len(chosen) * (120 + TRAVEL_ALLOWANCE_MIN) <= DAY
+
+    def test_respects_limits(self):
+        """Test the chosen set never exceeds the real budget or time"""
+        candidates = _random_candidates(80)
+        chosen = select_places(candidates, 777, 3 * DAY)
+        assert sum(candidates[i].cost for i in chosen) <= 777
+        assert sum(candidates[i].minutes + TRAVEL_ALLOWANCE_MIN for i in chosen) <= 3 * DAY
+
+    def test_zero_utility_places_fill_spare_time(self):
+        """Test unrated places are still used when time and money remain"""
+        assert select_places([Candidate(0, 60, 0.0), Candidate(0, 60, 0.0)], None, DAY) == [0, 1]
+
+    def test_zero_budget_keeps_free_places(self):
+        """Test an exhausted budget still allows free places"""
+        assert select_places([Candidate(10, 60, 5.0), Candidate(0, 60, 1.0)], 0, DAY) == [1]
+
+    def test_empty(self):
+        """Test no candidates or no time"""
+        assert select_places([], 100, DAY) == []
+        assert select_places([Candidate(0, 60, 5.0)], 100, 0) == []
+
+    def test_pure_python_dp_matches_numpy(self):
+        """Test both DP implementations reach the same utility"""
+        if place_selection.np is None:
+            pytest.skip("NumPy not installed")
+        candidates = _random_candidates(30)
+        total = lambda chosen: round(sum(candidates[i].utility for i in chosen), 9)
+        assert total(select_places(candidates, 500, 2 * DAY, use_numpy=False)) == total(
+            select_places(candidates, 500, 2 * DAY, use_numpy=True)
+        )
+
+    def test_greedy_fallback_for_huge_inputs(self, monkeypatch):
+        """Test the greedy path is used above the DP size limit and stays feasible"""
+        monkeypatch.setattr(place_selection, "MAX_DP_CELLS", 0)
+        monkeypatch.setattr(place_selection, "MAX_DP_CELLS_PYTHON", 0)
+        candidates = _random_candidates(200)
+        chosen = select_places(candidates, 1000, 5 * DAY)
+        assert chosen
+        assert sum(candidates[i].cost for i in chosen) <= 1000
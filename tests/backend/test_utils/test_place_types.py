@@ -0,0 +1,19 @@
+"""
+Unit tests for the place-type classification helpers
+"""
+import pytest
+from utils.place_types import is_accommodation_type
+
+
+class TestIsAccommodationType:
+    """Tests for is_accommodation_type"""
+
+    @pytest.mark.parametrize("place_type", ["hotel", "Resort", "Boutique Homestay", "motel", "accommodation"])
+    def test_accommodation(self, place_type):
+        """Test lodging types are recognised case-insensitively"""
+        assert is_accommodation_type(place_type) is True
+
+    @pytest.mark.parametrize("place_type", [None, "", "beach", "museum"])
+    def test_not_accommodation(self, place_type):
+        """Test other and missing types"""
+        assert is_accommodation_type(place_type) is False
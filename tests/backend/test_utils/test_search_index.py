@@ -0,0 +1,66 @@
+"""
+Unit tests for the FTS5 destination search index
+"""
+import pytest
+from utils.search_index import build_match_expression, normalize_text
+
+
+class TestNormalizeText:
+    """Tests for normalize_text"""
+
+    def test_flattens_json_list(self):
+        """Test JSON description arrays are flattened and unaccented"""
+        assert normalize_text('["Di sản thiên nhiên", "Đẹp"]') == "di san thien nhien dep"
+
+    def test_plain_text(self):
+        """Test plain strings are unaccented and lower-cased"""
+        assert normalize_text("Vịnh Hạ Long") == "vinh ha long"
+
+    def test_none(self):
+        """Test None becomes an empty document"""
+        assert normalize_text(None) == ""
+
+
+class TestBuildMatchExpression:
+    """Tests for build_match_expression"""
+
+    def test_prefix_tokens(self):
+        """Test every token becomes a quoted prefix term"""
+        assert build_match_expression("Hạ Long") == '"ha"* AND "long"*'
+
+    def test_column_filter(self):
+        """Test column filters wrap the whole expression"""
+        expression = build_match_expression("sapa", columns=("name", "province"))
+        assert expression == '{name province} : ("sapa"*)'
+
+    def test_operators_are_not_injected(self):
+        """Test FTS syntax characters are stripped from user input"""
+        assert build_match_expression('"} OR *') == '"or"*'
+
+    def test_no_tokens(self):
+        """Test punctuation-only input yields no expression"""
+        assert build_match_expression("!!!") is None
+
+
+class TestSearchIndexAvailable:
+    """Tests for search_index_available"""
+
+    def test_table_created_later_is_picked_up(self, app):
+        """Test a missing FTS table is re-checked, so one created by seed.py later is used"""
+        from models import db
+        from utils.search_index import FTS_TABLE, create_search_index, drop_search_index, search_index_available
+
+        with db.engine.begin() as connection:
+            drop_search_index(connection)
+        assert search_index_available(db.session) is False
+        db.session.rollback()
+
+        # Process khác (seed.py / flask search-reindex) tạo bảng: không đi qua create_search_index của process này
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, province, description, tags)")
+        assert search_index_available(db.session) is True
+        db.session.rollback()
+
+        with db.engine.begin() as connection:
+            drop_search_index(connection)
+            create_search_index(connection)
@@ -0,0 +1,33 @@
+"""
+Unit tests for the shared SQLite virtual-table index helpers
+"""
+from utils.sqlite_index import VirtualTableIndex, chunks
+
+
+class TestChunks:
+    """Tests for chunks"""
+
+    def test_splits_by_size(self):
+        """Test ids are split into IN-sized slices in order"""
+        assert list(chunks([1, 2, 3, 4, 5], size=2)) == [[1, 2], [3, 4], [5]]
+        assert list(chunks([])) == []
+
+
+class TestVirtualTableIndex:
+    """Tests for VirtualTableIndex"""
+
+    def test_remove_deletes_rows_in_chunks(self, app, monkeypatch):
+        """Test remove() deletes every id even when the list spans several IN chunks"""
+        from models import db
+        import utils.sqlite_index as sqlite_index
+
+        index = VirtualTableIndex("test_vtable", "rowid",
+                                  "CREATE VIRTUAL TABLE IF NOT EXISTS test_vtable USING fts5(body)", "test_pending")
+        monkeypatch.setattr(sqlite_index, "CHUNK_SIZE", 2)
+        with db.engine.begin() as connection:
+            assert index.create(connection) is True
+            connection.exec_driver_sql("INSERT INTO test_vtable(rowid, body) VALUES (1, 'a'), (2, 'b'), (3, 'c'), (4, 'd')")
+            index.remove(connection, [1, 2, 3])
+            remaining = [row[0] for row in connection.exec_driver_sql("SELECT rowid FROM test_vtable")]
+            index.drop(connection)
+        assert remaining == [4]
@@ -0,0 +1,101 @@
+"""
+Unit tests for the normalized tag tables and inverted tag index
+"""
+import pytest
+from utils.tag_index import _intersect_sorted, parse_tags, tag_index
+
+
+class TestParseTags:
+    """Tests for parse_tags"""
+
+    def test_json_list(self):
+        """Test JSON arrays are decoded and stripped"""
+        assert parse_tags('["Beach", " Adventure "]') == ["Beach", "Adventure"]
+
+    def test_duplicates_ignore_case(self):
+        """Test the first spelling of a duplicate tag wins"""
+        assert parse_tags('["Beach", "beach", "BEACH"]') == ["Beach"]
+
+    def test_comma_separated_fallback(self):
+        """Test non-JSON values fall back to comma splitting"""
+        assert parse_tags("Beach, Food") == ["Beach", "Food"]
+
+    def test_empty(self):
+        """Test empty values yield no tags"""
+        assert parse_tags(None) == []
+        assert parse_tags("[]") == []
+
+
+class TestIntersectSorted:
+    """Tests for _intersect_sorted"""
+
+    def test_intersection(self):
+        """Test common ids are returned in order"""
+        assert _intersect_sorted([1, 3, 5, 7, 9], [2, 3, 4, 9]) == [3, 9]
+
+    def test_disjoint(self):
+        """Test disjoint lists intersect to nothing"""
+        assert _intersect_sorted([1, 2], [3, 4]) == []
+
+
+class TestTagIndex:
+    """Tests for the tag index backed by destination_tags"""
+
+    @pytest.fixture
+    def tagged_destinations(self, app, test_province):
+        from models import db, Destination
+        with app.app_context():
+            rows = [
+                Destination(name="A", province_id=test_province.id, tags='["Beach", "Food"]'),
+                Destination(name="B", province_id=test_province.id, tags='["beach"]'),
+                Destination(name="C", province_id=test_province.id, tags='["Food", "Culture"]'),
+            ]
+            db.session.add_all(rows)
+            db.session.commit()
+            return [row.id for row in rows]
+
+    def test_flush_creates_links(self, app, tagged_destinations):
+        """Test inserted destinations are linked to shared, case-folded tags"""
+        from models import db, Tag
+        with app.app_context():
+            assert sorted(tag.name_key for tag in Tag.query.all()) == ["beach", "culture", "food"]
+            assert tag_index.ids_for(db.session, ["BEACH"]) == tagged_destinations[:2]
+
+    def test_intersection_of_tags(self, app, tagged_destinations):
+        """Test multi-tag lookups require every tag"""
+        from models import db
+        a, _, c = tagged_destinations
+        with app.app_context():
+            assert tag_index.ids_for(db.session, ["food", "beach"]) == [a]
+            assert tag_index.ids_for(db.session, ["food"]) == [a, c]
+            assert tag_index.ids_for(db.session, ["food", "unknown"]) == []
+
+    def test_vocabulary_most_used_first(self, app, tagged_destinations):
+        """Test the vocabulary is ordered by usage"""
+        from models import db
+        with app.app_context():
+            assert tag_index.vocabulary(db.session) == ["Beach", "Food", "Culture"]
+
+    def test_delete_drops_links(self, app, tagged_destinations):
+        """Test deleting a destination removes it from the index"""
+        from models import db, Destination
+        a, b, _ = tagged_destinations
+        with app.app_context():
+            db.session.delete(db.session.get(Destination, a))
+            db.session.commit()
+            assert tag_index.ids_for(db.session, ["beach"]) == [b]
+
+    def test_out_of_process_reindex_reaches_live_server(self, app, client, tagged_destinations, monkeypatch):
+        """Test links rewritten by another process (flask tags-reindex) are seen on the next request"""
+        from sqlalchemy import text
+        from models import db
+        a, b, _ = tagged_destinations
+        assert {d["id"] for d in client.get('/api/destinations?tags=beach').get_json()['items']} == {a, b}
+
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text("DELETE FROM destination_tags WHERE destination_id = :id"), {"id": a})
+                connection.execute(text("UPDATE catalog_meta SET version = version + 1"))
+        monkeypatch.setenv('CATALOG_SYNC_INTERVAL', '0')
+
+        assert [d["id"] for d in client.get('/api/destinations?tags=beach').get_json()['items']] == [b]
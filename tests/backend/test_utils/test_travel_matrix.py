@@ -0,0 +1,73 @@
+"""
+Unit tests for the vectorized distance / travel-time matrices
+"""
+import pytest
+from app import estimate_travel_time_km, haversine_distance
+from utils import travel_matrix
+from utils.travel_matrix import distance_matrix, travel_time_matrices, travel_time_matrix
+
+POINTS = [
+    (21.0285, 105.8542),   # Hà Nội
+    (20.9101, 107.1839),   # Hạ Long
+    (10.8231, 106.6297),   # TP.HCM
+    (21.0288, 105.8525),   # Hồ Gươm (rất gần Hà Nội)
+]
+
+
+def _as_lists(matrix):
+    return [list(row) for row in (matrix.tolist() if hasattr(matrix, "tolist") else matrix)]
+
+
+class TestDistanceMatrix:
+    """Tests for distance_matrix"""
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_matches_scalar_haversine(self, use_numpy):
+        """Test every entry equals haversine_distance from app.py"""
+        if use_numpy and not travel_matrix.numpy_available():
+            pytest.skip("NumPy not installed")
+        matrix = _as_lists(distance_matrix(POINTS, use_numpy=use_numpy))
+        for i, (lat1, lng1) in enumerate(POINTS):
+            for j, (lat2, lng2) in enumerate(POINTS):
+                assert matrix[i][j] == pytest.approx(haversine_distance(lat1, lng1, lat2, lng2), abs=0.011)
+
+    def test_rectangular(self):
+        """Test points x others gives an n x m matrix"""
+        matrix = _as_lists(distance_matrix(POINTS[:2], POINTS, use_numpy=False))
+        assert len(matrix) == 2 and len(matrix[0]) == 4
+
+    def test_missing_coordinates_fallback(self):
+        """Test missing coordinates give None distances in the fallback"""
+        matrix = distance_matrix([(None, None), POINTS[0]], use_numpy=False)
+        assert matrix[0] == [None, None]
+
+    def test_numpy_forced_without_numpy(self, monkeypatch):
+        """Test requesting NumPy when it is missing raises"""
+        monkeypatch.setattr(travel_matrix, "np", None)
+        with pytest.raises(RuntimeError):
+            distance_matrix(POINTS, use_numpy=True)
+        assert distance_matrix(POINTS[:1])[0][0] == 0
+
+
+class TestTravelTimeMatrix:
+    """Tests for travel_time_matrix / travel_time_matrices"""
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_matches_scalar_estimate(self, use_numpy):
+        """Test minutes equal estimate_travel_time_km for every mode"""
+        if use_numpy and not travel_matrix.numpy_available():
+            pytest.skip("NumPy not installed")
+        distances, times = travel_time_matrices(POINTS, use_numpy=use_numpy)
+        distances = _as_lists(distances)
+        assert set(times) == {"car", "walk", "bike"}
+        for mode, matrix in times.items():
+            for i, row in enumerate(_as_lists(matrix)):
+                for j, minutes in enumerate(row):
+                    assert minutes == estimate_travel_time_km(distances[i][j], mode)
+
+    def test_missing_coordinates_numpy(self):
+        """Test nan distances become 0-minute travel times"""
+        if not travel_matrix.numpy_available():
+            pytest.skip("NumPy not installed")
+        distances = distance_matrix([(None, None), POINTS[0]], use_numpy=True)
+        assert _as_lists(travel_time_matrix(distances, "car"))[0] == [0, 0]